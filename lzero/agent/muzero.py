@@ -1,3 +1,4 @@
+import copy
 import os
 from functools import partial
 from typing import Optional, Union, List
@@ -24,6 +25,7 @@ from lzero.policy.muzero import MuZeroPolicy
 from lzero.policy.random_policy import LightZeroRandomPolicy
 from lzero.worker import MuZeroCollector as Collector
 from lzero.worker import MuZeroEvaluator as Evaluator
+from lzero.worker import MuZeroInferenceServer
 
 
 class MuZeroAgent:
@@ -270,12 +272,14 @@ class MuZeroAgent:
             concatenate_all_replay: bool = False,
             replay_save_path: str = None,
             seed: Optional[Union[int, List]] = None,
-            debug: bool = False
+            debug: bool = False,
+            batch_deploy: bool = False,
+            max_env_num: Optional[int] = None
     ) -> EvalReturn:
         """
         Overview:
             Deploy the agent for evaluation in the environment, with optional replay saving. The performance of the
-            agent will be evaluated. Average return and standard deviation of the return will be returned. 
+            agent will be evaluated. Average return and standard deviation of the return will be returned.
             If `enable_save_replay` is True, replay videos are saved in the specified `replay_save_path`.
         Arguments:
             - enable_save_replay (:obj:`bool`): Flag to enable saving of replay footage. Defaults to False.
@@ -283,6 +287,14 @@ class MuZeroAgent:
             - replay_save_path (:obj:`Optional[str]`): Directory path to save replay videos. Defaults to None, which sets a default path.
             - seed (:obj:`Optional[Union[int, List[int]]]`): Seed or list of seeds for environment reproducibility. Defaults to None.
             - debug (:obj:`bool`): Whether to enable the debug mode. Default to False.
+            - batch_deploy (:obj:`bool`): Whether to run the seeds concurrently, one env per seed in one env manager, \
+                so that the policy searches the MCTS of all the envs in one batch. Otherwise the seeds are run one \
+                after another. The return and the replay of each seed are kept. The random state of the policy is \
+                seeded once per chunk, by the first seed of the chunk, instead of once per seed as in the serial \
+                mode. So the return of a seed is reproducible for the same ``seed`` list and ``max_env_num``, but \
+                it may differ from the return of the seed in the serial mode. Defaults to False.
+            - max_env_num (:obj:`Optional[int]`): The maximum number of concurrent envs of ``batch_deploy``, the \
+                seeds are run in chunks of this size. Defaults to None, which means the number of CPUs.
         Returns:
             - An `EvalReturn` object containing evaluation metrics such as mean and standard deviation of returns.
         """
@@ -305,34 +317,83 @@ class MuZeroAgent:
             deply_configs[0]['replay_path'] = replay_save_path
             deply_configs[0]['save_replay'] = True
 
-        for seed in seed_list:
-
-            evaluator_env = create_env_manager(self.cfg.env.manager, [partial(self.env_fn, cfg=deply_configs[0])])
-
-            evaluator_env.seed(seed if seed is not None else self.cfg.seed, dynamic_seed=False)
-            set_pkg_seed(seed if seed is not None else self.cfg.seed, use_cuda=self.cfg.policy.cuda)
-
-            # ==============================================================
-            # MCTS+RL algorithms related core code
-            # ==============================================================
-            policy_config = self.cfg.policy
-
-            evaluator = Evaluator(
-                eval_freq=self.cfg.policy.eval_freq,
-                n_evaluator_episode=1,
-                stop_value=self.cfg.env.stop_value,
-                env=evaluator_env,
-                policy=self.policy.eval_mode,
-                exp_name=self.cfg.exp_name,
-                policy_config=policy_config
-            )
+        if batch_deploy:
+            seed_list = [seed if seed is not None else self.cfg.seed for seed in seed_list]
+            max_env_num = max_env_num if max_env_num is not None else os.cpu_count()
+            for start in range(0, len(seed_list), max_env_num):
+                chunk_seeds = seed_list[start:start + max_env_num]
+                # the policy is seeded by each chunk, so that the returns of a chunk do not depend on the previous ones
+                set_pkg_seed(chunk_seeds[0], use_cuda=self.cfg.policy.cuda)
+                env_cfgs = [copy.deepcopy(deply_configs[0]) for _ in chunk_seeds]
+                # the replays of each env are saved in its own directory, named by the position of its seed in the
+                # list, so that the concurrent envs do not overwrite each other's videos even for duplicate seeds
+                replay_dirs = ['seed_{}_{}'.format(i, seed) for i, seed in enumerate(chunk_seeds, start)]
+                if enable_save_replay:
+                    for env_cfg, replay_dir in zip(env_cfgs, replay_dirs):
+                        env_cfg['replay_path'] = os.path.join(replay_save_path, replay_dir)
+                evaluator_env = create_env_manager(
+                    self.cfg.env.manager, [partial(self.env_fn, cfg=env_cfg) for env_cfg in env_cfgs]
+                )
+                # the env manager clears the seeds of its list once they are used
+                evaluator_env.seed(list(chunk_seeds), dynamic_seed=False)
+
+                evaluator = Evaluator(
+                    eval_freq=self.cfg.policy.eval_freq,
+                    n_evaluator_episode=len(chunk_seeds),
+                    stop_value=self.cfg.env.stop_value,
+                    env=evaluator_env,
+                    policy=self.policy.eval_mode,
+                    exp_name=self.cfg.exp_name,
+                    policy_config=self.cfg.policy
+                )
+                stop, reward = evaluator.eval()
+                # each env plays one episode, and the returns are in the order of the envs, i.e. of the seeds
+                reward_list.extend(reward['eval_episode_return'])
+                for seed, episode_return in zip(chunk_seeds, reward['eval_episode_return']):
+                    logging.info('Deploy seed {}: episode return {}'.format(seed, episode_return))
+                # close the envs of the chunk, which also finishes writing their replays
+                evaluator.close()
+
+                if enable_save_replay:
+                    for replay_dir in replay_dirs:
+                        seed_replay_path = os.path.join(replay_save_path, replay_dir)
+                        if not os.path.exists(seed_replay_path):
+                            continue
+                        for file in os.listdir(seed_replay_path):
+                            os.replace(
+                                os.path.join(seed_replay_path, file),
+                                os.path.join(replay_save_path, '{}_{}'.format(replay_dir, file))
+                            )
+                        os.rmdir(seed_replay_path)
+        else:
+            for seed in seed_list:
+
+                evaluator_env = create_env_manager(self.cfg.env.manager, [partial(self.env_fn, cfg=deply_configs[0])])
+
+                evaluator_env.seed(seed if seed is not None else self.cfg.seed, dynamic_seed=False)
+                set_pkg_seed(seed if seed is not None else self.cfg.seed, use_cuda=self.cfg.policy.cuda)
+
+                # ==============================================================
+                # MCTS+RL algorithms related core code
+                # ==============================================================
+                policy_config = self.cfg.policy
+
+                evaluator = Evaluator(
+                    eval_freq=self.cfg.policy.eval_freq,
+                    n_evaluator_episode=1,
+                    stop_value=self.cfg.env.stop_value,
+                    env=evaluator_env,
+                    policy=self.policy.eval_mode,
+                    exp_name=self.cfg.exp_name,
+                    policy_config=policy_config
+                )
 
-            # ==============================================================
-            # Main loop
-            # ==============================================================
+                # ==============================================================
+                # Main loop
+                # ==============================================================
 
-            stop, reward = evaluator.eval()
-            reward_list.extend(reward['eval_episode_return'])
+                stop, reward = evaluator.eval()
+                reward_list.extend(reward['eval_episode_return'])
 
         if enable_save_replay:
             if not os.path.exists(replay_save_path):
@@ -404,6 +465,18 @@ class MuZeroAgent:
             eval_value=np.mean(reward['eval_episode_return']), eval_value_std=np.std(reward['eval_episode_return'])
         )
 
+    def serve(self, server_cfg: Optional[dict] = None) -> MuZeroInferenceServer:
+        """
+        Overview:
+            Start a local inference server of the agent, which serves the actions of the agent to many independent
+            game sessions, searching the pending requests of the sessions in batches.
+        Arguments:
+            - server_cfg (:obj:`Optional[dict]`): The config of the server, see ``MuZeroInferenceServer.config``.
+        Returns:
+            - server (:obj:`MuZeroInferenceServer`): The running server, to be closed by ``server.close()``.
+        """
+        return MuZeroInferenceServer(server_cfg or {}, policy=self.policy.eval_mode, policy_config=self.cfg.policy)
+
     @property
     def best(self):
         """
@@ -0,0 +1,51 @@
+import logging
+import re
+from copy import deepcopy
+
+import pytest
+
+import lzero.agent.muzero as muzero_agent
+from lzero.agent import MuZeroAgent
+from lzero.agent.config.muzero import supported_env_cfg
+
+
+def make_agent(exp_name: str) -> MuZeroAgent:
+    cfg = deepcopy(supported_env_cfg['CartPole-v0'])
+    cfg.main_config.policy.update(dict(cuda=False, num_simulations=5))
+    # the search breaks the ties of the children at random, and the zero initialized prediction heads make all of them
+    # ties, so that the returns would not be reproducible
+    cfg.main_config.policy.model.last_linear_layer_init_zero = False
+    cfg.create_config.env_manager.type = 'base'
+    return MuZeroAgent(env_id='CartPole-v0', exp_name=exp_name, cfg=cfg)
+
+
+@pytest.mark.unittest
+def test_batch_deploy(tmp_path, monkeypatch, caplog):
+    # the loggers of the evaluator write under the working directory
+    monkeypatch.chdir(tmp_path)
+    agent = make_agent('exp')
+    # seeds of different returns, with duplicates, run in the chunks [2, 0], [1, 0] and [2]
+    seeds = [2, 0, 1, 0, 2]
+    # the eval mode of MuZero searches without noise and picks the most visited action, so that the return of a seed
+    # only depends on the initial state of its env
+    serial_returns = {seed: agent.deploy(seed=seed).eval_value for seed in set(seeds)}
+
+    env_nums = []
+    create_env_manager = muzero_agent.create_env_manager
+
+    def recording_create_env_manager(manager_cfg, env_fns):
+        env_nums.append(len(env_fns))
+        return create_env_manager(manager_cfg, env_fns)
+
+    monkeypatch.setattr(muzero_agent, 'create_env_manager', recording_create_env_manager)
+    with caplog.at_level(logging.INFO):
+        eval_return = agent.deploy(seed=seeds, batch_deploy=True, max_env_num=2)
+    assert env_nums == [2, 2, 1]
+
+    deploy_logs = [re.search(r'Deploy seed (\d+): episode return (\S+)', r.getMessage()) for r in caplog.records]
+    deploy_logs = [(int(m.group(1)), float(m.group(2))) for m in deploy_logs if m is not None]
+    # the returns are reported in the order of the seeds, and match the ones of the serial mode
+    assert [seed for seed, _ in deploy_logs] == seeds
+    assert len(set(serial_returns.values())) == 3
+    assert [episode_return for _, episode_return in deploy_logs] == [serial_returns[seed] for seed in seeds]
+    assert eval_return.eval_value == pytest.approx(sum(serial_returns[seed] for seed in seeds) / len(seeds))
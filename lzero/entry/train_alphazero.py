@@ -12,6 +12,7 @@ from ding.utils import set_pkg_seed
 from ding.worker import BaseLearner, create_buffer
 from tensorboardX import SummaryWriter
 
+from lzero.mcts import AlphaZeroReplayBuffer
 from lzero.policy import visit_count_temperature
 from lzero.worker import AlphaZeroCollector, AlphaZeroEvaluator
 
@@ -67,7 +68,10 @@ def train_alphazero(
     # Create worker components: learner, collector, evaluator, replay buffer, commander.
     tb_logger = SummaryWriter(os.path.join('./{}/log/'.format(cfg.exp_name), 'serial'))
     learner = BaseLearner(cfg.policy.learn.learner, policy.learn_mode, tb_logger, exp_name=cfg.exp_name)
-    replay_buffer = create_buffer(cfg.policy.other.replay_buffer, tb_logger=tb_logger, exp_name=cfg.exp_name)
+    if cfg.policy.other.replay_buffer.get('columnar', False):
+        replay_buffer = AlphaZeroReplayBuffer(cfg.policy.other.replay_buffer)
+    else:
+        replay_buffer = create_buffer(cfg.policy.other.replay_buffer, tb_logger=tb_logger, exp_name=cfg.exp_name)
 
     policy_config = cfg.policy
     batch_size = policy_config.batch_size
@@ -18,6 +18,8 @@ from lzero.policy import visit_count_temperature
 from lzero.policy.random_policy import LightZeroRandomPolicy
 from lzero.worker import MuZeroCollector as Collector
 from lzero.worker import MuZeroEvaluator as Evaluator
+from lzero.worker import MuZeroReanalyzeService as ReanalyzeService
+from lzero.worker import MuZeroAsyncEvaluator as AsyncEvaluator
 from .utils import random_collect
 
 
@@ -115,6 +117,21 @@ def train_muzero(
         policy_config=policy_config
     )
 
+    # The reanalyze service computes the targets of the sampled batches in background worker processes,
+    # so that the learner does not wait for the reanalyze search.
+    reanalyze_service = None
+    if policy_config.reanalyze_service.num_workers > 0:
+        reanalyze_service = ReanalyzeService(
+            policy_config.reanalyze_service, replay_buffer, policy, tb_logger=tb_logger, seed=cfg.seed
+        )
+
+    # The asynchronous evaluator evaluates the snapshots of the policy in background worker processes,
+    # so that the training continues during the evaluation episodes.
+    async_evaluator = None
+    if policy_config.async_eval.num_workers > 0:
+        assert not cfg.policy.eval_offline, "async_eval and eval_offline are exclusive"
+        async_evaluator = AsyncEvaluator(policy_config.async_eval, cfg, policy, tb_logger=tb_logger, seed=cfg.seed)
+
     # ==============================================================
     # Main loop
     # ==============================================================
@@ -134,7 +151,10 @@ def train_muzero(
         eval_train_envstep_list = []
 
     # Evaluate the random agent
-    stop, reward = evaluator.eval(learner.save_checkpoint, learner.train_iter, collector.envstep)
+    if async_evaluator is not None:
+        stop, reward = async_evaluator.eval(learner.train_iter, collector.envstep)
+    else:
+        stop, reward = evaluator.eval(learner.save_checkpoint, learner.train_iter, collector.envstep)
 
     while True:
         log_buffer_memory_usage(learner.train_iter, replay_buffer, tb_logger)
@@ -160,7 +180,15 @@ def train_muzero(
             collect_kwargs['epsilon'] = 0.0
 
         # Evaluate policy performance.
-        if evaluator.should_eval(learner.train_iter):
+        if async_evaluator is not None:
+            if async_evaluator.should_eval(learner.train_iter):
+                stop, reward = async_evaluator.eval(learner.train_iter, collector.envstep)
+            else:
+                # the evaluations which finished since the last check are logged against their own train_iter
+                stop, reward = async_evaluator.poll()
+            if stop:
+                break
+        elif evaluator.should_eval(learner.train_iter):
             if cfg.policy.eval_offline:
                 eval_train_iter_list.append(learner.train_iter)
                 eval_train_envstep_list.append(collector.envstep)
@@ -171,12 +199,16 @@ def train_muzero(
 
         # Collect data by default config n_sample/n_episode.
         new_data = collector.collect(train_iter=learner.train_iter, policy_kwargs=collect_kwargs)
+        # save returned new_data collected by the collector
+        # NOTE: the game segments written into the segment storage by the collector only get their columns back here.
+        replay_buffer.push_game_segments(new_data)
+        if replay_buffer.segment_storage is not None:
+            # the collector writes the next game segments straight into the slots of the segment storage
+            collector.attach_segment_storage(replay_buffer.segment_storage.handle)
         if cfg.policy.update_per_collect is None:
             # update_per_collect is None, then update_per_collect is set to the number of collected transitions multiplied by the model_update_ratio.
             collected_transitions_num = sum([len(game_segment) for game_segment in new_data[0]])
             update_per_collect = int(collected_transitions_num * cfg.policy.model_update_ratio)
-        # save returned new_data collected by the collector
-        replay_buffer.push_game_segments(new_data)
         # remove the oldest data if the replay buffer is full.
         replay_buffer.remove_oldest_data_to_fit()
 
@@ -184,7 +216,10 @@ def train_muzero(
         for i in range(update_per_collect):
             # Learner will train ``update_per_collect`` times in one iteration.
             if replay_buffer.get_num_of_transitions() > batch_size:
-                train_data = replay_buffer.sample(batch_size, policy)
+                if reanalyze_service is not None:
+                    train_data = reanalyze_service.sample(batch_size, learner.train_iter)
+                else:
+                    train_data = replay_buffer.sample(batch_size, policy)
             else:
                 logging.warning(
                     f'The data in replay_buffer is not sufficient to sample a mini-batch: '
@@ -216,6 +251,10 @@ def train_muzero(
                 logging.info(f'eval offline finished!')
             break
 
+    if reanalyze_service is not None:
+        reanalyze_service.close()
+    if async_evaluator is not None:
+        async_evaluator.close()
     # Learner's after_run hook.
     learner.call_hook('after_run')
     return policy
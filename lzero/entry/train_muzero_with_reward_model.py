@@ -167,8 +167,6 @@ def train_muzero_with_reward_model(
             # train reward_model with obs
             if len(reward_model.train_obs) > reward_model.cfg.batch_size:
                 reward_model.train_with_data()
-        # clear old data in reward_model
-        reward_model.clear_old_data()
 
         if cfg.policy.update_per_collect is None:
             # update_per_collect is None, then update_per_collect is set to the number of collected transitions multiplied by the model_update_ratio.
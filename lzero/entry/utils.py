@@ -1,7 +1,6 @@
 import os
 
 import psutil
-from pympler.asizeof import asizeof
 from tensorboardX import SummaryWriter
 from typing import Optional, Callable
 
@@ -43,7 +42,9 @@ def random_collect(
 def log_buffer_memory_usage(train_iter: int, buffer: "GameBuffer", writer: SummaryWriter) -> None:
     """
     Overview:
-        Log the memory usage of the buffer and the current process to TensorBoard.
+        Log the memory usage of the buffer and the current process to TensorBoard. The memory usage of the buffer is
+        read from the byte counts the buffer keeps when game segments are pushed and removed, see
+        ``GameBuffer.get_memory_usage``, so logging it does not walk the buffer.
     Arguments:
         - train_iter (:obj:`int`): The current training iteration.
         - buffer (:obj:`GameBuffer`): The game buffer.
@@ -53,18 +54,19 @@ def log_buffer_memory_usage(train_iter: int, buffer: "GameBuffer", writer: Summa
     if writer is not None:
         writer.add_scalar('Buffer/num_of_all_collected_episodes', buffer.num_of_collected_episodes, train_iter)
         writer.add_scalar('Buffer/num_of_game_segments', len(buffer.game_segment_buffer), train_iter)
-        writer.add_scalar('Buffer/num_of_transitions', len(buffer.game_segment_game_pos_look_up), train_iter)
-
-        game_segment_buffer = buffer.game_segment_buffer
-
-        # Calculate the amount of memory occupied by self.game_segment_buffer (in bytes).
-        buffer_memory_usage = asizeof(game_segment_buffer)
-
-        # Convert buffer_memory_usage to megabytes (MB).
-        buffer_memory_usage_mb = buffer_memory_usage / (1024 * 1024)
-
-        # Record the memory usage of self.game_segment_buffer to TensorBoard.
-        writer.add_scalar('Buffer/memory_usage/game_segment_buffer', buffer_memory_usage_mb, train_iter)
+        writer.add_scalar('Buffer/num_of_transitions', buffer.get_num_of_transitions(), train_iter)
+
+        memory_usage = buffer.get_memory_usage()
+
+        # Record the memory usage of self.game_segment_buffer (in megabytes) to TensorBoard.
+        writer.add_scalar('Buffer/memory_usage/game_segment_buffer', memory_usage['total'] / (1024 * 1024), train_iter)
+        for key, nbytes in memory_usage.items():
+            if key != 'total':
+                writer.add_scalar('Buffer/memory_usage/{}'.format(key), nbytes / (1024 * 1024), train_iter)
+        if memory_usage['obs'] > 0:
+            writer.add_scalar(
+                'Buffer/obs_compression_ratio', memory_usage['obs_raw'] / memory_usage['obs'], train_iter
+            )
 
         # Get the amount of memory currently used by the process (in bytes).
         process = psutil.Process(os.getpid())
@@ -0,0 +1,170 @@
+import copy
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import torch
+from easydict import EasyDict
+
+# The 8 symmetries of the square board: ``np.rot90`` by ``k = index % 4`` quarter turns, then a left-right flip for
+# ``index >= 4``.
+NUM_SYMMETRIES = 8
+
+
+class AlphaZeroReplayBuffer(object):
+    """
+    Overview:
+        A columnar replay buffer for ``AlphaZeroPolicy``. The observations, the MCTS visit count distributions (probs)
+        and the game outcomes (reward) of the pushed transitions are written into preallocated contiguous ring arrays
+        of ``replay_buffer_size`` rows, which are allocated on the first push from the shapes of the transitions.
+        ``sample`` gathers a minibatch with one fancy index per column and returns it as ready tensors, so that the
+        learner does not collate a list of nested dicts for every batch.
+
+        With ``symmetry_augmentation=True``, each sampled position is transformed by one of the 8 symmetries of the
+        square board drawn at random (rotations and flips), applied to the board planes of the observation and to the
+        board part of the probs in a few vectorized ops per minibatch. It gives the 8 times larger data set of
+        ``get_augmented_data`` without storing it. It assumes channel-first observations ``(C, H, W)`` of a square
+        board, and actions ``i * W + j`` for the cell ``(i, j)`` in the first ``H * W`` entries of the probs, as in
+        Gomoku, TicTacToe and Go (the trailing pass action of Go is not transformed). It must not be used for boards
+        without these symmetries, e.g. Connect4 or Chess.
+    Interfaces:
+        ``__init__``, ``push``, ``sample``, ``count``, ``clear``
+    """
+
+    @classmethod
+    def default_config(cls: type) -> EasyDict:
+        cfg = EasyDict(copy.deepcopy(cls.config))
+        cfg.cfg_type = cls.__name__ + 'Dict'
+        return cfg
+
+    # Default configuration for AlphaZeroReplayBuffer.
+    config = dict(
+        # (int) The size/capacity of the replay buffer in terms of transitions.
+        replay_buffer_size=int(1e6),
+        # (bool) Whether to transform each sampled position by a random symmetry of the square board.
+        symmetry_augmentation=False,
+    )
+
+    def __init__(self, cfg: dict) -> None:
+        """
+        Overview:
+            Use the default configuration mechanism. If a user passes in a cfg with a key that matches an existing key
+            in the default configuration, the user-provided value will override the default configuration. Otherwise,
+            the default configuration will be used.
+        """
+        default_config = self.default_config()
+        default_config.update(cfg)
+        self._cfg = default_config
+        self.replay_buffer_size = self._cfg.replay_buffer_size
+        self._obs = None
+        self._probs = None
+        self._reward = None
+        # the next row to write, and the number of valid rows
+        self._head = 0
+        self._count = 0
+
+    def push(self, data: List[Dict[str, Any]], cur_collector_envstep: int = -1) -> None:
+        """
+        Overview:
+            Write the transitions collected by ``AlphaZeroCollector`` into the ring arrays, overwriting the oldest
+            ones when the buffer is full.
+        Arguments:
+            - data (:obj:`List[Dict[str, Any]]`): The transitions, with the keys ``obs`` (a dict with the key \
+                ``observation``), ``probs`` and ``reward``.
+            - cur_collector_envstep (:obj:`int`): The env step of the collector, unused, for the compatibility with \
+                the buffers of DI-engine.
+        """
+        if len(data) == 0:
+            return
+        obs = np.stack([np.asarray(d['obs']['observation']) for d in data])
+        probs = np.stack([np.asarray(d['probs'], dtype=np.float32) for d in data])
+        reward = np.asarray([d['reward'] for d in data], dtype=np.float32).reshape(-1)
+        if self._obs is None:
+            self._allocate(obs[0], probs[0])
+        if len(obs) > self.replay_buffer_size:
+            # keep the last transitions of a push larger than the buffer
+            size = self.replay_buffer_size
+            obs, probs, reward = obs[-size:], probs[-size:], reward[-size:]
+        index = (self._head + np.arange(len(obs))) % self.replay_buffer_size
+        self._obs[index] = obs
+        self._probs[index] = probs
+        self._reward[index] = reward
+        self._head = (self._head + len(obs)) % self.replay_buffer_size
+        self._count = min(self._count + len(obs), self.replay_buffer_size)
+
+    def sample(self, batch_size: int, train_iter: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Overview:
+            Sample a minibatch uniformly with replacement, and transform it by random symmetries of the board if
+            ``symmetry_augmentation`` is enabled.
+        Arguments:
+            - batch_size (:obj:`int`): The batch size.
+            - train_iter (:obj:`int`): The train iteration of the learner, unused, for the compatibility with the \
+                buffers of DI-engine.
+        Returns:
+            - train_data (:obj:`Optional[Dict[str, Any]]`): The dict of the tensors ``obs`` (a dict with the key \
+                ``observation``), ``probs`` and ``reward``, in the format of the collated transitions, or None if \
+                the buffer has less than ``batch_size`` transitions.
+        """
+        if self._count < batch_size:
+            return None
+        index = np.random.randint(0, self._count, size=batch_size)
+        obs, probs, reward = self._obs[index], self._probs[index], self._reward[index]
+        if self._cfg.symmetry_augmentation:
+            self._augment(obs, probs, np.random.randint(0, NUM_SYMMETRIES, size=batch_size))
+        return {
+            'obs': {
+                'observation': torch.from_numpy(obs)
+            },
+            'probs': torch.from_numpy(probs),
+            'reward': torch.from_numpy(reward),
+        }
+
+    def count(self) -> int:
+        """
+        Overview:
+            Return the number of transitions in the buffer.
+        """
+        return self._count
+
+    def clear(self) -> None:
+        """
+        Overview:
+            Remove all the transitions, keeping the allocated arrays.
+        """
+        self._head = 0
+        self._count = 0
+
+    def _allocate(self, obs: np.ndarray, probs: np.ndarray) -> None:
+        if self._cfg.symmetry_augmentation:
+            assert obs.ndim == 3 and obs.shape[1] == obs.shape[2], \
+                'symmetry augmentation needs the channel-first observations of a square board, got {}'.format(obs.shape)
+            assert probs.shape[0] >= obs.shape[1] * obs.shape[2], \
+                'symmetry augmentation needs the probs of all the cells of the board, got {}'.format(probs.shape)
+        self._obs = np.empty((self.replay_buffer_size, ) + obs.shape, dtype=obs.dtype)
+        self._probs = np.empty((self.replay_buffer_size, ) + probs.shape, dtype=np.float32)
+        self._reward = np.empty((self.replay_buffer_size, ), dtype=np.float32)
+
+    @staticmethod
+    def _augment(obs: np.ndarray, probs: np.ndarray, symmetry: np.ndarray) -> None:
+        """
+        Overview:
+            Transform in place each position of a minibatch by its symmetry of the board, with one vectorized op per
+            group of positions with the same rotation, and one for the flipped positions.
+        Arguments:
+            - obs (:obj:`np.ndarray`): The observations of shape (B, C, H, W).
+            - probs (:obj:`np.ndarray`): The probs of shape (B, A), whose first H * W entries are the cells.
+            - symmetry (:obj:`np.ndarray`): The index of the symmetry of each position, in [0, 8).
+        """
+        board_size = obs.shape[-1]
+        num_cells = board_size * board_size
+        board_probs = probs[:, :num_cells].reshape(-1, board_size, board_size)
+        for k in range(1, 4):
+            mask = symmetry % 4 == k
+            if mask.any():
+                obs[mask] = np.rot90(obs[mask], k, axes=(-2, -1))
+                board_probs[mask] = np.rot90(board_probs[mask], k, axes=(-2, -1))
+        mask = symmetry >= 4
+        if mask.any():
+            obs[mask] = obs[mask][..., ::-1]
+            board_probs[mask] = board_probs[mask][..., ::-1]
+        probs[:, :num_cells] = board_probs.reshape(-1, num_cells)
@@ -0,0 +1,188 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class FrameView(object):
+    """
+    Overview:
+        The observations of a game segment whose frames are kept in a ``FrameStore``. It replaces the
+        ``obs_segment`` array of the game segment: indexing it gathers the frames from the store by fancy indexing,
+        so ``GameSegment.get_unroll_obs`` assembles the stacked observations at sample time from the shared frames.
+    Interfaces:
+        ``__init__``, ``__len__``, ``__getitem__``, ``__array__``, ``__reduce__``
+    Properties:
+        ``ids``, ``shape``, ``dtype``, ``nbytes``
+    """
+
+    def __init__(self, store: 'FrameStore', ids: np.ndarray, tail_start: int) -> None:
+        """
+        Overview:
+            Create the view of the frames ``ids`` of the store.
+        Arguments:
+            - store (:obj:`FrameStore`): The store of the frames.
+            - ids (:obj:`np.ndarray`): The ids of the frames of the game segment in the store, in order.
+            - tail_start (:obj:`int`): The index of the first frame of the tail, see ``FrameStore.store``.
+        """
+        self._store = store
+        self._ids = ids
+        self.tail_start = tail_start
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (len(self._ids), ) + self._store.frame_shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._store.dtype
+
+    @property
+    def nbytes(self) -> int:
+        # the bytes of the frames the view spans, which may be shared with other views
+        return len(self._ids) * self._store.frame_nbytes
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, index: Any) -> np.ndarray:
+        return self._store.frames[self._ids[index]]
+
+    def __array__(self, dtype: Optional[np.dtype] = None) -> np.ndarray:
+        frames = self._store.frames[self._ids]
+        return frames if dtype is None else frames.astype(dtype)
+
+    def __reduce__(self) -> Tuple:
+        # a pickled view, e.g. sent to another process, carries its own frames instead of the whole store
+        return np.asarray, (np.asarray(self), )
+
+
+class FrameStore(object):
+    """
+    Overview:
+        The episode-level store of the observation frames of the game segments in a ``GameBuffer``, where each
+        frame is kept once. Consecutive game segments of an episode overlap: the ``frame_stack_num`` frames that
+        start a game segment and the ``num_unroll_steps`` frames it is padded with are the frames the next game
+        segment starts with. A pushed game segment looks for such a tail among the game segments pushed before it,
+        shares its frames if found, and only adds its other frames to the store.
+        The frames are reference counted by the game segments that use them, so that the frames of evicted game
+        segments are only released once no other game segment refers to them.
+    Interfaces:
+        ``__init__``, ``accepts``, ``store``, ``release``
+    Properties:
+        ``frames``, ``frame_shape``, ``dtype``, ``frame_nbytes``, ``num_frames``, ``nbytes``
+    """
+
+    def __init__(self, frame_shape: Tuple[int, ...], dtype: Any, capacity: int = 1024) -> None:
+        """
+        Overview:
+            Create an empty store.
+        Arguments:
+            - frame_shape (:obj:`Tuple[int, ...]`): The shape of a frame.
+            - dtype (:obj:`Any`): The dtype of the frames.
+            - capacity (:obj:`int`): The initial number of frames, the store grows as needed.
+        """
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_nbytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self.frames = np.zeros((capacity, ) + self.frame_shape, dtype=self.dtype)
+        self._ref_counts = np.zeros(capacity, dtype=np.int32)
+        self._free_ids = list(range(capacity - 1, -1, -1))
+        # The tails of the stored game segments which no game segment has shared yet, by the hash of their first
+        # frame. A tail is shared by at most one game segment, the next one of the same episode.
+        self._tails: Dict[int, List[FrameView]] = {}
+
+    @property
+    def num_frames(self) -> int:
+        # the number of frames used by the game segments
+        return len(self._ref_counts) - len(self._free_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.frames.nbytes
+
+    def accepts(self, obs: Any) -> bool:
+        """
+        Overview:
+            Whether the observations of a game segment can be kept in the store, i.e. whether they are an array of
+            frames of the shape and dtype of the store (and not, e.g., compressed strings).
+        """
+        return isinstance(obs, np.ndarray) and obs.dtype == self.dtype and obs.shape[1:] == self.frame_shape
+
+    def _allocate(self, num: int) -> np.ndarray:
+        if len(self._free_ids) < num:
+            capacity = len(self._ref_counts)
+            new_capacity = max(2 * capacity, capacity + num)
+            frames = np.zeros((new_capacity, ) + self.frame_shape, dtype=self.dtype)
+            frames[:capacity] = self.frames
+            self.frames = frames
+            self._ref_counts = np.concatenate([self._ref_counts, np.zeros(new_capacity - capacity, dtype=np.int32)])
+            self._free_ids.extend(range(new_capacity - 1, capacity - 1, -1))
+        ids = np.array([self._free_ids.pop() for _ in range(num)], dtype=np.int64)
+        return ids
+
+    def _match_tail(self, obs: np.ndarray) -> Optional[FrameView]:
+        """
+        Overview:
+            Find and unregister a stored tail which is the same as the first frames of ``obs``.
+        """
+        if len(obs) == 0:
+            return None
+        candidates = self._tails.get(hash(obs[0].tobytes()), [])
+        for i, view in enumerate(candidates):
+            tail_ids = view.ids[view.tail_start:]
+            if len(tail_ids) <= len(obs) and np.array_equal(self.frames[tail_ids], obs[:len(tail_ids)]):
+                del candidates[i]
+                if len(candidates) == 0:
+                    del self._tails[hash(obs[0].tobytes())]
+                return view
+        return None
+
+    def store(self, obs: np.ndarray, tail_start: int) -> FrameView:
+        """
+        Overview:
+            Keep the observations of a game segment in the store, sharing the frames it starts with if they are the
+            tail of a game segment stored before.
+        Arguments:
+            - obs (:obj:`np.ndarray`): The observations of the game segment, of shape ``(N, *frame_shape)``.
+            - tail_start (:obj:`int`): The index of the first frame of the tail of the game segment, i.e. of the \
+                frames the next game segment of the episode starts with. It is the length of the game segment, \
+                as its tail is the stacked frames of its last step and its padding frames.
+        Returns:
+            - view (:obj:`FrameView`): The view of the frames of the game segment, to replace its ``obs_segment``.
+        """
+        previous = self._match_tail(obs)
+        num_shared = 0 if previous is None else len(previous.ids) - previous.tail_start
+        ids = np.empty(len(obs), dtype=np.int64)
+        if num_shared > 0:
+            ids[:num_shared] = previous.ids[previous.tail_start:]
+        ids[num_shared:] = self._allocate(len(obs) - num_shared)
+        self.frames[ids[num_shared:]] = obs[num_shared:]
+        self._ref_counts[ids] += 1
+
+        view = FrameView(self, ids, tail_start)
+        if tail_start < len(ids):
+            self._tails.setdefault(hash(self.frames[ids[tail_start]].tobytes()), []).append(view)
+        return view
+
+    def release(self, view: FrameView) -> None:
+        """
+        Overview:
+            Release the frames of an evicted game segment. The frames no other game segment refers to are freed.
+        Arguments:
+            - view (:obj:`FrameView`): The view of the frames of the game segment.
+        """
+        if view.tail_start < len(view.ids):
+            key = hash(self.frames[view.ids[view.tail_start]].tobytes())
+            candidates = self._tails.get(key, [])
+            for i, candidate in enumerate(candidates):
+                if candidate is view:
+                    del candidates[i]
+                    break
+            if key in self._tails and len(candidates) == 0:
+                del self._tails[key]
+        self._ref_counts[view.ids] -= 1
+        self._free_ids.extend(view.ids[self._ref_counts[view.ids] == 0].tolist())
@@ -1,13 +1,20 @@
 import copy
 import time
 from abc import ABC, abstractmethod
-from typing import Any, List, Tuple, Optional, Union, TYPE_CHECKING
+from typing import Any, Dict, List, Tuple, Optional, Union, TYPE_CHECKING
 
 import numpy as np
+import torch
 from ding.torch_utils.data_helper import to_list
 from ding.utils import BUFFER_REGISTRY
 from easydict import EasyDict
 
+from .frame_store import FrameStore, FrameView
+from .memory_usage import MemoryUsage
+from .obs_codec import ObsDecoder, create_obs_codec
+from .segment_storage import SegmentStorage
+from .transition_index import TransitionIndex
+
 if TYPE_CHECKING:
     from lzero.policy import MuZeroPolicy, EfficientZeroPolicy, SampledEfficientZeroPolicy, GumbelMuZeroPolicy
 
@@ -38,6 +45,36 @@ class GameBuffer(ABC, object):
         use_root_value=False,
         # (int) The number of samples required for mini inference.
         mini_infer_size=10240,
+        # (bool) Whether to index the transitions with a preallocated ring of int32 arrays and sample them with a
+        # sum tree. It makes sampling, priority update and eviction O(log N) instead of O(N), which matters for
+        # large buffers. Note that the sum tree samples with replacement (stratified over the priority mass).
+        use_sum_tree=False,
+        # (bool) Whether to keep the per-step arrays of the game segments in a columnar storage backed by a shared
+        # memory-mapped file, instead of the private arrays of each game segment. The collectors, also in other
+        # processes on the same node, attach to it by ``segment_storage.handle`` (``attach_segment_storage``), write
+        # their game segments into free slots and only send the game segments without the stored columns.
+        use_segment_storage=False,
+        # (int) The number of game segments the segment storage can hold. None means 1.25 times the number of full
+        # game segments of the replay buffer. The game segments pushed when the storage is full keep their own arrays.
+        segment_storage_slots=None,
+        # (bool) Whether to keep the observation frames of the game segments in a ``FrameStore``, where the frames
+        # shared by consecutive game segments of an episode (the stacked frames and the padding frames) are kept once.
+        # It only applies to the game segments whose observations are arrays outside of the segment storage.
+        use_frame_store=False,
+        # (str) The codec which compresses the observation frames kept in the buffer, one of ``zlib``, ``lz4``,
+        # ``zstd`` and ``jpeg`` (see ``OBS_CODECS``). None keeps the frames as they are. It only applies to the
+        # observations which are arrays of frames outside of the segment storage and the frame store.
+        obs_codec=None,
+        # (bool) Whether the codec stores each frame as the XOR with the previous one, see ``ObsCodec``.
+        obs_codec_delta=False,
+        # (int) The number of threads which decode the stacked observations of a minibatch, when the frames are
+        # compressed by ``obs_codec`` or ``transform2string``. 0 decodes them in the sampling thread.
+        obs_decode_workers=4,
+        # (int) The number of decoded stacked observations of the recently sampled positions kept in a cache.
+        obs_decode_cache_size=512,
+        # (bool) Whether ``get_memory_usage`` also measures the buffer by a recursive walk of all its objects with
+        # pympler. The walk takes seconds for large buffers, it is only meant for debugging the byte counts.
+        deep_memory_usage=False,
     )
 
     def __init__(self, cfg: dict):
@@ -51,7 +88,6 @@ class GameBuffer(ABC, object):
         default_config = self.default_config()
         default_config.update(cfg)
         self._cfg = default_config
-        self._cfg = cfg
         assert self._cfg.env_type in ['not_board_games', 'board_games']
         assert self._cfg.action_type in ['fixed_action_space', 'varied_action_space']
 
@@ -63,12 +99,117 @@ class GameBuffer(ABC, object):
         self.game_segment_buffer = []
         self.game_pos_priorities = []
         self.game_segment_game_pos_look_up = []
+        self.transition_index = self._build_transition_index()
+        self.segment_storage = None
+        self.frame_store = None
+        self.memory_usage = MemoryUsage()
+        self.obs_codec = None
+        if self._cfg.get('obs_codec', None) is not None:
+            self.obs_codec = create_obs_codec(self._cfg.obs_codec, delta=self._cfg.get('obs_codec_delta', False))
+        self.obs_decoder = None
+        if self.obs_codec is not None or self._cfg.get('transform2string', False):
+            self.obs_decoder = ObsDecoder(
+                self._cfg.get('obs_decode_workers', 4), self._cfg.get('obs_decode_cache_size', 512)
+            )
 
         self.keep_ratio = 1
         self.num_of_collected_episodes = 0
         self.base_idx = 0
         self.clear_time = 0
 
+    def _build_transition_index(self) -> Optional[TransitionIndex]:
+        """
+        Overview:
+            Build the array-backed ``TransitionIndex`` if ``use_sum_tree`` is enabled. Otherwise return None and the
+            transitions are indexed by ``game_pos_priorities`` and ``game_segment_game_pos_look_up``.
+        """
+        if not self._cfg.get('use_sum_tree', False):
+            return None
+        return TransitionIndex(capacity=self._cfg.replay_buffer_size, alpha=self._alpha)
+
+    def _store_game_segment(self, game_segment: Any) -> None:
+        """
+        Overview:
+            Move the per-step arrays of the game segment into the ``SegmentStorage``, which is created on the first
+            push with the array shapes of that game segment. A game segment already written into its slot by another
+            process is bound to the slot without copying.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): The game segment to be pushed into the buffer.
+        """
+        if getattr(game_segment, 'storage_slot', None) is not None:
+            self.segment_storage.bind(game_segment.storage_slot, game_segment)
+            return
+        if self.segment_storage is None:
+            max_len = self._cfg.game_segment_length + self._cfg.model.frame_stack_num + self._cfg.num_unroll_steps + \
+                self._cfg.td_steps
+            num_slots = self._cfg.get('segment_storage_slots', None)
+            if num_slots is None:
+                num_slots = int(np.ceil(1.25 * self.replay_buffer_size / self._cfg.game_segment_length))
+            self.segment_storage = SegmentStorage.from_game_segment(game_segment, num_slots, max_len)
+        slot = self.segment_storage.allocate()
+        if slot is None:
+            # the storage is full, the game segment keeps its own arrays
+            return
+        self.segment_storage.write(slot, game_segment)
+        self.segment_storage.bind(slot, game_segment)
+
+    def _store_frames(self, game_segment: Any) -> None:
+        """
+        Overview:
+            Move the observations of the game segment into the ``FrameStore``, which is created on the first push
+            with the frame shape and dtype of that game segment. The ``obs_segment`` of the game segment is replaced
+            by a ``FrameView`` of its frames in the store.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): The game segment to be pushed into the buffer.
+        """
+        obs = getattr(game_segment, 'obs_segment', None)
+        if getattr(game_segment, 'storage_slot', None) is not None or not isinstance(obs, np.ndarray):
+            # the observations are in the segment storage, or are not an array of frames
+            return
+        if self.frame_store is None:
+            if obs.dtype == object or obs.ndim < 2:
+                return
+            self.frame_store = FrameStore(obs.shape[1:], obs.dtype)
+        if self.frame_store.accepts(obs):
+            game_segment.obs_segment = self.frame_store.store(obs, len(game_segment))
+
+    def _encode_obs(self, game_segment: Any) -> None:
+        """
+        Overview:
+            Compress the observations of the game segment by the ``obs_codec``. The ``obs_segment`` of the game
+            segment is replaced by the ``EncodedFrames``, which decodes the frames when indexed.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): The game segment to be pushed into the buffer.
+        """
+        obs = getattr(game_segment, 'obs_segment', None)
+        if getattr(game_segment, 'storage_slot', None) is not None or not isinstance(obs, np.ndarray) or \
+                obs.dtype == object or obs.ndim < 2:
+            # the observations are in the segment storage or the frame store, or are already compressed
+            return
+        game_segment.obs_segment = self.obs_codec.encode(obs)
+
+    def _get_unroll_obs_batch(
+            self, game_segments: List[Any], timesteps: List[int], num_unroll_steps: int = 0, padding: bool = False
+    ) -> List[np.ndarray]:
+        """
+        Overview:
+            Get the stacked observations ``game_segments[i].get_unroll_obs(timesteps[i], num_unroll_steps, padding)``
+            of the positions of a minibatch. The compressed frames are decoded by the ``ObsDecoder`` in parallel.
+        Arguments:
+            - game_segments (:obj:`List[GameSegment]`): The game segments of the positions.
+            - timesteps (:obj:`List[int]`): The positions in the game segments.
+            - num_unroll_steps (:obj:`int`): The extra length of the observation frames.
+            - padding (:obj:`bool`): Whether to pad the frames outside of the game segment with the last one.
+        Returns:
+            - stacked_obs (:obj:`List[np.ndarray]`): The stacked observations of each position.
+        """
+        if self.obs_decoder is None:
+            return [
+                game_segment.get_unroll_obs(timestep, num_unroll_steps, padding)
+                for game_segment, timestep in zip(game_segments, timesteps)
+            ]
+        return self.obs_decoder.get_unroll_obs_batch(game_segments, timesteps, num_unroll_steps, padding)
+
     @abstractmethod
     def sample(
             self, batch_size: int, policy: Union["MuZeroPolicy", "EfficientZeroPolicy", "SampledEfficientZeroPolicy", "GumbelMuZeroPolicy"]
@@ -114,6 +255,8 @@ class GameBuffer(ABC, object):
             - beta: float the parameter in PER for calculating the priority
         """
         assert self._beta > 0
+        if self.transition_index is not None:
+            return self._sample_orig_data_from_transition_index(batch_size)
         num_of_transitions = self.get_num_of_transitions()
         if self._cfg.use_priority is False:
             self.game_pos_priorities = np.ones_like(self.game_pos_priorities)
@@ -149,6 +292,30 @@ class GameBuffer(ABC, object):
         orig_data = (game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time)
         return orig_data
 
+    def _sample_orig_data_from_transition_index(self, batch_size: int) -> Tuple:
+        """
+        Overview:
+             The ``use_sum_tree`` version of ``_sample_orig_data``, which returns the same orig_data tuple.
+        Arguments:
+            - batch_size (:obj:`int`): batch size
+        """
+        batch_index_list, weights_list = self.transition_index.sample(
+            batch_size, self._beta, use_priority=self._cfg.use_priority
+        )
+        if self._cfg.reanalyze_outdated is True:
+            # NOTE: used in reanalyze part
+            order = np.argsort(batch_index_list, kind='stable')
+            batch_index_list, weights_list = batch_index_list[order], weights_list[order]
+
+        segment_ids, pos_in_game_segment = self.transition_index.lookup(batch_index_list)
+        game_segment_list = [self.game_segment_buffer[idx] for idx in (segment_ids - self.base_idx).tolist()]
+        pos_in_game_segment_list = pos_in_game_segment.tolist()
+
+        make_time = [time.time() for _ in range(len(batch_index_list))]
+
+        orig_data = (game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time)
+        return orig_data
+
     def _preprocess_to_play_and_action_mask(
         self, game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
     ):
@@ -329,12 +496,32 @@ class GameBuffer(ABC, object):
         Returns:
             - buffered_data (:obj:`BufferedData`): The pushed data.
         """
+        if self._cfg.get('use_segment_storage', False):
+            self._store_game_segment(data)
+        if self._cfg.get('use_frame_store', False):
+            self._store_frames(data)
+        if self.obs_codec is not None:
+            self._encode_obs(data)
+
         if meta['done']:
             self.num_of_collected_episodes += 1
             valid_len = len(data)
         else:
             valid_len = len(data) - meta['unroll_plus_td_steps']
 
+        if self.transition_index is not None:
+            if meta['priorities'] is None:
+                max_prio = self.transition_index.max_priority() if len(self.transition_index) > 0 else 1
+                priorities = np.full(len(data), max_prio, dtype=np.float64)
+            else:
+                assert len(data) == len(meta['priorities']), " priorities should be of same length as the game steps"
+                priorities = np.array(meta['priorities'], dtype=np.float64).reshape(-1)
+            priorities[valid_len:len(data)] = 0.
+            self.game_segment_buffer.append(data)
+            self.memory_usage.push(data)
+            self.transition_index.push(self.base_idx + len(self.game_segment_buffer) - 1, priorities)
+            return
+
         if meta['priorities'] is None:
             max_prio = self.game_pos_priorities.max() if self.game_segment_buffer else 1
             # if no 'priorities' provided, set the valid part of the new-added game history the max_prio
@@ -351,6 +538,7 @@ class GameBuffer(ABC, object):
             self.game_pos_priorities = np.concatenate((self.game_pos_priorities, priorities))
 
         self.game_segment_buffer.append(data)
+        self.memory_usage.push(data)
         self.game_segment_game_pos_look_up += [
             (self.base_idx + len(self.game_segment_buffer) - 1, step_pos) for step_pos in range(len(data))
         ]
@@ -384,12 +572,53 @@ class GameBuffer(ABC, object):
         excess_game_positions = sum(
             [len(game_segment) for game_segment in self.game_segment_buffer[:excess_game_segment_index]]
         )
+        if self.segment_storage is not None:
+            for game_segment in self.game_segment_buffer[:excess_game_segment_index]:
+                if getattr(game_segment, 'storage_slot', None) is not None:
+                    self.segment_storage.release(game_segment.storage_slot)
+        if self.frame_store is not None:
+            for game_segment in self.game_segment_buffer[:excess_game_segment_index]:
+                if isinstance(getattr(game_segment, 'obs_segment', None), FrameView):
+                    self.frame_store.release(game_segment.obs_segment)
+        if self.obs_decoder is not None:
+            # the cached observations may be of the removed game segments
+            self.obs_decoder.clear()
         del self.game_segment_buffer[:excess_game_segment_index]
-        self.game_pos_priorities = self.game_pos_priorities[excess_game_positions:]
-        del self.game_segment_game_pos_look_up[:excess_game_positions]
+        self.memory_usage.pop_front(excess_game_segment_index)
+        if self.transition_index is not None:
+            self.transition_index.pop_front(excess_game_positions)
+        else:
+            self.game_pos_priorities = self.game_pos_priorities[excess_game_positions:]
+            del self.game_segment_game_pos_look_up[:excess_game_positions]
         self.base_idx += excess_game_segment_index
         self.clear_time = time.time()
 
+    def _update_priority_of_transitions(
+            self, batch_index_list: List[int], make_time_list: List[float], batch_priorities: Any
+    ) -> None:
+        """
+        Overview:
+            Set the priorities of the sampled transitions, only for the data that is still in the replay buffer,
+            i.e. which was sampled after the last removal of old game segments.
+        Arguments:
+            - batch_index_list (:obj:`List[int]`): the index of the sampled transitions in replay buffer
+            - make_time_list (:obj:`List[float]`): the time the batch is made
+            - batch_priorities (:obj:`Any`): priorities to update to.
+        """
+        if self.transition_index is not None:
+            if isinstance(batch_priorities, torch.Tensor):
+                batch_priorities = batch_priorities.detach().cpu().numpy()
+            valid = np.asarray(make_time_list) > self.clear_time
+            self.transition_index.update_priority(
+                np.asarray(batch_index_list)[valid],
+                np.asarray(batch_priorities).reshape(-1)[valid]
+            )
+            return
+        for i in range(len(batch_index_list)):
+            if make_time_list[i] > self.clear_time:
+                idx, prio = batch_index_list[i], batch_priorities[i]
+                self.game_pos_priorities[idx] = prio
+
     def get_num_of_episodes(self) -> int:
         # number of collected episodes
         return self.num_of_collected_episodes
@@ -400,7 +629,35 @@ class GameBuffer(ABC, object):
 
     def get_num_of_transitions(self) -> int:
         # total number of transitions
+        if self.transition_index is not None:
+            return len(self.transition_index)
         return len(self.game_segment_game_pos_look_up)
 
+    def get_memory_usage(self, deep: Optional[bool] = None) -> Dict[str, int]:
+        """
+        Overview:
+            Return the byte counts of the game segments in the buffer, which are updated when game segments are
+            pushed and removed, see ``MemoryUsage.stats``.
+        Arguments:
+            - deep (:obj:`Optional[bool]`): Whether to also measure the game segments by a recursive walk with \
+                pympler, as ``deep_walk``. None means the ``deep_memory_usage`` of the config.
+        Returns:
+            - stats (:obj:`Dict[str, int]`): The byte counts of the buffer.
+        """
+        stats = self.memory_usage.stats(self.segment_storage, self.frame_store)
+        if deep is None:
+            deep = self._cfg.get('deep_memory_usage', False)
+        if deep:
+            from pympler.asizeof import asizeof
+            # The arrays of the stored game segments are views of the segment storage, which is counted as a whole,
+            # and so are the frames of the frame store.
+            stats['deep_walk'] = stats['segment_storage'] + stats['frame_store'] + asizeof(
+                [
+                    game_segment for game_segment in self.game_segment_buffer
+                    if getattr(game_segment, 'storage_slot', None) is None
+                ]
+            )
+        return stats
+
     def __repr__(self):
-        return f'current buffer statistics is: num_of_all_collected_episodes: {self.num_of_collected_episodes}, num of game segments: {len(self.game_segment_buffer)}, number of transitions: {len(self.game_segment_game_pos_look_up)}'
+        return f'current buffer statistics is: num_of_all_collected_episodes: {self.num_of_collected_episodes}, num of game segments: {len(self.game_segment_buffer)}, number of transitions: {self.get_num_of_transitions()}'
@@ -1,4 +1,4 @@
-from typing import Any, List
+from typing import Any, List, Tuple
 
 import numpy as np
 import torch
@@ -9,6 +9,7 @@ from lzero.mcts.tree_search.mcts_ptree import EfficientZeroMCTSPtree as MCTSPtre
 from lzero.mcts.utils import prepare_observation
 from lzero.policy import to_detach_cpu_numpy, concat_output, concat_output_value, inverse_scalar_transform
 from .game_buffer_muzero import MuZeroGameBuffer
+from .target_utils import compute_target_reward_value, compute_target_policy_reanalyzed
 
 
 @BUFFER_REGISTRY.register('game_buffer_efficientzero')
@@ -59,16 +60,26 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         policy._target_model.eval()
 
         # obtain the current_batch and prepare target context
-        reward_value_context, policy_re_context, policy_non_re_context, current_batch = self._make_batch(
-            batch_size, self._cfg.reanalyze_ratio
-        )
+        context = self._make_batch(batch_size, self._cfg.reanalyze_ratio)
+        return self._compute_train_data(context, policy._target_model)
+
+    def _compute_train_data(self, context: Tuple[Any], model: Any) -> List[Any]:
+        """
+        Overview:
+            compute the target batch from the context returned by ``_make_batch()`` with the given target model,
+            and assemble it with the current_batch into the train data.
+        Arguments:
+            - context (:obj:`Tuple`): reward_value_context, policy_re_context, policy_non_re_context, current_batch
+            - model (:obj:`torch.nn.Module`): the target model used to reanalyze the targets.
+        Returns:
+            - train_data (:obj:`List`): List of train data
+        """
+        reward_value_context, policy_re_context, policy_non_re_context, current_batch = context
 
         # target value_prefixs, target value
-        batch_value_prefixs, batch_target_values = self._compute_target_reward_value(
-            reward_value_context, policy._target_model
-        )
+        batch_value_prefixs, batch_target_values = self._compute_target_reward_value(reward_value_context, model)
         # target policy
-        batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, policy._target_model)
+        batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, model)
         batch_target_policies_non_re = self._compute_target_policy_non_reanalyzed(
             policy_non_re_context, self._cfg.model.action_space_size
         )
@@ -111,7 +122,18 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         action_mask_segment, to_play_segment = [], []
 
         td_steps_list = []
-        for game_segment, state_index, idx in zip(game_segment_list, pos_in_game_segment_list, batch_index_list):
+        # prepare the corresponding observations for bootstrapped values o_{t+k} of the batch
+        # o[t+ td_steps, t + td_steps + stack frames + num_unroll_steps]
+        # t=2+3 -> o[2+3, 2+3+4+5] -> o[5, 14]
+        bootstrap_obs_list = self._get_unroll_obs_batch(
+            game_segment_list, [
+                state_index + np.clip(self._cfg.td_steps, 1, max(1, len(game_segment) - state_index)).astype(np.int32)
+                for game_segment, state_index in zip(game_segment_list, pos_in_game_segment_list)
+            ], self._cfg.num_unroll_steps
+        )
+        for game_segment, state_index, idx, game_obs in zip(
+                game_segment_list, pos_in_game_segment_list, batch_index_list, bootstrap_obs_list
+        ):
             game_segment_len = len(game_segment)
             game_segment_lens.append(game_segment_len)
 
@@ -125,11 +147,6 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
             # td_steps = np.clip(td_steps, 1, 5).astype(np.int)
             td_steps = np.clip(self._cfg.td_steps, 1, max(1, game_segment_len - state_index)).astype(np.int32)
 
-            # prepare the corresponding observations for bootstrapped values o_{t+k}
-            # o[t+ td_steps, t + td_steps + stack frames + num_unroll_steps]
-            # t=2+3 -> o[2+3, 2+3+4+5] -> o[5, 14]
-            game_obs = game_segment.get_unroll_obs(state_index + td_steps, self._cfg.num_unroll_steps)
-
             rewards_list.append(game_segment.reward_segment)
 
             # for two_player board games
@@ -187,7 +204,6 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         # ==============================================================
         # EfficientZero related core code
         # ==============================================================
-        batch_target_values, batch_value_prefixs = [], []
         with torch.no_grad():
             value_obs_list = prepare_observation(value_obs_list, self._cfg.model.model_type)
             # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
@@ -258,64 +274,23 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
                 # use the predicted values
                 value_list = concat_output_value(network_output)
 
-            # get last state value
-            if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
+            # compute the n-step value targets and value prefix targets in a vectorized way
+            batch_value_prefixs, batch_target_values = compute_target_reward_value(
+                value_list,
+                value_mask,
+                rewards_list,
+                to_play_segment,
+                pos_in_game_segment_list,
+                game_segment_lens,
+                td_steps_list,
+                num_unroll_steps=self._cfg.num_unroll_steps,
+                discount_factor=self._cfg.discount_factor,
                 # TODO(pu): for board_games, very important, to check
-                value_list = value_list.reshape(-1) * np.array(
-                    [
-                        self._cfg.discount_factor ** td_steps_list[i] if int(td_steps_list[i]) %
-                        2 == 0 else -self._cfg.discount_factor ** td_steps_list[i]
-                        for i in range(transition_batch_size)
-                    ]
-                )
-            else:
-                value_list = value_list.reshape(-1) * (
-                    np.array([self._cfg.discount_factor for _ in range(transition_batch_size)]) ** td_steps_list
-                )
-
-            value_list = value_list * np.array(value_mask)
-            value_list = value_list.tolist()
-            horizon_id, value_index = 0, 0
-            for game_segment_len_non_re, reward_list, state_index, to_play_list in zip(game_segment_lens, rewards_list,
-                                                                                       pos_in_game_segment_list,
-                                                                                       to_play_segment):
-                target_values = []
-                target_value_prefixs = []
-                value_prefix = 0.0
-                base_index = state_index
-                for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
-                    bootstrap_index = current_index + td_steps_list[value_index]
-                    for i, reward in enumerate(reward_list[current_index:bootstrap_index]):
-                        if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
-                            # TODO(pu): for board_games, very important, to check
-                            if to_play_list[base_index] == to_play_list[i]:
-                                value_list[value_index] += reward * self._cfg.discount_factor ** i
-                            else:
-                                value_list[value_index] += -reward * self._cfg.discount_factor ** i
-                        else:
-                            value_list[value_index] += reward * self._cfg.discount_factor ** i
-
-                    # reset every lstm_horizon_len
-                    if horizon_id % self._cfg.lstm_horizon_len == 0:
-                        value_prefix = 0.0
-                        base_index = current_index
-                    horizon_id += 1
-
-                    if current_index < game_segment_len_non_re:
-                        target_values.append(value_list[value_index])
-                        # TODO: Since the horizon is small and the discount_factor is close to 1.
-                        # Compute the reward sum to approximate the value prefix for simplification
-                        value_prefix += reward_list[current_index
-                                                    ]  # * self._cfg.discount_factor ** (current_index - base_index)
-                        target_value_prefixs.append(value_prefix)
-                    else:
-                        target_values.append(0)
-                        target_value_prefixs.append(value_prefix)
-                    value_index += 1
-                batch_value_prefixs.append(target_value_prefixs)
-                batch_target_values.append(target_values)
-        batch_value_prefixs = np.asarray(batch_value_prefixs, dtype=object)
-        batch_target_values = np.asarray(batch_target_values, dtype=object)
+                two_player_game=self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2],
+                # Since the horizon is small and the discount_factor is close to 1, the value prefix is approximated by
+                # the reward sum, which is reset every lstm_horizon_len
+                lstm_horizon_len=self._cfg.lstm_horizon_len,
+            )
 
         return batch_value_prefixs, batch_target_values
 
@@ -330,7 +305,6 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
         """
         if policy_re_context is None:
             return []
-        batch_target_policies_re = []
 
         policy_obs_list, policy_mask, pos_in_game_segment_list, batch_index_list, child_visits, root_values, game_segment_lens, action_mask_segment, \
         to_play_segment = policy_re_context  # noqa
@@ -401,64 +375,21 @@ class EfficientZeroGameBuffer(MuZeroGameBuffer):
                     roots, model, latent_state_roots, reward_hidden_state_roots, to_play=to_play
                 )
 
-            roots_legal_actions_list = legal_actions
             roots_distributions = roots.get_distributions()
             roots_values = roots.get_values()
-            policy_index = 0
-            for state_index, child_visit, root_value in zip(pos_in_game_segment_list, child_visits, root_values):
-                target_policies = []
-                for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
-                    distributions = roots_distributions[policy_index]
-                    searched_value = roots_values[policy_index]
-
-                    if policy_mask[policy_index] == 0:
-                        # NOTE: the invalid padding target policy, O is to make sure the corresponding cross_entropy_loss=0
-                        target_policies.append([0 for _ in range(self._cfg.model.action_space_size)])
-                    else:
-                        if distributions is None:
-                            # if at some obs, the legal_action is None, add the fake target_policy
-                            target_policies.append(
-                                list(np.ones(self._cfg.model.action_space_size) / self._cfg.model.action_space_size)
-                            )
-                        else:
-                            # Update the data in game segment:
-                            # after the reanalyze search, new target policies and root values are obtained
-                            # the target policies and root values are stored in the gamesegment, specifically, ``child_visit_segment`` and ``root_value_segment``
-                            # we replace the data at the corresponding location with the latest search results to keep the most up-to-date targets
-                            sim_num = sum(distributions)
-                            child_visit[current_index] = [visit_count/sim_num for visit_count in distributions]
-                            root_value[current_index] = searched_value
-                            if self._cfg.mcts_ctree:
-                                # cpp mcts_tree
-                                if self._cfg.action_type == 'fixed_action_space':
-                                    sum_visits = sum(distributions)
-                                    policy = [visit_count / sum_visits for visit_count in distributions]
-                                    target_policies.append(policy)
-                                else:
-                                    # for two_player board games
-                                    policy_tmp = [0 for _ in range(self._cfg.model.action_space_size)]
-                                    # to make sure target_policies have the same dimension
-                                    sum_visits = sum(distributions)
-                                    policy = [visit_count / sum_visits for visit_count in distributions]
-                                    for index, legal_action in enumerate(roots_legal_actions_list[policy_index]):
-                                        policy_tmp[legal_action] = policy[index]
-                                    target_policies.append(policy_tmp)
-                            else:
-                                # python mcts_tree
-                                if self._cfg.action_type == 'fixed_action_space':
-                                    sum_visits = sum(distributions)
-                                    policy = [visit_count / sum_visits for visit_count in distributions]
-                                    target_policies.append(policy)
-                                else:
-                                    # for two_player board games
-                                    policy_tmp = [0 for _ in range(self._cfg.model.action_space_size)]
-                                    # to make sure target_policies have the same dimension
-                                    sum_visits = sum(distributions)
-                                    policy = [visit_count / sum_visits for visit_count in distributions]
-                                    for index, legal_action in enumerate(roots_legal_actions_list[policy_index]):
-                                        policy_tmp[legal_action] = policy[index]
-                                    target_policies.append(policy_tmp)
-                    policy_index += 1
-                batch_target_policies_re.append(target_policies)
-        batch_target_policies_re = np.array(batch_target_policies_re)
+            # normalize the visit counts into target policies, and update the child visits and root values stored in
+            # the game segments with the latest search results.
+            batch_target_policies_re = compute_target_policy_reanalyzed(
+                roots_distributions,
+                roots_values,
+                policy_mask,
+                child_visits,
+                root_values,
+                pos_in_game_segment_list,
+                num_unroll_steps=self._cfg.num_unroll_steps,
+                policy_shape=self._cfg.model.action_space_size,
+                # for two_player board games
+                legal_action_mask=action_mask if self._cfg.action_type == 'varied_action_space' else None,
+            )
+
         return batch_target_policies_re
@@ -38,7 +38,7 @@ class GumbelMuZeroGameBuffer(MuZeroGameBuffer):
         # The core difference between GumbelMuZero and MuZero
         # ==============================================================
         # The main difference between Gumbel MuZero and MuZero lies in the preprocessing of improved_policy.
-        obs_list, action_list, improved_policy_list, mask_list = [], [], [], []
+        action_list, improved_policy_list, mask_list = [], [], []
         # prepare the inputs of a batch
         for i in range(batch_size):
             game = game_segment_list[i]
@@ -66,18 +66,17 @@ class GumbelMuZeroGameBuffer(MuZeroGameBuffer):
             _improved_policy.extend(np.random.dirichlet(np.ones(game.action_space_size),
                                                         size=self._cfg.num_unroll_steps + 1 - len(_improved_policy)))
 
-            # obtain the input observations
-            # pad if length of obs in game_segment is less than stack+num_unroll_steps
-            # e.g. stack+num_unroll_steps = 4+5
-            obs_list.append(
-                game_segment_list[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
-                )
-            )
             action_list.append(actions_tmp)
             improved_policy_list.append(_improved_policy)
             mask_list.append(mask_tmp)
 
+        # obtain the input observations, the compressed frames of the batch are decoded in parallel
+        # pad if length of obs in game_segment is less than stack+num_unroll_steps
+        # e.g. stack+num_unroll_steps = 4+5
+        obs_list = self._get_unroll_obs_batch(
+            game_segment_list, pos_in_game_segment_list, num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+        )
+
         # formalize the input observations
         obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
 
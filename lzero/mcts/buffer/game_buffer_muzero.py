@@ -9,6 +9,8 @@ from lzero.mcts.tree_search.mcts_ptree import MuZeroMCTSPtree as MCTSPtree
 from lzero.mcts.utils import prepare_observation
 from lzero.policy import to_detach_cpu_numpy, concat_output, concat_output_value, inverse_scalar_transform
 from .game_buffer import GameBuffer
+from .target_utils import compute_target_reward_value, compute_target_policy_reanalyzed, \
+    compute_target_policy_non_reanalyzed
 
 if TYPE_CHECKING:
     from lzero.policy import MuZeroPolicy, EfficientZeroPolicy, SampledEfficientZeroPolicy
@@ -65,15 +67,25 @@ class MuZeroGameBuffer(GameBuffer):
         policy._target_model.eval()
 
         # obtain the current_batch and prepare target context
-        reward_value_context, policy_re_context, policy_non_re_context, current_batch = self._make_batch(
-            batch_size, self._cfg.reanalyze_ratio
-        )
+        context = self._make_batch(batch_size, self._cfg.reanalyze_ratio)
+        return self._compute_train_data(context, policy._target_model)
+
+    def _compute_train_data(self, context: Tuple[Any], model: Any) -> List[Any]:
+        """
+        Overview:
+            compute the target batch from the context returned by ``_make_batch()`` with the given target model,
+            and assemble it with the current_batch into the train data.
+        Arguments:
+            - context (:obj:`Tuple`): reward_value_context, policy_re_context, policy_non_re_context, current_batch
+            - model (:obj:`torch.nn.Module`): the target model used to reanalyze the targets.
+        Returns:
+            - train_data (:obj:`List`): List of train data, including current_batch and target_batch.
+        """
+        reward_value_context, policy_re_context, policy_non_re_context, current_batch = context
         # target reward, target value
-        batch_rewards, batch_target_values = self._compute_target_reward_value(
-            reward_value_context, policy._target_model
-        )
+        batch_rewards, batch_target_values = self._compute_target_reward_value(reward_value_context, model)
         # target policy
-        batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, policy._target_model)
+        batch_target_policies_re = self._compute_target_policy_reanalyzed(policy_re_context, model)
         batch_target_policies_non_re = self._compute_target_policy_non_reanalyzed(
             policy_non_re_context, self._cfg.model.action_space_size
         )
@@ -111,7 +123,7 @@ class MuZeroGameBuffer(GameBuffer):
         orig_data = self._sample_orig_data(batch_size)
         game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time_list = orig_data
         batch_size = len(batch_index_list)
-        obs_list, action_list, mask_list = [], [], []
+        action_list, mask_list = [], []
         # prepare the inputs of a batch
         for i in range(batch_size):
             game = game_segment_list[i]
@@ -129,17 +141,16 @@ class MuZeroGameBuffer(GameBuffer):
                 for _ in range(self._cfg.num_unroll_steps - len(actions_tmp))
             ]
 
-            # obtain the input observations
-            # pad if length of obs in game_segment is less than stack+num_unroll_steps
-            # e.g. stack+num_unroll_steps = 4+5
-            obs_list.append(
-                game_segment_list[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
-                )
-            )
             action_list.append(actions_tmp)
             mask_list.append(mask_tmp)
 
+        # obtain the input observations, the compressed frames of the batch are decoded in parallel
+        # pad if length of obs in game_segment is less than stack+num_unroll_steps
+        # e.g. stack+num_unroll_steps = 4+5
+        obs_list = self._get_unroll_obs_batch(
+            game_segment_list, pos_in_game_segment_list, num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+        )
+
         # formalize the input observations
         obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
 
@@ -209,17 +220,23 @@ class MuZeroGameBuffer(GameBuffer):
         action_mask_segment, to_play_segment = [], []
 
         td_steps_list = []
-        for game_segment, state_index, idx in zip(game_segment_list, pos_in_game_segment_list, batch_index_list):
+        # prepare the corresponding observations for bootstrapped values o_{t+k} of the batch
+        # o[t+ td_steps, t + td_steps + stack frames + num_unroll_steps]
+        # t=2+3 -> o[2+3, 2+3+4+5] -> o[5, 14]
+        bootstrap_obs_list = self._get_unroll_obs_batch(
+            game_segment_list, [
+                state_index + np.clip(self._cfg.td_steps, 1, max(1, len(game_segment) - state_index)).astype(np.int32)
+                for game_segment, state_index in zip(game_segment_list, pos_in_game_segment_list)
+            ], self._cfg.num_unroll_steps
+        )
+        for game_segment, state_index, idx, game_obs in zip(
+                game_segment_list, pos_in_game_segment_list, batch_index_list, bootstrap_obs_list
+        ):
             game_segment_len = len(game_segment)
             game_segment_lens.append(game_segment_len)
 
             td_steps = np.clip(self._cfg.td_steps, 1, max(1, game_segment_len - state_index)).astype(np.int32)
 
-            # prepare the corresponding observations for bootstrapped values o_{t+k}
-            # o[t+ td_steps, t + td_steps + stack frames + num_unroll_steps]
-            # t=2+3 -> o[2+3, 2+3+4+5] -> o[5, 14]
-            game_obs = game_segment.get_unroll_obs(state_index + td_steps, self._cfg.num_unroll_steps)
-
             rewards_list.append(game_segment.reward_segment)
 
             # for board games
@@ -307,7 +324,11 @@ class MuZeroGameBuffer(GameBuffer):
             rewards, child_visits, game_segment_lens, root_values = [], [], [], []
             # for board games
             action_mask_segment, to_play_segment = [], []
-            for game_segment, state_index in zip(game_segment_list, pos_in_game_segment_list):
+            # prepare the corresponding observations
+            game_obs_list = self._get_unroll_obs_batch(
+                game_segment_list, pos_in_game_segment_list, self._cfg.num_unroll_steps
+            )
+            for game_segment, state_index, game_obs in zip(game_segment_list, pos_in_game_segment_list, game_obs_list):
                 game_segment_len = len(game_segment)
                 game_segment_lens.append(game_segment_len)
                 rewards.append(game_segment.reward_segment)
@@ -317,8 +338,6 @@ class MuZeroGameBuffer(GameBuffer):
 
                 child_visits.append(game_segment.child_visit_segment)
                 root_values.append(game_segment.root_value_segment)
-                # prepare the corresponding observations
-                game_obs = game_segment.get_unroll_obs(state_index, self._cfg.num_unroll_steps)
                 for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
 
                     if current_index < game_segment_len:
@@ -369,7 +388,6 @@ class MuZeroGameBuffer(GameBuffer):
         else:
             legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
 
-        batch_target_values, batch_rewards = [], []
         with torch.no_grad():
             value_obs_list = prepare_observation(value_obs_list, self._cfg.model.model_type)
             # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
@@ -434,58 +452,21 @@ class MuZeroGameBuffer(GameBuffer):
                 # use the predicted values
                 value_list = concat_output_value(network_output)
 
-            # get last state value
-            if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
+            # compute the n-step value targets and reward targets in a vectorized way
+            batch_rewards, batch_target_values = compute_target_reward_value(
+                value_list,
+                value_mask,
+                rewards_list,
+                to_play_segment,
+                pos_in_game_segment_list,
+                game_segment_lens,
+                td_steps_list,
+                num_unroll_steps=self._cfg.num_unroll_steps,
+                discount_factor=self._cfg.discount_factor,
                 # TODO(pu): for board_games, very important, to check
-                value_list = value_list.reshape(-1) * np.array(
-                    [
-                        self._cfg.discount_factor ** td_steps_list[i] if int(td_steps_list[i]) %
-                        2 == 0 else -self._cfg.discount_factor ** td_steps_list[i]
-                        for i in range(transition_batch_size)
-                    ]
-                )
-            else:
-                value_list = value_list.reshape(-1) * (
-                    np.array([self._cfg.discount_factor for _ in range(transition_batch_size)]) ** td_steps_list
-                )
-
-            value_list = value_list * np.array(value_mask)
-            value_list = value_list.tolist()
-            horizon_id, value_index = 0, 0
-
-            for game_segment_len_non_re, reward_list, state_index, to_play_list in zip(game_segment_lens, rewards_list,
-                                                                                       pos_in_game_segment_list,
-                                                                                       to_play_segment):
-                target_values = []
-                target_rewards = []
-                base_index = state_index
-                for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
-                    bootstrap_index = current_index + td_steps_list[value_index]
-                    # for i, reward in enumerate(game.rewards[current_index:bootstrap_index]):
-                    for i, reward in enumerate(reward_list[current_index:bootstrap_index]):
-                        if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
-                            # TODO(pu): for board_games, very important, to check
-                            if to_play_list[base_index] == to_play_list[i]:
-                                value_list[value_index] += reward * self._cfg.discount_factor ** i
-                            else:
-                                value_list[value_index] += -reward * self._cfg.discount_factor ** i
-                        else:
-                            value_list[value_index] += reward * self._cfg.discount_factor ** i
-                    horizon_id += 1
-
-                    if current_index < game_segment_len_non_re:
-                        target_values.append(value_list[value_index])
-                        target_rewards.append(reward_list[current_index])
-                    else:
-                        target_values.append(0)
-                        target_rewards.append(0.0)
-                    value_index += 1
-
-                batch_rewards.append(target_rewards)
-                batch_target_values.append(target_values)
+                two_player_game=self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2],
+            )
 
-        batch_rewards = np.asarray(batch_rewards, dtype=object)
-        batch_target_values = np.asarray(batch_target_values, dtype=object)
         return batch_rewards, batch_target_values
 
     def _compute_target_policy_reanalyzed(self, policy_re_context: List[Any], model: Any) -> np.ndarray:
@@ -499,7 +480,6 @@ class MuZeroGameBuffer(GameBuffer):
         """
         if policy_re_context is None:
             return []
-        batch_target_policies_re = []
 
         # for board games
         policy_obs_list, policy_mask, pos_in_game_segment_list, batch_index_list, child_visits, root_values, game_segment_lens, action_mask_segment, \
@@ -573,54 +553,22 @@ class MuZeroGameBuffer(GameBuffer):
                 # do MCTS for a new policy with the recent target model
                 MCTSPtree(self._cfg).search(roots, model, latent_state_roots, to_play)
 
-            roots_legal_actions_list = legal_actions
             roots_distributions = roots.get_distributions()
             roots_values = roots.get_values()
-            policy_index = 0
-            for state_index, child_visit, root_value in zip(pos_in_game_segment_list, child_visits, root_values):
-                target_policies = []
-
-                for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
-                    distributions = roots_distributions[policy_index]
-                    searched_value = roots_values[policy_index]
-
-                    if policy_mask[policy_index] == 0:
-                        # NOTE: the invalid padding target policy, O is to make sure the corresponding cross_entropy_loss=0
-                        target_policies.append([0 for _ in range(self._cfg.model.action_space_size)])
-                    else:
-                        if distributions is None:
-                            # if at some obs, the legal_action is None, add the fake target_policy
-                            target_policies.append(
-                                list(np.ones(self._cfg.model.action_space_size) / self._cfg.model.action_space_size)
-                            )
-                        else:
-                            # Update the data in game segment:
-                            # after the reanalyze search, new target policies and root values are obtained
-                            # the target policies and root values are stored in the gamesegment, specifically, ``child_visit_segment`` and ``root_value_segment``
-                            # we replace the data at the corresponding location with the latest search results to keep the most up-to-date targets
-                            sim_num = sum(distributions)
-                            child_visit[current_index] = [visit_count/sim_num for visit_count in distributions]
-                            root_value[current_index] = searched_value
-                            if self._cfg.action_type == 'fixed_action_space':
-                                # for atari/classic_control/box2d environments that only have one player.
-                                sum_visits = sum(distributions)
-                                policy = [visit_count / sum_visits for visit_count in distributions]
-                                target_policies.append(policy)
-                            else:
-                                # for board games that have two players and legal_actions is dy
-                                policy_tmp = [0 for _ in range(self._cfg.model.action_space_size)]
-                                # to make sure target_policies have the same dimension
-                                sum_visits = sum(distributions)
-                                policy = [visit_count / sum_visits for visit_count in distributions]
-                                for index, legal_action in enumerate(roots_legal_actions_list[policy_index]):
-                                    policy_tmp[legal_action] = policy[index]
-                                target_policies.append(policy_tmp)
-
-                    policy_index += 1
-
-                batch_target_policies_re.append(target_policies)
-
-        batch_target_policies_re = np.array(batch_target_policies_re)
+            # normalize the visit counts into target policies, and update the child visits and root values stored in
+            # the game segments with the latest search results.
+            batch_target_policies_re = compute_target_policy_reanalyzed(
+                roots_distributions,
+                roots_values,
+                policy_mask,
+                child_visits,
+                root_values,
+                pos_in_game_segment_list,
+                num_unroll_steps=self._cfg.num_unroll_steps,
+                policy_shape=self._cfg.model.action_space_size,
+                # for board games that have two players and legal_actions is dynamic
+                legal_action_mask=action_mask if self._cfg.action_type == 'varied_action_space' else None,
+            )
 
         return batch_target_policies_re
 
@@ -647,57 +595,24 @@ class MuZeroGameBuffer(GameBuffer):
 
         pos_in_game_segment_list, child_visits, game_segment_lens, action_mask_segment, to_play_segment = policy_non_re_context
         game_segment_batch_size = len(pos_in_game_segment_list)
-        transition_batch_size = game_segment_batch_size * (self._cfg.num_unroll_steps + 1)
-
-        to_play, action_mask = self._preprocess_to_play_and_action_mask(
-            game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
-        )
-
-        if self._cfg.model.continuous_action_space is True:
-            # when the action space of the environment is continuous, action_mask[:] is None.
-            action_mask = [
-                list(np.ones(self._cfg.model.action_space_size, dtype=np.int8)) for _ in range(transition_batch_size)
-            ]
-            # NOTE: in continuous action space env: we set all legal_actions as -1
-            legal_actions = [
-                [-1 for _ in range(self._cfg.model.action_space_size)] for _ in range(transition_batch_size)
-            ]
-        else:
-            legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
-
-        with torch.no_grad():
-            policy_index = 0
-            # 0 -> Invalid target policy for padding outside of game segments,
-            # 1 -> Previous target policy for game segments.
-            policy_mask = []
-            for game_segment_len, child_visit, state_index in zip(game_segment_lens, child_visits,
-                                                                  pos_in_game_segment_list):
-                target_policies = []
 
-                for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
-                    if current_index < game_segment_len:
-                        policy_mask.append(1)
-                        # NOTE: child_visit is already a distribution
-                        distributions = child_visit[current_index]
-                        if self._cfg.action_type == 'fixed_action_space':
-                            # for atari/classic_control/box2d environments that only have one player.
-                            target_policies.append(distributions)
-                        else:
-                            # for board games that have two players.
-                            policy_tmp = [0 for _ in range(policy_shape)]
-                            for index, legal_action in enumerate(legal_actions[policy_index]):
-                                # only the action in ``legal_action`` the policy logits is nonzero
-                                policy_tmp[legal_action] = distributions[index]
-                            target_policies.append(policy_tmp)
-                    else:
-                        # NOTE: the invalid padding target policy, O is to make sure the correspoding cross_entropy_loss=0
-                        policy_mask.append(0)
-                        target_policies.append([0 for _ in range(policy_shape)])
-
-                    policy_index += 1
+        legal_action_mask = None
+        if self._cfg.action_type == 'varied_action_space' and not self._cfg.model.continuous_action_space:
+            # for board games that have two players, only the policy of the actions in ``legal_action`` is nonzero
+            to_play, legal_action_mask = self._preprocess_to_play_and_action_mask(
+                game_segment_batch_size, to_play_segment, action_mask_segment, pos_in_game_segment_list
+            )
 
-                batch_target_policies_non_re.append(target_policies)
-        batch_target_policies_non_re = np.asarray(batch_target_policies_non_re)
+        # NOTE: child_visit is already a distribution, the invalid padding target policy is 0 to make sure the
+        # corresponding cross_entropy_loss=0
+        batch_target_policies_non_re = compute_target_policy_non_reanalyzed(
+            child_visits,
+            pos_in_game_segment_list,
+            game_segment_lens,
+            num_unroll_steps=self._cfg.num_unroll_steps,
+            policy_shape=policy_shape,
+            legal_action_mask=legal_action_mask,
+        )
         return batch_target_policies_non_re
 
     def update_priority(self, train_data: List[np.ndarray], batch_priorities: Any) -> None:
@@ -714,7 +629,4 @@ class MuZeroGameBuffer(GameBuffer):
         indices = train_data[0][-3]
         metas = {'make_time': train_data[0][-1], 'batch_priorities': batch_priorities}
         # only update the priorities for data still in replay buffer
-        for i in range(len(indices)):
-            if metas['make_time'][i] > self.clear_time:
-                idx, prio = indices[i], metas['batch_priorities'][i]
-                self.game_pos_priorities[idx] = prio
+        self._update_priority_of_transitions(indices, metas['make_time'], metas['batch_priorities'])
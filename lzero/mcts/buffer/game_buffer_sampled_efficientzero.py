@@ -9,6 +9,7 @@ from lzero.mcts.tree_search.mcts_ptree_sampled import SampledEfficientZeroMCTSPt
 from lzero.mcts.utils import prepare_observation, generate_random_actions_discrete
 from lzero.policy import to_detach_cpu_numpy, concat_output, concat_output_value, inverse_scalar_transform
 from .game_buffer_efficientzero import EfficientZeroGameBuffer
+from .target_utils import compute_target_reward_value, compute_target_policy_reanalyzed
 
 
 @BUFFER_REGISTRY.register('game_buffer_sampled_efficientzero')
@@ -59,14 +60,25 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
         policy._target_model.to(self._cfg.device)
         policy._target_model.eval()
 
-        reward_value_context, policy_re_context, policy_non_re_context, current_batch = self._make_batch(
-            batch_size, self._cfg.reanalyze_ratio
-        )
+        context = self._make_batch(batch_size, self._cfg.reanalyze_ratio)
+        return self._compute_train_data(context, policy._target_model)
+
+    def _compute_train_data(self, context: Tuple[Any], model: Any) -> List[Any]:
+        """
+        Overview:
+            compute the target batch from the context returned by ``_make_batch()`` with the given target model,
+            and assemble it with the current_batch into the train data.
+        Arguments:
+            - context (:obj:`Tuple`): reward_value_context, policy_re_context, policy_non_re_context, current_batch
+            - model (:obj:`torch.nn.Module`): the target model used to reanalyze the targets.
+        Returns:
+            - train_data (:obj:`List`): List of train data
+        """
+        reward_value_context, policy_re_context, policy_non_re_context, current_batch = context
+        batch_size = len(current_batch[4])
 
         # target reward, target value
-        batch_value_prefixs, batch_target_values = self._compute_target_reward_value(
-            reward_value_context, policy._target_model
-        )
+        batch_value_prefixs, batch_target_values = self._compute_target_reward_value(reward_value_context, model)
 
         batch_target_policies_non_re = self._compute_target_policy_non_reanalyzed(
             policy_non_re_context, self._cfg.model.num_of_sampled_actions
@@ -75,7 +87,7 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
         if self._cfg.reanalyze_ratio > 0:
             # target policy
             batch_target_policies_re, root_sampled_actions = self._compute_target_policy_reanalyzed(
-                policy_re_context, policy._target_model
+                policy_re_context, model
             )
             # ==============================================================
             # fix reanalyze in sez:
@@ -131,7 +143,7 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
         orig_data = self._sample_orig_data(batch_size)
         game_lst, pos_in_game_segment_list, batch_index_list, weights_list, make_time_list = orig_data
         batch_size = len(batch_index_list)
-        obs_list, action_list, mask_list = [], [], []
+        action_list, mask_list = [], []
         root_sampled_actions_list = []
         # prepare the inputs of a batch
         for i in range(batch_size):
@@ -179,19 +191,18 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
                     reshape=reshape
                 )
 
-            # obtain the input observations
-            # stack+num_unroll_steps = 4+5
-            # pad if length of obs in game_segment is less than stack+num_unroll_steps
-            obs_list.append(
-                game_lst[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
-                )
-            )
             action_list.append(actions_tmp)
             root_sampled_actions_list.append(root_sampled_actions_tmp)
 
             mask_list.append(mask_tmp)
 
+        # obtain the input observations, the compressed frames of the batch are decoded in parallel
+        # stack+num_unroll_steps = 4+5
+        # pad if length of obs in game_segment is less than stack+num_unroll_steps
+        obs_list = self._get_unroll_obs_batch(
+            game_lst, pos_in_game_segment_list, num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+        )
+
         # formalize the input observations
         obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
         # ==============================================================
@@ -271,7 +282,6 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
         else:
             legal_actions = [[i for i, x in enumerate(action_mask[j]) if x == 1] for j in range(transition_batch_size)]
 
-        batch_target_values, batch_value_prefixs = [], []
         with torch.no_grad():
             value_obs_list = prepare_observation(value_obs_list, self._cfg.model.model_type)
             # split a full batch into slices of mini_infer_size: to save the GPU memory for more GPU actors
@@ -350,71 +360,23 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
                 # use the predicted values
                 value_list = concat_output_value(network_output)
 
-            # get last state value
-            if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
+            # compute the n-step value targets and value prefix targets in a vectorized way
+            batch_value_prefixs, batch_target_values = compute_target_reward_value(
+                value_list,
+                value_mask,
+                rewards_list,
+                to_play_segment,
+                pos_in_game_segment_list,
+                game_segment_lens,
+                td_steps_list,
+                num_unroll_steps=self._cfg.num_unroll_steps,
+                discount_factor=self._cfg.discount_factor,
                 # TODO(pu): for board_games, very important, to check
-                value_list = value_list.reshape(-1) * np.array(
-                    [
-                        self._cfg.discount_factor ** td_steps_list[i] if int(td_steps_list[i]) %
-                        2 == 0 else -self._cfg.discount_factor ** td_steps_list[i]
-                        for i in range(transition_batch_size)
-                    ]
-                )
-            else:
-                value_list = value_list.reshape(-1) * (
-                    np.array([self._cfg.discount_factor for _ in range(transition_batch_size)]) ** td_steps_list
-                )
-
-            value_list = value_list * np.array(value_mask)
-            value_list = value_list.tolist()
-
-            horizon_id, value_index = 0, 0
-            for game_segment_len_non_re, reward_list, state_index, to_play_list in zip(game_segment_lens, rewards_list,
-                                                                                       pos_in_game_segment_list,
-                                                                                       to_play_segment):
-                target_values = []
-                target_value_prefixs = []
-
-                value_prefix = 0.0
-                base_index = state_index
-                for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
-                    bootstrap_index = current_index + td_steps_list[value_index]
-                    # for i, reward in enumerate(game.rewards[current_index:bootstrap_index]):
-                    for i, reward in enumerate(reward_list[current_index:bootstrap_index]):
-                        if self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2]:
-                            # TODO(pu): for board_games, very important, to check
-                            if to_play_list[base_index] == to_play_list[i]:
-                                value_list[value_index] += reward * self._cfg.discount_factor ** i
-                            else:
-                                value_list[value_index] += -reward * self._cfg.discount_factor ** i
-                        else:
-                            value_list[value_index] += reward * self._cfg.discount_factor ** i
-                            # TODO(pu): why value don't use discount_factor factor
-
-                    # reset every lstm_horizon_len
-                    if horizon_id % self._cfg.lstm_horizon_len == 0:
-                        value_prefix = 0.0
-                        base_index = current_index
-                    horizon_id += 1
-
-                    if current_index < game_segment_len_non_re:
-                        target_values.append(value_list[value_index])
-                        # Since the horizon is small and the discount_factor is close to 1.
-                        # Compute the reward sum to approximate the value prefix for simplification
-                        value_prefix += reward_list[current_index
-                                                    ]  # * config.discount_factor ** (current_index - base_index)
-                        target_value_prefixs.append(value_prefix)
-                    else:
-                        target_values.append(0)
-                        target_value_prefixs.append(value_prefix)
-
-                    value_index += 1
-
-                batch_value_prefixs.append(target_value_prefixs)
-                batch_target_values.append(target_values)
-
-        batch_value_prefixs = np.asarray(batch_value_prefixs, dtype=object)
-        batch_target_values = np.asarray(batch_target_values, dtype=object)
+                two_player_game=self._cfg.env_type == 'board_games' and to_play_segment[0][0] in [1, 2],
+                # Since the horizon is small and the discount_factor is close to 1, the value prefix is approximated by
+                # the reward sum, which is reset every lstm_horizon_len
+                lstm_horizon_len=self._cfg.lstm_horizon_len,
+            )
 
         return batch_value_prefixs, batch_target_values
 
@@ -429,7 +391,6 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
         """
         if policy_re_context is None:
             return []
-        batch_target_policies_re = []
 
         policy_obs_list, policy_mask, pos_in_game_segment_list, batch_index_list, child_visits, root_values, game_segment_lens, action_mask_segment, \
         to_play_segment = policy_re_context  # noqa
@@ -520,7 +481,6 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
                 # do MCTS for a new policy with the recent target model
                 MCTSPtree.roots(self._cfg).search(roots, model, latent_state_roots, reward_hidden_state_roots, to_play)
 
-            roots_legal_actions_list = legal_actions
             roots_distributions = roots.get_distributions()
             roots_values = roots.get_values()
 
@@ -532,55 +492,21 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
                 root_sampled_actions = np.array([action.value for action in roots_sampled_actions])
             except Exception:
                 root_sampled_actions = np.array([action for action in roots_sampled_actions])
-            
-            policy_index = 0
-            for state_index, child_visit, root_value in zip(pos_in_game_segment_list, child_visits, root_values):
-                target_policies = []
-                for current_index in range(state_index, state_index + self._cfg.num_unroll_steps + 1):
-                    distributions = roots_distributions[policy_index]
-                    searched_value = roots_values[policy_index]
-                    # ==============================================================
-                    # sampled related core code
-                    # ==============================================================
-                    if policy_mask[policy_index] == 0:
-                        # NOTE: the invalid padding target policy, O is to make sure the corresponding cross_entropy_loss=0
-                        target_policies.append([0 for _ in range(self._cfg.model.num_of_sampled_actions)])
-                    else:
-                        if distributions is None:
-                            # if at some obs, the legal_action is None, then add the fake target_policy
-                            target_policies.append(
-                                list(
-                                    np.ones(self._cfg.model.num_of_sampled_actions) /
-                                    self._cfg.model.num_of_sampled_actions
-                                )
-                            )
-                        else:
-                            # Update the data in game segment:
-                            # after the reanalyze search, new target policies and root values are obtained
-                            # the target policies and root values are stored in the gamesegment, specifically, ``child_visit_segment`` and ``root_value_segment``
-                            # we replace the data at the corresponding location with the latest search results to keep the most up-to-date targets
-                            sim_num = sum(distributions)
-                            child_visit[current_index] = [visit_count/sim_num for visit_count in distributions]
-                            root_value[current_index] = searched_value
-                            if self._cfg.action_type == 'fixed_action_space':
-                                sum_visits = sum(distributions)
-                                policy = [visit_count / sum_visits for visit_count in distributions]
-                                target_policies.append(policy)
-                            else:
-                                # for two_player board games
-                                policy_tmp = [0 for _ in range(self._cfg.model.num_of_sampled_actions)]
-                                # to make sure target_policies have the same dimension
-                                sum_visits = sum(distributions)
-                                policy = [visit_count / sum_visits for visit_count in distributions]
-                                for index, legal_action in enumerate(roots_legal_actions_list[policy_index]):
-                                    policy_tmp[legal_action] = policy[index]
-                                target_policies.append(policy_tmp)
-
-                    policy_index += 1
-
-                batch_target_policies_re.append(target_policies)
-
-        batch_target_policies_re = np.array(batch_target_policies_re)
+
+            # normalize the visit counts into target policies, and update the child visits and root values stored in
+            # the game segments with the latest search results.
+            batch_target_policies_re = compute_target_policy_reanalyzed(
+                roots_distributions,
+                roots_values,
+                policy_mask,
+                child_visits,
+                root_values,
+                pos_in_game_segment_list,
+                num_unroll_steps=self._cfg.num_unroll_steps,
+                policy_shape=self._cfg.model.num_of_sampled_actions,
+                # for two_player board games
+                legal_action_mask=action_mask if self._cfg.action_type == 'varied_action_space' else None,
+            )
 
         return batch_target_policies_re, root_sampled_actions
 
@@ -599,7 +525,4 @@ class SampledEfficientZeroGameBuffer(EfficientZeroGameBuffer):
         batch_index_list = train_data[0][4]
         metas = {'make_time': train_data[0][6], 'batch_priorities': batch_priorities}
         # only update the priorities for data still in replay buffer
-        for i in range(len(batch_index_list)):
-            if metas['make_time'][i] > self.clear_time:
-                idx, prio = batch_index_list[i], metas['batch_priorities'][i]
-                self.game_pos_priorities[idx] = prio
+        self._update_priority_of_transitions(batch_index_list, metas['make_time'], metas['batch_priorities'])
@@ -61,7 +61,7 @@ class StochasticMuZeroGameBuffer(MuZeroGameBuffer):
         orig_data = self._sample_orig_data(batch_size)
         game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time_list = orig_data
         batch_size = len(batch_index_list)
-        obs_list, action_list, mask_list = [], [], []
+        action_list, mask_list = [], []
         if self._cfg.use_ture_chance_label_in_chance_encoder:
             chance_list = []
         # prepare the inputs of a batch
@@ -88,19 +88,18 @@ class StochasticMuZeroGameBuffer(MuZeroGameBuffer):
                     np.random.randint(0, game.action_space_size)
                     for _ in range(self._cfg.num_unroll_steps - len(chances_tmp))
                 ]
-            # obtain the input observations
-            # pad if length of obs in game_segment is less than stack+num_unroll_steps
-            # e.g. stack+num_unroll_steps  4+5
-            obs_list.append(
-                game_segment_list[i].get_unroll_obs(
-                    pos_in_game_segment_list[i], num_unroll_steps=self._cfg.num_unroll_steps, padding=True
-                )
-            )
             action_list.append(actions_tmp)
             mask_list.append(mask_tmp)
             if self._cfg.use_ture_chance_label_in_chance_encoder:
                 chance_list.append(chances_tmp)
 
+        # obtain the input observations, the compressed frames of the batch are decoded in parallel
+        # pad if length of obs in game_segment is less than stack+num_unroll_steps
+        # e.g. stack+num_unroll_steps = 4+5
+        obs_list = self._get_unroll_obs_batch(
+            game_segment_list, pos_in_game_segment_list, num_unroll_steps=self._cfg.num_unroll_steps, padding=True
+        )
+
         # formalize the input observations
         obs_list = prepare_observation(obs_list, self._cfg.model.model_type)
 
@@ -166,7 +165,4 @@ class StochasticMuZeroGameBuffer(MuZeroGameBuffer):
         indices = train_data[0][3]
         metas = {'make_time': train_data[0][5], 'batch_priorities': batch_priorities}
         # only update the priorities for data still in replay buffer
-        for i in range(len(indices)):
-            if metas['make_time'][i] > self.clear_time:
-                idx, prio = indices[i], metas['batch_priorities'][i]
-                self.game_pos_priorities[idx] = prio
+        self._update_priority_of_transitions(indices, metas['make_time'], metas['batch_priorities'])
@@ -80,6 +80,9 @@ class GameSegment:
         if self.use_ture_chance_label_in_chance_encoder:
             self.chance_segment = []
 
+        # The slot of the ``SegmentStorage`` holding the per-step arrays, None if they are private.
+        self.storage_slot = None
+
     def get_unroll_obs(self, timestep: int, num_unroll_steps: int = 0, padding: bool = False) -> np.ndarray:
         """
         Overview:
@@ -0,0 +1,145 @@
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .frame_store import FrameView
+from .obs_codec import EncodedFrames
+
+# The groups of the arrays of a game segment whose bytes are counted.
+NBYTES_FIELDS = ('obs', 'obs_raw', 'policy', 'action_mask', 'other')
+
+
+def _nbytes(data: Any) -> int:
+    """
+    Overview:
+        The number of bytes of the elements of an array, a list or a compressed observation. The object arrays and
+        the lists (e.g. the child visits of varied action spaces) are counted element by element.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, (FrameView, EncodedFrames)):
+        return data.nbytes
+    if isinstance(data, np.ndarray) and data.dtype != object:
+        return data.nbytes
+    if isinstance(data, (np.ndarray, list, tuple)):
+        return sum(_nbytes(x) for x in data)
+    return np.asarray(data).nbytes
+
+
+def game_segment_nbytes(game_segment: Any) -> Dict[str, int]:
+    """
+    Overview:
+        Count the bytes of the arrays of a game segment, grouped by ``NBYTES_FIELDS``:
+            - obs: the observations as they are stored, i.e. compressed if ``transform2string`` or by an \
+                ``ObsCodec``;
+            - obs_raw: the observations uncompressed, i.e. the uint8 frames of ``zero_obs_shape`` if \
+                ``transform2string``, the decoded frames if compressed by an ``ObsCodec``, otherwise the same as \
+                ``obs``;
+            - policy: the child visits, the improved policies and the sampled actions of the roots;
+            - action_mask: the action masks;
+            - other: the actions, rewards, root values, players to play and chances.
+        The arrays which are views of a ``SegmentStorage`` and the observations kept in a ``FrameStore`` are counted
+        as well, by the bytes they span.
+    Arguments:
+        - game_segment (:obj:`GameSegment`): The game segment, after ``game_segment_to_array``.
+    Returns:
+        - nbytes (:obj:`Dict[str, int]`): The bytes of each group of arrays.
+    """
+    if not hasattr(game_segment, 'obs_segment'):
+        # the data pushed into the buffer is not a game segment, e.g. in the tests of the buffer
+        return {'obs': 0, 'obs_raw': 0, 'policy': 0, 'action_mask': 0, 'other': _nbytes(game_segment)}
+    obs = _nbytes(game_segment.obs_segment)
+    if isinstance(game_segment.obs_segment, EncodedFrames):
+        obs_raw = game_segment.obs_segment.raw_nbytes
+    elif getattr(game_segment, 'transform2string', False):
+        obs_raw = len(game_segment.obs_segment) * int(np.prod(game_segment.zero_obs_shape))
+    else:
+        obs_raw = obs
+    policy = _nbytes(game_segment.child_visit_segment) + _nbytes(game_segment.improved_policy_probs)
+    if getattr(game_segment, 'sampled_algo', False):
+        policy += _nbytes(game_segment.root_sampled_actions)
+    other = _nbytes(game_segment.action_segment) + _nbytes(game_segment.reward_segment) + \
+        _nbytes(game_segment.root_value_segment) + _nbytes(game_segment.to_play_segment)
+    if getattr(game_segment, 'use_ture_chance_label_in_chance_encoder', False):
+        other += _nbytes(game_segment.chance_segment)
+    return {
+        'obs': obs,
+        'obs_raw': obs_raw,
+        'policy': policy,
+        'action_mask': _nbytes(game_segment.action_mask_segment),
+        'other': other
+    }
+
+
+class MemoryUsage(object):
+    """
+    Overview:
+        The byte counts of the game segments of a ``GameBuffer``, updated when a game segment is pushed or removed,
+        so that reading them does not walk the buffer. The counts of each game segment are kept in the push order,
+        so that the oldest game segments are removed with the counts they were pushed with.
+    Interfaces:
+        ``__init__``, ``push``, ``pop_front``, ``stats``
+    """
+
+    def __init__(self) -> None:
+        self.nbytes = {field: 0 for field in NBYTES_FIELDS}
+        # the bytes of the arrays the game segments keep on their own, i.e. which are not in a ``SegmentStorage`` or
+        # a ``FrameStore``
+        self.private_nbytes = 0
+        self._segment_nbytes = deque()
+
+    def push(self, game_segment: Any) -> None:
+        """
+        Overview:
+            Count the bytes of a game segment pushed into the buffer.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): The pushed game segment.
+        """
+        nbytes = game_segment_nbytes(game_segment)
+        private_nbytes = 0
+        if getattr(game_segment, 'storage_slot', None) is None:
+            private_nbytes = nbytes['policy'] + nbytes['action_mask'] + nbytes['other']
+            if not isinstance(getattr(game_segment, 'obs_segment', None), FrameView):
+                private_nbytes += nbytes['obs']
+        self._segment_nbytes.append((nbytes, private_nbytes))
+        for field, n in nbytes.items():
+            self.nbytes[field] += n
+        self.private_nbytes += private_nbytes
+
+    def pop_front(self, num: int) -> None:
+        """
+        Overview:
+            Discount the bytes of the ``num`` oldest game segments, which are removed from the buffer.
+        Arguments:
+            - num (:obj:`int`): The number of removed game segments.
+        """
+        for _ in range(num):
+            nbytes, private_nbytes = self._segment_nbytes.popleft()
+            for field, n in nbytes.items():
+                self.nbytes[field] -= n
+            self.private_nbytes -= private_nbytes
+
+    def stats(self, segment_storage: Optional[Any] = None, frame_store: Optional[Any] = None) -> Dict[str, int]:
+        """
+        Overview:
+            Return the byte counts of the buffer.
+        Arguments:
+            - segment_storage (:obj:`Optional[SegmentStorage]`): The segment storage of the buffer, if any.
+            - frame_store (:obj:`Optional[FrameStore]`): The frame store of the buffer, if any.
+        Returns:
+            - stats (:obj:`Dict[str, int]`): The bytes of each group of ``NBYTES_FIELDS``, and
+                - game_segments: the bytes of the arrays of the game segments, as they are stored;
+                - game_segments_raw: the same with the observations uncompressed;
+                - segment_storage: the bytes of the segment storage, counted as a whole;
+                - frame_store: the bytes of the frame store, counted as a whole;
+                - total: the bytes held by the buffer, i.e. the segment storage, the frame store and the arrays of \
+                    the game segments outside of them.
+        """
+        stats = dict(self.nbytes)
+        stats['game_segments'] = stats['obs'] + stats['policy'] + stats['action_mask'] + stats['other']
+        stats['game_segments_raw'] = stats['game_segments'] - stats['obs'] + stats['obs_raw']
+        stats['segment_storage'] = 0 if segment_storage is None else segment_storage.nbytes
+        stats['frame_store'] = 0 if frame_store is None else frame_store.nbytes
+        stats['total'] = stats['segment_storage'] + stats['frame_store'] + self.private_nbytes
+        return stats
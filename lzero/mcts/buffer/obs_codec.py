@@ -0,0 +1,381 @@
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class EncodedFrames(object):
+    """
+    Overview:
+        The observations of a game segment encoded frame by frame by an ``ObsCodec``. It replaces the
+        ``obs_segment`` array of the game segment: indexing it decodes the frames, so ``GameSegment.get_unroll_obs``
+        returns the decoded stacked observations.
+    Interfaces:
+        ``__init__``, ``__len__``, ``__getitem__``, ``__array__``
+    Properties:
+        ``shape``, ``dtype``, ``nbytes``, ``raw_nbytes``
+    """
+
+    def __init__(self, codec: 'ObsCodec', frames: List[bytes], frame_shape: Tuple[int, ...], dtype: Any) -> None:
+        """
+        Overview:
+            Wrap the encoded frames of a game segment.
+        Arguments:
+            - codec (:obj:`ObsCodec`): The codec the frames are encoded with.
+            - frames (:obj:`List[bytes]`): The encoded frames, in order.
+            - frame_shape (:obj:`Tuple[int, ...]`): The shape of a decoded frame.
+            - dtype (:obj:`Any`): The dtype of the decoded frames.
+        """
+        self.codec = codec
+        self.frames = frames
+        self.frame_shape = tuple(frame_shape)
+        self._dtype = np.dtype(dtype)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return (len(self.frames), ) + self.frame_shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(frame) for frame in self.frames)
+
+    @property
+    def raw_nbytes(self) -> int:
+        return len(self.frames) * int(np.prod(self.frame_shape)) * self._dtype.itemsize
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __getitem__(self, index: Any) -> np.ndarray:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.frames))
+            return self.codec.decode(self, start, max(start, stop))[::step]
+        if index < 0:
+            index += len(self.frames)
+        return self.codec.decode(self, index, index + 1)[0]
+
+    def __array__(self, dtype: Optional[np.dtype] = None) -> np.ndarray:
+        frames = self.codec.decode(self, 0, len(self.frames))
+        return frames if dtype is None else frames.astype(dtype)
+
+
+class ObsCodec(object):
+    """
+    Overview:
+        The base class of the lossless codecs of the observation frames kept in the replay buffer. The frames of a
+        game segment are compressed one by one. With ``delta=True``, a frame is stored as the XOR of its bytes with
+        the previous frame, which is mostly zeros for consecutive frames of a game and compresses much better. Every
+        ``keyframe_interval`` frames is stored as is, so that decoding a stack only decodes from the nearest keyframe.
+        The compression libraries release the GIL, so that the frames of a minibatch are decoded in parallel by the
+        threads of an ``ObsDecoder``.
+    Interfaces:
+        ``__init__``, ``compress``, ``decompress``, ``encode``, ``decode``
+    """
+
+    def __init__(self, delta: bool = False, keyframe_interval: int = 8) -> None:
+        """
+        Arguments:
+            - delta (:obj:`bool`): Whether to store the frames as the XOR with the previous frame.
+            - keyframe_interval (:obj:`int`): The interval of the frames stored as is when ``delta``.
+        """
+        assert keyframe_interval >= 1
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def _is_keyframe(self, index: int) -> bool:
+        return not self.delta or index % self.keyframe_interval == 0
+
+    def encode(self, obs: np.ndarray) -> EncodedFrames:
+        """
+        Overview:
+            Encode the observations of a game segment.
+        Arguments:
+            - obs (:obj:`np.ndarray`): The observations of the game segment, of shape ``(N, *frame_shape)``.
+        Returns:
+            - encoded (:obj:`EncodedFrames`): The encoded observations, to replace the ``obs_segment``.
+        """
+        obs = np.ascontiguousarray(obs)
+        raw = obs.reshape(len(obs), -1).view(np.uint8)
+        frames = []
+        for i in range(len(obs)):
+            frame = raw[i] if self._is_keyframe(i) else np.bitwise_xor(raw[i], raw[i - 1])
+            frames.append(self.compress(frame.tobytes()))
+        return EncodedFrames(self, frames, obs.shape[1:], obs.dtype)
+
+    def decode(self, encoded: EncodedFrames, start: int, stop: int) -> np.ndarray:
+        """
+        Overview:
+            Decode the frames ``[start, stop)`` of the encoded observations.
+        Returns:
+            - frames (:obj:`np.ndarray`): The decoded frames, of shape ``(stop - start, *frame_shape)``.
+        """
+        frame_nbytes = int(np.prod(encoded.frame_shape)) * encoded.dtype.itemsize
+        out = np.empty((stop - start, frame_nbytes), dtype=np.uint8)
+        first = start
+        while not self._is_keyframe(first):
+            first -= 1
+        previous = None
+        for i in range(first, stop):
+            frame = np.frombuffer(self.decompress(encoded.frames[i]), dtype=np.uint8)
+            if not self._is_keyframe(i):
+                frame = np.bitwise_xor(frame, previous)
+            if i >= start:
+                out[i - start] = frame
+            previous = frame
+        return out.view(encoded.dtype).reshape((stop - start, ) + encoded.frame_shape)
+
+
+class ZlibCodec(ObsCodec):
+    """
+    Overview:
+        The zlib codec, which needs no extra dependency.
+    """
+
+    def __init__(self, delta: bool = False, keyframe_interval: int = 8, level: int = 1) -> None:
+        super().__init__(delta, keyframe_interval)
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class Lz4Codec(ObsCodec):
+    """
+    Overview:
+        The lz4 codec, the fastest to decode. It needs the ``lz4`` package.
+    """
+
+    def __init__(self, delta: bool = False, keyframe_interval: int = 8) -> None:
+        super().__init__(delta, keyframe_interval)
+        try:
+            import lz4.block
+        except ImportError:
+            raise ImportError("Please install lz4 first, such as `pip3 install lz4`")
+        self._lz4 = lz4.block
+
+    def compress(self, data: bytes) -> bytes:
+        return self._lz4.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._lz4.decompress(data)
+
+    def __getstate__(self) -> dict:
+        # the module is imported again when unpickled, e.g. in the processes of the reanalysis
+        state = self.__dict__.copy()
+        del state['_lz4']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state['delta'], state['keyframe_interval'])
+
+
+class ZstdCodec(ObsCodec):
+    """
+    Overview:
+        The zstd codec, which compresses better than lz4 at a similar decode speed. It needs the ``zstandard``
+        package.
+    """
+
+    def __init__(self, delta: bool = False, keyframe_interval: int = 8, level: int = 3) -> None:
+        super().__init__(delta, keyframe_interval)
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Please install zstandard first, such as `pip3 install zstandard`")
+        self.level = level
+        self._zstd = zstandard
+        # the (de)compressor objects of zstandard must not be used by several threads at once
+        self._local = threading.local()
+
+    def compress(self, data: bytes) -> bytes:
+        if not hasattr(self._local, 'compressor'):
+            self._local.compressor = self._zstd.ZstdCompressor(level=self.level)
+        return self._local.compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        if not hasattr(self._local, 'decompressor'):
+            self._local.decompressor = self._zstd.ZstdDecompressor()
+        return self._local.decompressor.decompress(data)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_zstd'], state['_local']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state['delta'], state['keyframe_interval'], state['level'])
+
+
+class JpegCodec(ObsCodec):
+    """
+    Overview:
+        The lossy jpeg codec of ``jpeg_data_compressor``, for the uint8 image frames of shape ``(C, H, W)`` with 1
+        or 3 channels. It needs ``opencv-python``, and does not support ``delta``.
+    """
+
+    def __init__(self, delta: bool = False, keyframe_interval: int = 8, quality: int = 95) -> None:
+        assert not delta, "the jpeg codec does not support delta frames"
+        super().__init__(False, keyframe_interval)
+        try:
+            import cv2
+        except ImportError:
+            raise ImportError("Please install opencv-python first, such as `pip3 install opencv-python`")
+        self.quality = quality
+        self._cv2 = cv2
+
+    def encode(self, obs: np.ndarray) -> EncodedFrames:
+        assert obs.dtype == np.uint8 and obs.ndim == 4 and obs.shape[1] in (1, 3)
+        params = [int(self._cv2.IMWRITE_JPEG_QUALITY), self.quality]
+        frames = [self._cv2.imencode('.jpg', frame.transpose(1, 2, 0), params)[1].tobytes() for frame in obs]
+        return EncodedFrames(self, frames, obs.shape[1:], obs.dtype)
+
+    def decode(self, encoded: EncodedFrames, start: int, stop: int) -> np.ndarray:
+        flag = self._cv2.IMREAD_GRAYSCALE if encoded.frame_shape[0] == 1 else self._cv2.IMREAD_COLOR
+        out = np.empty((stop - start, ) + encoded.frame_shape, dtype=np.uint8)
+        for i in range(start, stop):
+            frame = self._cv2.imdecode(np.frombuffer(encoded.frames[i], np.uint8), flag)
+            out[i - start] = frame.reshape(frame.shape[:2] + (-1, )).transpose(2, 0, 1)
+        return out
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state['_cv2']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(False, state['keyframe_interval'], state['quality'])
+
+
+OBS_CODECS = {'zlib': ZlibCodec, 'lz4': Lz4Codec, 'zstd': ZstdCodec, 'jpeg': JpegCodec}
+
+
+def create_obs_codec(name: str, delta: bool = False, keyframe_interval: int = 8) -> ObsCodec:
+    """
+    Overview:
+        Create the observation codec of the name in ``OBS_CODECS``.
+    Arguments:
+        - name (:obj:`str`): The name of the codec, one of ``zlib``, ``lz4``, ``zstd`` and ``jpeg``.
+        - delta (:obj:`bool`): Whether to store the frames as the XOR with the previous frame.
+        - keyframe_interval (:obj:`int`): The interval of the frames stored as is when ``delta``.
+    Returns:
+        - codec (:obj:`ObsCodec`): The codec.
+    """
+    if name not in OBS_CODECS:
+        raise KeyError("unknown observation codec: {}, supported codecs: {}".format(name, list(OBS_CODECS.keys())))
+    return OBS_CODECS[name](delta=delta, keyframe_interval=keyframe_interval)
+
+
+class ObsDecoder(object):
+    """
+    Overview:
+        Assemble the stacked observations of a whole minibatch, i.e. call ``GameSegment.get_unroll_obs`` for each
+        sampled position, in a pool of threads. The decoding of compressed frames (by an ``ObsCodec`` or the jpeg
+        strings of ``transform2string``) releases the GIL, so that the stacks are decoded in parallel.
+        The decoded stacks of the recently sampled positions are kept in a LRU cache, as the same positions are
+        decoded again for the reanalysis of the policy targets of the minibatch and when sampled again.
+    Interfaces:
+        ``__init__``, ``get_unroll_obs_batch``, ``clear``, ``close``
+    """
+
+    def __init__(self, num_workers: int = 4, cache_size: int = 1024) -> None:
+        """
+        Arguments:
+            - num_workers (:obj:`int`): The number of decoding threads, 0 decodes in the calling thread.
+            - cache_size (:obj:`int`): The number of decoded stacks kept in the cache, 0 disables the cache.
+        """
+        self.num_workers = num_workers
+        self.cache_size = cache_size
+        self._executor = None
+        # (id of the game segment, timestep, num_unroll_steps, padded) -> (game segment, stacked obs). The game
+        # segment is kept in the value so that its id is not reused while the entry is cached.
+        self._cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _decode(self, requests: Sequence[Tuple[Any, int, int, bool]]) -> List[np.ndarray]:
+        return [
+            np.asarray(game_segment.get_unroll_obs(timestep, num_unroll_steps, padding))
+            for game_segment, timestep, num_unroll_steps, padding in requests
+        ]
+
+    def get_unroll_obs_batch(
+            self,
+            game_segments: Sequence[Any],
+            timesteps: Sequence[int],
+            num_unroll_steps: int = 0,
+            padding: bool = False
+    ) -> List[np.ndarray]:
+        """
+        Overview:
+            Get the stacked observations ``game_segments[i].get_unroll_obs(timesteps[i], num_unroll_steps, padding)``
+            of each position of a minibatch.
+        Arguments:
+            - game_segments (:obj:`Sequence[GameSegment]`): The game segments of the positions.
+            - timesteps (:obj:`Sequence[int]`): The positions in the game segments.
+            - num_unroll_steps (:obj:`int`): The extra length of the observation frames.
+            - padding (:obj:`bool`): Whether to pad the frames outside of the game segment with the last one.
+        Returns:
+            - stacked_obs (:obj:`List[np.ndarray]`): The stacked observations of each position.
+        """
+        results = [None] * len(game_segments)
+        missing = []
+        for i, (game_segment, timestep) in enumerate(zip(game_segments, timesteps)):
+            # the padding only changes the stacks which end outside of the game segment, so that the other stacks
+            # are shared by the requests with and without padding
+            pad = padding and timestep + game_segment.frame_stack_num + num_unroll_steps > len(game_segment.obs_segment)
+            key = (id(game_segment), int(timestep), num_unroll_steps, pad)
+            cached = self._cache.get(key) if self.cache_size > 0 else None
+            if cached is not None and cached[0] is game_segment:
+                self._cache.move_to_end(key)
+                results[i] = cached[1]
+                self.cache_hits += 1
+            else:
+                missing.append((i, key, (game_segment, int(timestep), num_unroll_steps, padding)))
+        self.cache_misses += len(missing)
+
+        requests = [request for _, _, request in missing]
+        if self.num_workers > 0 and len(requests) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.num_workers)
+            chunk = -(-len(requests) // self.num_workers)
+            futures = [
+                self._executor.submit(self._decode, requests[start:start + chunk])
+                for start in range(0, len(requests), chunk)
+            ]
+            decoded = [obs for future in futures for obs in future.result()]
+        else:
+            decoded = self._decode(requests)
+
+        for (i, key, (game_segment, _, _, _)), obs in zip(missing, decoded):
+            results[i] = obs
+            if self.cache_size > 0:
+                # the cached stacks are shared by the minibatches, they must not be modified in place
+                obs.flags.writeable = False
+                self._cache[key] = (game_segment, obs)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
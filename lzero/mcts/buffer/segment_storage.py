@@ -0,0 +1,254 @@
+import mmap
+import os
+import tempfile
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # without ``fcntl`` (e.g. on Windows) the slots are only reserved safely by the threads of one process
+    fcntl = None
+
+# The per-step columns of a ``GameSegment`` that are kept in the columnar storage.
+SEGMENT_COLUMNS = (
+    'obs_segment', 'action_segment', 'reward_segment', 'child_visit_segment', 'root_value_segment',
+    'action_mask_segment', 'to_play_segment'
+)
+_ALIGNMENT = 64
+# The states of the slots, kept in the shared header of the storage file.
+_SLOT_FREE, _SLOT_USED = 0, 1
+
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class SegmentStorage(object):
+    """
+    Overview:
+        A columnar replay storage backed by one shared memory-mapped file. Each column of a ``GameSegment``
+        (obs, action, reward, child_visit, root_value, action_mask and to_play) lives in a preallocated array of shape
+        ``(num_slots, max_len, *step_shape)``, and a game segment occupies the same slot in every column.
+        Once a game segment is written into a slot, its columns are rebound to views of the slot, so that the
+        ``GameBuffer`` and the reanalyze code read and update the storage in place instead of private copies.
+
+        Other processes on the same node, e.g. collectors, can ``attach`` to the storage by its ``handle``, reserve
+        slots and write game segments straight into them. The states of the slots are kept in the storage file and
+        updated under a file lock, so that the owner and the attached processes share them. The writers then
+        ``strip`` the columns off the game segment, so that only a small shell with its ``storage_slot`` has to be
+        sent to the learner, which binds the columns to the slot again when the game segment is pushed.
+
+        Columns that do not fit the storage, e.g. the ragged child visits of varied action spaces, or segments longer
+        than ``max_len``, are left as the private arrays of the game segment.
+    Interfaces:
+        ``__init__``, ``from_game_segment``, ``attach``, ``allocate``, ``reserve``, ``release``, ``write``, ``bind``,
+        ``strip``, ``close``
+    Properties:
+        ``handle``, ``num_slots``, ``num_free_slots``, ``nbytes``
+    """
+
+    def __init__(
+            self,
+            num_slots: int,
+            max_len: int,
+            spec: Dict[str, Tuple[Tuple[int, ...], str]],
+            path: Optional[str] = None,
+    ) -> None:
+        """
+        Overview:
+            Create the storage file, or attach to an existing one if ``path`` is given.
+        Arguments:
+            - num_slots (:obj:`int`): The number of game segments the storage can hold.
+            - max_len (:obj:`int`): The maximum length of each column of a game segment.
+            - spec (:obj:`Dict[str, Tuple]`): The ``(step_shape, dtype)`` of each stored column.
+            - path (:obj:`Optional[str]`): The path of an existing storage file to attach to.
+        """
+        self._num_slots = num_slots
+        self._max_len = max_len
+        self._spec = {k: (tuple(shape), np.dtype(dtype).str) for k, (shape, dtype) in spec.items()}
+        self._columns_name = [k for k in SEGMENT_COLUMNS if k in self._spec]
+
+        offsets, size = self._layout()
+        owner = path is None
+        if owner:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            path = os.path.join(directory, 'lzero_segment_storage_{}'.format(uuid.uuid4().hex))
+            with open(path, 'wb') as f:
+                f.truncate(size)
+        self._path = path
+        self._owner = owner
+        # the owner removes the file when the storage is closed, garbage collected, or at interpreter exit
+        self._finalizer = weakref.finalize(self, _remove_file, path) if owner else None
+        # the file stays open for the lock of the slot states
+        self._file = open(path, 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self._thread_lock = threading.Lock()
+
+        self._lengths = np.frombuffer(self._mmap, dtype=np.int64, count=num_slots * len(self._columns_name),
+                                      offset=0).reshape(num_slots, len(self._columns_name))
+        self._slot_states = np.frombuffer(
+            self._mmap, dtype=np.int64, count=num_slots, offset=self._lengths.nbytes
+        )
+        self._columns = {}
+        for name, offset in zip(self._columns_name, offsets):
+            shape, dtype = self._spec[name]
+            self._columns[name] = np.frombuffer(
+                self._mmap, dtype=dtype, count=num_slots * max_len * int(np.prod(shape)), offset=offset
+            ).reshape((num_slots, max_len) + shape)
+
+        if self._owner:
+            self._lengths[:] = -1
+            self._slot_states[:] = _SLOT_FREE
+
+    def _layout(self) -> Tuple[List[int], int]:
+        size = self._num_slots * (len(self._columns_name) + 1) * np.dtype(np.int64).itemsize
+        offsets = []
+        for name in self._columns_name:
+            shape, dtype = self._spec[name]
+            size = (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+            offsets.append(size)
+            size += self._num_slots * self._max_len * int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return offsets, max(size, 1)
+
+    @classmethod
+    def from_game_segment(cls: type, game_segment: Any, num_slots: int, max_len: int) -> 'SegmentStorage':
+        """
+        Overview:
+            Create a storage whose columns have the step shapes and dtypes of the given game segment.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): A game segment after ``game_segment_to_array``.
+            - num_slots (:obj:`int`): The number of game segments the storage can hold.
+            - max_len (:obj:`int`): The maximum length of each column of a game segment.
+        """
+        spec = {}
+        for name in SEGMENT_COLUMNS:
+            column = getattr(game_segment, name)
+            if isinstance(column, np.ndarray) and column.dtype != object and column.ndim >= 1:
+                spec[name] = (column.shape[1:], column.dtype.str)
+        return cls(num_slots, max_len, spec)
+
+    @classmethod
+    def attach(cls: type, handle: Tuple) -> 'SegmentStorage':
+        """
+        Overview:
+            Attach to the storage created in another process.
+        Arguments:
+            - handle (:obj:`Tuple`): The ``handle`` of the storage.
+        """
+        path, num_slots, max_len, spec = handle
+        return cls(num_slots, max_len, spec, path=path)
+
+    @property
+    def handle(self) -> Tuple:
+        return self._path, self._num_slots, self._max_len, self._spec
+
+    @property
+    def num_slots(self) -> int:
+        return self._num_slots
+
+    @property
+    def num_free_slots(self) -> int:
+        return int(np.count_nonzero(self._slot_states == _SLOT_FREE))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mmap)
+
+    @contextmanager
+    def _lock_slots(self) -> Iterator[None]:
+        """
+        Overview:
+            Lock the slot states against the other threads and the other processes attached to the storage.
+        """
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def allocate(self) -> Optional[int]:
+        """
+        Overview:
+            Take a free slot, or return None if the storage is full.
+        """
+        slots = self.reserve(1)
+        return slots[0] if slots else None
+
+    def reserve(self, num: int) -> List[int]:
+        """
+        Overview:
+            Take up to ``num`` free slots, the lowest ones first. It can be called by the owner and by the processes
+            attached to the storage.
+        """
+        with self._lock_slots():
+            slots = np.flatnonzero(self._slot_states == _SLOT_FREE)[:num]
+            self._slot_states[slots] = _SLOT_USED
+        return slots.tolist()
+
+    def release(self, slot: int) -> None:
+        """
+        Overview:
+            Give a slot back once its game segment is removed from the buffer.
+        """
+        with self._lock_slots():
+            self._lengths[slot] = -1
+            self._slot_states[slot] = _SLOT_FREE
+
+    def write(self, slot: int, game_segment: Any) -> None:
+        """
+        Overview:
+            Copy the columns of the game segment into the slot.
+        """
+        for i, name in enumerate(self._columns_name):
+            column = getattr(game_segment, name)
+            shape, dtype = self._spec[name]
+            if not isinstance(column, np.ndarray) or column.dtype == object or column.shape[1:] != shape or \
+                    len(column) > self._max_len or not np.can_cast(column.dtype, dtype, casting='same_kind'):
+                # keep the private array of the game segment
+                self._lengths[slot, i] = -1
+                continue
+            self._columns[name][slot, :len(column)] = column
+            self._lengths[slot, i] = len(column)
+
+    def bind(self, slot: int, game_segment: Any) -> None:
+        """
+        Overview:
+            Replace the stored columns of the game segment with views of the slot.
+        """
+        for i, name in enumerate(self._columns_name):
+            length = self._lengths[slot, i]
+            if length >= 0:
+                setattr(game_segment, name, self._columns[name][slot, :length])
+        game_segment.storage_slot = slot
+
+    def strip(self, game_segment: Any, slot: int) -> None:
+        """
+        Overview:
+            Drop the columns stored in the slot from the game segment, so that it can be sent to the owner process
+            without copying them. The owner binds them again when the game segment is pushed into the buffer.
+        """
+        for i, name in enumerate(self._columns_name):
+            if self._lengths[slot, i] >= 0:
+                setattr(game_segment, name, None)
+        game_segment.storage_slot = slot
+
+    def close(self) -> None:
+        """
+        Overview:
+            Remove the storage file if it is owned by this process. The memory stays mapped until all the views
+            are released.
+        """
+        self._file.close()
+        if self._finalizer is not None:
+            self._finalizer()
@@ -0,0 +1,120 @@
+from typing import Callable
+
+import numpy as np
+
+
+class SegmentTree(object):
+    """
+    Overview:
+        A complete binary segment tree stored in a flat array, whose leaves hold one value per transition slot
+        and whose inner nodes hold the reduction (e.g. sum or max) of their two children.
+        All the operations are vectorized over a batch of indices, i.e. an update of ``k`` leaves or a query of
+        ``k`` prefix sums costs ``O(k log N)`` numpy work and only ``log N`` python iterations.
+    Interfaces:
+        ``__init__``, ``update``, ``rebuild``, ``reduce``, ``__getitem__``, ``capacity``
+    """
+
+    def __init__(self, capacity: int, operation: Callable, neutral_element: float) -> None:
+        """
+        Overview:
+            Initialize the segment tree. The capacity is rounded up to the next power of two.
+        Arguments:
+            - capacity (:obj:`int`): The minimum number of leaves.
+            - operation (:obj:`Callable`): A numpy ufunc used to reduce two children, e.g. ``np.add``.
+            - neutral_element (:obj:`float`): The neutral element of ``operation``, e.g. ``0.`` for ``np.add``.
+        """
+        assert capacity > 0, "capacity of the segment tree should be positive"
+        self._capacity = 1 << int(np.ceil(np.log2(capacity)))
+        self._depth = int(np.log2(self._capacity))
+        self._operation = operation
+        self._neutral_element = neutral_element
+        # index 0 is unused, index 1 is the root, leaves are in [capacity, 2 * capacity).
+        self._value = np.full(2 * self._capacity, neutral_element, dtype=np.float64)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def update(self, idx: np.ndarray, val: np.ndarray) -> None:
+        """
+        Overview:
+            Set the leaves ``idx`` to ``val`` and refresh all the ancestors of the modified leaves.
+        Arguments:
+            - idx (:obj:`np.ndarray`): The leaf indices in ``[0, capacity)``.
+            - val (:obj:`np.ndarray`): The new leaf values, broadcastable to ``idx``.
+        """
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1)
+        if idx.size == 0:
+            return
+        nodes = idx + self._capacity
+        self._value[nodes] = val
+        for _ in range(self._depth):
+            nodes = np.unique(nodes >> 1)
+            self._value[nodes] = self._operation(self._value[2 * nodes], self._value[2 * nodes + 1])
+
+    def rebuild(self) -> None:
+        """
+        Overview:
+            Recompute all the inner nodes from the leaves, level by level. Used after bulk writes of the leaves.
+        """
+        start = self._capacity
+        while start > 1:
+            nodes = np.arange(start >> 1, start)
+            self._value[nodes] = self._operation(self._value[2 * nodes], self._value[2 * nodes + 1])
+            start >>= 1
+
+    def reduce(self) -> float:
+        """
+        Overview:
+            Return the reduction over all the leaves, i.e. the value of the root.
+        """
+        return float(self._value[1])
+
+    def __getitem__(self, idx: np.ndarray) -> np.ndarray:
+        return self._value[np.asarray(idx, dtype=np.int64) + self._capacity]
+
+
+class SumSegmentTree(SegmentTree):
+    """
+    Overview:
+        Segment tree whose inner nodes hold the sum of the leaves, used for proportional prioritized sampling.
+    Interfaces:
+        ``__init__``, ``update``, ``rebuild``, ``reduce``, ``find_prefixsum_idx``
+    """
+
+    def __init__(self, capacity: int) -> None:
+        super().__init__(capacity, operation=np.add, neutral_element=0.)
+
+    def find_prefixsum_idx(self, prefixsum: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            For every query ``s`` find the highest leaf index ``i`` such that ``sum(leaf[:i]) <= s``.
+            The descent never enters a subtree whose sum is zero, so that the returned leaves always have a positive
+            value as long as the root is positive, even in the presence of floating point rounding errors.
+        Arguments:
+            - prefixsum (:obj:`np.ndarray`): The queried prefix sums in ``[0, reduce())``.
+        Returns:
+            - idx (:obj:`np.ndarray`): The leaf indices in ``[0, capacity)``.
+        """
+        prefixsum = np.array(prefixsum, dtype=np.float64).reshape(-1)
+        idx = np.ones_like(prefixsum, dtype=np.int64)
+        for _ in range(self._depth):
+            left = 2 * idx
+            left_value = self._value[left]
+            go_right = (prefixsum >= left_value) & (self._value[left + 1] > 0)
+            go_right |= left_value <= 0
+            prefixsum = np.where(go_right, prefixsum - left_value, prefixsum)
+            idx = np.where(go_right, left + 1, left)
+        return idx - self._capacity
+
+
+class MaxSegmentTree(SegmentTree):
+    """
+    Overview:
+        Segment tree whose inner nodes hold the maximum of the leaves, used to assign the max priority to new data.
+    Interfaces:
+        ``__init__``, ``update``, ``rebuild``, ``reduce``
+    """
+
+    def __init__(self, capacity: int) -> None:
+        super().__init__(capacity, operation=np.maximum, neutral_element=0.)
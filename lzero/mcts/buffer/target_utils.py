@@ -0,0 +1,271 @@
+"""
+Overview:
+    Vectorized construction of the reward/value/policy targets of the MuZero-family game buffers.
+    The functions here take the per-segment context prepared by ``_prepare_*_context`` of the buffers and return
+    dense ``float32`` arrays of shape ``(game_segment_batch_size, num_unroll_steps + 1, ...)``. They reproduce the
+    element-wise arithmetic (and its order) of the original nested python loops, so that the targets are the same as
+    before, bit for bit, while the python work is reduced to one slice per sampled game segment.
+"""
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+
+def _gather_windows(segments: List[Any], start: np.ndarray, width: int, fill_value: float,
+                    dtype: type) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Overview:
+        Gather ``segments[b][start[b]:start[b] + width]`` into a dense ``(batch, width)`` array, padded with
+        ``fill_value`` where the window is out of the segment.
+    Returns:
+        - windows (:obj:`np.ndarray`): The gathered windows.
+        - valid (:obj:`np.ndarray`): Whether each entry of the windows is inside its segment.
+    """
+    batch_size = len(segments)
+    windows = np.full((batch_size, width), fill_value, dtype=dtype)
+    valid = np.zeros((batch_size, width), dtype=bool)
+    for b in range(batch_size):
+        window = segments[b][start[b]:start[b] + width]
+        windows[b, :len(window)] = window
+        valid[b, :len(window)] = True
+    return windows, valid
+
+
+def compute_bootstrap_discount(td_steps: np.ndarray, discount_factor: float, two_player_game: bool) -> np.ndarray:
+    """
+    Overview:
+        The factor applied to the bootstrapped value ``v_{t+n}``: ``gamma ** n``, and ``-gamma ** n`` for odd ``n`` in
+        two-player board games, since the value is then predicted from the opponent's perspective.
+    """
+    td_steps = np.asarray(td_steps).reshape(-1)
+    discount = np.full(len(td_steps), discount_factor) ** td_steps
+    if two_player_game:
+        discount = np.where(td_steps % 2 == 0, discount, -discount)
+    return discount
+
+
+def compute_target_reward_value(
+        value_list: np.ndarray,
+        value_mask: List[int],
+        rewards_list: List[np.ndarray],
+        to_play_segment: List[np.ndarray],
+        pos_in_game_segment_list: List[int],
+        game_segment_lens: List[int],
+        td_steps_list: List[int],
+        num_unroll_steps: int,
+        discount_factor: float,
+        two_player_game: bool,
+        lstm_horizon_len: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Overview:
+        Compute the n-step TD value targets ``z_t = sum_{i<n} gamma^i r_{t+i} + gamma^n v_{t+n}`` and the reward
+        (or value prefix) targets for all the ``num_unroll_steps + 1`` positions of every sampled game segment.
+    Arguments:
+        - value_list (:obj:`np.ndarray`): The predicted (or searched) values of the bootstrapped observations.
+        - value_mask (:obj:`List[int]`): 1 if the bootstrapped observation is inside the game segment, else 0.
+        - rewards_list (:obj:`List[np.ndarray]`): The reward segment of each sampled game segment.
+        - to_play_segment (:obj:`List[np.ndarray]`): The to_play segment of each sampled game segment.
+        - pos_in_game_segment_list (:obj:`List[int]`): The sampled position in each game segment.
+        - game_segment_lens (:obj:`List[int]`): The length of each game segment.
+        - td_steps_list (:obj:`List[int]`): The td steps of each of the ``batch * (num_unroll_steps + 1)`` targets.
+        - num_unroll_steps (:obj:`int`): The number of unroll steps.
+        - discount_factor (:obj:`float`): The discount factor.
+        - two_player_game (:obj:`bool`): Whether to flip the sign of the rewards and values of the opponent.
+        - lstm_horizon_len (:obj:`Optional[int]`): If not None, compute the value prefix of EfficientZero, which is \
+            reset every ``lstm_horizon_len`` targets, instead of the one-step rewards of MuZero.
+    Returns:
+        - batch_rewards (:obj:`np.ndarray`): The reward or value prefix targets, shape ``(B, num_unroll_steps + 1)``.
+        - batch_target_values (:obj:`np.ndarray`): The value targets, shape ``(B, num_unroll_steps + 1)``.
+    """
+    batch_size = len(pos_in_game_segment_list)
+    unroll_len = num_unroll_steps + 1
+    pos = np.asarray(pos_in_game_segment_list, dtype=np.int64)
+    td_steps = np.asarray(td_steps_list, dtype=np.int64).reshape(batch_size, unroll_len)
+    max_td_steps = int(td_steps.max())
+
+    values = np.asarray(value_list).reshape(-1) * compute_bootstrap_discount(td_steps, discount_factor, two_player_game)
+    values = (values * np.array(value_mask)).reshape(batch_size, unroll_len)
+
+    # rewards[b, j] = r_{pos_b + j}, for the n-step sums of all the unroll steps.
+    rewards, reward_valid = _gather_windows(rewards_list, pos, unroll_len + max_td_steps - 1, 0., np.float64)
+    discounts = [discount_factor ** i for i in range(max_td_steps)]
+
+    unroll_step = np.arange(unroll_len)
+    if lstm_horizon_len is not None:
+        # the value prefix (and the reference player of board games) is reset every lstm_horizon_len targets,
+        # counted over the whole batch.
+        reset = ((np.arange(batch_size)[:, None] * unroll_len + unroll_step) % lstm_horizon_len) == 0
+        last_reset = np.maximum.accumulate(np.where(reset, unroll_step, -1), axis=1)
+        base_step = np.maximum(np.concatenate([np.full((batch_size, 1), -1), last_reset[:, :-1]], axis=1), 0)
+    else:
+        reset = np.zeros((batch_size, unroll_len), dtype=bool)
+        base_step = np.zeros((batch_size, unroll_len), dtype=np.int64)
+
+    if two_player_game:
+        # NOTE: as in the original implementation, the player of the i-th reward is taken as to_play[i].
+        to_play_head, _ = _gather_windows(
+            to_play_segment, np.zeros(batch_size, dtype=np.int64), max_td_steps, -1, np.int64
+        )
+        to_play_unroll, _ = _gather_windows(to_play_segment, pos, unroll_len, -1, np.int64)
+        base_to_play = np.take_along_axis(to_play_unroll, base_step, axis=1)
+
+    for i in range(max_td_steps):
+        reward = rewards[:, i:i + unroll_len]
+        valid = (i < td_steps) & reward_valid[:, i:i + unroll_len]
+        if two_player_game:
+            same_player = base_to_play == to_play_head[:, i:i + 1]
+            reward = np.where(same_player, reward, -reward)
+        values = np.where(valid, values + reward * discounts[i], values)
+
+    in_segment = (pos[:, None] + unroll_step) < np.asarray(game_segment_lens)[:, None]
+    batch_target_values = np.where(in_segment, values, 0.)
+    if lstm_horizon_len is None:
+        batch_rewards = np.where(in_segment, rewards[:, :unroll_len], 0.)
+    else:
+        batch_rewards = np.zeros((batch_size, unroll_len), dtype=np.float64)
+        value_prefix = np.zeros(batch_size, dtype=np.float64)
+        for k in range(unroll_len):
+            value_prefix = np.where(reset[:, k], 0., value_prefix)
+            value_prefix = np.where(in_segment[:, k], value_prefix + rewards[:, k], value_prefix)
+            batch_rewards[:, k] = value_prefix
+    return batch_rewards.astype(np.float32), batch_target_values.astype(np.float32)
+
+
+def compute_target_policy_non_reanalyzed(
+        child_visits: List[np.ndarray],
+        pos_in_game_segment_list: List[int],
+        game_segment_lens: List[int],
+        num_unroll_steps: int,
+        policy_shape: int,
+        legal_action_mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Overview:
+        Gather the visit count distributions stored during self-play as the policy targets. The targets out of the
+        game segment are all zeros, so that the corresponding cross entropy loss is 0.
+    Arguments:
+        - child_visits (:obj:`List[np.ndarray]`): The child visit segment of each sampled game segment.
+        - pos_in_game_segment_list (:obj:`List[int]`): The sampled position in each game segment.
+        - game_segment_lens (:obj:`List[int]`): The length of each game segment.
+        - num_unroll_steps (:obj:`int`): The number of unroll steps.
+        - policy_shape (:obj:`int`): The size of the policy targets.
+        - legal_action_mask (:obj:`Optional[np.ndarray]`): For varied action spaces, the legal action mask of shape \
+            ``(B * (num_unroll_steps + 1), policy_shape)``, into which the distributions over the legal actions \
+            are scattered.
+    Returns:
+        - batch_target_policies (:obj:`np.ndarray`): shape ``(B, num_unroll_steps + 1, policy_shape)``.
+    """
+    batch_size = len(pos_in_game_segment_list)
+    unroll_len = num_unroll_steps + 1
+    target_policies = np.zeros((batch_size, unroll_len, policy_shape), dtype=np.float64)
+    valid_len = np.clip(np.asarray(game_segment_lens) - np.asarray(pos_in_game_segment_list), 0, unroll_len)
+
+    if legal_action_mask is None:
+        for b in range(batch_size):
+            if valid_len[b] > 0:
+                pos = pos_in_game_segment_list[b]
+                child_visit = child_visits[b][pos:pos + valid_len[b]]
+                if not isinstance(child_visit, np.ndarray) or child_visit.dtype == object:
+                    child_visit = list(child_visit)
+                target_policies[b, :valid_len[b]] = child_visit
+        return target_policies.astype(np.float32)
+
+    # scatter the distributions over legal actions into the full action space.
+    distributions = [
+        np.asarray(d, dtype=np.float64).reshape(-1) for b in range(batch_size)
+        for d in child_visits[b][pos_in_game_segment_list[b]:pos_in_game_segment_list[b] + valid_len[b]]
+    ]
+    valid = np.arange(unroll_len)[None, :] < valid_len[:, None]
+    legal_action_mask = np.asarray(legal_action_mask).reshape(batch_size, unroll_len, -1)[valid] == 1
+    rows = target_policies[valid]
+    if len(distributions) > 0:
+        rows[legal_action_mask] = np.concatenate(distributions)
+    target_policies[valid] = rows
+    return target_policies.astype(np.float32)
+
+
+def compute_target_policy_reanalyzed(
+        roots_distributions: List[Optional[List[int]]],
+        roots_values: List[float],
+        policy_mask: List[int],
+        child_visits: List[np.ndarray],
+        root_values: List[np.ndarray],
+        pos_in_game_segment_list: List[int],
+        num_unroll_steps: int,
+        policy_shape: int,
+        legal_action_mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Overview:
+        Normalize the root visit counts of the reanalyze search into policy targets, and write the new
+        distributions and searched root values back into the ``child_visit_segment`` and ``root_value_segment`` of
+        the game segments, to keep the most up-to-date targets in the buffer.
+    Arguments:
+        - roots_distributions (:obj:`List[Optional[List[int]]]`): The root visit counts of the search, one per target. \
+            None means the root has no legal action, whose target is then the uniform distribution.
+        - roots_values (:obj:`List[float]`): The searched root values, one per target.
+        - policy_mask (:obj:`List[int]`): 1 if the target is inside the game segment, else 0.
+        - child_visits (:obj:`List[np.ndarray]`): The child visit segment of each sampled game segment.
+        - root_values (:obj:`List[np.ndarray]`): The root value segment of each sampled game segment.
+        - pos_in_game_segment_list (:obj:`List[int]`): The sampled position in each game segment.
+        - num_unroll_steps (:obj:`int`): The number of unroll steps.
+        - policy_shape (:obj:`int`): The size of the policy targets.
+        - legal_action_mask (:obj:`Optional[np.ndarray]`): For varied action spaces, the legal action mask of shape \
+            ``(B * (num_unroll_steps + 1), policy_shape)``, into which the distributions over the legal actions \
+            are scattered.
+    Returns:
+        - batch_target_policies (:obj:`np.ndarray`): shape ``(B, num_unroll_steps + 1, policy_shape)``.
+    """
+    batch_size = len(pos_in_game_segment_list)
+    unroll_len = num_unroll_steps + 1
+    transition_batch_size = batch_size * unroll_len
+    policy_mask = np.asarray(policy_mask).reshape(-1) == 1
+    searched = policy_mask & np.array([d is not None for d in roots_distributions], dtype=bool)
+    searched_idx = np.nonzero(searched)[0]
+
+    target_policies = np.zeros((transition_batch_size, policy_shape), dtype=np.float64)
+    # if at some obs, the legal_action is None, use the fake uniform target_policy
+    target_policies[policy_mask & ~searched] = 1. / policy_shape
+
+    lengths = np.array([len(roots_distributions[k]) for k in searched_idx], dtype=np.int64)
+    if len(searched_idx) > 0:
+        if np.all(lengths == lengths[0]):
+            visit_counts = np.array([roots_distributions[k] for k in searched_idx])
+            policies = (visit_counts / visit_counts.sum(axis=1, keepdims=True)).reshape(-1)
+        else:
+            visit_counts = np.concatenate([np.asarray(roots_distributions[k]).reshape(-1) for k in searched_idx])
+            starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            policies = visit_counts / np.repeat(np.add.reduceat(visit_counts, starts), lengths)
+        if legal_action_mask is None:
+            target_policies[searched_idx] = policies.reshape(len(searched_idx), -1)
+        else:
+            rows = target_policies[searched_idx]
+            rows[np.asarray(legal_action_mask).reshape(transition_batch_size, -1)[searched_idx] == 1] = policies
+            target_policies[searched_idx] = rows
+
+        # Update the data in game segment:
+        # after the reanalyze search, new target policies and root values are obtained, and we replace the data
+        # in ``child_visit_segment`` and ``root_value_segment`` with the latest search results.
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        roots_values = np.asarray(roots_values)
+        for b in range(batch_size):
+            begin, end = np.searchsorted(searched_idx, [b * unroll_len, (b + 1) * unroll_len])
+            if begin == end:
+                continue
+            ks = searched_idx[begin:end]
+            steps = pos_in_game_segment_list[b] + ks - b * unroll_len
+            child_visit, root_value = child_visits[b], root_values[b]
+            if isinstance(child_visit, np.ndarray) and child_visit.dtype != object and \
+                    np.all(lengths[begin:end] == child_visit.shape[-1]):
+                child_visit[steps] = policies[offsets[begin]:offsets[end]].reshape(end - begin, -1)
+            else:
+                for j, step in enumerate(steps):
+                    child_visit[step] = policies[offsets[begin + j]:offsets[begin + j + 1]].tolist()
+            if isinstance(root_value, np.ndarray):
+                root_value[steps] = roots_values[ks]
+            else:
+                for step, k in zip(steps, ks):
+                    root_value[step] = roots_values[k]
+
+    return target_policies.reshape(batch_size, unroll_len, policy_shape).astype(np.float32)
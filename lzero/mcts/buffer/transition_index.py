@@ -0,0 +1,158 @@
+from typing import Tuple
+
+import numpy as np
+
+from .segment_tree import SumSegmentTree, MaxSegmentTree
+
+
+class TransitionIndex(object):
+    """
+    Overview:
+        The array-backed index of all the transitions stored in a ``GameBuffer``. It replaces the python list of
+        ``(game_segment_idx, pos_in_game_segment)`` tuples and the flat ``game_pos_priorities`` array with:
+            - a preallocated ring of int32 ``segment_ids`` and ``positions``, so that pushing and evicting a game
+              segment only writes/clears its own slots instead of concatenating or slicing the whole buffer;
+            - a ``SumSegmentTree`` over ``priority ** alpha`` for ``O(log N)`` proportional sampling;
+            - a ``MaxSegmentTree`` over the raw priorities to give new transitions the current max priority.
+        Transitions are addressed by their logical index, i.e. the offset from the oldest transition in the buffer,
+        which is exactly the ``batch_index_list`` convention of the list-based implementation.
+    Interfaces:
+        ``__init__``, ``push``, ``pop_front``, ``sample``, ``update_priority``, ``lookup``, ``get_priority``,
+        ``max_priority``, ``__len__``
+    """
+
+    def __init__(self, capacity: int, alpha: float, eps: float = 1e-6) -> None:
+        """
+        Overview:
+            Initialize the transition index.
+        Arguments:
+            - capacity (:obj:`int`): The initial number of transition slots, rounded up to a power of two. \
+                The ring grows automatically if more transitions are pushed before the oldest ones are removed.
+            - alpha (:obj:`float`): The priority exponent used for sampling.
+            - eps (:obj:`float`): Added to ``priority ** alpha`` for numerical stability, as in the list-based buffer.
+        """
+        self._alpha = alpha
+        self._eps = eps
+        self._allocate(capacity)
+        self._head = 0
+        self._size = 0
+
+    def _allocate(self, capacity: int) -> None:
+        self._sum_tree = SumSegmentTree(capacity)
+        self._max_tree = MaxSegmentTree(capacity)
+        self._capacity = self._sum_tree.capacity
+        self._segment_ids = np.zeros(self._capacity, dtype=np.int32)
+        self._positions = np.zeros(self._capacity, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slots(self, logical_idx: np.ndarray) -> np.ndarray:
+        return (self._head + np.asarray(logical_idx, dtype=np.int64)) % self._capacity
+
+    def _grow(self, min_capacity: int) -> None:
+        """
+        Overview:
+            Reallocate the ring with at least ``min_capacity`` slots, keeping the transitions in logical order.
+        """
+        slots = self._slots(np.arange(self._size))
+        segment_ids, positions = self._segment_ids[slots], self._positions[slots]
+        sum_leaves, max_leaves = self._sum_tree[slots], self._max_tree[slots]
+
+        self._allocate(max(min_capacity, 2 * self._capacity))
+        self._head = 0
+        self._segment_ids[:self._size] = segment_ids
+        self._positions[:self._size] = positions
+        self._sum_tree._value[self._capacity:self._capacity + self._size] = sum_leaves
+        self._sum_tree.rebuild()
+        self._max_tree._value[self._capacity:self._capacity + self._size] = max_leaves
+        self._max_tree.rebuild()
+
+    def push(self, segment_id: int, priorities: np.ndarray) -> None:
+        """
+        Overview:
+            Append all the transitions of one game segment.
+        Arguments:
+            - segment_id (:obj:`int`): The absolute id of the game segment, i.e. ``base_idx`` + its list index.
+            - priorities (:obj:`np.ndarray`): The raw priority of every transition in the game segment.
+        """
+        priorities = np.asarray(priorities, dtype=np.float64).reshape(-1)
+        length = len(priorities)
+        if self._size + length > self._capacity:
+            self._grow(self._size + length)
+        slots = self._slots(np.arange(self._size, self._size + length))
+        self._segment_ids[slots] = segment_id
+        self._positions[slots] = np.arange(length, dtype=np.int32)
+        self._set_leaves(slots, priorities)
+        self._size += length
+
+    def pop_front(self, num: int) -> None:
+        """
+        Overview:
+            Evict the ``num`` oldest transitions.
+        """
+        assert num <= self._size
+        slots = self._slots(np.arange(num))
+        self._sum_tree.update(slots, 0.)
+        self._max_tree.update(slots, 0.)
+        self._head = (self._head + num) % self._capacity
+        self._size -= num
+
+    def _set_leaves(self, slots: np.ndarray, priorities: np.ndarray) -> None:
+        self._sum_tree.update(slots, priorities ** self._alpha + self._eps)
+        self._max_tree.update(slots, priorities)
+
+    def update_priority(self, logical_idx: np.ndarray, priorities: np.ndarray) -> None:
+        """
+        Overview:
+            Set the raw priorities of the transitions at ``logical_idx``. Indices out of the buffer are ignored.
+        """
+        logical_idx = np.asarray(logical_idx, dtype=np.int64).reshape(-1)
+        priorities = np.asarray(priorities, dtype=np.float64).reshape(-1)
+        valid = (logical_idx >= 0) & (logical_idx < self._size)
+        self._set_leaves(self._slots(logical_idx[valid]), priorities[valid])
+
+    def get_priority(self, logical_idx: np.ndarray) -> np.ndarray:
+        return self._max_tree[self._slots(logical_idx)]
+
+    def max_priority(self) -> float:
+        return self._max_tree.reduce()
+
+    def lookup(self, logical_idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Resolve logical transition indices to ``(segment_ids, positions)`` arrays.
+        """
+        slots = self._slots(logical_idx)
+        return self._segment_ids[slots], self._positions[slots]
+
+    def sample(self, batch_size: int, beta: float, use_priority: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Sample ``batch_size`` logical transition indices and their importance sampling weights.
+            With priority, the total mass is split into ``batch_size`` equal strata and one transition is drawn in
+            each stratum via a prefix-sum query on the sum tree. This is sampling with replacement, but stratification
+            keeps duplicates rare, without the ``O(N)`` cost of ``np.random.choice(..., replace=False)``.
+        Arguments:
+            - batch_size (:obj:`int`): The number of transitions to sample.
+            - beta (:obj:`float`): The importance sampling exponent.
+            - use_priority (:obj:`bool`): If False, sample uniformly and return unit weights.
+        Returns:
+            - logical_idx (:obj:`np.ndarray`): The sampled logical transition indices.
+            - weights (:obj:`np.ndarray`): The normalized importance sampling weights.
+        """
+        assert self._size > 0, "can not sample from an empty buffer"
+        if not use_priority:
+            logical_idx = np.random.randint(0, self._size, size=batch_size)
+            return logical_idx, np.ones(batch_size, dtype=np.float64)
+
+        total = self._sum_tree.reduce()
+        segment = total / batch_size
+        prefixsum = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * segment
+        slots = self._sum_tree.find_prefixsum_idx(np.minimum(prefixsum, np.nextafter(total, 0)))
+        logical_idx = (slots - self._head) % self._capacity
+
+        probs = self._sum_tree[slots] / total
+        weights = (self._size * probs) ** (-beta)
+        weights /= weights.max()
+        return logical_idx, weights
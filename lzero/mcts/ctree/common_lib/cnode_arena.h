@@ -0,0 +1,159 @@
+// C++11
+
+#ifndef CNODE_ARENA_H
+#define CNODE_ARENA_H
+
+#include <mutex>
+#include <vector>
+
+namespace tools {
+
+    namespace {
+        // The pool of free chunks of the arenas of a node type. It has internal linkage on purpose: the extension
+        // modules of the different trees all name their node type ``tree::CNode``, and a pool with external linkage
+        // would be a single object shared by all the loaded modules.
+        template <class Node>
+        struct CNodeArenaPool {
+            std::mutex mutex;
+            std::vector<std::vector<Node> > free_chunks;
+        };
+
+        template <class Node>
+        CNodeArenaPool<Node> &cnode_arena_pool()
+        {
+            static CNodeArenaPool<Node> pool;
+            return pool;
+        }
+    }
+
+    template <class Node>
+    class CNodeArena {
+        /*
+        Overview:
+            The storage of the nodes of the trees of a batch of roots. The nodes live in large chunks, and the \
+            children of a node are allocated as one contiguous block of a chunk, so that a tree is built without a \
+            heap allocation per node and the children of a node are scanned sequentially. \
+            The chunks of a released arena go back to a pool shared by the arenas of the same node type, and are \
+            taken again by the next arenas, so that the trees of consecutive searches reuse the same memory.
+        */
+        public:
+            enum {
+                // The number of nodes of a chunk, unless a larger block is requested.
+                CHUNK_SIZE = 1 << 16,
+                // The maximum number of free chunks kept in the pool.
+                MAX_POOL_SIZE = 64
+            };
+
+            CNodeArena() : chunk_index(0), chunk_used(0) {}
+
+            ~CNodeArena()
+            {
+                this->release();
+            }
+
+            CNodeArena(const CNodeArena &) = delete;
+            CNodeArena &operator=(const CNodeArena &) = delete;
+
+            Node *allocate(size_t num)
+            {
+                /*
+                Overview:
+                    Allocate a contiguous block of nodes. The nodes may hold the values of a previous tree and have \
+                    to be initialized by the caller.
+                Arguments:
+                    - num: the number of nodes of the block.
+                */
+                while (this->chunk_index < this->chunks.size() && this->chunk_used + num > this->chunks[this->chunk_index].size())
+                {
+                    this->chunk_index += 1;
+                    this->chunk_used = 0;
+                }
+                if (this->chunk_index == this->chunks.size())
+                {
+                    this->chunks.push_back(acquire_chunk(num));
+                }
+                Node *block = this->chunks[this->chunk_index].data() + this->chunk_used;
+                this->chunk_used += num;
+                return block;
+            }
+
+            void reserve(size_t num)
+            {
+                /*
+                Overview:
+                    Make room for at least ``num`` more nodes, so that the allocations of a search do not wait for new \
+                    chunks.
+                Arguments:
+                    - num: the number of nodes to make room for.
+                */
+                size_t available = 0;
+                for (size_t i = this->chunk_index; i < this->chunks.size(); ++i)
+                {
+                    available += this->chunks[i].size() - (i == this->chunk_index ? this->chunk_used : 0);
+                }
+                while (available < num)
+                {
+                    this->chunks.push_back(acquire_chunk(num - available));
+                    available += this->chunks.back().size();
+                }
+            }
+
+            void reset()
+            {
+                /*
+                Overview:
+                    Drop all the allocated nodes and keep the chunks for the next allocations.
+                */
+                this->chunk_index = 0;
+                this->chunk_used = 0;
+            }
+
+            void release()
+            {
+                /*
+                Overview:
+                    Drop all the allocated nodes and give the chunks back to the pool.
+                */
+                CNodeArenaPool<Node> &pool = cnode_arena_pool<Node>();
+                std::lock_guard<std::mutex> lock(pool.mutex);
+                for (auto &chunk : this->chunks)
+                {
+                    if (pool.free_chunks.size() < MAX_POOL_SIZE)
+                    {
+                        pool.free_chunks.push_back(std::move(chunk));
+                    }
+                }
+                this->chunks.clear();
+                this->reset();
+            }
+
+        private:
+            std::vector<std::vector<Node> > chunks;
+            size_t chunk_index, chunk_used;
+
+            static std::vector<Node> acquire_chunk(size_t num)
+            {
+                /*
+                Overview:
+                    Take a free chunk of at least ``num`` nodes from the pool, or allocate a new one.
+                */
+                {
+                    CNodeArenaPool<Node> &pool = cnode_arena_pool<Node>();
+                    std::lock_guard<std::mutex> lock(pool.mutex);
+                    std::vector<std::vector<Node> > &free_chunks = pool.free_chunks;
+                    for (size_t i = free_chunks.size(); i > 0; --i)
+                    {
+                        if (free_chunks[i - 1].size() >= num)
+                        {
+                            std::vector<Node> chunk = std::move(free_chunks[i - 1]);
+                            free_chunks.erase(free_chunks.begin() + (i - 1));
+                            return chunk;
+                        }
+                    }
+                }
+                return std::vector<Node>(num > CHUNK_SIZE ? num : static_cast<size_t>(CHUNK_SIZE));
+            }
+    };
+}
+
+#endif
@@ -0,0 +1,275 @@
+// This header defines the native game states used by the AlphaZero MCTS in place of the Python ``simulate_env``
+// of the board games in ``zoo/board_games``. A game state is a plain copyable object, so the MCTS can restore the
+// root state of a search and step it along the selected path without calling into Python.
+// The states follow the rules of the Python envs in the ``self_play_mode``: ``step`` places a stone of the current
+// player and switches the player, and ``get_done_winner`` and ``current_state`` return the same values as the
+// methods of the same names of the envs.
+
+#ifndef GAME_STATE_H
+#define GAME_STATE_H
+
+#include <cstdint>
+#include <memory>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "transposition_table.h"
+
+// The interface of a native game state.
+class GameState {
+public:
+    virtual ~GameState() {}
+
+    // This function returns a copy of the state.
+    virtual std::unique_ptr<GameState> clone() const = 0;
+    // This function resets the state to the given board, of ``num_cells()`` cells in row-major order (or to the empty
+    // board if ``board`` is nullptr), with ``players[start_player_index]`` to play, where ``players = [1, 2]``.
+    virtual void reset(const int32_t* board, int start_player_index) = 0;
+    // This function places a stone of the current player and switches the player. The action has to be legal.
+    virtual void step(int action) = 0;
+    virtual bool is_legal(int action) const = 0;
+    virtual std::pair<bool, int> get_done_winner() const = 0;
+
+    virtual int action_space_size() const = 0;
+    virtual int rows() const = 0;
+    virtual int cols() const = 0;
+    virtual int current_player() const = 0;
+    virtual const std::vector<int32_t>& board() const = 0;
+    // This function returns the Zobrist hash of the state, see ``zobrist_hash``, which is updated incrementally.
+    virtual uint64_t hash() const = 0;
+
+    int num_cells() const {
+        return rows() * cols();
+    }
+
+    int next_player() const {
+        return current_player() == 1 ? 2 : 1;
+    }
+
+    // This function returns the legal actions in increasing order, as ``env.legal_actions``.
+    std::vector<int> legal_actions() const {
+        std::vector<int> actions;
+        for (int action = 0; action < action_space_size(); ++action) {
+            if (is_legal(action)) {
+                actions.push_back(action);
+            }
+        }
+        return actions;
+    }
+
+    // This function returns the mask of the legal actions, as the ``action_mask`` of the observations of the envs.
+    std::vector<int8_t> legal_action_mask() const {
+        std::vector<int8_t> mask(action_space_size(), 0);
+        for (int action = 0; action < action_space_size(); ++action) {
+            mask[action] = is_legal(action) ? 1 : 0;
+        }
+        return mask;
+    }
+
+    // This function returns the number of values written by ``current_state``.
+    int state_size() const {
+        return 3 * num_cells();
+    }
+
+    // This function writes ``env.current_state()[1]`` into ``out``, i.e. the stones of the current player, the stones
+    // of the next player and the current player, divided by 2 if ``scale``, of shape (3, rows, cols) or
+    // (rows, cols, 3) if ``channel_last``.
+    void current_state(float* out, bool scale, bool channel_last) const {
+        const std::vector<int32_t>& cells = board();
+        float unit = scale ? 0.5f : 1.0f;
+        int n = num_cells();
+        int player = current_player();
+        int opponent = next_player();
+        for (int i = 0; i < n; ++i) {
+            float planes[3] = {cells[i] == player ? unit : 0.0f, cells[i] == opponent ? unit : 0.0f, player * unit};
+            for (int c = 0; c < 3; ++c) {
+                out[channel_last ? i * 3 + c : c * n + i] = planes[c];
+            }
+        }
+    }
+};
+
+// The state of the games of stones placed on a ``rows`` x ``cols`` board, where a player wins with ``n_in_row``
+// stones in a horizontal, vertical or diagonal line.
+class BoardGameState : public GameState {
+public:
+    BoardGameState(int rows, int cols, int n_in_row)
+        : rows_(rows), cols_(cols), n_in_row_(n_in_row), current_player_(1), cells_(rows * cols, 0),
+          hash_(zobrist_key(-1, 1)) {}
+
+    void reset(const int32_t* board, int start_player_index) override {
+        for (int i = 0; i < num_cells(); ++i) {
+            cells_[i] = board == nullptr ? 0 : board[i];
+        }
+        current_player_ = start_player_index == 0 ? 1 : 2;
+        hash_ = zobrist_hash(cells_.data(), num_cells(), current_player_);
+    }
+
+    int rows() const override {
+        return rows_;
+    }
+
+    int cols() const override {
+        return cols_;
+    }
+
+    int current_player() const override {
+        return current_player_;
+    }
+
+    const std::vector<int32_t>& board() const override {
+        return cells_;
+    }
+
+    uint64_t hash() const override {
+        return hash_;
+    }
+
+protected:
+    // This function places a stone of the current player on a cell and switches the player.
+    void _place_stone(int cell) {
+        int next = next_player();
+        cells_[cell] = current_player_;
+        hash_ ^= zobrist_key(cell, current_player_) ^ zobrist_key(-1, current_player_) ^ zobrist_key(-1, next);
+        current_player_ = next;
+    }
+
+    // This function returns whether ``n_in_row`` stones of the player at (row, col) start at (row, col) in the
+    // direction (d_row, d_col).
+    bool _is_line(int row, int col, int d_row, int d_col) const {
+        int player = cells_[row * cols_ + col];
+        int end_row = row + (n_in_row_ - 1) * d_row;
+        int end_col = col + (n_in_row_ - 1) * d_col;
+        if (end_row < 0 || end_row >= rows_ || end_col < 0 || end_col >= cols_) {
+            return false;
+        }
+        for (int k = 1; k < n_in_row_; ++k) {
+            if (cells_[(row + k * d_row) * cols_ + col + k * d_col] != player) {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    // This function returns whether a line of ``n_in_row`` stones starts at (row, col), in one of the directions
+    // diagonal left, vertical, diagonal right and horizontal.
+    bool _starts_line(int row, int col) const {
+        return _is_line(row, col, 1, -1) || _is_line(row, col, 1, 0) || _is_line(row, col, 1, 1) ||
+               _is_line(row, col, 0, 1);
+    }
+
+    bool _has_empty_cell() const {
+        for (int32_t cell : cells_) {
+            if (cell == 0) {
+                return true;
+            }
+        }
+        return false;
+    }
+
+    int rows_;
+    int cols_;
+    int n_in_row_;
+    int current_player_;
+    std::vector<int32_t> cells_;
+    uint64_t hash_;
+};
+
+// The games where a stone is placed on any empty cell, i.e. TicTacToe and Gomoku.
+// As ``get_done_winner_cython`` of these envs, the winner is the player of the first line found in row-major order.
+class PlaceStoneGameState : public BoardGameState {
+public:
+    PlaceStoneGameState(int board_size, int n_in_row) : BoardGameState(board_size, board_size, n_in_row) {}
+
+    std::unique_ptr<GameState> clone() const override {
+        return std::unique_ptr<GameState>(new PlaceStoneGameState(*this));
+    }
+
+    int action_space_size() const override {
+        return num_cells();
+    }
+
+    bool is_legal(int action) const override {
+        return action >= 0 && action < num_cells() && cells_[action] == 0;
+    }
+
+    void step(int action) override {
+        _place_stone(action);
+    }
+
+    std::pair<bool, int> get_done_winner() const override {
+        bool has_empty_cell = false;
+        for (int row = 0; row < rows_; ++row) {
+            for (int col = 0; col < cols_; ++col) {
+                int player = cells_[row * cols_ + col];
+                if (player == 0) {
+                    has_empty_cell = true;
+                } else if (_starts_line(row, col)) {
+                    return std::make_pair(true, player);
+                }
+            }
+        }
+        return std::make_pair(!has_empty_cell, -1);
+    }
+};
+
+// The game where a stone drops to the lowest empty cell of the chosen column, i.e. Connect4.
+// As ``Connect4Env.get_done_winner``, the lines of player 1 are checked before the lines of player 2.
+class DropStoneGameState : public BoardGameState {
+public:
+    DropStoneGameState(int rows, int cols, int n_in_row) : BoardGameState(rows, cols, n_in_row) {}
+
+    std::unique_ptr<GameState> clone() const override {
+        return std::unique_ptr<GameState>(new DropStoneGameState(*this));
+    }
+
+    int action_space_size() const override {
+        return cols_;
+    }
+
+    bool is_legal(int action) const override {
+        return action >= 0 && action < cols_ && cells_[action] == 0;
+    }
+
+    void step(int action) override {
+        for (int row = rows_ - 1; row >= 0; --row) {
+            if (cells_[row * cols_ + action] == 0) {
+                _place_stone(row * cols_ + action);
+                return;
+            }
+        }
+        current_player_ = next_player();
+        hash_ = zobrist_hash(cells_.data(), num_cells(), current_player_);
+    }
+
+    std::pair<bool, int> get_done_winner() const override {
+        for (int player = 1; player <= 2; ++player) {
+            for (int row = 0; row < rows_; ++row) {
+                for (int col = 0; col < cols_; ++col) {
+                    if (cells_[row * cols_ + col] == player && _starts_line(row, col)) {
+                        return std::make_pair(true, player);
+                    }
+                }
+            }
+        }
+        return std::make_pair(!_has_empty_cell(), -1);
+    }
+};
+
+// This function creates the native state of the board game of the given env class name, or returns nullptr if the
+// game has no native state.
+inline std::unique_ptr<GameState> make_game_state(const std::string& env_name, int board_size) {
+    if (env_name == "TicTacToeEnv") {
+        return std::unique_ptr<GameState>(new PlaceStoneGameState(3, 3));
+    }
+    if (env_name == "GomokuEnv") {
+        return std::unique_ptr<GameState>(new PlaceStoneGameState(board_size, 5));
+    }
+    if (env_name == "Connect4Env") {
+        return std::unique_ptr<GameState>(new DropStoneGameState(6, 7, 4));
+    }
+    return nullptr;
+}
+
+#endif  // GAME_STATE_H
@@ -5,20 +5,62 @@
 
 // The following lines include the necessary headers to facilitate the implementation of the MCTS algorithm.
 #include "node_alphazero.h"
+#include "game_state.h"
+#include "transposition_table.h"
+#include <algorithm>
 #include <cmath>
 #include <map>
 #include <random>
 #include <vector>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 #include <functional>
 #include <iostream>
 #include <memory>
 #include <numeric>
+#include <set>
+#include <unordered_map>
 
 // This line creates an alias for the pybind11 namespace, making it easier to reference in the code.
 namespace py = pybind11;
 
+// This function returns whether the simulation of a simulate_env is deterministic, i.e. the self-play without random
+// or expert agent moves, where the position reached by each node of the search is fixed.
+bool is_deterministic_simulation(py::object simulate_env) {
+    if (simulate_env.is_none()) {
+        return false;
+    }
+    std::string battle_mode = py::getattr(simulate_env, "battle_mode_in_simulation_env", py::str("")).cast<std::string>();
+    return battle_mode == "self_play_mode" &&
+           py::getattr(simulate_env, "prob_random_agent", py::float_(0.)).cast<double>() <= 0 &&
+           py::getattr(simulate_env, "prob_expert_agent", py::float_(0.)).cast<double>() <= 0;
+}
+
+// This function creates the native game state of a simulate_env, or returns nullptr if the env has no native state or
+// its simulation is not deterministic.
+std::unique_ptr<GameState> make_native_game_state(py::object simulate_env) {
+    if (!is_deterministic_simulation(simulate_env)) {
+        return nullptr;
+    }
+    std::string env_name = simulate_env.attr("__class__").attr("__name__").cast<std::string>();
+    int board_size = py::getattr(simulate_env, "board_size", py::int_(0)).cast<int>();
+    return make_game_state(env_name, board_size);
+}
+
+// This function resets a native game state from the ``start_player_index`` and ``init_state`` of a state config.
+void reset_native_game_state(GameState& game_state, py::object init_state, int start_player_index) {
+    if (init_state.is_none()) {
+        game_state.reset(nullptr, start_player_index);
+        return;
+    }
+    auto board = init_state.cast<py::array_t<int32_t, py::array::c_style | py::array::forcecast>>();
+    if (board.size() != game_state.num_cells()) {
+        throw std::invalid_argument("The init_state does not match the board of the native game state.");
+    }
+    game_state.reset(board.data(), start_player_index);
+}
+
 // This part defines the MCTS class and its member variables.
 // The MCTS class implements the MCTS algorithm, and its member variables store configuration values used in the algorithm.
 class MCTS {
@@ -29,18 +71,130 @@ class MCTS {
     double root_dirichlet_alpha;
     double root_noise_weight;
     py::object simulate_env;
+    // The maximum number of leaves of one tree evaluated in the same batch by ``get_next_actions``,
+    // and the virtual loss that keeps the pending leaves of a tree apart.
+    int max_pending_leaves_per_tree;
+    double virtual_loss;
+    // The native game state of the simulate_env, which replaces the Python calls of the simulate_env in the search
+    // when available, see ``game_state.h``. It is nullptr when ``use_native_game_state`` is false or the simulate_env
+    // has no native state.
+    std::unique_ptr<GameState> native_game_state;
+    bool scale_state;
+    bool channel_last_state;
+    // The transposition table of the positions evaluated by the searches, kept across the moves, see
+    // ``transposition_table.h``. It is disabled when its size is 0 or the simulation is not deterministic.
+    TranspositionTable transposition_table;
+    // The number of the moves searched since the last ``reset_transposition_table_stats``.
+    long long num_moves;
+
+    // The arguments of ``simulate_env.reset`` that restore the root state of a search.
+    struct RootState {
+        int start_player_index;
+        py::object init_state;
+        bool katago_policy_init;
+        py::object katago_game_state;
+    };
+
+    // A leaf selected by ``get_next_actions`` and waiting for the batched evaluation.
+    // The state of the leaf is evaluated in the row ``batch_row`` of the batch, which is shared by the leaves of the same
+    // position (of Zobrist hash ``key``) when the transposition table is enabled.
+    struct PendingLeaf {
+        int tree_index;
+        std::vector<Node*> search_path;
+        std::vector<int> legal_actions;
+        uint64_t key;
+        int batch_row;
+    };
 
 // This part defines the constructor of the MCTS class.
 // The constructor initializes the member variables with the provided arguments or with their default values.
 public:
     MCTS(int max_moves=512, int num_simulations=800,
          double pb_c_base=19652, double pb_c_init=1.25,
-         double root_dirichlet_alpha=0.3, double root_noise_weight=0.25, py::object simulate_env=py::none())
+         double root_dirichlet_alpha=0.3, double root_noise_weight=0.25, py::object simulate_env=py::none(),
+         int max_pending_leaves_per_tree=1, double virtual_loss=1.0, bool use_native_game_state=true,
+         int transposition_table_size=0)
         : max_moves(max_moves), num_simulations(num_simulations),
           pb_c_base(pb_c_base), pb_c_init(pb_c_init),
           root_dirichlet_alpha(root_dirichlet_alpha),
           root_noise_weight(root_noise_weight),
-          simulate_env(simulate_env) {}
+          simulate_env(simulate_env),
+          max_pending_leaves_per_tree(max_pending_leaves_per_tree),
+          virtual_loss(virtual_loss),
+          native_game_state(use_native_game_state ? make_native_game_state(simulate_env) : nullptr),
+          scale_state(py::getattr(simulate_env, "scale", py::bool_(false)).cast<bool>()),
+          channel_last_state(py::getattr(simulate_env, "channel_last", py::bool_(false)).cast<bool>()),
+          transposition_table(is_deterministic_simulation(simulate_env) ? std::max(transposition_table_size, 0) : 0),
+          num_moves(0) {}
+
+    // This function returns whether the search uses the native game state instead of the simulate_env.
+    bool uses_native_game_state() const {
+        return native_game_state != nullptr;
+    }
+
+    // This function removes all the positions of the transposition table, e.g. when the network is updated.
+    void clear_transposition_table() {
+        transposition_table.clear();
+    }
+
+    // This function returns the statistics of the transposition table since the last ``reset_transposition_table_stats``:
+    // the hit rate of the lookups of the positions to evaluate, and the number of network evaluations saved per move.
+    py::dict get_transposition_table_stats() const {
+        py::dict stats;
+        long long num_lookups = transposition_table.num_lookups();
+        long long num_hits = transposition_table.num_hits();
+        stats["size"] = transposition_table.size();
+        stats["capacity"] = transposition_table.capacity();
+        stats["num_lookups"] = num_lookups;
+        stats["num_hits"] = num_hits;
+        stats["hit_rate"] = num_lookups > 0 ? static_cast<double>(num_hits) / num_lookups : 0.;
+        stats["num_moves"] = num_moves;
+        stats["network_calls_saved_per_move"] = num_moves > 0 ? static_cast<double>(num_hits) / num_moves : 0.;
+        return stats;
+    }
+
+    void reset_transposition_table_stats() {
+        transposition_table.reset_stats();
+        num_moves = 0;
+    }
+
+    // This function returns the Zobrist hash of the position of the simulate_env.
+    uint64_t _position_key(py::object simulate_env) {
+        auto board = simulate_env.attr("board").cast<py::array_t<int32_t, py::array::c_style | py::array::forcecast>>();
+        return zobrist_hash(board.data(), board.size(), simulate_env.attr("current_player").cast<int>());
+    }
+
+    // This function expands a leaf node with the priors of its position in the transposition table, and links the
+    // node to the entry of the position. It returns false if the position is not in the table.
+    bool _expand_from_transposition_table(Node* node, uint64_t key, double& leaf_value) {
+        std::shared_ptr<TranspositionEntry> entry = transposition_table.find(key);
+        if (!entry) {
+            return false;
+        }
+        for (const auto& action_prior : entry->priors) {
+            if (node->children.count(action_prior.first) == 0) {
+                node->children[action_prior.first] = new Node(node, action_prior.second);
+            }
+        }
+        node->transposition_entry = entry;
+        leaf_value = entry->value;
+        return true;
+    }
+
+    // This function links a node just expanded by the network to the entry of its position, which is created from the
+    // priors of the children of the node and the value of the position if the position is not in the table.
+    void _store_in_transposition_table(Node* node, uint64_t key, double leaf_value) {
+        std::shared_ptr<TranspositionEntry> entry = transposition_table.peek(key);
+        if (!entry) {
+            entry = std::make_shared<TranspositionEntry>();
+            for (const auto& kv : node->children) {
+                entry->priors.push_back(std::make_pair(kv.first, static_cast<double>(kv.second->prior_p)));
+            }
+            entry->value = leaf_value;
+            transposition_table.insert(key, entry);
+        }
+        node->transposition_entry = entry;
+    }
 
     // This function calculates the Upper Confidence Bound (UCB) score for a given node in the MCTS tree based on the parent node's visit count,
     // the child node's visit count, and the child node's prior probability.
@@ -113,8 +267,38 @@ public:
         return std::make_pair(action, child);
     }
 
-    // This function expands a leaf node by generating its children based on the legal actions and their prior probabilities.
+    // This function expands a leaf node, with the priors and value of its position in the transposition table if any, or
+    // with ``_evaluate_leaf_node`` otherwise.
     double _expand_leaf_node(Node* node, py::object simulate_env, py::object policy_value_func) {
+        if (!transposition_table.enabled()) {
+            return _evaluate_leaf_node(node, simulate_env, policy_value_func);
+        }
+        uint64_t key = _position_key(simulate_env);
+        double leaf_value;
+        if (!_expand_from_transposition_table(node, key, leaf_value)) {
+            leaf_value = _evaluate_leaf_node(node, simulate_env, policy_value_func);
+            _store_in_transposition_table(node, key, leaf_value);
+        }
+        return leaf_value;
+    }
+
+    // This function is ``_expand_leaf_node`` for the position of a native game state. The simulate_env is only reset to
+    // the position when it has to be evaluated.
+    double _expand_native_leaf_node(Node* node, const GameState& game_state, py::object policy_value_func) {
+        double leaf_value;
+        if (transposition_table.enabled() && _expand_from_transposition_table(node, game_state.hash(), leaf_value)) {
+            return leaf_value;
+        }
+        _reset_simulate_env(game_state);
+        leaf_value = _evaluate_leaf_node(node, simulate_env, policy_value_func);
+        if (transposition_table.enabled()) {
+            _store_in_transposition_table(node, game_state.hash(), leaf_value);
+        }
+        return leaf_value;
+    }
+
+    // This function expands a leaf node by generating its children based on the legal actions and their prior probabilities.
+    double _evaluate_leaf_node(Node* node, py::object simulate_env, py::object policy_value_func) {
 
         std::map<int, double> action_probs_dict;
         double leaf_value;
@@ -141,6 +325,10 @@ public:
 
     // This function returns the next action to take and the probabilities of each action based on the current state and the policy-value function.
     std::pair<int, std::vector<double>> get_next_action(py::object state_config_for_env_reset, py::object policy_value_func, double temperature, bool sample) {
+        if (native_game_state) {
+            return _get_next_action_native(state_config_for_env_reset, policy_value_func, temperature, sample);
+        }
+        num_moves += 1;
         Node* root = new Node();
 
         py::object init_state = state_config_for_env_reset["init_state"];
@@ -174,8 +362,59 @@ public:
             _simulate(root, simulate_env, policy_value_func);
         }
 
+        std::pair<int, std::vector<double>> result = _select_action(root, temperature, sample);
+        delete root;
+        return result;
+    }
+
+    // This function is ``get_next_action`` with the native game state. The simulations step copies of the root state
+    // without calling into Python, and the simulate_env is only reset to the states of the leaves to expand, for
+    // ``policy_value_func``.
+    std::pair<int, std::vector<double>> _get_next_action_native(py::object state_config_for_env_reset, py::object policy_value_func, double temperature, bool sample) {
+        num_moves += 1;
+        Node* root = new Node();
+        std::unique_ptr<GameState> root_state = native_game_state->clone();
+        reset_native_game_state(*root_state, state_config_for_env_reset["init_state"],
+                                state_config_for_env_reset["start_player_index"].cast<int>());
+
+        _expand_native_leaf_node(root, *root_state, policy_value_func);
+        if (sample) {
+            _add_exploration_noise(root);
+        }
+        for (int n = 0; n < num_simulations; ++n) {
+            std::unique_ptr<GameState> game_state = root_state->clone();
+            std::vector<Node*> search_path;
+            _select_leaf(root, *game_state, search_path);
+            Node* leaf = search_path.back();
+
+            std::pair<bool, int> done_winner = game_state->get_done_winner();
+            double leaf_value;
+            if (done_winner.first) {
+                leaf_value = _terminal_value(done_winner.second, game_state->current_player(), "self_play_mode");
+            } else {
+                leaf_value = _expand_native_leaf_node(leaf, *game_state, policy_value_func);
+            }
+            _backpropagate(leaf, leaf_value, "self_play_mode");
+        }
+
+        std::pair<int, std::vector<double>> result = _select_action(root, temperature, sample);
+        delete root;
+        return result;
+    }
+
+    // This function returns the size of the action space of the game.
+    int _action_space_size() {
+        if (native_game_state) {
+            return native_game_state->action_space_size();
+        }
+        return simulate_env.attr("action_space").attr("n").cast<int>();
+    }
+
+    // This function selects the action to take at the root from the visit counts of its children.
+    std::pair<int, std::vector<double>> _select_action(Node* root, double temperature, bool sample) {
         std::vector<std::pair<int, int>> action_visits;
-        for (int action = 0; action < simulate_env.attr("action_space").attr("n").cast<int>(); ++action) {
+        int action_space_size = _action_space_size();
+        for (int action = 0; action < action_space_size; ++action) {
             if (root->children.count(action)) {
                 action_visits.push_back(std::make_pair(action, root->children[action]->visit_count));
             } else {
@@ -253,6 +492,328 @@ public:
     }
    }
 
+    // This function resets the simulate_env to the root state of a search.
+    void _reset_simulate_env(const RootState& root_state) {
+        simulate_env.attr("reset")(
+            root_state.start_player_index,
+            root_state.init_state,
+            root_state.katago_policy_init,
+            root_state.katago_game_state
+        );
+    }
+
+    // This function resets the simulate_env to a native game state, so that ``policy_value_func`` can evaluate it.
+    // The board is passed flat, as the ``init_state`` bytes of ``get_next_action``.
+    void _reset_simulate_env(const GameState& game_state) {
+        py::array_t<int32_t> board(game_state.num_cells(), game_state.board().data());
+        simulate_env.attr("reset")(game_state.current_player() - 1, board);
+    }
+
+    // This function returns the value of a terminal state for the current player, in the same way as ``_simulate``.
+    double _terminal_value(int winner, int current_player, const std::string& battle_mode) {
+        if (winner == -1) {
+            return 0;
+        }
+        if (battle_mode == "self_play_mode") {
+            return (current_player == winner) ? 1 : -1;
+        }
+        return (winner == 1) ? 1 : -1;
+    }
+
+    // This function backpropagates the value of a leaf node, in the same way as ``_simulate``.
+    void _backpropagate(Node* leaf, double leaf_value, const std::string& battle_mode) {
+        if (battle_mode == "play_with_bot_mode") {
+            leaf->update_recursive(leaf_value, battle_mode);
+        }
+        else if (battle_mode == "self_play_mode") {
+            leaf->update_recursive(-leaf_value, battle_mode);
+        }
+    }
+
+    // This function adds (sign=1) or removes (sign=-1) the virtual loss along a search path, so that the next
+    // selections in the same tree prefer other paths while the leaf of this one is pending.
+    void _apply_virtual_loss(const std::vector<Node*>& search_path, int sign) {
+        for (size_t i = 0; i < search_path.size(); ++i) {
+            search_path[i]->visit_count += sign;
+            if (i > 0) {
+                search_path[i]->value_sum -= sign * virtual_loss;
+            }
+        }
+    }
+
+    // This function descends from the root to a leaf node by the UCB scores, stepping the simulate_env along the way.
+    // Unlike ``_select_child``, the legal actions are queried once per node rather than once per child.
+    void _select_leaf(Node* root, std::vector<Node*>& search_path) {
+        Node* node = root;
+        search_path.push_back(node);
+        while (!node->is_leaf()) {
+            std::vector<int> legal_actions = simulate_env.attr("legal_actions").cast<std::vector<int>>();
+            int action = -1;
+            Node* child = nullptr;
+            double best_score = -9999999;
+            for (const auto& kv : node->children) {
+                if (std::find(legal_actions.begin(), legal_actions.end(), kv.first) != legal_actions.end()) {
+                    double score = _ucb_score(node, kv.second);
+                    if (score > best_score) {
+                        best_score = score;
+                        action = kv.first;
+                        child = kv.second;
+                    }
+                }
+            }
+            if (action == -1) {
+                break;
+            }
+            simulate_env.attr("step")(action);
+            node = child;
+            search_path.push_back(node);
+        }
+    }
+
+    // This function is ``_select_leaf`` with a native game state, which is stepped along the way instead of the
+    // simulate_env.
+    void _select_leaf(Node* root, GameState& game_state, std::vector<Node*>& search_path) {
+        Node* node = root;
+        search_path.push_back(node);
+        while (!node->is_leaf()) {
+            int action = -1;
+            Node* child = nullptr;
+            double best_score = -9999999;
+            for (const auto& kv : node->children) {
+                if (game_state.is_legal(kv.first)) {
+                    double score = _ucb_score(node, kv.second);
+                    if (score > best_score) {
+                        best_score = score;
+                        action = kv.first;
+                        child = kv.second;
+                    }
+                }
+            }
+            if (action == -1) {
+                break;
+            }
+            game_state.step(action);
+            node = child;
+            search_path.push_back(node);
+        }
+    }
+
+    // This function appends the leaf at the end of a search path to the pending leaves, with its state and its legal
+    // actions, taken from the native game state if given, or from the simulate_env otherwise.
+    // When the transposition table is enabled, the leaves of the same position (of Zobrist hash ``key``) share the row
+    // of the first one in the batch, which is counted as a hit of the table. ``pending_rows`` maps the positions of
+    // the batch to their rows.
+    void _add_pending_leaf(int tree_index, const std::vector<Node*>& search_path, const GameState* game_state,
+                           uint64_t key, std::vector<PendingLeaf>& pending_leaves,
+                           std::unordered_map<uint64_t, int>& pending_rows, py::list& leaf_states,
+                           std::vector<float>& native_leaf_states) {
+        std::vector<int> legal_actions = game_state ? game_state->legal_actions()
+                                                    : simulate_env.attr("legal_actions").cast<std::vector<int>>();
+        if (transposition_table.enabled()) {
+            auto it = pending_rows.find(key);
+            if (it != pending_rows.end()) {
+                transposition_table.record_hit();
+                pending_leaves.push_back(PendingLeaf{tree_index, search_path, legal_actions, key, it->second});
+                return;
+            }
+        }
+        int batch_row;
+        if (game_state) {
+            size_t offset = native_leaf_states.size();
+            batch_row = offset / game_state->state_size();
+            native_leaf_states.resize(offset + game_state->state_size());
+            game_state->current_state(native_leaf_states.data() + offset, scale_state, channel_last_state);
+        } else {
+            batch_row = py::len(leaf_states);
+            leaf_states.append(simulate_env.attr("current_state")().cast<py::tuple>()[1]);
+        }
+        pending_rows[key] = batch_row;
+        pending_leaves.push_back(PendingLeaf{tree_index, search_path, legal_actions, key, batch_row});
+    }
+
+    // This function evaluates the states of the pending leaves in one call of ``policy_value_batch_func`` and
+    // expands the leaves with the priors of their legal actions. It returns the values of the leaves.
+    // The states are the list ``leaf_states`` of the simulate_env, or with the native game state, the array of the
+    // states written in ``native_leaf_states``.
+    std::vector<double> _expand_leaf_nodes(std::vector<PendingLeaf>& pending_leaves, py::list leaf_states,
+                                           const std::vector<float>& native_leaf_states,
+                                           py::object policy_value_batch_func) {
+        py::object batch_states = leaf_states;
+        if (native_game_state) {
+            ssize_t num_states = native_leaf_states.size() / native_game_state->state_size();
+            ssize_t rows = native_game_state->rows();
+            ssize_t cols = native_game_state->cols();
+            std::vector<ssize_t> shape = channel_last_state ? std::vector<ssize_t>{num_states, rows, cols, 3}
+                                                            : std::vector<ssize_t>{num_states, 3, rows, cols};
+            batch_states = py::array_t<float>(shape, native_leaf_states.data());
+        }
+        py::tuple result = policy_value_batch_func(batch_states);
+        auto action_probs = result[0].cast<py::array_t<double, py::array::c_style | py::array::forcecast>>();
+        auto values = result[1].cast<py::array_t<double, py::array::c_style | py::array::forcecast>>();
+        auto action_probs_view = action_probs.unchecked<2>();
+        auto values_view = values.unchecked<1>();
+
+        std::vector<double> leaf_values;
+        for (size_t i = 0; i < pending_leaves.size(); ++i) {
+            Node* leaf = pending_leaves[i].search_path.back();
+            int row = pending_leaves[i].batch_row;
+            for (int action : pending_leaves[i].legal_actions) {
+                if (leaf->children.count(action) == 0) {
+                    leaf->children[action] = new Node(leaf, action_probs_view(row, action));
+                }
+            }
+            leaf_values.push_back(values_view(row));
+            if (transposition_table.enabled()) {
+                _store_in_transposition_table(leaf, pending_leaves[i].key, values_view(row));
+            }
+        }
+        return leaf_values;
+    }
+
+    // This function runs the searches of a batch of envs together and returns the action to take and the action
+    // probabilities of each env. In each round, it selects up to ``max_pending_leaves_per_tree`` leaves in every tree,
+    // with virtual losses on their paths, and evaluates all of them with one call of ``policy_value_batch_func``,
+    // which maps the states of the leaves to their action probabilities, of shape (N, action_space_size), and their
+    // values, of shape (N, ). The states are a list of ``env.current_state()[1]``, or with the native game state, one
+    // array of these states.
+    std::vector<std::pair<int, std::vector<double>>> get_next_actions(py::list state_configs_for_env_reset,
+                                                                      py::object policy_value_batch_func,
+                                                                      double temperature, bool sample) {
+        int batch_size = py::len(state_configs_for_env_reset);
+        num_moves += batch_size;
+        std::vector<RootState> root_states;
+        std::vector<std::unique_ptr<GameState>> root_game_states;
+        std::vector<Node*> roots;
+        for (int i = 0; i < batch_size; ++i) {
+            py::object state_config = state_configs_for_env_reset[i];
+            if (native_game_state) {
+                root_game_states.push_back(native_game_state->clone());
+                reset_native_game_state(*root_game_states.back(), state_config["init_state"],
+                                        state_config["start_player_index"].cast<int>());
+            } else {
+                py::object init_state = state_config["init_state"];
+                if (!init_state.is_none()) {
+                    init_state = py::bytes(init_state.attr("tobytes")());
+                }
+                py::object katago_game_state = state_config["katago_game_state"];
+                if (!katago_game_state.is_none()) {
+                    katago_game_state = py::module::import("pickle").attr("dumps")(katago_game_state);
+                }
+                root_states.push_back(RootState{state_config["start_player_index"].cast<int>(), init_state,
+                                                state_config["katago_policy_init"].cast<bool>(), katago_game_state});
+            }
+            roots.push_back(new Node());
+        }
+
+        // expand all the roots in one batch
+        std::vector<PendingLeaf> pending_leaves;
+        std::unordered_map<uint64_t, int> pending_rows;
+        py::list leaf_states;
+        std::vector<float> native_leaf_states;
+        for (int i = 0; i < batch_size; ++i) {
+            if (!native_game_state) {
+                _reset_simulate_env(root_states[i]);
+            }
+            uint64_t key = 0;
+            if (transposition_table.enabled()) {
+                double root_value;
+                key = native_game_state ? root_game_states[i]->hash() : _position_key(simulate_env);
+                if (_expand_from_transposition_table(roots[i], key, root_value)) {
+                    continue;
+                }
+            }
+            _add_pending_leaf(i, std::vector<Node*>{roots[i]}, native_game_state ? root_game_states[i].get() : nullptr,
+                              key, pending_leaves, pending_rows, leaf_states, native_leaf_states);
+        }
+        if (!pending_leaves.empty()) {
+            _expand_leaf_nodes(pending_leaves, leaf_states, native_leaf_states, policy_value_batch_func);
+        }
+        if (sample) {
+            for (Node* root : roots) {
+                _add_exploration_noise(root);
+            }
+        }
+
+        std::string battle_mode = simulate_env.attr("battle_mode_in_simulation_env").cast<std::string>();
+        std::vector<int> num_simulated(batch_size, 0);
+        bool searching = true;
+        while (searching) {
+            searching = false;
+            pending_leaves.clear();
+            pending_rows.clear();
+            leaf_states = py::list();
+            native_leaf_states.clear();
+            std::set<Node*> pending_nodes;
+            for (int i = 0; i < batch_size; ++i) {
+                int num_pending = 0;
+                while (num_pending < max_pending_leaves_per_tree && num_simulated[i] < num_simulations) {
+                    std::vector<Node*> search_path;
+                    std::unique_ptr<GameState> game_state;
+                    std::pair<bool, int> done_winner;
+                    int current_player;
+                    if (native_game_state) {
+                        game_state = root_game_states[i]->clone();
+                        _select_leaf(roots[i], *game_state, search_path);
+                        done_winner = game_state->get_done_winner();
+                        current_player = game_state->current_player();
+                    } else {
+                        _reset_simulate_env(root_states[i]);
+                        simulate_env.attr("battle_mode") = simulate_env.attr("battle_mode_in_simulation_env");
+                        _select_leaf(roots[i], search_path);
+                        done_winner = simulate_env.attr("get_done_winner")().cast<std::pair<bool, int>>();
+                        current_player = simulate_env.attr("current_player").cast<int>();
+                    }
+                    Node* leaf = search_path.back();
+
+                    if (done_winner.first) {
+                        _backpropagate(leaf, _terminal_value(done_winner.second, current_player, battle_mode),
+                                       battle_mode);
+                        num_simulated[i] += 1;
+                        continue;
+                    }
+                    if (pending_nodes.count(leaf)) {
+                        // the leaf is already waiting for its evaluation, continue the tree in the next round
+                        break;
+                    }
+                    uint64_t key = 0;
+                    if (transposition_table.enabled()) {
+                        double leaf_value;
+                        key = game_state ? game_state->hash() : _position_key(simulate_env);
+                        if (_expand_from_transposition_table(leaf, key, leaf_value)) {
+                            _backpropagate(leaf, leaf_value, battle_mode);
+                            num_simulated[i] += 1;
+                            continue;
+                        }
+                    }
+                    pending_nodes.insert(leaf);
+                    _apply_virtual_loss(search_path, 1);
+                    _add_pending_leaf(i, search_path, game_state.get(), key, pending_leaves, pending_rows,
+                                      leaf_states, native_leaf_states);
+                    num_simulated[i] += 1;
+                    num_pending += 1;
+                }
+                searching = searching || num_simulated[i] < num_simulations;
+            }
+            if (pending_leaves.empty()) {
+                continue;
+            }
+
+            std::vector<double> leaf_values = _expand_leaf_nodes(pending_leaves, leaf_states, native_leaf_states,
+                                                                 policy_value_batch_func);
+            for (size_t j = 0; j < pending_leaves.size(); ++j) {
+                _apply_virtual_loss(pending_leaves[j].search_path, -1);
+                _backpropagate(pending_leaves[j].search_path.back(), leaf_values[j], battle_mode);
+            }
+        }
+
+        std::vector<std::pair<int, std::vector<double>>> results;
+        for (Node* root : roots) {
+            results.push_back(_select_action(root, temperature, sample));
+            delete root;
+        }
+        return results;
+    }
+
 
 
 
@@ -335,14 +896,57 @@ PYBIND11_MODULE(mcts_alphazero, m) {
         .def_readwrite("visit_count", &Node::visit_count);
 
     py::class_<MCTS>(m, "MCTS")
-        .def(py::init<int, int, double, double, double, double, py::object>(),
+        .def(py::init<int, int, double, double, double, double, py::object, int, double, bool, int>(),
              py::arg("max_moves")=512, py::arg("num_simulations")=800,
              py::arg("pb_c_base")=19652, py::arg("pb_c_init")=1.25,
-             py::arg("root_dirichlet_alpha")=0.3, py::arg("root_noise_weight")=0.25, py::arg("simulate_env"))
+             py::arg("root_dirichlet_alpha")=0.3, py::arg("root_noise_weight")=0.25, py::arg("simulate_env"),
+             py::arg("max_pending_leaves_per_tree")=1, py::arg("virtual_loss")=1.0,
+             py::arg("use_native_game_state")=true, py::arg("transposition_table_size")=0)
+        .def_property_readonly("uses_native_game_state", &MCTS::uses_native_game_state)
+        .def("clear_transposition_table", &MCTS::clear_transposition_table)
+        .def("get_transposition_table_stats", &MCTS::get_transposition_table_stats)
+        .def("reset_transposition_table_stats", &MCTS::reset_transposition_table_stats)
         .def("_ucb_score", &MCTS::_ucb_score)
         .def("_add_exploration_noise", &MCTS::_add_exploration_noise)
         .def("_select_child", &MCTS::_select_child)
         .def("_expand_leaf_node", &MCTS::_expand_leaf_node)
         .def("get_next_action", &MCTS::get_next_action)
+        .def("get_next_actions", &MCTS::get_next_actions)
         .def("_simulate", &MCTS::_simulate);
+
+    // The native game states are exposed to check them against the Python envs.
+    py::class_<GameState>(m, "GameState")
+        .def("clone", &GameState::clone)
+        .def("reset", [](GameState& game_state, int start_player_index, py::object init_state) {
+            reset_native_game_state(game_state, init_state, start_player_index);
+        }, py::arg("start_player_index")=0, py::arg("init_state")=py::none())
+        .def("step", &GameState::step)
+        .def("get_done_winner", &GameState::get_done_winner)
+        .def("current_state", [](const GameState& game_state, bool scale, bool channel_last) {
+            std::vector<ssize_t> shape = channel_last
+                ? std::vector<ssize_t>{game_state.rows(), game_state.cols(), 3}
+                : std::vector<ssize_t>{3, game_state.rows(), game_state.cols()};
+            py::array_t<float> state(shape);
+            game_state.current_state(state.mutable_data(), scale, channel_last);
+            return state;
+        }, py::arg("scale")=false, py::arg("channel_last")=false)
+        .def_property_readonly("legal_actions", &GameState::legal_actions)
+        .def_property_readonly("legal_action_mask", [](const GameState& game_state) {
+            std::vector<int8_t> mask = game_state.legal_action_mask();
+            return py::array_t<int8_t>(mask.size(), mask.data());
+        })
+        .def_property_readonly("board", [](const GameState& game_state) {
+            return py::array_t<int32_t>(std::vector<ssize_t>{game_state.rows(), game_state.cols()},
+                                        game_state.board().data());
+        })
+        .def_property_readonly("current_player", &GameState::current_player)
+        .def_property_readonly("action_space_size", &GameState::action_space_size)
+        .def_property_readonly("zobrist_hash", &GameState::hash);
+
+    m.def("zobrist_hash", [](py::array_t<int32_t, py::array::c_style | py::array::forcecast> board, int current_player) {
+        return zobrist_hash(board.data(), board.size(), current_player);
+    }, py::arg("board"), py::arg("current_player"), "Return the Zobrist hash of a board with current_player to play.");
+
+    m.def("make_game_state", &make_native_game_state, py::arg("simulate_env"),
+          "Create the native game state of a simulate_env, or return None if it has no native state.");
 }
\ No newline at end of file
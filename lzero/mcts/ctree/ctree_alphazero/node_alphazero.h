@@ -3,6 +3,7 @@
 #include <iostream>
 #include <memory>
 #include <mutex>
+#include "transposition_table.h"
 
 class Node {
 public:
@@ -17,15 +18,23 @@ public:
         }
     }
 
-    // Returns the average value of the node
+    // Returns the average value of the node, or the average value of its position over all the nodes of the position
+    // in the transposition table, when they have more visits
     float get_value() {
+        if (transposition_entry && transposition_entry->visit_count > visit_count) {
+            return transposition_entry->value_sum / transposition_entry->visit_count;
+        }
         return visit_count == 0 ? 0.0 : value_sum / visit_count;
     }
 
-    // Updates the visit count and value sum of the node
+    // Updates the visit count and value sum of the node, and of its position in the transposition table
     void update(float value) {
         visit_count++;
         value_sum += value;
+        if (transposition_entry) {
+            transposition_entry->visit_count++;
+            transposition_entry->value_sum += value;
+        }
     }
 
     // Recursively updates the value and visit count of the node and its parent nodes
@@ -82,4 +91,5 @@ public:
     int visit_count;  // Count of visits to the node
     float value_sum;  // Sum of values of the node
     std::map<int, Node*> children;  // Map of child nodes
+    std::shared_ptr<TranspositionEntry> transposition_entry;  // Entry of the node's position in the transposition table
 };
\ No newline at end of file
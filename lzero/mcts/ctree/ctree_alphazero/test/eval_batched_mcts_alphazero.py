@@ -0,0 +1,111 @@
+"""
+Overview:
+    Benchmark of the batched search ``MCTS.get_next_actions`` of the AlphaZero ctree against the per-env loop of
+    ``MCTS.get_next_action``, on TicTacToe with a randomly initialized model.
+    With ``max_pending_leaves_per_tree=1`` the batched search visits the same nodes as the per-env loop, which is
+    checked on the returned action probabilities. The leaves of several envs (and of several pending leaves per tree)
+    are then evaluated in one forward pass of the model, so the throughput grows with the number of envs.
+    The ctree has to be built first, see ``make.sh`` in ``lzero/mcts/ctree/ctree_alphazero``.
+"""
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+import torch
+from easydict import EasyDict
+
+sys.path.append('./LightZero/lzero/mcts/ctree/ctree_alphazero/build')
+
+import mcts_alphazero
+from lzero.model.alphazero_model import AlphaZeroModel
+from zoo.board_games.tictactoe.config.tictactoe_alphazero_sp_mode_config import tictactoe_alphazero_config
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+
+board_size = tictactoe_alphazero_config.env.board_size
+num_simulations = 50
+
+model = AlphaZeroModel(
+    observation_shape=(3, board_size, board_size),
+    action_space_size=board_size * board_size,
+    num_channels=32,
+    last_linear_layer_init_zero=False
+)
+model.eval()
+
+
+@torch.no_grad()
+def policy_value_fn(env: TicTacToeEnv) -> Tuple[Dict[int, float], float]:
+    legal_actions = env.legal_actions
+    state = torch.from_numpy(env.current_state()[1]).float().unsqueeze(0)
+    action_probs, value = model.compute_policy_value(state)
+    return dict(zip(legal_actions, action_probs.squeeze(0)[legal_actions].numpy())), value.item()
+
+
+@torch.no_grad()
+def policy_value_batch_fn(states: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    action_probs, values = model.compute_policy_value(torch.from_numpy(np.stack(states)).float())
+    return action_probs.numpy(), values.view(-1).numpy()
+
+
+def make_mcts(max_pending_leaves_per_tree: int = 1) -> mcts_alphazero.MCTS:
+    env_cfg = EasyDict(dict(TicTacToeEnv.default_config(), **tictactoe_alphazero_config.env))
+    env_cfg.alphazero_mcts_ctree = True
+    simulate_env = TicTacToeEnv(env_cfg)
+    return mcts_alphazero.MCTS(
+        num_simulations=num_simulations,
+        simulate_env=simulate_env,
+        max_pending_leaves_per_tree=max_pending_leaves_per_tree
+    )
+
+
+def make_state_configs(env_num: int, seed: int = 0) -> List[EasyDict]:
+    rng = np.random.RandomState(seed)
+    state_configs = []
+    for _ in range(env_num):
+        # a few random stones on the board, with player 1 to play
+        board = np.zeros(board_size * board_size, dtype=np.int32)
+        stones = rng.choice(board_size * board_size, size=2 * rng.randint(0, 3), replace=False)
+        board[stones[::2]], board[stones[1::2]] = 1, 2
+        state_configs.append(
+            EasyDict(
+                dict(
+                    start_player_index=0,
+                    init_state=board.reshape(board_size, board_size),
+                    katago_policy_init=False,
+                    katago_game_state=None
+                )
+            )
+        )
+    return state_configs
+
+
+if __name__ == "__main__":
+    # the searches are deterministic without exploration noise, so the batched search with one pending leaf per tree
+    # returns the same action probabilities as the per-env loop
+    state_configs = make_state_configs(8)
+    mcts = make_mcts()
+    expected = [mcts.get_next_action(config, policy_value_fn, 1.0, False) for config in state_configs]
+    for (action, probs), (expected_action, expected_probs) in zip(
+            mcts.get_next_actions(state_configs, policy_value_batch_fn, 1.0, False), expected):
+        assert action == expected_action and np.allclose(probs, expected_probs)
+    print('get_next_actions with max_pending_leaves_per_tree=1 matches get_next_action')
+
+    for env_num in [8, 32, 64]:
+        state_configs = make_state_configs(env_num)
+        mcts = make_mcts()
+        start = time.time()
+        for config in state_configs:
+            mcts.get_next_action(config, policy_value_fn, 1.0, True)
+        loop_time = time.time() - start
+        results = [f'env_num={env_num}: per-env loop {env_num / loop_time:.1f} searches/s']
+        for max_pending_leaves_per_tree in [1, 4]:
+            mcts = make_mcts(max_pending_leaves_per_tree)
+            start = time.time()
+            mcts.get_next_actions(state_configs, policy_value_batch_fn, 1.0, True)
+            batched_time = time.time() - start
+            results.append(
+                f'batched (max_pending_leaves_per_tree={max_pending_leaves_per_tree}) '
+                f'{env_num / batched_time:.1f} searches/s ({loop_time / batched_time:.1f}x)'
+            )
+        print(', '.join(results))
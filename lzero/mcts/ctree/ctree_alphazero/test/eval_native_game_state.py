@@ -0,0 +1,82 @@
+"""
+Overview:
+    Benchmark of the native game states of the AlphaZero ctree (``game_state.h``) against the Python simulate_env,
+    on the board games of ``zoo/board_games`` with a cheap fixed policy value function, so that the time is spent in
+    the search itself. It reports the searches per second of ``get_next_action`` and of the batched
+    ``get_next_actions``, with and without ``use_native_game_state``.
+    The ctree has to be built first, see ``make.sh`` in ``lzero/mcts/ctree/ctree_alphazero``.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+from easydict import EasyDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../build'))
+
+import mcts_alphazero
+from zoo.board_games.connect4.envs.connect4_env import Connect4Env
+from zoo.board_games.gomoku.envs.gomoku_env import GomokuEnv
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+
+num_simulations = 100
+env_num = 16
+
+
+def make_env(env_type, **kwargs):
+    cfg = EasyDict(env_type.default_config())
+    cfg.update(dict(battle_mode='self_play_mode', alphazero_mcts_ctree=True, **kwargs))
+    return env_type(cfg)
+
+
+def make_policy_value_batch_fn(action_space_size):
+
+    def policy_value_batch_fn(states):
+        return np.full((len(states), action_space_size), 1. / action_space_size), np.zeros(len(states))
+
+    return policy_value_batch_fn
+
+
+def policy_value_fn(env):
+    legal_actions = env.legal_actions
+    return {action: 1. / len(legal_actions) for action in legal_actions}, 0.
+
+
+if __name__ == "__main__":
+    for env_type, env_kwargs in [
+        (TicTacToeEnv, dict()),
+        (Connect4Env, dict(bot_action_type='rule')),
+        (GomokuEnv, dict(board_size=9)),
+    ]:
+        env = make_env(env_type, **env_kwargs)
+        obs = env.reset()
+        state_configs = [
+            EasyDict(
+                start_player_index=0,
+                init_state=np.array(obs['board'], dtype=np.int32),
+                katago_policy_init=False,
+                katago_game_state=None
+            ) for _ in range(env_num)
+        ]
+        policy_value_batch_fn = make_policy_value_batch_fn(env.action_space.n)
+        results = []
+        for use_native_game_state in [False, True]:
+            if env_type is Connect4Env and not use_native_game_state:
+                # the Python simulate_env of connect4 can not be reset from the bytes of the board
+                continue
+            mcts = mcts_alphazero.MCTS(
+                num_simulations=num_simulations, simulate_env=env, use_native_game_state=use_native_game_state
+            )
+            start = time.time()
+            for config in state_configs:
+                mcts.get_next_action(config, policy_value_fn, 1.0, True)
+            single_time = time.time() - start
+            start = time.time()
+            mcts.get_next_actions(state_configs, policy_value_batch_fn, 1.0, True)
+            batched_time = time.time() - start
+            results.append(
+                f'use_native_game_state={use_native_game_state}: get_next_action {env_num / single_time:.1f} '
+                f'searches/s, get_next_actions {env_num / batched_time:.1f} searches/s'
+            )
+        print(f'{env_type.__name__}: ' + ', '.join(results))
@@ -0,0 +1,96 @@
+"""
+Overview:
+    Benchmark of the transposition table of the AlphaZero ctree (``transposition_table.h``) on self-play games of the
+    board games of ``zoo/board_games``, with a small torch policy value network. It reports the network evaluations
+    per move, the hit rate of the table and the time per move, with and without ``transposition_table_size``.
+    The ctree has to be built first, see ``make.sh`` in ``lzero/mcts/ctree/ctree_alphazero``.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from easydict import EasyDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../build'))
+
+import mcts_alphazero
+from zoo.board_games.connect4.envs.connect4_env import Connect4Env
+from zoo.board_games.gomoku.envs.gomoku_env import GomokuEnv
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+
+num_simulations = 200
+num_games = 4
+
+
+def make_env(env_type, **kwargs):
+    cfg = EasyDict(env_type.default_config())
+    cfg.update(dict(battle_mode='self_play_mode', alphazero_mcts_ctree=True, **kwargs))
+    return env_type(cfg)
+
+
+class PolicyValueNetwork(object):
+    """
+    Overview:
+        A small fixed MLP of the states, counting the evaluated states.
+    """
+
+    def __init__(self, state_size, action_space_size):
+        torch.manual_seed(0)
+        self.net = torch.nn.Sequential(
+            torch.nn.Flatten(), torch.nn.Linear(state_size, 256), torch.nn.ReLU(),
+            torch.nn.Linear(256, action_space_size + 1)
+        )
+        self.num_states = 0
+
+    @torch.no_grad()
+    def batch(self, states):
+        self.num_states += len(states)
+        output = self.net(torch.as_tensor(np.stack(states), dtype=torch.float32))
+        return torch.softmax(output[:, :-1], -1).numpy(), torch.tanh(output[:, -1]).numpy()
+
+    def __call__(self, env):
+        probs, value = self.batch([env.current_state()[1]])
+        return {a: probs[0, a] for a in env.legal_actions}, value[0]
+
+
+def play_games(env, transposition_table_size):
+    mcts = mcts_alphazero.MCTS(
+        num_simulations=num_simulations, simulate_env=env, transposition_table_size=transposition_table_size
+    )
+    game_state = mcts_alphazero.make_game_state(env)
+    network = PolicyValueNetwork(3 * game_state.board.size, game_state.action_space_size)
+    num_moves = 0
+    start = time.time()
+    for game in range(num_games):
+        np.random.seed(game)
+        game_state.reset(0)
+        mcts.clear_transposition_table()
+        while not game_state.get_done_winner()[0]:
+            config = EasyDict(
+                start_player_index=game_state.current_player - 1,
+                init_state=np.array(game_state.board, dtype=np.int32),
+                katago_policy_init=False,
+                katago_game_state=None
+            )
+            action, _ = mcts.get_next_action(config, network, 1.0, True)
+            game_state.step(action)
+            num_moves += 1
+    return network.num_states / num_moves, mcts.get_transposition_table_stats(), (time.time() - start) / num_moves
+
+
+if __name__ == "__main__":
+    for env_type, env_kwargs in [
+        (TicTacToeEnv, dict()),
+        (Connect4Env, dict(bot_action_type='rule')),
+        (GomokuEnv, dict(board_size=9)),
+    ]:
+        env = make_env(env_type, **env_kwargs)
+        for transposition_table_size in [0, 100000]:
+            states_per_move, stats, time_per_move = play_games(env, transposition_table_size)
+            print(
+                f'{env_type.__name__} transposition_table_size={transposition_table_size}: '
+                f'{states_per_move:.1f} network evaluations per move, hit rate {stats["hit_rate"]:.3f}, '
+                f'{stats["network_calls_saved_per_move"]:.1f} saved per move, {time_per_move * 1000:.1f} ms per move'
+            )
@@ -0,0 +1,143 @@
+"""
+Overview:
+    Parity tests of the native game states of the AlphaZero ctree (``game_state.h``) against the board game envs in
+    ``zoo/board_games``, and of the searches with and without the native game state.
+    The ctree has to be built first, see ``make.sh`` in ``lzero/mcts/ctree/ctree_alphazero``.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../build'))
+mcts_alphazero = pytest.importorskip('mcts_alphazero')
+
+from zoo.board_games.connect4.envs.connect4_env import Connect4Env
+from zoo.board_games.gomoku.envs.gomoku_env import GomokuEnv
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+
+env_configs = [
+    (TicTacToeEnv, dict(scale=True)),
+    (TicTacToeEnv, dict(scale=False, channel_last=True)),
+    (Connect4Env, dict(bot_action_type='rule')),
+    (GomokuEnv, dict(board_size=6)),
+    (GomokuEnv, dict(board_size=9, scale=True)),
+]
+
+
+def make_env(env_type, **kwargs):
+    cfg = EasyDict(env_type.default_config())
+    cfg.update(dict(battle_mode='self_play_mode', alphazero_mcts_ctree=True, **kwargs))
+    return env_type(cfg)
+
+
+def assert_same_state(game_state, env):
+    assert game_state.current_player == env.current_player
+    assert game_state.legal_actions == list(env.legal_actions)
+    assert game_state.legal_action_mask.tolist() == [int(a in env.legal_actions) for a in range(env.action_space.n)]
+    assert tuple(game_state.get_done_winner()) == tuple(env.get_done_winner())
+    assert (game_state.board == np.array(env.board).reshape(game_state.board.shape)).all()
+    current_state = game_state.current_state(env.scale, env.channel_last)
+    assert current_state.dtype == env.current_state()[1].dtype
+    assert (current_state == env.current_state()[1]).all()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('env_type, env_kwargs', env_configs)
+def test_game_state_parity(env_type, env_kwargs):
+    env = make_env(env_type, **env_kwargs)
+    game_state = mcts_alphazero.make_game_state(env)
+    assert game_state is not None
+    rng = np.random.RandomState(0)
+    for episode in range(20):
+        start_player_index = episode % 2
+        env.reset(start_player_index)
+        game_state.reset(start_player_index)
+        assert_same_state(game_state, env)
+        done = False
+        while not done:
+            action = int(rng.choice(game_state.legal_actions))
+            # the clones are independent of the stepped state
+            clone = game_state.clone()
+            game_state.step(action)
+            done = env.step(action).done
+            assert_same_state(game_state, env)
+            assert clone.current_player != game_state.current_player
+
+        # resume from the last board with the other player to play, as the MCTS resets from ``obs['board']``
+        board = np.array(env.board, dtype=np.int32)
+        env.reset(1 - start_player_index, board.tolist() if env_type is Connect4Env else board.tobytes())
+        game_state.reset(1 - start_player_index, board)
+        assert_same_state(game_state, env)
+
+
+@pytest.mark.unittest
+def test_make_game_state():
+    assert mcts_alphazero.make_game_state(make_env(TicTacToeEnv, prob_random_agent=0.5)) is None
+    assert mcts_alphazero.make_game_state(make_env(TicTacToeEnv)).action_space_size == 9
+    assert mcts_alphazero.make_game_state(make_env(Connect4Env)).action_space_size == 7
+    assert mcts_alphazero.make_game_state(make_env(GomokuEnv, board_size=9)).action_space_size == 81
+    with pytest.raises(ValueError):
+        mcts_alphazero.make_game_state(make_env(TicTacToeEnv)).reset(0, np.zeros(4, dtype=np.int32))
+
+
+class LinearPolicyValue(object):
+    """
+    Overview:
+        A deterministic policy value function of the flattened scaled states, in the formats of the single and batched
+        searches of the MCTS.
+    """
+
+    def __init__(self, state_size, action_space_size, seed=0):
+        rng = np.random.RandomState(seed)
+        self.policy_weight = rng.randn(state_size, action_space_size)
+        self.value_weight = rng.randn(state_size)
+
+    def batch(self, states):
+        states = np.stack(states).reshape(len(states), -1).astype(np.float64)
+        logits = states @ self.policy_weight
+        probs = np.exp(logits - logits.max(-1, keepdims=True))
+        return probs / probs.sum(-1, keepdims=True), np.tanh(states @ self.value_weight)
+
+    def __call__(self, env):
+        probs, value = self.batch([env.current_state()[1]])
+        return {a: probs[0, a] for a in env.legal_actions}, value[0]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('env_type, env_kwargs', [(TicTacToeEnv, dict()), (GomokuEnv, dict(board_size=6))])
+def test_search_parity(env_type, env_kwargs):
+    env = make_env(env_type, **env_kwargs)
+    native_mcts = mcts_alphazero.MCTS(num_simulations=50, simulate_env=env, max_pending_leaves_per_tree=2)
+    python_mcts = mcts_alphazero.MCTS(
+        num_simulations=50, simulate_env=env, max_pending_leaves_per_tree=2, use_native_game_state=False
+    )
+    assert native_mcts.uses_native_game_state and not python_mcts.uses_native_game_state
+    policy_value = LinearPolicyValue(3 * env.board_size ** 2, env.board_size ** 2)
+
+    rng = np.random.RandomState(0)
+    state_configs = []
+    for i in range(4):
+        env.reset(i % 2)
+        for _ in range(rng.randint(0, 4)):
+            env.step(int(rng.choice(env.legal_actions)))
+        state_configs.append(
+            EasyDict(
+                start_player_index=env.current_player - 1,
+                init_state=np.array(env.board, dtype=np.int32),
+                katago_policy_init=False,
+                katago_game_state=None
+            )
+        )
+
+    # without exploration noise, the searches visit the same nodes with and without the native game state
+    for config in state_configs:
+        native_action, native_probs = native_mcts.get_next_action(config, policy_value, 1.0, False)
+        action, probs = python_mcts.get_next_action(config, policy_value, 1.0, False)
+        assert native_action == action and np.allclose(native_probs, probs)
+    for (native_action, native_probs), (action, probs) in zip(
+            native_mcts.get_next_actions(state_configs, policy_value.batch, 1.0, False),
+            python_mcts.get_next_actions(state_configs, policy_value.batch, 1.0, False)):
+        assert native_action == action and np.allclose(native_probs, probs)
@@ -0,0 +1,134 @@
+"""
+Overview:
+    Tests of the transposition table of the AlphaZero ctree (``transposition_table.h``): the Zobrist hashes of the
+    native game states, and the searches sharing the evaluations of the positions reached by different move orders.
+    The ctree has to be built first, see ``make.sh`` in ``lzero/mcts/ctree/ctree_alphazero``.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../build'))
+mcts_alphazero = pytest.importorskip('mcts_alphazero')
+
+from zoo.board_games.connect4.envs.connect4_env import Connect4Env
+from zoo.board_games.gomoku.envs.gomoku_env import GomokuEnv
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+from test_game_state import LinearPolicyValue, make_env
+
+
+class CountingPolicyValue(LinearPolicyValue):
+    """
+    Overview:
+        ``LinearPolicyValue`` counting the evaluated states.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_states = 0
+
+    def batch(self, states):
+        self.num_states += len(states)
+        return super().batch(states)
+
+
+def state_config(board, start_player_index):
+    return EasyDict(
+        start_player_index=start_player_index,
+        init_state=np.array(board, dtype=np.int32),
+        katago_policy_init=False,
+        katago_game_state=None
+    )
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('env_type, env_kwargs', [(TicTacToeEnv, dict()), (Connect4Env, dict()),
+                                                  (GomokuEnv, dict(board_size=6))])
+def test_zobrist_hash(env_type, env_kwargs):
+    game_state = mcts_alphazero.make_game_state(make_env(env_type, **env_kwargs))
+    rng = np.random.RandomState(0)
+    for episode in range(10):
+        game_state.reset(episode % 2)
+        hashes = set()
+        while not game_state.get_done_winner()[0]:
+            # the hash updated at each step is the hash of the board and the player to play
+            assert game_state.zobrist_hash == mcts_alphazero.zobrist_hash(game_state.board, game_state.current_player)
+            assert game_state.zobrist_hash != mcts_alphazero.zobrist_hash(game_state.board, 3 - game_state.current_player)
+            hashes.add(game_state.zobrist_hash)
+            game_state.step(int(rng.choice(game_state.legal_actions)))
+        assert len(hashes) == np.count_nonzero(game_state.board)
+    # the same position reached by different move orders has the same hash
+    game_state.reset(0)
+    for action in [0, 1, 2]:
+        game_state.step(action)
+    other_state = game_state.clone()
+    other_state.reset(0)
+    for action in [2, 1, 0]:
+        other_state.step(action)
+    assert game_state.zobrist_hash == other_state.zobrist_hash
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('use_native_game_state', [True, False])
+@pytest.mark.parametrize('batched', [True, False])
+def test_search_with_transposition_table(use_native_game_state, batched):
+    env = make_env(TicTacToeEnv)
+    configs = [state_config(np.zeros((3, 3)), i % 2) for i in range(4)]
+    results = {}
+    for transposition_table_size in [0, 10000]:
+        mcts = mcts_alphazero.MCTS(
+            num_simulations=100,
+            simulate_env=env,
+            max_pending_leaves_per_tree=4,
+            use_native_game_state=use_native_game_state,
+            transposition_table_size=transposition_table_size
+        )
+        policy_value = CountingPolicyValue(27, 9)
+        if batched:
+            next_actions = mcts.get_next_actions(configs, policy_value.batch, 1.0, True)
+        else:
+            next_actions = [mcts.get_next_action(config, policy_value, 1.0, True) for config in configs]
+        for action, probs in next_actions:
+            assert np.isclose(np.sum(probs), 1) and probs[action] > 0
+        results[transposition_table_size] = (policy_value.num_states, mcts.get_transposition_table_stats())
+
+    num_states, stats = results[10000]
+    assert results[0][1]['capacity'] == 0 and results[0][1]['num_lookups'] == 0
+    assert stats['num_moves'] == len(configs) and stats['num_hits'] > 0
+    # every lookup of a position to evaluate either hits the table or calls the network
+    assert num_states == stats['num_lookups'] - stats['num_hits']
+    assert num_states < results[0][0]
+    assert stats['network_calls_saved_per_move'] == stats['num_hits'] / len(configs)
+    assert stats['hit_rate'] == stats['num_hits'] / stats['num_lookups']
+
+    mcts.reset_transposition_table_stats()
+    assert mcts.get_transposition_table_stats()['num_lookups'] == 0
+    mcts.clear_transposition_table()
+    assert mcts.get_transposition_table_stats()['size'] == 0
+
+
+@pytest.mark.unittest
+def test_transposition_table_bound():
+    env = make_env(GomokuEnv, board_size=6)
+    mcts = mcts_alphazero.MCTS(num_simulations=200, simulate_env=env, transposition_table_size=16)
+    policy_value = CountingPolicyValue(3 * 36, 36)
+    config = state_config(np.zeros((6, 6)), 0)
+    for _ in range(3):
+        mcts.get_next_action(config, policy_value, 1.0, True)
+        assert mcts.get_transposition_table_stats()['size'] == 16
+
+    # the positions evaluated by the previous search of the same root are reused
+    mcts = mcts_alphazero.MCTS(num_simulations=200, simulate_env=env, transposition_table_size=10000)
+    mcts.get_next_action(config, policy_value, 1.0, True)
+    num_states = policy_value.num_states
+    mcts.get_next_action(config, policy_value, 1.0, True)
+    assert policy_value.num_states - num_states < mcts.get_transposition_table_stats()['num_hits']
+
+    # the table is disabled when the simulation is not deterministic
+    random_env = make_env(TicTacToeEnv, prob_random_agent=0.5)
+    mcts = mcts_alphazero.MCTS(num_simulations=20, simulate_env=random_env, transposition_table_size=16)
+    mcts.get_next_action(state_config(np.zeros((3, 3)), 0), CountingPolicyValue(27, 9), 1.0, True)
+    assert mcts.get_transposition_table_stats()['capacity'] == 0
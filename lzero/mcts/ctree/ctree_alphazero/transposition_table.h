@@ -0,0 +1,123 @@
+// This header defines the transposition table of the AlphaZero MCTS, which caches the network evaluations of the
+// positions reached by the search and merges the statistics of the nodes of the same position, as the same position
+// is often reached by different move orders. The positions are identified by their Zobrist hashes.
+
+#ifndef TRANSPOSITION_TABLE_H
+#define TRANSPOSITION_TABLE_H
+
+#include <cstdint>
+#include <list>
+#include <memory>
+#include <unordered_map>
+#include <utility>
+#include <vector>
+
+// The entry of a position, shared by all the nodes of the position.
+struct TranspositionEntry {
+    // The priors of the legal actions of the position, and its value, given by the network.
+    std::vector<std::pair<int, double>> priors;
+    double value = 0;
+    // The visit count and value sum of the position, summed over its nodes, in the same perspective as ``Node``.
+    int visit_count = 0;
+    double value_sum = 0;
+};
+
+// This function returns the Zobrist key of a stone of ``player`` on ``cell``, or of ``player`` to play if ``cell`` is
+// -1, i.e. the splitmix64 hash of (cell, player).
+inline uint64_t zobrist_key(int cell, int player) {
+    uint64_t x = ((static_cast<uint64_t>(cell + 1) << 2) | static_cast<uint64_t>(player)) + 0x9e3779b97f4a7c15ULL;
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+    return x ^ (x >> 31);
+}
+
+// This function returns the Zobrist hash of a board of ``num_cells`` cells with ``current_player`` to play.
+inline uint64_t zobrist_hash(const int32_t* board, int num_cells, int current_player) {
+    uint64_t hash = zobrist_key(-1, current_player);
+    for (int i = 0; i < num_cells; ++i) {
+        if (board[i] != 0) {
+            hash ^= zobrist_key(i, board[i]);
+        }
+    }
+    return hash;
+}
+
+// The table of the entries of at most ``capacity`` positions, which evicts the least recently used entry when full.
+// The evicted entries stay alive as long as nodes refer to them. A capacity of 0 disables the table.
+class TranspositionTable {
+public:
+    explicit TranspositionTable(size_t capacity = 0) : capacity_(capacity) {}
+
+    bool enabled() const {
+        return capacity_ > 0;
+    }
+
+    // This function returns the entry of a position and marks it as the most recently used, or nullptr if the
+    // position is not in the table. It is counted as a lookup in the statistics.
+    std::shared_ptr<TranspositionEntry> find(uint64_t key) {
+        ++num_lookups_;
+        std::shared_ptr<TranspositionEntry> entry = peek(key);
+        if (entry) {
+            ++num_hits_;
+            lru_.splice(lru_.begin(), lru_, index_[key]);
+        }
+        return entry;
+    }
+
+    // This function returns the entry of a position, or nullptr, without changing the table or the statistics.
+    std::shared_ptr<TranspositionEntry> peek(uint64_t key) const {
+        auto it = index_.find(key);
+        return it == index_.end() ? nullptr : it->second->second;
+    }
+
+    // This function inserts the entry of a new position, and evicts the least recently used one if the table is full.
+    void insert(uint64_t key, std::shared_ptr<TranspositionEntry> entry) {
+        lru_.emplace_front(key, entry);
+        index_[key] = lru_.begin();
+        if (index_.size() > capacity_) {
+            index_.erase(lru_.back().first);
+            lru_.pop_back();
+        }
+    }
+
+    // This function counts a network evaluation saved otherwise than by ``find``, e.g. for a position already
+    // waiting for its evaluation in the same batch.
+    void record_hit() {
+        ++num_hits_;
+    }
+
+    void clear() {
+        lru_.clear();
+        index_.clear();
+    }
+
+    void reset_stats() {
+        num_lookups_ = 0;
+        num_hits_ = 0;
+    }
+
+    size_t size() const {
+        return index_.size();
+    }
+
+    size_t capacity() const {
+        return capacity_;
+    }
+
+    long long num_lookups() const {
+        return num_lookups_;
+    }
+
+    long long num_hits() const {
+        return num_hits_;
+    }
+
+private:
+    size_t capacity_;
+    std::list<std::pair<uint64_t, std::shared_ptr<TranspositionEntry>>> lru_;
+    std::unordered_map<uint64_t, std::list<std::pair<uint64_t, std::shared_ptr<TranspositionEntry>>>::iterator> index_;
+    long long num_lookups_ = 0;
+    long long num_hits_ = 0;
+};
+
+#endif  // TRANSPOSITION_TABLE_H
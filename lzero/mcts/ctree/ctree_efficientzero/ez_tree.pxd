@@ -30,6 +30,9 @@ cdef extern from "lib/cnode.cpp":
 
 
 cdef extern from "lib/cnode.h" namespace "tree":
+    cdef cppclass CArena:
+        CArena() except +
+
     cdef cppclass CNode:
         CNode() except +
         CNode(float prior, vector[int] & legal_actions) except +
@@ -37,7 +40,7 @@ cdef extern from "lib/cnode.h" namespace "tree":
         float value_prefixs, prior, value_sum, parent_value_prefix
 
         void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs,
-                    vector[float] policy_logits)
+                    vector[float] policy_logits, CArena &arena)
         void add_exploration_noise(float exploration_fraction, vector[float] noises)
         float compute_mean_q(int isRoot, float parent_q, float discount_factor)
 
@@ -59,9 +62,11 @@ cdef extern from "lib/cnode.h" namespace "tree":
         void prepare_no_noise(const vector[float] & value_prefixs, const vector[vector[float]] & policies,
                               vector[int] to_play_batch)
         void clear()
+        void reserve(int num_simulations)
         vector[vector[int]] get_trajectories()
         vector[vector[int]] get_distributions()
         vector[float] get_values()
+        vector[vector[int]] reuse(int index, CRoots *roots, int root_index, int action, float root_noise_weight, const vector[float] &noises)
         # visualize related code
         # CNode* get_root(int index)
 
@@ -95,3 +100,4 @@ cdef class Roots:
 
 cdef class Node:
     cdef CNode cnode
+    cdef CArena arena
@@ -51,6 +51,13 @@ cdef class Roots:
     def get_values(self):
         return self.roots[0].get_values()
 
+    def reuse(self, int index, Roots roots, int root_index, int action, float root_noise_weight=0, list noises=None):
+        cdef vector[float] cnoises = [] if noises is None else noises
+        return self.roots[0].reuse(index, roots.roots, root_index, action, root_noise_weight, cnoises)
+
+    def reserve(self, int num_simulations):
+        self.roots[0].reserve(num_simulations)
+
     # visualize related code
     #def get_root(self, int index):
     #    return self.roots[index]
@@ -77,7 +84,7 @@ cdef class Node:
     def expand(self, int to_play, int current_latent_state_index, int batch_index, float value_prefix,
                list policy_logits):
         cdef vector[float] cpolicy = policy_logits
-        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy)
+        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy, self.arena)
 
 @cython.binding
 def batch_backpropagate(int current_latent_state_index, float discount_factor, list value_prefixs, list values, list policies,
@@ -31,13 +31,16 @@ cdef extern from "lib/cnode.cpp":
 
 
 cdef extern from "lib/cnode.h" namespace "tree":
+    cdef cppclass CArena:
+        CArena() except +
+
     cdef cppclass CNode:
         CNode() except +
         CNode(float prior, vector[int] &legal_actions) except +
         int visit_count, to_play, current_latent_state_index, batch_index, best_action
         float value_prefixs, prior, value_sum, parent_value_prefix
 
-        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs, float value, vector[float] policy_logits)
+        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs, float value, vector[float] policy_logits, CArena &arena)
         void add_exploration_noise(float exploration_fraction, vector[float] noises)
         float compute_mean_q(int isRoot, float parent_q, float discount)
 
@@ -59,6 +62,7 @@ cdef extern from "lib/cnode.h" namespace "tree":
         void prepare(float root_noise_weight, const vector[vector[float]] &noises, const vector[float] &value_prefixs, const vector[float] &values, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void prepare_no_noise(const vector[float] &value_prefixs, const vector[float] &values, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void clear()
+        void reserve(int num_simulations)
         vector[vector[int]] get_trajectories()
         vector[vector[int]] get_distributions()
         vector[vector[float]] get_children_values(float discount, int action_space_size)
@@ -54,6 +54,9 @@ cdef class Roots:
     def get_values(self):
         return self.roots[0].get_values()
 
+    def reserve(self, int num_simulations):
+        self.roots[0].reserve(num_simulations)
+
     def clear(self):
         self.roots[0].clear()
 
@@ -67,6 +70,7 @@ cdef class Roots:
 
 cdef class Node:
     cdef CNode cnode
+    cdef CArena arena
 
     def __cinit__(self):
         pass
@@ -76,7 +80,7 @@ cdef class Node:
 
     def expand(self, int to_play, int current_latent_state_index, int batch_index, float value_prefix, float value, list policy_logits):
         cdef vector[float] cpolicy = policy_logits
-        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, value, cpolicy)        
+        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, value, cpolicy, self.arena)        
 
 def batch_back_propagate(int current_latent_state_index, float discount, list value_prefixs, list values, list policies, MinMaxStatsList min_max_stats_lst, ResultsWrapper results, list to_play_batch):
     cdef int i
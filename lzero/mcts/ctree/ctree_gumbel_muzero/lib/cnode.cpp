@@ -23,6 +23,7 @@ namespace tree{
             Initialization of CSearchResults, the default result number is set to 0.
         */
         this->num = 0;
+        this->arena = nullptr;
     }
 
     CSearchResults::CSearchResults(int num)
@@ -32,6 +33,7 @@ namespace tree{
             Initialization of CSearchResults with result number.
         */
         this->num = num;
+        this->arena = nullptr;
         for (int i = 0; i < num; ++i)
         {
             this->search_paths.push_back(std::vector<CNode *>());
@@ -57,6 +59,8 @@ namespace tree{
         this->best_action = -1;
         this->to_play = 0;
         this->reward = 0.0;
+        this->action_num = 0;
+        this->children = nullptr;
 
         // gumbel muzero related code
         this->gumbel_scale = 10.0;
@@ -82,16 +86,22 @@ namespace tree{
         this->to_play = 0;
         this->current_latent_state_index = -1;
         this->batch_index = -1;
+        this->reward = 0.0;
+        this->action_num = 0;
+        this->children = nullptr;
 
         // gumbel muzero related code
         this->gumbel_scale = 10.0;
         this->gumbel_rng=0.0;
-        this->gumbel = generate_gumbel(this->gumbel_scale, this->gumbel_rng, legal_actions.size());
+        // the gumbel noise is only used at the roots, the other nodes have no legal actions
+        if(!legal_actions.empty()){
+            this->gumbel = generate_gumbel(this->gumbel_scale, this->gumbel_rng, legal_actions.size());
+        }
     }
 
     CNode::~CNode(){}
 
-    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, float value, const std::vector<float> &policy_logits)
+    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, float value, const std::vector<float> &policy_logits, CArena &arena)
     {
         /*
         Overview:
@@ -103,6 +113,7 @@ namespace tree{
             - reward: the reward of the current node.
             - value: the value network approximation of current node.
             - policy_logits: the logit of the child nodes.
+            - arena: the arena where the child nodes are allocated.
         */
         this->to_play = to_play;
         this->current_latent_state_index = current_latent_state_index;
@@ -111,13 +122,9 @@ namespace tree{
         this->raw_value = value;
 
         int action_num = policy_logits.size();
-        if (this->legal_actions.size() == 0)
-        {
-            for (int i = 0; i < action_num; ++i)
-            {
-                this->legal_actions.push_back(i);
-            }
-        }
+        this->action_num = action_num;
+        this->children = arena.allocate(action_num);
+        int legal_action_num = this->legal_action_num();
         float temp_policy;
         float policy_sum = 0.0;
 
@@ -129,22 +136,25 @@ namespace tree{
         #endif
 
         float policy_max = FLOAT_MIN;
-        for(auto a: this->legal_actions){
+        for(int i = 0; i < legal_action_num; ++i){
+            int a = this->legal_action(i);
             if(policy_max < policy_logits[a]){
                 policy_max = policy_logits[a];
             }
         }
 
-        for(auto a: this->legal_actions){
+        for(int i = 0; i < legal_action_num; ++i){
+            int a = this->legal_action(i);
             temp_policy = exp(policy_logits[a] - policy_max);
             policy_sum += temp_policy;
             policy[a] = temp_policy;
         }
 
         float prior;
-        for(auto a: this->legal_actions){
+        std::vector<int> tmp_empty;
+        for(int i = 0; i < legal_action_num; ++i){
+            int a = this->legal_action(i);
             prior = policy[a] / policy_sum;
-            std::vector<int> tmp_empty;
             this->children[a] = CNode(prior, tmp_empty); // only for muzero/efficient zero, not support alphazero
         }
 
@@ -165,9 +175,9 @@ namespace tree{
             - noises: the vector of noises added to each child node.
         */
         float noise, prior;
-        for(int i =0; i<this->legal_actions.size(); ++i){
+        for(int i =0; i<this->legal_action_num(); ++i){
             noise = noises[i];
-            CNode* child = this->get_child(this->legal_actions[i]);
+            CNode* child = this->get_child(this->legal_action(i));
 
             prior = child->prior;
             child->prior = prior * (1 - exploration_fraction) + noise * exploration_fraction;
@@ -187,7 +197,8 @@ namespace tree{
             - discount_factor: the discount_factor of reward.
         */
         std::vector<float> child_value;
-        for(auto a: this->legal_actions){
+        for(int i = 0; i < this->legal_action_num(); ++i){
+            int a = this->legal_action(i);
             CNode* child = this->get_child(a);
             float true_reward = child->reward;
             float qsa = true_reward + discount_factor * child->value();
@@ -208,7 +219,8 @@ namespace tree{
         */
         float total_unsigned_q = 0.0;
         int total_visits = 0;
-        for(auto a: this->legal_actions){
+        for(int i = 0; i < this->legal_action_num(); ++i){
+            int a = this->legal_action(i);
             CNode* child = this->get_child(a);
             if(child->visit_count > 0){
                 float true_reward = child->reward;
@@ -239,7 +251,7 @@ namespace tree{
         Overview:
             Return whether the current node is expanded.
         */
-        return this->children.size() > 0;
+        return this->children != nullptr;
     }
 
     float CNode::value()
@@ -293,9 +305,9 @@ namespace tree{
         std::vector<int> distribution;
         if (this->expanded())
         {
-            for (auto a : this->legal_actions)
+            for (int i = 0; i < this->legal_action_num(); ++i)
             {
-                CNode *child = this->get_child(a);
+                CNode *child = this->get_child(this->legal_action(i));
                 distribution.push_back(child->visit_count);
             }
         }
@@ -318,7 +330,8 @@ namespace tree{
         float infymin = -std::numeric_limits<float>::infinity();
         std::vector<int> child_visit_count;
         std::vector<float> child_prior;
-        for(auto a: this->legal_actions){
+        for(int i = 0; i < this->legal_action_num(); ++i){
+            int a = this->legal_action(i);
             CNode* child = this->get_child(a);
             child_visit_count.push_back(child->visit_count);
             child_prior.push_back(child->prior);
@@ -331,7 +344,7 @@ namespace tree{
             values.push_back(infymin);
         }
         for (int i=0;i<child_prior.size();i++){
-            values[this->legal_actions[i]] = completed_qvalues[i];
+            values[this->legal_action(i)] = completed_qvalues[i];
         }
 
         return values;
@@ -363,7 +376,8 @@ namespace tree{
         float infymin = -std::numeric_limits<float>::infinity();
         std::vector<int> child_visit_count;
         std::vector<float> child_prior;
-        for(auto a: this->legal_actions){
+        for(int i = 0; i < this->legal_action_num(); ++i){
+            int a = this->legal_action(i);
             CNode* child = this->get_child(a);
             child_visit_count.push_back(child->visit_count);
             child_prior.push_back(child->prior);
@@ -376,7 +390,7 @@ namespace tree{
             probs.push_back(infymin);
         }
         for (int i=0;i<child_prior.size();i++){
-            probs[this->legal_actions[i]] = child_prior[i] + completed_qvalues[i];
+            probs[this->legal_action(i)] = child_prior[i] + completed_qvalues[i];
         }
 
         csoftmax(probs, probs.size());
@@ -429,7 +443,7 @@ namespace tree{
             - to_play_batch: the vector of the player side of each root.
         */
         for(int i = 0; i < this->root_num; ++i){
-            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], values[i], policies[i]);
+            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], values[i], policies[i], this->arena);
             this->roots[i].add_exploration_noise(root_noise_weight, noises[i]);
 
             this->roots[i].visit_count += 1;
@@ -448,7 +462,7 @@ namespace tree{
             - to_play_batch: the vector of the player side of each root.
         */
         for(int i = 0; i < this->root_num; ++i){
-            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], values[i], policies[i]);
+            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], values[i], policies[i], this->arena);
 
             this->roots[i].visit_count += 1;
         }
@@ -461,6 +475,23 @@ namespace tree{
             Clear the roots vector.
         */
         this->roots.clear();
+        this->arena.reset();
+    }
+
+    void CRoots::reserve(int num_simulations)
+    {
+        /*
+        Overview:
+            Preallocate the nodes of a search of ``num_simulations`` simulations from the expanded roots, i.e. the \
+            children of the nodes expanded in each simulation.
+        Arguments:
+            - num_simulations: the number of simulations of the search.
+        */
+        size_t num_nodes = 0;
+        for(int i = 0; i < this->root_num; ++i){
+            num_nodes += (size_t)num_simulations * this->roots[i].action_num;
+        }
+        this->arena.reserve(num_nodes);
     }
 
     std::vector<std::vector<int> > CRoots::get_trajectories()
@@ -591,7 +622,8 @@ namespace tree{
                 min_max_stats.update(qsa);
             }
 
-            for(auto a: node->legal_actions){
+            for(int i = 0; i < node->legal_action_num(); ++i){
+                int a = node->legal_action(i);
                 CNode* child = node->get_child(a);
                 if(child->expanded()){
 //                    child->parent_value_prefix = node->value_prefix;
@@ -646,7 +678,7 @@ namespace tree{
             - to_play_batch: the batch of which player is playing on this node.
         */
         for(int i = 0; i < results.num; ++i){
-            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, value_prefixs[i], values[i], policies[i]);
+            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, value_prefixs[i], values[i], policies[i], *results.arena);
             cback_propagate(results.search_paths[i], min_max_stats_lst->stats_lst[i], to_play_batch[i], values[i], discount_factor);
         }
     }
@@ -670,7 +702,9 @@ namespace tree{
         float max_score = FLOAT_MIN;
         const float epsilon = 0.000001;
         std::vector<int> max_index_lst;
-        for(auto a: root->legal_actions){
+        for(int i = 0; i < root->legal_action_num(); ++i){
+
+            int a = root->legal_action(i);
 
             CNode* child = root->get_child(a);
             float temp_score = cucb_score(child, min_max_stats, mean_q, root->visit_count - 1,  pb_c_base, pb_c_init, discount_factor, players);
@@ -713,7 +747,8 @@ namespace tree{
         */
         std::vector<int> child_visit_count;
         std::vector<float> child_prior;
-        for(auto a: root->legal_actions){
+        for(int i = 0; i < root->legal_action_num(); ++i){
+            int a = root->legal_action(i);
             CNode* child = root->get_child(a);
             child_visit_count.push_back(child->visit_count);
             child_prior.push_back(child->prior);
@@ -723,7 +758,7 @@ namespace tree{
         std::vector<float> completed_qvalues = qtransform_completed_by_mix_value(root, child_visit_count, child_prior, discount_factor);
         std::vector<std::vector<int> > visit_table = get_table_of_considered_visits(max_num_considered_actions, num_simulations);
         
-        int num_valid_actions = root->legal_actions.size();
+        int num_valid_actions = root->legal_action_num();
         int num_considered = std::min(max_num_considered_actions, num_simulations);
         int simulation_index = std::accumulate(child_visit_count.begin(), child_visit_count.end(), 0);
         int considered_visit = visit_table[num_considered][simulation_index];
@@ -731,9 +766,10 @@ namespace tree{
         std::vector<float> score = score_considered(considered_visit, root->gumbel, child_prior, completed_qvalues, child_visit_count);
 
         float argmax = -std::numeric_limits<float>::infinity();
-        int max_action = root->legal_actions[0];
+        int max_action = root->legal_action(0);
         int index = 0;
-        for(auto a: root->legal_actions){
+        for(int i = 0; i < root->legal_action_num(); ++i){
+            int a = root->legal_action(i);
             if(score[index] > argmax){
                 argmax = score[index];
                 max_action = a;
@@ -757,7 +793,8 @@ namespace tree{
         */
         std::vector<int> child_visit_count;
         std::vector<float> child_prior;
-        for(auto a: root->legal_actions){
+        for(int i = 0; i < root->legal_action_num(); ++i){
+            int a = root->legal_action(i);
             CNode* child = root->get_child(a);
             child_visit_count.push_back(child->visit_count);
             child_prior.push_back(child->prior);
@@ -776,9 +813,10 @@ namespace tree{
         }
         
         float argmax = -std::numeric_limits<float>::infinity();
-        int max_action = root->legal_actions[0];
+        int max_action = root->legal_action(0);
         int index = 0;
-        for(auto a: root->legal_actions){
+        for(int i = 0; i < root->legal_action_num(); ++i){
+            int a = root->legal_action(i);
             if(to_argmax[index] > argmax){
                 argmax = to_argmax[index];
                 max_action = a;
@@ -852,6 +890,7 @@ namespace tree{
         int last_action = -1;
         float parent_q = 0.0;
         results.search_lens = std::vector<int>();
+        results.arena = &(roots->arena);
 
         int players = 0;
         int largest_element = *max_element(virtual_to_play_batch.begin(),virtual_to_play_batch.end()); // 0 or 2
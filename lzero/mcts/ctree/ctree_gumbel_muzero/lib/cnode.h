@@ -4,6 +4,7 @@
 #define CNODE_H
 
 #include "./../common_lib/cminimax.h"
+#include "./../common_lib/cnode_arena.h"
 #include <math.h>
 #include <vector>
 #include <stack>
@@ -18,13 +19,17 @@ const int DEBUG_MODE = 0;
 
 namespace tree {
 
+    class CNode;
+    typedef tools::CNodeArena<CNode> CArena;
+
     class CNode {
         public:
-            int visit_count, to_play, current_latent_state_index, batch_index, best_action;
+            int visit_count, to_play, current_latent_state_index, batch_index, best_action, action_num;
             float reward, prior, value_sum, raw_value, gumbel_scale, gumbel_rng;
-            std::vector<int> children_index;
-            std::map<int, CNode> children;
+            // The children of an expanded node, one per action in [0, action_num), in a contiguous block of the arena.
+            CNode *children;
 
+            // The legal actions of a root, empty for the other nodes, where all the actions are legal.
             std::vector<int> legal_actions;
             std::vector<float> gumbel;
 
@@ -32,7 +37,17 @@ namespace tree {
             CNode(float prior, std::vector<int> &legal_actions);
             ~CNode();
 
-            void expand(int to_play, int current_latent_state_index, int batch_index, float reward, float value, const std::vector<float> &policy_logits);
+            int legal_action_num() const
+            {
+                return this->legal_actions.empty() ? this->action_num : this->legal_actions.size();
+            }
+
+            int legal_action(int i) const
+            {
+                return this->legal_actions.empty() ? i : this->legal_actions[i];
+            }
+
+            void expand(int to_play, int current_latent_state_index, int batch_index, float reward, float value, const std::vector<float> &policy_logits, CArena &arena);
             void add_exploration_noise(float exploration_fraction, const std::vector<float> &noises);
             std::vector<float> get_q(float discount);
             float compute_mean_q(int isRoot, float parent_q, float discount);
@@ -54,6 +69,7 @@ namespace tree {
             int root_num;
             std::vector<CNode> roots;
             std::vector<std::vector<int> > legal_actions_list;
+            CArena arena;
 
             CRoots();
             CRoots(int root_num, std::vector<std::vector<int> > &legal_actions_list);
@@ -62,6 +78,7 @@ namespace tree {
             void prepare(float root_noise_weight, const std::vector<std::vector<float> > &noises, const std::vector<float> &rewards, const std::vector<float> &values, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
             void prepare_no_noise(const std::vector<float> &rewards, const std::vector<float> &values, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
             void clear();
+            void reserve(int num_simulations);
             std::vector<std::vector<int> > get_trajectories();
             std::vector<std::vector<int> > get_distributions();
             std::vector<std::vector<float> > get_children_values(float discount, int action_space_size);
@@ -77,6 +94,8 @@ namespace tree {
             std::vector<int> virtual_to_play_batchs;
             std::vector<CNode*> nodes;
             std::vector<std::vector<CNode*> > search_paths;
+            // The arena of the traversed roots, where the leaf nodes are expanded.
+            CArena *arena;
 
             CSearchResults();
             CSearchResults(int num);
@@ -23,6 +23,7 @@ namespace tree
             Initialization of CSearchResults, the default result number is set to 0.
         */
         this->num = 0;
+        this->arena = nullptr;
     }
 
     CSearchResults::CSearchResults(int num)
@@ -32,6 +33,7 @@ namespace tree
             Initialization of CSearchResults with result number.
         */
         this->num = num;
+        this->arena = nullptr;
         for (int i = 0; i < num; ++i)
         {
             this->search_paths.push_back(std::vector<CNode *>());
@@ -56,6 +58,8 @@ namespace tree
         this->best_action = -1;
         this->to_play = 0;
         this->reward = 0.0;
+        this->action_num = 0;
+        this->children = nullptr;
     }
 
     CNode::CNode(float prior, std::vector<int> &legal_actions)
@@ -74,13 +78,16 @@ namespace tree
         this->value_sum = 0;
         this->best_action = -1;
         this->to_play = 0;
+        this->reward = 0.0;
         this->current_latent_state_index = -1;
         this->batch_index = -1;
+        this->action_num = 0;
+        this->children = nullptr;
     }
 
     CNode::~CNode() {}
 
-    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, const std::vector<float> &policy_logits)
+    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, const std::vector<float> &policy_logits, CArena &arena)
     {
         /*
         Overview:
@@ -91,6 +98,7 @@ namespace tree
             - batch_index: The index of latent state of the leaf node in the search path of the current node.
             - reward: the reward of the current node.
             - policy_logits: the logit of the child nodes.
+            - arena: the arena where the child nodes are allocated.
         */
         this->to_play = to_play;
         this->current_latent_state_index = current_latent_state_index;
@@ -98,13 +106,9 @@ namespace tree
         this->reward = reward;
 
         int action_num = policy_logits.size();
-        if (this->legal_actions.size() == 0)
-        {
-            for (int i = 0; i < action_num; ++i)
-            {
-                this->legal_actions.push_back(i);
-            }
-        }
+        this->action_num = action_num;
+        this->children = arena.allocate(action_num);
+        int legal_action_num = this->legal_action_num();
         float temp_policy;
         float policy_sum = 0.0;
 
@@ -116,26 +120,29 @@ namespace tree
         #endif
 
         float policy_max = FLOAT_MIN;
-        for (auto a : this->legal_actions)
+        for (int i = 0; i < legal_action_num; ++i)
         {
+            int a = this->legal_action(i);
             if (policy_max < policy_logits[a])
             {
                 policy_max = policy_logits[a];
             }
         }
 
-        for (auto a : this->legal_actions)
+        for (int i = 0; i < legal_action_num; ++i)
         {
+            int a = this->legal_action(i);
             temp_policy = exp(policy_logits[a] - policy_max);
             policy_sum += temp_policy;
             policy[a] = temp_policy;
         }
 
         float prior;
-        for (auto a : this->legal_actions)
+        std::vector<int> tmp_empty;
+        for (int i = 0; i < legal_action_num; ++i)
         {
+            int a = this->legal_action(i);
             prior = policy[a] / policy_sum;
-            std::vector<int> tmp_empty;
             this->children[a] = CNode(prior, tmp_empty); // only for muzero/efficient zero, not support alphazero
         }
         
@@ -156,10 +163,10 @@ namespace tree
             - noises: the vector of noises added to each child node.
         */
         float noise, prior;
-        for (int i = 0; i < this->legal_actions.size(); ++i)
+        for (int i = 0; i < this->legal_action_num(); ++i)
         {
             noise = noises[i];
-            CNode *child = this->get_child(this->legal_actions[i]);
+            CNode *child = this->get_child(this->legal_action(i));
 
             prior = child->prior;
             child->prior = prior * (1 - exploration_fraction) + noise * exploration_fraction;
@@ -178,9 +185,9 @@ namespace tree
         */
         float total_unsigned_q = 0.0;
         int total_visits = 0;
-        for (auto a : this->legal_actions)
+        for (int i = 0; i < this->legal_action_num(); ++i)
         {
-            CNode *child = this->get_child(a);
+            CNode *child = this->get_child(this->legal_action(i));
             if (child->visit_count > 0)
             {
                 float true_reward = child->reward;
@@ -213,7 +220,7 @@ namespace tree
         Overview:
             Return whether the current node is expanded.
         */
-        return this->children.size() > 0;
+        return this->children != nullptr;
     }
 
     float CNode::value()
@@ -267,9 +274,9 @@ namespace tree
         std::vector<int> distribution;
         if (this->expanded())
         {
-            for (auto a : this->legal_actions)
+            for (int i = 0; i < this->legal_action_num(); ++i)
             {
-                CNode *child = this->get_child(a);
+                CNode *child = this->get_child(this->legal_action(i));
                 distribution.push_back(child->visit_count);
             }
         }
@@ -287,6 +294,53 @@ namespace tree
         return &(this->children[action]);
     }
 
+    void CNode::copy_subtree(CNode &node, CArena &arena)
+    {
+        /*
+        Overview:
+            Copy the current node into ``node``, with the children of the expanded nodes of its subtree allocated in \
+            ``arena``.
+        Arguments:
+            - node: the node to copy the current node into.
+            - arena: the arena where the children of the copied nodes are allocated.
+        */
+        node = *this;
+        if (!this->expanded())
+        {
+            return;
+        }
+        node.children = arena.allocate(this->action_num);
+        for (int i = 0; i < this->legal_action_num(); ++i)
+        {
+            int a = this->legal_action(i);
+            this->children[a].copy_subtree(node.children[a], arena);
+        }
+    }
+
+    void CNode::reindex(int batch_index, std::vector<std::vector<int> > &latent_state_indices)
+    {
+        /*
+        Overview:
+            Reindex the latent states of the expanded nodes in the subtree of the current node in depth-first order, \
+            so that the k-th node uses the latent state at (k, batch_index) in the next search.
+        Arguments:
+            - batch_index: the index of the current node in the batch of roots of the next search.
+            - latent_state_indices: the old current_latent_state_index and batch_index of the reindexed nodes.
+        */
+        latent_state_indices[0].push_back(this->current_latent_state_index);
+        latent_state_indices[1].push_back(this->batch_index);
+        this->current_latent_state_index = latent_state_indices[0].size() - 1;
+        this->batch_index = batch_index;
+        for (int i = 0; i < this->legal_action_num(); ++i)
+        {
+            CNode *child = this->get_child(this->legal_action(i));
+            if (child->expanded())
+            {
+                child->reindex(batch_index, latent_state_indices);
+            }
+        }
+    }
+
     //*********************************************************
 
     CRoots::CRoots()
@@ -332,7 +386,7 @@ namespace tree
         */
         for (int i = 0; i < this->root_num; ++i)
         {
-            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i]);
+            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i], this->arena);
             this->roots[i].add_exploration_noise(root_noise_weight, noises[i]);
 
             this->roots[i].visit_count += 1;
@@ -351,7 +405,7 @@ namespace tree
         */
         for (int i = 0; i < this->root_num; ++i)
         {
-            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i]);
+            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i], this->arena);
 
             this->roots[i].visit_count += 1;
         }
@@ -364,6 +418,24 @@ namespace tree
             Clear the roots vector.
         */
         this->roots.clear();
+        this->arena.reset();
+    }
+
+    void CRoots::reserve(int num_simulations)
+    {
+        /*
+        Overview:
+            Preallocate the nodes of a search of ``num_simulations`` simulations from the expanded roots, i.e. the \
+            children of the nodes expanded in each simulation.
+        Arguments:
+            - num_simulations: the number of simulations of the search.
+        */
+        size_t num_nodes = 0;
+        for (int i = 0; i < this->root_num; ++i)
+        {
+            num_nodes += (size_t)num_simulations * this->roots[i].action_num;
+        }
+        this->arena.reserve(num_nodes);
     }
 
     std::vector<std::vector<int> > CRoots::get_trajectories()
@@ -416,6 +488,72 @@ namespace tree
         return values;
     }
 
+    std::vector<std::vector<int> > CRoots::reuse(int index, CRoots *roots, int root_index, int action, float root_noise_weight, const std::vector<float> &noises)
+    {
+        /*
+        Overview:
+            Replace the root at ``index`` with the subtree of the chosen action of a root of the previous search, \
+            keeping its visit counts and values. The subtree is reused only if it is expanded and none of its visited \
+            children is illegal at the new root.
+        Arguments:
+            - index: the index of the root to replace.
+            - roots: the roots of the previous search.
+            - root_index: the index of the previous root.
+            - action: the action taken at the previous root.
+            - root_noise_weight: the exploration fraction of the noise added to the new root, 0 means no noise.
+            - noises: the vector of noise added to the new root.
+        Returns:
+            - latent_state_indices: the old current_latent_state_index and batch_index of the nodes of the subtree, \
+                whose latent states are used at (k, index) in the next search, with k the position in the vectors. \
+                They are empty if the subtree is not reused.
+        */
+        std::vector<std::vector<int> > latent_state_indices(2);
+        CNode *parent = &(roots->roots[root_index]);
+        if (!parent->expanded() || action < 0 || action >= parent->action_num || !parent->get_child(action)->expanded())
+        {
+            return latent_state_indices;
+        }
+        CNode *node = parent->get_child(action);
+        std::vector<int> &legal_actions = this->legal_actions_list[index];
+        float prior_sum = 0.0;
+        int legal_visit_count = 0;
+        for (auto a : legal_actions)
+        {
+            if (a < 0 || a >= node->action_num)
+            {
+                return latent_state_indices;
+            }
+            prior_sum += node->get_child(a)->prior;
+            legal_visit_count += node->get_child(a)->visit_count;
+        }
+        if (legal_visit_count != node->visit_count - 1 || prior_sum <= 0)
+        {
+            return latent_state_indices;
+        }
+
+        // copy the subtrees of the legal children into the arena of the new roots, and renormalize their priors as
+        // ``expand`` does at the roots
+        CNode &root = this->roots[index];
+        root = *node;
+        // the reward of the action taken is not part of the search from the new root, whose reward is 0 as the one of
+        // a fresh root, so that it is not added to the min-max statistics in ``cbackpropagate``
+        root.reward = 0;
+        root.legal_actions = legal_actions;
+        root.children = this->arena.allocate(node->action_num);
+        for (auto a : legal_actions)
+        {
+            node->get_child(a)->copy_subtree(root.children[a], this->arena);
+            root.children[a].prior /= prior_sum;
+        }
+
+        root.reindex(index, latent_state_indices);
+        if (root_noise_weight > 0)
+        {
+            this->roots[index].add_exploration_noise(root_noise_weight, noises);
+        }
+        return latent_state_indices;
+    }
+
     void cbackpropagate(std::vector<CNode *> &search_path, tools::CMinMaxStats &min_max_stats, int to_play, float value, float discount_factor)
     {
         /*
@@ -494,7 +632,7 @@ namespace tree
         */
         for (int i = 0; i < results.num; ++i)
         {
-            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, rewards[i], policies[i]);
+            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, rewards[i], policies[i], *results.arena);
             cbackpropagate(results.search_paths[i], min_max_stats_lst->stats_lst[i], to_play_batch[i], values[i], discount_factor);
         }
     }
@@ -518,9 +656,9 @@ namespace tree
         float max_score = FLOAT_MIN;
         const float epsilon = 0.000001;
         std::vector<int> max_index_lst;
-        for (auto a : root->legal_actions)
+        for (int i = 0; i < root->legal_action_num(); ++i)
         {
-
+            int a = root->legal_action(i);
             CNode *child = root->get_child(a);
             float temp_score = cucb_score(child, min_max_stats, mean_q, root->visit_count - 1, pb_c_base, pb_c_init, discount_factor, players);
 
@@ -612,6 +750,7 @@ namespace tree
         int last_action = -1;
         float parent_q = 0.0;
         results.search_lens = std::vector<int>();
+        results.arena = &(roots->arena);
 
         int players = 0;
         int largest_element = *max_element(virtual_to_play_batch.begin(), virtual_to_play_batch.end()); // 0 or 2
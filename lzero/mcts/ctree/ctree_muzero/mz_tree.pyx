@@ -47,6 +47,13 @@ cdef class Roots:
     def get_values(self):
         return self.roots[0].get_values()
 
+    def reuse(self, int index, Roots roots, int root_index, int action, float root_noise_weight=0, list noises=None):
+        cdef vector[float] cnoises = [] if noises is None else noises
+        return self.roots[0].reuse(index, roots.roots, root_index, action, root_noise_weight, cnoises)
+
+    def reserve(self, int num_simulations):
+        self.roots[0].reserve(num_simulations)
+
     def clear(self):
         self.roots[0].clear()
 
@@ -59,6 +66,7 @@ cdef class Roots:
 
 cdef class Node:
     cdef CNode cnode
+    cdef CArena arena
 
     def __cinit__(self):
         pass
@@ -69,7 +77,7 @@ cdef class Node:
     def expand(self, int to_play, int current_latent_state_index, int batch_index, float value_prefix,
                list policy_logits):
         cdef vector[float] cpolicy = policy_logits
-        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy)
+        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy, self.arena)
 
 def batch_backpropagate(int current_latent_state_index, float discount_factor, list value_prefixs, list values, list policies,
                          MinMaxStatsList min_max_stats_lst, ResultsWrapper results, list to_play_batch):
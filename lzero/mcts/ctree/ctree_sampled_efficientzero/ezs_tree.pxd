@@ -31,6 +31,9 @@ cdef extern from "lib/cnode.cpp":
 
 
 cdef extern from "lib/cnode.h" namespace "tree":
+    cdef cppclass CArena:
+        CArena() except +
+
     cdef cppclass CAction:
         CAction() except +
         CAction(vector[float] value, int is_root_action)  except +
@@ -49,7 +52,8 @@ cdef extern from "lib/cnode.h" namespace "tree":
         float value_prefixs, prior, value_sum, parent_value_prefix
         vector[CNode]* ptr_node_pool;
 
-        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs, vector[float] policy_logits)
+        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs, vector[float] policy_logits, CArena &arena)
+        void expand_with_sampled_actions(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const float *sampled_actions, const float *sampled_priors, int action_dim, CArena &arena)
         void add_exploration_noise(float exploration_fraction, vector[float] noises)
         float compute_mean_q(int isRoot, float parent_q, float discount_factor)
 
@@ -69,7 +73,9 @@ cdef extern from "lib/cnode.h" namespace "tree":
 
         void prepare(float root_noise_weight, const vector[vector[float]] &noises, const vector[float] &value_prefixs, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void prepare_no_noise(const vector[float] &value_prefixs, const vector[vector[float]] &policies, vector[int] to_play_batch)
+        void prepare_with_sampled_actions(float root_noise_weight, const vector[vector[float]] &noises, const vector[float] &value_prefixs, const float *sampled_actions, const float *sampled_priors, int action_dim, vector[int] to_play_batch)
         void clear()
+        void reserve(int num_simulations)
         vector[vector[vector[float]]] get_trajectories()
         vector[vector[int]] get_distributions()
         vector[vector[vector[float]]] get_sampled_actions()
@@ -87,4 +93,6 @@ cdef extern from "lib/cnode.h" namespace "tree":
     cdef void cbackpropagate(vector[CNode*] &search_path, CMinMaxStats &min_max_stats, int to_play, float value, float discount_factor)
     void cbatch_backpropagate(int current_latent_state_index, float discount_factor, vector[float] value_prefixs, vector[float] values, vector[vector[float]] policies,
                                CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, vector[int] is_reset_list, vector[int] &to_play_batch)
+    void cbatch_backpropagate_with_sampled_actions(int current_latent_state_index, float discount_factor, vector[float] value_prefixs, vector[float] values, const float *sampled_actions, const float *sampled_priors, int action_dim,
+                                                   CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, vector[int] is_reset_list, vector[int] &to_play_batch)
     void cbatch_traverse(CRoots *roots, int pb_c_base, float pb_c_init, float discount_factor, CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, vector[int] &virtual_to_play_batch, bool continuous_action_space)
@@ -61,6 +61,17 @@ cdef class Roots:
     def prepare_no_noise(self, list value_prefix_pool, list policy_logits_pool, vector[int] & to_play_batch):
         self.roots[0].prepare_no_noise(value_prefix_pool, policy_logits_pool, to_play_batch)
 
+    def prepare_with_sampled_actions(self, float root_noise_weight, list noises, list value_prefix_pool,
+                                     float[:, :, ::1] sampled_actions, float[:, ::1] sampled_priors,
+                                     vector[int] & to_play_batch):
+        # the sampled actions and their priors of the roots, of shape (root_num, num_of_sampled_actions, action_dim)
+        # and (root_num, num_of_sampled_actions). An empty ``noises`` means no exploration noise.
+        if sampled_actions.shape[0] != self.root_num or sampled_actions.shape[1] != self.num_of_sampled_actions or \
+                sampled_priors.shape[0] != self.root_num or sampled_priors.shape[1] != self.num_of_sampled_actions:
+            raise ValueError('the sampled actions must have the shape (root_num, num_of_sampled_actions, action_dim)')
+        self.roots[0].prepare_with_sampled_actions(root_noise_weight, noises, value_prefix_pool, &sampled_actions[0, 0, 0],
+                                                   &sampled_priors[0, 0], sampled_actions.shape[2], to_play_batch)
+
     def get_trajectories(self):
         return self.roots[0].get_trajectories()
 
@@ -73,6 +84,9 @@ cdef class Roots:
     def get_values(self):
         return self.roots[0].get_values()
 
+    def reserve(self, int num_simulations):
+        self.roots[0].reserve(num_simulations)
+
     def clear(self):
         self.roots[0].clear()
 
@@ -85,6 +99,7 @@ cdef class Roots:
 
 cdef class Node:
     cdef CNode cnode
+    cdef CArena arena
     cdef bool continuous_action_space
 
     def __cinit__(self):
@@ -98,7 +113,7 @@ cdef class Node:
     def expand(self, int to_play, int current_latent_state_index, int batch_index, float value_prefix,
                list policy_logits):
         cdef vector[float] cpolicy = policy_logits
-        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy)
+        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy, self.arena)
 
 def batch_backpropagate(int current_latent_state_index, float discount_factor, list value_prefixs, list values, list policies,
                          MinMaxStatsList min_max_stats_lst, ResultsWrapper results, list is_reset_list,
@@ -111,6 +126,23 @@ def batch_backpropagate(int current_latent_state_index, float discount_factor, l
     cbatch_backpropagate(current_latent_state_index, discount_factor, cvalue_prefixs, cvalues, cpolicies,
                           min_max_stats_lst.cmin_max_stats_lst, results.cresults, is_reset_list, to_play_batch)
 
+def batch_backpropagate_with_sampled_actions(int current_latent_state_index, float discount_factor, list value_prefixs,
+                                             list values, float[:, :, ::1] sampled_actions, float[:, ::1] sampled_priors,
+                                             MinMaxStatsList min_max_stats_lst, ResultsWrapper results,
+                                             list is_reset_list, list to_play_batch):
+    # the sampled actions and their priors of the leaf nodes, of shape (num, num_of_sampled_actions, action_dim) and
+    # (num, num_of_sampled_actions), which replace the sampling of ``CNode::expand`` from the policy logits.
+    cdef vector[float] cvalue_prefixs = value_prefixs
+    cdef vector[float] cvalues = values
+    if sampled_actions.shape[0] != results.cresults.num or sampled_priors.shape[0] != results.cresults.num or \
+            sampled_actions.shape[1] != sampled_priors.shape[1]:
+        raise ValueError('the sampled actions must have the shape (num, num_of_sampled_actions, action_dim)')
+
+    cbatch_backpropagate_with_sampled_actions(current_latent_state_index, discount_factor, cvalue_prefixs, cvalues,
+                                              &sampled_actions[0, 0, 0], &sampled_priors[0, 0], sampled_actions.shape[2],
+                                              min_max_stats_lst.cmin_max_stats_lst, results.cresults, is_reset_list,
+                                              to_play_batch)
+
 def batch_traverse(Roots roots, int pb_c_base, float pb_c_init, float discount_factor, MinMaxStatsList min_max_stats_lst,
                    ResultsWrapper results, list virtual_to_play_batch, bool continuous_action_space):
     cbatch_traverse(roots.roots, pb_c_base, pb_c_init, discount_factor, min_max_stats_lst.cmin_max_stats_lst, results.cresults,
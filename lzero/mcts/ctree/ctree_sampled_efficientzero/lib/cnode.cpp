@@ -119,6 +119,7 @@ namespace tree
             Initialization of CSearchResults, the default result number is set to 0.
         */
         this->num = 0;
+        this->arena = nullptr;
     }
 
     CSearchResults::CSearchResults(int num)
@@ -128,6 +129,7 @@ namespace tree
             Initialization of CSearchResults with result number.
         */
         this->num = num;
+        this->arena = nullptr;
         for (int i = 0; i < num; ++i)
         {
             this->search_paths.push_back(std::vector<CNode *>());
@@ -158,6 +160,7 @@ namespace tree
         this->to_play = 0;
         this->value_prefix = 0.0;
         this->parent_value_prefix = 0.0;
+        this->children = nullptr;
     }
 
     CNode::CNode(float prior, std::vector<CAction> &legal_actions, int action_space_size, int num_of_sampled_actions, bool continuous_action_space)
@@ -186,12 +189,13 @@ namespace tree
         this->parent_value_prefix = 0.0;
         this->current_latent_state_index = -1;
         this->batch_index = -1;
+        this->children = nullptr;
     }
 
     CNode::~CNode() {}
 
 
-    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const std::vector<float> &policy_logits)
+    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const std::vector<float> &policy_logits, CArena &arena)
     {
         /*
         Overview:
@@ -202,6 +206,7 @@ namespace tree
             - batch_index: the y/second index of hidden state vector of the current node, i.e. the index of batch root node, its maximum is ``batch_size``/``env_num``.
             - value_prefix: the value prefix of the current node.
             - policy_logits: the logit of the child nodes.
+            - arena: the arena where the child nodes are allocated.
         */
         this->to_play = to_play;
         this->current_latent_state_index = current_latent_state_index;
@@ -419,31 +424,25 @@ namespace tree
             disc_action_with_probs.clear(); // Empty the collection to prepare for the next sampling.
         }
 
-        float prior;
+        // flatten the sampled actions and their priors, i.e. the log-probs after tanh (continuous) or the probs (discrete)
+        int action_dim = this->continuous_action_space == true ? this->action_space_size : 1;
+        std::vector<float> flat_sampled_actions;
+        std::vector<float> sampled_priors;
         for (int i = 0; i < this->num_of_sampled_actions; ++i)
         {
-
             if (this->continuous_action_space == true)
             {
-                CAction action = CAction(sampled_actions_after_tanh[i], 0);
-                std::vector<CAction> legal_actions;
-                this->children[action.get_combined_hash()] = CNode(sampled_actions_log_probs_after_tanh[i], legal_actions, this->action_space_size, this->num_of_sampled_actions, this->continuous_action_space); // only for muzero/efficient zero, not support alphazero
-                this->legal_actions.push_back(action);
+                flat_sampled_actions.insert(flat_sampled_actions.end(), sampled_actions_after_tanh[i].begin(), sampled_actions_after_tanh[i].end());
+                sampled_priors.push_back(sampled_actions_log_probs_after_tanh[i]);
             }
             else
             {
-                std::vector<float> sampled_action_tmp;
-                for (size_t iter = 0; iter < 1; iter++)
-                {
-                    sampled_action_tmp.push_back(float(sampled_actions[i]));
-                }
-                CAction action = CAction(sampled_action_tmp, 0);
-                std::vector<CAction> legal_actions;
-                this->children[action.get_combined_hash()] = CNode(sampled_actions_probs[i], legal_actions, this->action_space_size, this->num_of_sampled_actions, this->continuous_action_space); // only for muzero/efficient zero, not support alphazero
-                this->legal_actions.push_back(action);
+                flat_sampled_actions.push_back(float(sampled_actions[i]));
+                sampled_priors.push_back(sampled_actions_probs[i]);
             }
         }
-        
+        this->expand_with_sampled_actions(to_play, current_latent_state_index, batch_index, value_prefix, flat_sampled_actions.data(), sampled_priors.data(), action_dim, arena);
+
         #ifdef _WIN32
         // 释放数组内存
         delete[] policy;
@@ -451,6 +450,45 @@ namespace tree
         #endif
     }
 
+    void CNode::expand_with_sampled_actions(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const float *sampled_actions, const float *sampled_priors, int action_dim, CArena &arena)
+    {
+        /*
+        Overview:
+            Expand the child nodes of the current node with the given ``num_of_sampled_actions`` sampled actions, \
+            which are sampled outside the tree, e.g. for all the leaf nodes of a simulation at once.
+        Arguments:
+            - to_play: which player to play the game in the current node.
+            - current_latent_state_index: the x/first index of hidden state vector of the current node, i.e. the search depth.
+            - batch_index: the y/second index of hidden state vector of the current node, i.e. the index of batch root node, its maximum is ``batch_size``/``env_num``.
+            - value_prefix: the value prefix of the current node.
+            - sampled_actions: the contiguous ``(num_of_sampled_actions, action_dim)`` array of the sampled actions, \
+                i.e. the actions after tanh (continuous) or the action indices (discrete, ``action_dim=1``).
+            - sampled_priors: the ``num_of_sampled_actions`` priors of the sampled actions, i.e. the log-probs after tanh \
+                (continuous) or the probs (discrete).
+            - action_dim: the dimension of the sampled actions.
+            - arena: the arena where the child nodes are allocated.
+        */
+        this->to_play = to_play;
+        this->current_latent_state_index = current_latent_state_index;
+        this->batch_index = batch_index;
+        this->value_prefix = value_prefix;
+        if (this->continuous_action_space == true)
+        {
+            this->action_space_size = action_dim;
+        }
+
+        // the sampled actions are the legal actions of the expanded node, with the i-th child for the i-th action
+        this->children = arena.allocate(this->num_of_sampled_actions);
+        this->legal_actions.clear();
+        for (int i = 0; i < this->num_of_sampled_actions; ++i)
+        {
+            std::vector<float> action_value(sampled_actions + i * action_dim, sampled_actions + (i + 1) * action_dim);
+            std::vector<CAction> legal_actions;
+            this->children[i] = CNode(sampled_priors[i], legal_actions, this->action_space_size, this->num_of_sampled_actions, this->continuous_action_space); // only for muzero/efficient zero, not support alphazero
+            this->legal_actions.push_back(CAction(action_value, 0));
+        }
+    }
+
     void CNode::add_exploration_noise(float exploration_fraction, const std::vector<float> &noises)
     {
         /*
@@ -465,7 +503,7 @@ namespace tree
         {
 
             noise = noises[i];
-            CNode *child = this->get_child(this->legal_actions[i]);
+            CNode *child = &(this->children[i]);
             prior = child->prior;
             if (this->continuous_action_space == true)
             {
@@ -493,9 +531,9 @@ namespace tree
         float total_unsigned_q = 0.0;
         int total_visits = 0;
         float parent_value_prefix = this->value_prefix;
-        for (auto a : this->legal_actions)
+        for (int i = 0; i < this->legal_actions.size(); ++i)
         {
-            CNode *child = this->get_child(a);
+            CNode *child = &(this->children[i]);
             if (child->visit_count > 0)
             {
                 float true_reward = child->value_prefix - parent_value_prefix;
@@ -532,7 +570,7 @@ namespace tree
         Overview:
             Return whether the current node is expanded.
         */
-        return this->children.size() > 0;
+        return this->children != nullptr;
     }
 
     float CNode::value()
@@ -591,9 +629,9 @@ namespace tree
         std::vector<int> distribution;
         if (this->expanded())
         {
-            for (auto a : this->legal_actions)
+            for (int i = 0; i < this->legal_actions.size(); ++i)
             {
-                CNode *child = this->get_child(a);
+                CNode *child = &(this->children[i]);
                 distribution.push_back(child->visit_count);
             }
         }
@@ -608,10 +646,14 @@ namespace tree
         Arguments:
             - action: the action to get child.
         */
-        return &(this->children[action.get_combined_hash()]);
-        // TODO(pu): no hash
-        // return &(this->children[action]);
-        // return &(this->children[action.value[0]]);
+        for (int i = 0; i < this->legal_actions.size(); ++i)
+        {
+            if (this->legal_actions[i].value == action.value)
+            {
+                return &(this->children[i]);
+            }
+        }
+        return nullptr;
     }
 
     //*********************************************************
@@ -690,7 +732,7 @@ namespace tree
         // sampled related core code
         for (int i = 0; i < this->root_num; ++i)
         {
-            this->roots[i].expand(to_play_batch[i], 0, i, value_prefixs[i], policies[i]);
+            this->roots[i].expand(to_play_batch[i], 0, i, value_prefixs[i], policies[i], this->arena);
             this->roots[i].add_exploration_noise(root_noise_weight, noises[i]);
             this->roots[i].visit_count += 1;
         }
@@ -708,15 +750,53 @@ namespace tree
         */
         for (int i = 0; i < this->root_num; ++i)
         {
-            this->roots[i].expand(to_play_batch[i], 0, i, value_prefixs[i], policies[i]);
+            this->roots[i].expand(to_play_batch[i], 0, i, value_prefixs[i], policies[i], this->arena);
 
             this->roots[i].visit_count += 1;
         }
     }
 
+    void CRoots::prepare_with_sampled_actions(float root_noise_weight, const std::vector<std::vector<float> > &noises, const std::vector<float> &value_prefixs, const float *sampled_actions, const float *sampled_priors, int action_dim, std::vector<int> &to_play_batch)
+    {
+        /*
+        Overview:
+            Expand the roots with the given sampled actions, and add noises if ``noises`` is not empty.
+        Arguments:
+            - root_noise_weight: the exploration fraction of roots
+            - noises: the vector of noise add to the roots, or an empty vector for no noise.
+            - value_prefixs: the vector of value prefixs of each root.
+            - sampled_actions: the contiguous ``(root_num, num_of_sampled_actions, action_dim)`` array of the sampled actions.
+            - sampled_priors: the contiguous ``(root_num, num_of_sampled_actions)`` array of the priors of the sampled actions.
+            - action_dim: the dimension of the sampled actions.
+            - to_play_batch: the vector of the player side of each root.
+        */
+        for (int i = 0; i < this->root_num; ++i)
+        {
+            this->roots[i].expand_with_sampled_actions(to_play_batch[i], 0, i, value_prefixs[i], sampled_actions + (size_t)i * this->num_of_sampled_actions * action_dim, sampled_priors + (size_t)i * this->num_of_sampled_actions, action_dim, this->arena);
+            if (!noises.empty())
+            {
+                this->roots[i].add_exploration_noise(root_noise_weight, noises[i]);
+            }
+            this->roots[i].visit_count += 1;
+        }
+    }
+
     void CRoots::clear()
     {
         this->roots.clear();
+        this->arena.reset();
+    }
+
+    void CRoots::reserve(int num_simulations)
+    {
+        /*
+        Overview:
+            Preallocate the nodes of a search of ``num_simulations`` simulations from the expanded roots, i.e. the \
+            children of the nodes expanded in each simulation.
+        Arguments:
+            - num_simulations: the number of simulations of the search.
+        */
+        this->arena.reserve((size_t)num_simulations * this->root_num * this->num_of_sampled_actions);
     }
 
     std::vector<std::vector<std::vector<float> > > CRoots::get_trajectories()
@@ -843,9 +923,9 @@ namespace tree
                 min_max_stats.update(qsa);
             }
 
-            for (auto a : node->legal_actions)
+            for (int i = 0; i < node->legal_actions.size(); ++i)
             {
-                CNode *child = node->get_child(a);
+                CNode *child = &(node->children[i]);
                 if (child->expanded())
                 {
                     child->parent_value_prefix = node->value_prefix;
@@ -962,7 +1042,36 @@ namespace tree
         */
         for (int i = 0; i < results.num; ++i)
         {
-            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, value_prefixs[i], policies[i]);
+            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, value_prefixs[i], policies[i], *results.arena);
+            // reset
+            results.nodes[i]->is_reset = is_reset_list[i];
+
+            cbackpropagate(results.search_paths[i], min_max_stats_lst->stats_lst[i], to_play_batch[i], values[i], discount_factor);
+        }
+    }
+
+    void cbatch_backpropagate_with_sampled_actions(int current_latent_state_index, float discount_factor, const std::vector<float> &value_prefixs, const std::vector<float> &values, const float *sampled_actions, const float *sampled_priors, int action_dim, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, std::vector<int> is_reset_list, std::vector<int> &to_play_batch)
+    {
+        /*
+        Overview:
+            Expand the leaf nodes with the given sampled actions and update the infos along the search path.
+        Arguments:
+            - current_latent_state_index: The index of latent state of the leaf node in the search path.
+            - discount_factor: the discount factor of reward.
+            - value_prefixs: the value prefixs of nodes along the search path.
+            - values: the values to propagate along the search path.
+            - sampled_actions: the contiguous ``(num, num_of_sampled_actions, action_dim)`` array of the sampled actions of the leaf nodes.
+            - sampled_priors: the contiguous ``(num, num_of_sampled_actions)`` array of the priors of the sampled actions.
+            - action_dim: the dimension of the sampled actions.
+            - min_max_stats: a tool used to min-max normalize the q value.
+            - results: the search results.
+            - is_reset_list: the vector of is_reset nodes along the search path, where is_reset represents for whether the parent value prefix needs to be reset.
+            - to_play_batch: the batch of which player is playing on this node.
+        */
+        for (int i = 0; i < results.num; ++i)
+        {
+            size_t num_of_sampled_actions = results.nodes[i]->num_of_sampled_actions;
+            results.nodes[i]->expand_with_sampled_actions(to_play_batch[i], current_latent_state_index, i, value_prefixs[i], sampled_actions + i * num_of_sampled_actions * action_dim, sampled_priors + i * num_of_sampled_actions, action_dim, *results.arena);
             // reset
             results.nodes[i]->is_reset = is_reset_list[i];
 
@@ -992,10 +1101,10 @@ namespace tree
         float max_score = FLOAT_MIN;
         const float epsilon = 0.000001;
         std::vector<CAction> max_index_lst;
-        for (auto a : root->legal_actions)
+        for (int i = 0; i < root->legal_actions.size(); ++i)
         {
-
-            CNode *child = root->get_child(a);
+            CAction &a = root->legal_actions[i];
+            CNode *child = &(root->children[i]);
             // sampled related core code
             float temp_score = cucb_score(root, child, min_max_stats, mean_q, root->is_reset, root->visit_count - 1, root->value_prefix, pb_c_base, pb_c_init, discount_factor, players, continuous_action_space);
 
@@ -1057,25 +1166,25 @@ namespace tree
             if (continuous_action_space == true)
             {
                 float empirical_prob_sum = 0;
-                for (int i = 0; i < parent->children.size(); ++i)
+                for (int i = 0; i < parent->legal_actions.size(); ++i)
                 {
-                    empirical_prob_sum += exp(parent->get_child(parent->legal_actions[i])->prior);
+                    empirical_prob_sum += exp(parent->children[i].prior);
                 }
                 prior_score = pb_c * exp(child->prior) / (empirical_prob_sum + 1e-6);
             }
             else
             {
                 float empirical_prob_sum = 0;
-                for (int i = 0; i < parent->children.size(); ++i)
+                for (int i = 0; i < parent->legal_actions.size(); ++i)
                 {
-                    empirical_prob_sum += parent->get_child(parent->legal_actions[i])->prior;
+                    empirical_prob_sum += parent->children[i].prior;
                 }
                 prior_score = pb_c * child->prior / (empirical_prob_sum + 1e-6);
             }
         }
         else if (empirical_distribution_type.compare("uniform"))
         {
-            prior_score = pb_c * 1 / parent->children.size();
+            prior_score = pb_c * 1 / parent->legal_actions.size();
         }
         // sampled related core code
         if (child->visit_count == 0)
@@ -1134,6 +1243,7 @@ namespace tree
         std::vector<float> last_action;
         float parent_q = 0.0;
         results.search_lens = std::vector<int>();
+        results.arena = &(roots->arena);
 
         int players = 0;
         int largest_element = *max_element(virtual_to_play_batch.begin(), virtual_to_play_batch.end()); // 0 or 2
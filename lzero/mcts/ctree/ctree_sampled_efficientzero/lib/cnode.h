@@ -4,6 +4,7 @@
 #define CNODE_H
 
 #include "../../common_lib/cminimax.h"
+#include "../../common_lib/cnode_arena.h"
 #include <math.h>
 #include <vector>
 #include <stack>
@@ -34,6 +35,9 @@ namespace tree
         std::size_t get_combined_hash(void);
     };
 
+    class CNode;
+    typedef tools::CNodeArena<CNode> CArena;
+
     class CNode
     {
     public:
@@ -44,8 +48,8 @@ namespace tree
         float value_prefix, prior, value_sum;
         float parent_value_prefix;
         bool continuous_action_space;
-        std::vector<int> children_index;
-        std::map<size_t, CNode> children;
+        // The children of an expanded node, one per sampled action of legal_actions, in a contiguous block of the arena.
+        CNode *children;
 
         std::vector<CAction> legal_actions;
 
@@ -54,7 +58,8 @@ namespace tree
         CNode(float prior, std::vector<CAction> &legal_actions, int action_space_size, int num_of_sampled_actions, bool continuous_action_space);
         ~CNode();
 
-        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const std::vector<float> &policy_logits);
+        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const std::vector<float> &policy_logits, CArena &arena);
+        void expand_with_sampled_actions(int to_play, int current_latent_state_index, int batch_index, float value_prefix, const float *sampled_actions, const float *sampled_priors, int action_dim, CArena &arena);
         void add_exploration_noise(float exploration_fraction, const std::vector<float> &noises);
         float compute_mean_q(int isRoot, float parent_q, float discount_factor);
         void print_out();
@@ -78,6 +83,7 @@ namespace tree
         std::vector<CNode> roots;
         std::vector<std::vector<float> > legal_actions_list;
         bool continuous_action_space;
+        CArena arena;
 
         CRoots();
         CRoots(int root_num, std::vector<std::vector<float> > legal_actions_list, int action_space_size, int num_of_sampled_actions, bool continuous_action_space);
@@ -85,7 +91,9 @@ namespace tree
 
         void prepare(float root_noise_weight, const std::vector<std::vector<float> > &noises, const std::vector<float> &value_prefixs, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
         void prepare_no_noise(const std::vector<float> &value_prefixs, const std::vector<std::vector<float> > &policies, std::vector<int> &to_play_batch);
+        void prepare_with_sampled_actions(float root_noise_weight, const std::vector<std::vector<float> > &noises, const std::vector<float> &value_prefixs, const float *sampled_actions, const float *sampled_priors, int action_dim, std::vector<int> &to_play_batch);
         void clear();
+        void reserve(int num_simulations);
         // sampled related core code
         std::vector<std::vector<std::vector<float> > > get_trajectories();
         std::vector<std::vector<std::vector<float> > > get_sampled_actions();
@@ -105,6 +113,8 @@ namespace tree
 
         std::vector<CNode *> nodes;
         std::vector<std::vector<CNode *> > search_paths;
+        // The arena of the traversed roots, where the leaf nodes are expanded.
+        CArena *arena;
 
         CSearchResults();
         CSearchResults(int num);
@@ -115,6 +125,7 @@ namespace tree
     void update_tree_q(CNode *root, tools::CMinMaxStats &min_max_stats, float discount_factor, int players);
     void cbackpropagate(std::vector<CNode *> &search_path, tools::CMinMaxStats &min_max_stats, int to_play, float value, float discount_factor);
     void cbatch_backpropagate(int current_latent_state_index, float discount_factor, const std::vector<float> &value_prefixs, const std::vector<float> &values, const std::vector<std::vector<float> > &policies, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, std::vector<int> is_reset_list, std::vector<int> &to_play_batch);
+    void cbatch_backpropagate_with_sampled_actions(int current_latent_state_index, float discount_factor, const std::vector<float> &value_prefixs, const std::vector<float> &values, const float *sampled_actions, const float *sampled_priors, int action_dim, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, std::vector<int> is_reset_list, std::vector<int> &to_play_batch);
     CAction cselect_child(CNode *root, tools::CMinMaxStats &min_max_stats, int pb_c_base, float pb_c_init, float discount_factor, float mean_q, int players, bool continuous_action_space);
     float cucb_score(CNode *parent, CNode *child, tools::CMinMaxStats &min_max_stats, float parent_mean_q, int is_reset, float total_children_visit_counts, float parent_value_prefix, float pb_c_base, float pb_c_init, float discount_factor, int players, bool continuous_action_space);
     void cbatch_traverse(CRoots *roots, int pb_c_base, float pb_c_init, float discount_factor, tools::CMinMaxStatsList *min_max_stats_lst, CSearchResults &results, std::vector<int> &virtual_to_play_batch, bool continuous_action_space);
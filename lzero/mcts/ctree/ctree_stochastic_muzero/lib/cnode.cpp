@@ -30,6 +30,7 @@ namespace tree
             Initialization of CSearchResults, the default result number is set to 0.
         */
         this->num = 0;
+        this->arena = nullptr;
     }
 
     CSearchResults::CSearchResults(int num)
@@ -39,6 +40,7 @@ namespace tree
             Initialization of CSearchResults with result number.
         */
         this->num = num;
+        this->arena = nullptr;
         for (int i = 0; i < num; ++i)
         {
             this->search_paths.push_back(std::vector<CNode *>());
@@ -65,6 +67,8 @@ namespace tree
         this->reward = 0.0;
         this->is_chance = false;
         this->chance_space_size= 2;
+        this->action_num = 0;
+        this->children = nullptr;
 
     }
 
@@ -89,11 +93,14 @@ namespace tree
         this->batch_index = -1;
         this->is_chance = is_chance;
         this->chance_space_size = chance_space_size;
+        this->reward = 0.0;
+        this->action_num = 0;
+        this->children = nullptr;
     }
 
     CNode::~CNode() {}
 
-    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, const std::vector<float> &policy_logits, bool child_is_chance)
+    void CNode::expand(int to_play, int current_latent_state_index, int batch_index, float reward, const std::vector<float> &policy_logits, bool child_is_chance, CArena &arena)
     {
         /*
         Overview:
@@ -104,6 +111,8 @@ namespace tree
             - batch_index: The index of latent state of the leaf node in the search path of the current node.
             - reward: the reward of the current node.
             - policy_logits: the logit of the child nodes.
+            - child_is_chance: whether the child nodes are chance nodes.
+            - arena: the arena where the child nodes are allocated.
         */
         this->to_play = to_play;
         this->current_latent_state_index = current_latent_state_index;
@@ -122,13 +131,9 @@ namespace tree
         }
 
         int action_num = policy_logits.size();
-        if (this->legal_actions.size() == 0)
-        {
-            for (int i = 0; i < action_num; ++i)
-            {
-                this->legal_actions.push_back(i);
-            }
-        }
+        this->action_num = action_num;
+        this->children = arena.allocate(action_num);
+        int legal_action_num = this->legal_action_num();
 
         float temp_policy;
         float policy_sum = 0.0;
@@ -141,26 +146,29 @@ namespace tree
         #endif
 
         float policy_max = FLOAT_MIN;
-        for (auto a : this->legal_actions)
+        for (int i = 0; i < legal_action_num; ++i)
         {
+            int a = this->legal_action(i);
             if (policy_max < policy_logits[a])
             {
                 policy_max = policy_logits[a];
             }
         }
 
-        for (auto a : this->legal_actions)
+        for (int i = 0; i < legal_action_num; ++i)
         {
+            int a = this->legal_action(i);
             temp_policy = exp(policy_logits[a] - policy_max);
             policy_sum += temp_policy;
             policy[a] = temp_policy;
         }
 
         float prior;
-        for (auto a : this->legal_actions)
+        std::vector<int> tmp_empty;
+        for (int i = 0; i < legal_action_num; ++i)
         {
+            int a = this->legal_action(i);
             prior = policy[a] / policy_sum;
-            std::vector<int> tmp_empty;
             this->children[a] = CNode(prior, tmp_empty, child_is_chance, this->chance_space_size); // only for muzero/efficient zero, not support alphazero
             // this->children[a] = CNode(prior, tmp_empty, is_chance = child_is_chance); // only for muzero/efficient zero, not support alphazero
         }
@@ -182,10 +190,10 @@ namespace tree
             - noises: the vector of noises added to each child node.
         */
         float noise, prior;
-        for (int i = 0; i < this->legal_actions.size(); ++i)
+        for (int i = 0; i < this->legal_action_num(); ++i)
         {
             noise = noises[i];
-            CNode *child = this->get_child(this->legal_actions[i]);
+            CNode *child = this->get_child(this->legal_action(i));
 
             prior = child->prior;
             child->prior = prior * (1 - exploration_fraction) + noise * exploration_fraction;
@@ -204,8 +212,9 @@ namespace tree
         */
         float total_unsigned_q = 0.0;
         int total_visits = 0;
-        for (auto a : this->legal_actions)
+        for (int i = 0; i < this->legal_action_num(); ++i)
         {
+            int a = this->legal_action(i);
             CNode *child = this->get_child(a);
             if (child->visit_count > 0)
             {
@@ -239,7 +248,7 @@ namespace tree
         Overview:
             Return whether the current node is expanded.
         */
-        return this->children.size() > 0;
+        return this->children != nullptr;
     }
 
     float CNode::value()
@@ -293,8 +302,9 @@ namespace tree
         std::vector<int> distribution;
         if (this->expanded())
         {
-            for (auto a : this->legal_actions)
+            for (int i = 0; i < this->legal_action_num(); ++i)
             {
+                int a = this->legal_action(i);
                 CNode *child = this->get_child(a);
                 distribution.push_back(child->visit_count);
             }
@@ -360,7 +370,7 @@ namespace tree
         */
         for (int i = 0; i < this->root_num; ++i)
         {
-            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i], true);
+            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i], true, this->arena);
             this->roots[i].add_exploration_noise(root_noise_weight, noises[i]);
 
             this->roots[i].visit_count += 1;
@@ -379,7 +389,7 @@ namespace tree
         */
         for (int i = 0; i < this->root_num; ++i)
         {
-            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i], true);
+            this->roots[i].expand(to_play_batch[i], 0, i, rewards[i], policies[i], true, this->arena);
 
             this->roots[i].visit_count += 1;
         }
@@ -392,6 +402,24 @@ namespace tree
             Clear the roots vector.
         */
         this->roots.clear();
+        this->arena.reset();
+    }
+
+    void CRoots::reserve(int num_simulations)
+    {
+        /*
+        Overview:
+            Preallocate the nodes of a search of ``num_simulations`` simulations from the expanded roots, i.e. the \
+            children of the nodes expanded in each simulation, whose chance nodes have ``chance_space_size`` children.
+        Arguments:
+            - num_simulations: the number of simulations of the search.
+        */
+        size_t num_nodes = 0;
+        for (int i = 0; i < this->root_num; ++i)
+        {
+            num_nodes += (size_t)num_simulations * std::max(this->roots[i].action_num, this->chance_space_size);
+        }
+        this->arena.reserve(num_nodes);
     }
 
     std::vector<std::vector<int> > CRoots::get_trajectories()
@@ -482,8 +510,9 @@ namespace tree
                 min_max_stats.update(qsa);
             }
 
-            for (auto a : node->legal_actions)
+            for (int i = 0; i < node->legal_action_num(); ++i)
             {
+                int a = node->legal_action(i);
                 CNode *child = node->get_child(a);
                 if (child->expanded())
                 {
@@ -585,7 +614,7 @@ namespace tree
         for (int leaf_order = 0; leaf_order < leaf_idx_list.size(); ++leaf_order)
         {
             int i = leaf_idx_list[leaf_order];
-            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, value_prefixs[leaf_order], policies[leaf_order], is_chance_list[i]);
+            results.nodes[i]->expand(to_play_batch[i], current_latent_state_index, i, value_prefixs[leaf_order], policies[leaf_order], is_chance_list[i], *results.arena);
             cbackpropagate(results.search_paths[i], min_max_stats_lst->stats_lst[i], to_play_batch[i], values[leaf_order], discount_factor);
         }
 
@@ -614,9 +643,10 @@ namespace tree
                 std::vector<int> outcomes;
                 std::vector<double> probs;
 
-                for (const auto& kv : root->children) {
-                    outcomes.push_back(kv.first);
-                    probs.push_back(kv.second.prior); // Assuming 'prior' is a member variable of Node
+                for (int i = 0; i < root->legal_action_num(); ++i) {
+                    int a = root->legal_action(i);
+                    outcomes.push_back(a);
+                    probs.push_back(root->get_child(a)->prior); // Assuming 'prior' is a member variable of Node
                 }
 
                 std::random_device rd;
@@ -634,8 +664,9 @@ namespace tree
         float max_score = FLOAT_MIN;
         const float epsilon = 0.000001;
         std::vector<int> max_index_lst;
-        for (auto a : root->legal_actions)
+        for (int i = 0; i < root->legal_action_num(); ++i)
         {
+            int a = root->legal_action(i);
 
             CNode *child = root->get_child(a);
             float temp_score = cucb_score(child, min_max_stats, mean_q, root->visit_count - 1, pb_c_base, pb_c_init, discount_factor, players);
@@ -728,6 +759,7 @@ namespace tree
         int last_action = -1;
         float parent_q = 0.0;
         results.search_lens = std::vector<int>();
+        results.arena = &(roots->arena);
 
         int players = 0;
         int largest_element = *max_element(virtual_to_play_batch.begin(), virtual_to_play_batch.end()); // 0 or 2
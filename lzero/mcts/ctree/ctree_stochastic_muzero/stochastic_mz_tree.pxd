@@ -30,13 +30,16 @@ cdef extern from "lib/cnode.cpp":
 
 
 cdef extern from "lib/cnode.h" namespace "tree":
+    cdef cppclass CArena:
+        CArena() except +
+
     cdef cppclass CNode:
         CNode() except +
         CNode(float prior, vector[int] &legal_actions, bool is_chance, int chance_space_size) except +
         int visit_count, to_play, current_latent_state_index, batch_index, best_action
         float value_prefixs, prior, value_sum, parent_value_prefix
 
-        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs, vector[float] policy_logits, bool is_chance)
+        void expand(int to_play, int current_latent_state_index, int batch_index, float value_prefixs, vector[float] policy_logits, bool is_chance, CArena &arena)
         void add_exploration_noise(float exploration_fraction, vector[float] noises)
         float compute_mean_q(int isRoot, float parent_q, float discount_factor)
 
@@ -55,6 +58,7 @@ cdef extern from "lib/cnode.h" namespace "tree":
         void prepare(float root_noise_weight, const vector[vector[float]] &noises, const vector[float] &value_prefixs, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void prepare_no_noise(const vector[float] &value_prefixs, const vector[vector[float]] &policies, vector[int] to_play_batch)
         void clear()
+        void reserve(int num_simulations)
         vector[vector[int]] get_trajectories()
         vector[vector[int]] get_distributions()
         vector[float] get_values()
@@ -48,6 +48,9 @@ cdef class Roots:
     def get_values(self):
         return self.roots[0].get_values()
 
+    def reserve(self, int num_simulations):
+        self.roots[0].reserve(num_simulations)
+
     def clear(self):
         self.roots[0].clear()
 
@@ -60,6 +63,7 @@ cdef class Roots:
 
 cdef class Node:
     cdef CNode cnode
+    cdef CArena arena
 
     def __cinit__(self):
         pass
@@ -70,7 +74,7 @@ cdef class Node:
     def expand(self, int to_play, int current_latent_state_index, int batch_index, float value_prefix,
                list policy_logits, bool is_chance):
         cdef vector[float] cpolicy = policy_logits
-        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy, is_chance)
+        self.cnode.expand(to_play, current_latent_state_index, batch_index, value_prefix, cpolicy, is_chance, self.arena)
 
 def batch_backpropagate(int current_latent_state_index, float discount_factor, list value_prefixs, list values, list policies,
                          MinMaxStatsList min_max_stats_lst, ResultsWrapper results, list to_play_batch, list is_chance_list, list leaf_idx_list):
@@ -12,7 +12,8 @@ Overview:
 
 import copy
 import math
-from typing import List, Tuple, Union, Callable, Type, Dict, Any
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Union, Callable, Type, Dict, Any
 
 import numpy as np
 import torch
@@ -21,6 +22,101 @@ from ding.envs import BaseEnv
 from easydict import EasyDict
 
 
+class TranspositionEntry(object):
+    """
+    Overview:
+        The entry of a position in the ``TranspositionTable``, shared by all the nodes of the position: the priors of
+        its legal actions and its value given by the network, and its visit count and value sum summed over its nodes.
+    """
+
+    __slots__ = ('priors', 'value', 'visit_count', 'value_sum')
+
+    def __init__(self, priors: Dict[int, float], value: float) -> None:
+        self.priors = priors
+        self.value = value
+        self.visit_count = 0
+        self.value_sum = 0
+
+
+class TranspositionTable(object):
+    """
+    Overview:
+        The transposition table of the MCTS, which caches the network evaluations of the positions reached by the
+        search, across the simulations and the moves, and merges the statistics of the nodes of the same position, as
+        the same position is often reached by different move orders. The positions are identified by their Zobrist
+        hashes. The table keeps at most ``capacity`` positions and evicts the least recently used one when full, and is
+        disabled when ``capacity`` is 0.
+    Interfaces:
+        ``__init__``, ``zobrist_hash``, ``find``, ``get``, ``insert``, ``clear``, ``reset_stats``
+    """
+
+    def __init__(self, capacity: int = 0, seed: int = 0) -> None:
+        self.capacity = max(capacity, 0)
+        self._entries = OrderedDict()
+        # the random keys of the stones of each player on each cell, generated for the first board hashed
+        self._rng = np.random.RandomState(seed)
+        self._stone_keys = None
+        self._player_keys = self._rng.randint(0, 2 ** 63, size=3, dtype=np.uint64)
+        self.num_lookups = 0
+        self.num_hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def zobrist_hash(self, board: np.ndarray, current_player: int) -> int:
+        """
+        Overview:
+            Return the Zobrist hash of a board with ``current_player`` to play, i.e. the xor of the keys of its stones
+            and of the player to play.
+        Arguments:
+            - board (:obj:`np.ndarray`): The board, with 0 for the empty cells and the player 1 or 2 for the stones.
+            - current_player (:obj:`int`): The player to play, 1 or 2.
+        """
+        board = np.asarray(board).reshape(-1)
+        if self._stone_keys is None or len(self._stone_keys) != len(board):
+            self._stone_keys = self._rng.randint(0, 2 ** 63, size=(len(board), 3), dtype=np.uint64)
+            self._stone_keys[:, 0] = 0
+        stones = self._stone_keys[np.arange(len(board)), board.astype(np.int64)]
+        return int(np.bitwise_xor.reduce(stones) ^ self._player_keys[current_player])
+
+    def find(self, key: int) -> Optional[TranspositionEntry]:
+        """
+        Overview:
+            Return the entry of a position and mark it as the most recently used, or None if the position is not in
+            the table. It is counted as a lookup in the statistics.
+        """
+        self.num_lookups += 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.num_hits += 1
+            self._entries.move_to_end(key, last=False)
+        return entry
+
+    def insert(self, key: int, entry: TranspositionEntry) -> None:
+        """
+        Overview:
+            Insert the entry of a new position, and evict the least recently used one if the table is full.
+        """
+        self._entries[key] = entry
+        self._entries.move_to_end(key, last=False)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=True)
+
+    def get(self, key: int) -> Optional[TranspositionEntry]:
+        return self._entries.get(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def reset_stats(self) -> None:
+        self.num_lookups = 0
+        self.num_hits = 0
+
+
 class Node(object):
     """
     Overview:
@@ -49,6 +145,8 @@ class Node(object):
         self._value_sum = 0
         # The prior probability of selecting this node.
         self.prior_p = prior_p
+        # The entry of the node's position in the transposition table, if any.
+        self.transposition_entry = None
 
     @property
     def value(self) -> float:
@@ -58,7 +156,11 @@ class Node(object):
         Returns:
             - output (:obj:`Int`): Current value, used to compute ucb score.
         """
-        # Computes the average value of the current node.
+        # Computes the average value of the current node, or of its position over all the nodes of the position in the
+        # transposition table, when they have more visits.
+        entry = self.transposition_entry
+        if entry is not None and entry.visit_count > self._visit_count:
+            return entry.value_sum / entry.visit_count
         if self._visit_count == 0:
             return 0
         return self._value_sum / self._visit_count
@@ -74,6 +176,9 @@ class Node(object):
         self._visit_count += 1
         # Updates the sum of the values of all child nodes of this node.
         self._value_sum += value
+        if self.transposition_entry is not None:
+            self.transposition_entry.visit_count += 1
+            self.transposition_entry.value_sum += value
 
     def update_recursive(self, leaf_value: float, battle_mode_in_simulation_env: str) -> None:
         """
@@ -196,6 +301,17 @@ class MCTS(object):
 
         self.simulate_env = simulate_env
 
+        # The transposition table of the positions evaluated by the searches, kept across the moves. It is only used
+        # in the deterministic self-play simulation, i.e. without random or expert agent moves, where the position
+        # reached by each node is fixed.
+        deterministic_simulation = getattr(simulate_env, 'battle_mode_in_simulation_env', None) == 'self_play_mode' \
+            and getattr(simulate_env, 'prob_random_agent', 0) <= 0 and getattr(simulate_env, 'prob_expert_agent', 0) <= 0
+        self._transposition_table = TranspositionTable(
+            self._cfg.get('transposition_table_size', 0) if deterministic_simulation else 0
+        )
+        # The number of the moves searched since the last ``reset_transposition_table_stats``.
+        self._num_moves = 0
+
     def get_next_action(
             self,
             state_config_for_simulate_env_reset: Dict[str, Any],
@@ -217,6 +333,7 @@ class MCTS(object):
         """
 
         # Create a new root node for the MCTS search.
+        self._num_moves += 1
         root = Node()
 
         self.simulate_env.reset(
@@ -373,6 +490,65 @@ class MCTS(object):
         return action, child
 
     def _expand_leaf_node(self, node: Node, simulate_env: Type[BaseEnv], policy_forward_fn: Callable) -> float:
+        """
+        Overview:
+            expand the node with the priors and value of its position in the transposition table if any, or with
+            ``_evaluate_leaf_node`` otherwise, storing the position in the table.
+        Arguments:
+            - node (:obj:`Class Node`): current node when performing mcts search.
+            - simulate_env (:obj:`Class BaseGameEnv`): the class of simulate env.
+            - policy_forward_fn (:obj:`Function`): the Callable to compute the action probs and state value.
+        Returns:
+            - leaf_value (:obj:`Bool`): the leaf node's value.
+        """
+        table = self._transposition_table
+        if not table.enabled:
+            return self._evaluate_leaf_node(node, simulate_env, policy_forward_fn)
+        key = table.zobrist_hash(simulate_env.board, simulate_env.current_player)
+        entry = table.find(key)
+        if entry is None:
+            leaf_value = self._evaluate_leaf_node(node, simulate_env, policy_forward_fn)
+            # another node of the position may have been evaluated since its entry was evicted
+            entry = table.get(key)
+            if entry is None:
+                entry = TranspositionEntry({a: child.prior_p for a, child in node.children.items()}, leaf_value)
+                table.insert(key, entry)
+        else:
+            for action, prior_p in entry.priors.items():
+                node.children[action] = Node(parent=node, prior_p=prior_p)
+            leaf_value = entry.value
+        node.transposition_entry = entry
+        return leaf_value
+
+    def clear_transposition_table(self) -> None:
+        """
+        Overview:
+            Remove all the positions of the transposition table, e.g. when the network is updated.
+        """
+        self._transposition_table.clear()
+
+    def get_transposition_table_stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Overview:
+            Return the statistics of the transposition table since the last ``reset_transposition_table_stats``: the
+            hit rate of the lookups of the positions to evaluate, and the number of network evaluations saved per move.
+        """
+        table = self._transposition_table
+        return {
+            'size': len(table),
+            'capacity': table.capacity,
+            'num_lookups': table.num_lookups,
+            'num_hits': table.num_hits,
+            'hit_rate': table.num_hits / table.num_lookups if table.num_lookups > 0 else 0.,
+            'num_moves': self._num_moves,
+            'network_calls_saved_per_move': table.num_hits / self._num_moves if self._num_moves > 0 else 0.,
+        }
+
+    def reset_transposition_table_stats(self) -> None:
+        self._transposition_table.reset_stats()
+        self._num_moves = 0
+
+    def _evaluate_leaf_node(self, node: Node, simulate_env: Type[BaseEnv], policy_forward_fn: Callable) -> float:
         """
         Overview:
             expand the node with the policy_forward_fn.
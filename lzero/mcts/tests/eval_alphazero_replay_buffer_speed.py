@@ -0,0 +1,62 @@
+"""
+Overview:
+    Benchmark of the minibatch preparation of AlphaZero on 15x15 Gomoku positions. It compares the DI-engine naive
+    buffer of transition dicts followed by ``default_collate`` (as in ``AlphaZeroPolicy._forward_learn``) with
+    ``AlphaZeroReplayBuffer``, without and with the symmetry augmentation, at the batch size 256.
+"""
+import time
+
+import numpy as np
+from ding.utils.data import default_collate
+from ding.worker import NaiveReplayBuffer
+from easydict import EasyDict
+
+from lzero.mcts.buffer.alphazero_replay_buffer import AlphaZeroReplayBuffer
+
+board_size = 15
+
+
+def make_transitions(num: int):
+    return [
+        {
+            'obs': {
+                'observation': np.random.rand(3, board_size, board_size).astype(np.float32),
+                'action_mask': np.ones(board_size * board_size, dtype=np.int8),
+            },
+            'probs': np.random.dirichlet([0.3] * board_size * board_size).astype(np.float32),
+            'reward': 1,
+        } for _ in range(num)
+    ]
+
+
+def batch_time(sample_batch, num_batches: int = 50) -> float:
+    """
+    Overview:
+        Return the mean time in milliseconds of ``sample_batch``.
+    """
+    sample_batch()
+    t0 = time.perf_counter()
+    for _ in range(num_batches):
+        sample_batch()
+    return (time.perf_counter() - t0) / num_batches * 1000
+
+
+if __name__ == "__main__":
+    batch_size = 256
+    transitions = make_transitions(20000)
+    naive_buffer_cfg = NaiveReplayBuffer.default_config()
+    naive_buffer_cfg.replay_buffer_size = int(1e5)
+    naive_buffer = NaiveReplayBuffer(naive_buffer_cfg, instance_name='eval_buffer')
+    naive_buffer.push(transitions, cur_collector_envstep=0)
+    naive_time = batch_time(lambda: default_collate(naive_buffer.sample(batch_size, 0)))
+    print(f'DI-engine naive buffer + default_collate: {naive_time:.2f} ms per batch')
+    for symmetry_augmentation in [False, True]:
+        buffer = AlphaZeroReplayBuffer(
+            EasyDict(dict(replay_buffer_size=int(1e5), symmetry_augmentation=symmetry_augmentation))
+        )
+        buffer.push(transitions)
+        columnar_time = batch_time(lambda: buffer.sample(batch_size))
+        print(
+            f'AlphaZeroReplayBuffer (symmetry_augmentation={symmetry_augmentation}): {columnar_time:.2f} ms per batch '
+            f'({naive_time / columnar_time:.1f}x)'
+        )
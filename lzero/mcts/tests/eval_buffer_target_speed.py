@@ -0,0 +1,96 @@
+"""
+Overview:
+    Micro-benchmark of the target construction of the MuZero-family game buffers. It compares the vectorized functions
+    in ``lzero.mcts.buffer.target_utils`` with the original nested python loops (the reference of
+    ``test_target_utils.py``) on synthetic game segments, checks that both produce the same targets bit for bit, and
+    reports the speedup.
+"""
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from lzero.mcts.buffer.target_utils import compute_target_reward_value, compute_target_policy_non_reanalyzed, \
+    compute_target_policy_reanalyzed
+from lzero.mcts.tests.test_target_utils import make_fake_context, reference_target_reward_value, \
+    reference_target_policy_non_reanalyzed, reference_target_policy_reanalyzed, copy_segments
+
+
+def check_and_time(batch_size: int, varied_action_space: bool = False, two_player_game: bool = False,
+                   lstm_horizon_len: Optional[int] = None, num_unroll_steps: int = 5) -> Dict[str, float]:
+    """
+    Overview:
+        Check that the vectorized targets are bit-for-bit equal to the reference ones, and time both implementations.
+    Returns:
+        - speedup (:obj:`Dict[str, float]`): The speedup of every target type.
+    """
+    action_space_size = 361 if varied_action_space else 18
+    ctx = make_fake_context(
+        batch_size,
+        num_unroll_steps=num_unroll_steps,
+        action_space_size=action_space_size,
+        varied_action_space=varied_action_space
+    )
+    reward_value_args = (
+        ctx['value_list'], ctx['value_mask'], ctx['rewards_list'], ctx['to_play_segment'],
+        ctx['pos_in_game_segment_list'], ctx['game_segment_lens'], ctx['td_steps_list'], num_unroll_steps, 0.997,
+        two_player_game, lstm_horizon_len
+    )
+    non_re_args = (
+        ctx['child_visits'], ctx['pos_in_game_segment_list'], ctx['game_segment_lens'], num_unroll_steps,
+        action_space_size, ctx['legal_action_mask']
+    )
+    speedup = {}
+
+    t0 = time.perf_counter()
+    ref_rewards, ref_values = reference_target_reward_value(*reward_value_args)
+    t1 = time.perf_counter()
+    rewards, values = compute_target_reward_value(*reward_value_args)
+    t2 = time.perf_counter()
+    assert np.array_equal(ref_rewards.astype(np.float32), rewards)
+    assert np.array_equal(ref_values.astype(np.float32), values)
+    speedup['reward_value'] = (t1 - t0) / (t2 - t1)
+
+    t0 = time.perf_counter()
+    ref_policies = reference_target_policy_non_reanalyzed(*non_re_args)
+    t1 = time.perf_counter()
+    policies = compute_target_policy_non_reanalyzed(*non_re_args)
+    t2 = time.perf_counter()
+    assert np.array_equal(ref_policies.astype(np.float32), policies)
+    speedup['policy_non_re'] = (t1 - t0) / (t2 - t1)
+
+    ref_child_visits, ref_root_values = copy_segments(ctx['child_visits']), copy_segments(ctx['root_values'])
+    child_visits, root_values = copy_segments(ctx['child_visits']), copy_segments(ctx['root_values'])
+    common_args = (ctx['roots_distributions'], ctx['roots_values'], ctx['policy_mask'])
+    t0 = time.perf_counter()
+    ref_policies = reference_target_policy_reanalyzed(
+        *common_args, ref_child_visits, ref_root_values, ctx['pos_in_game_segment_list'], num_unroll_steps,
+        action_space_size, ctx['legal_action_mask']
+    )
+    t1 = time.perf_counter()
+    policies = compute_target_policy_reanalyzed(
+        *common_args, child_visits, root_values, ctx['pos_in_game_segment_list'], num_unroll_steps,
+        action_space_size, ctx['legal_action_mask']
+    )
+    t2 = time.perf_counter()
+    assert np.array_equal(ref_policies.astype(np.float32), policies)
+    for b in range(batch_size):
+        assert np.array_equal(ref_root_values[b], root_values[b])
+        for ref_row, row in zip(ref_child_visits[b], child_visits[b]):
+            assert np.array_equal(np.asarray(ref_row), np.asarray(row))
+    speedup['policy_re'] = (t1 - t0) / (t2 - t1)
+    return speedup
+
+
+if __name__ == "__main__":
+    for batch_size in [256, 1024]:
+        for name, kwargs in [
+            ('muzero', dict()),
+            ('efficientzero (value prefix)', dict(lstm_horizon_len=5)),
+            ('board games (varied action space)', dict(varied_action_space=True, two_player_game=True)),
+        ]:
+            speedup = check_and_time(batch_size, **kwargs)
+            print(
+                f'batch_size={batch_size}, {name}: targets are identical, speedup: ' +
+                ', '.join(f'{k}={v:.1f}x' for k, v in speedup.items())
+            )
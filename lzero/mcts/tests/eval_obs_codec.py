@@ -0,0 +1,127 @@
+"""
+Overview:
+    Benchmark of the observation codecs of the replay buffer (``lzero.mcts.buffer.obs_codec``). For each codec, it
+    encodes game segments of synthetic atari-like frames, and reports the bytes per frame and the time to decode the
+    stacked observations of a minibatch, serially and by the threads of an ``ObsDecoder``.
+"""
+import time
+from typing import List
+
+import numpy as np
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.buffer.obs_codec import OBS_CODECS, ObsDecoder, create_obs_codec
+
+
+def make_game_segments(
+        num_segments: int,
+        game_segment_length: int = 200,
+        frame_stack_num: int = 4,
+        num_unroll_steps: int = 5,
+        frame_shape: tuple = (3, 96, 96),
+        seed: int = 0
+) -> List[GameSegment]:
+    """
+    Overview:
+        Build game segments of frames made of a static background and a few moving sprites, as the frames of atari.
+    """
+    rng = np.random.RandomState(seed)
+    config = EasyDict(
+        dict(
+            num_unroll_steps=num_unroll_steps,
+            td_steps=5,
+            discount_factor=0.997,
+            gray_scale=False,
+            transform2string=False,
+            sampled_algo=False,
+            gumbel_algo=False,
+            use_ture_chance_label_in_chance_encoder=False,
+            model=dict(
+                frame_stack_num=frame_stack_num, action_space_size=6, observation_shape=frame_shape, image_channel=3
+            ),
+        )
+    )
+    _, height, width = frame_shape
+    game_segments = []
+    for _ in range(num_segments):
+        background = np.repeat(rng.randint(0, 256, size=(frame_shape[0], height // 8, width // 8)), 8, axis=1)
+        background = np.repeat(background, 8, axis=2).astype(np.uint8)
+        sprites = rng.randint(0, height - 8, size=(4, 2))
+        frames = []
+        for _ in range(game_segment_length + frame_stack_num + num_unroll_steps):
+            sprites = np.clip(sprites + rng.randint(-2, 3, size=sprites.shape), 0, height - 8)
+            frame = background.copy()
+            for y, x in sprites:
+                frame[:, y:y + 8, x:x + 8] = 255
+            frames.append(frame)
+        game_segment = GameSegment(6, game_segment_length, config)
+        game_segment.obs_segment = np.stack(frames)
+        game_segment.action_segment = np.zeros(game_segment_length, dtype=np.int64)
+        game_segments.append(game_segment)
+    return game_segments
+
+
+def eval_obs_codec(batch_size: int = 256, num_segments: int = 8, num_batches: int = 5, num_workers: int = 4) -> None:
+    game_segments = make_game_segments(num_segments)
+    num_unroll_steps = game_segments[0].num_unroll_steps
+    rng = np.random.RandomState(0)
+    batches = [
+        (
+            [game_segments[i] for i in rng.randint(num_segments, size=batch_size)],
+            rng.randint(0, len(game_segments[0].action_segment), size=batch_size).tolist()
+        ) for _ in range(num_batches)
+    ]
+    frame_nbytes = game_segments[0].obs_segment[0].nbytes
+    print(
+        'batch_size={}, frames per stack={}, frame={} bytes, {} decoding threads'.format(
+            batch_size, game_segments[0].frame_stack_num + num_unroll_steps, frame_nbytes, num_workers
+        )
+    )
+    print(
+        '{:<12} {:>14} {:>12} {:>20} {:>20}'.format(
+            'codec', 'bytes/frame', 'ratio', 'serial ms/batch', 'threaded ms/batch'
+        )
+    )
+
+    settings = [('raw', False)]
+    for name in OBS_CODECS:
+        # the jpeg codec does not support delta frames
+        settings += [(name, False)] if name == 'jpeg' else [(name, False), (name, True)]
+    for name, delta in settings:
+        label = name + ('+delta' if delta else '')
+        if name == 'raw':
+            encoded_segments, bytes_per_frame = game_segments, frame_nbytes
+        else:
+            try:
+                codec = create_obs_codec(name, delta=delta)
+            except ImportError as e:
+                print('{:<12} skipped: {}'.format(label, e))
+                continue
+            encoded_segments = []
+            for game_segment in game_segments:
+                encoded = GameSegment.__new__(GameSegment)
+                encoded.__dict__.update(game_segment.__dict__)
+                encoded.obs_segment = codec.encode(game_segment.obs_segment)
+                encoded_segments.append(encoded)
+            bytes_per_frame = np.mean([s.obs_segment.nbytes / len(s.obs_segment) for s in encoded_segments])
+        index = {id(s): e for s, e in zip(game_segments, encoded_segments)}
+
+        timings = []
+        for workers in [0, num_workers]:
+            # no cache, so that every batch is decoded
+            decoder = ObsDecoder(num_workers=workers, cache_size=0)
+            start = time.perf_counter()
+            for segments, timesteps in batches:
+                decoder.get_unroll_obs_batch([index[id(s)] for s in segments], timesteps, num_unroll_steps, True)
+            timings.append((time.perf_counter() - start) / num_batches * 1000)
+            decoder.close()
+        print(
+            '{:<12} {:>14.0f} {:>12.1f} {:>20.2f} {:>20.2f}'.format(
+                label, bytes_per_frame, frame_nbytes / bytes_per_frame, *timings
+            )
+        )
+
+
+if __name__ == "__main__":
+    eval_obs_codec()
@@ -0,0 +1,79 @@
+"""
+Overview:
+    Benchmark of ``SampledEfficientZeroMCTSCtree.search`` with the cheap fake model of ``test_mcts_sampled_ctree``, in a
+    continuous action space of dimension 6 with 20 sampled actions per node. It reports the search time of 50
+    simulations at the batch sizes 8, 64 and 256, with the actions sampled node by node in the C++ tree and with
+    the batched torch sampling of ``sample_actions_in_torch=True``.
+"""
+import time
+
+import numpy as np
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.tests.test_mcts_sampled_ctree import MuZeroModelFake
+from lzero.mcts.tree_search.mcts_ctree_sampled import SampledEfficientZeroMCTSCtree
+
+action_dim = 6
+num_of_sampled_actions = 20
+
+
+def search_time(
+        batch_size: int, sample_actions_in_torch: bool, num_simulations: int = 50, num_searches: int = 5
+) -> float:
+    """
+    Overview:
+        Return the mean time in seconds of one search of ``num_simulations`` simulations for ``batch_size`` roots.
+    """
+    mcts_config = EasyDict(
+        dict(
+            lstm_horizon_len=5,
+            num_simulations=num_simulations,
+            discount_factor=0.997,
+            device='cpu',
+            value_delta_max=0.01,
+            env_type='not_board_games',
+            sample_actions_in_torch=sample_actions_in_torch,
+            model=dict(
+                continuous_action_space=True,
+                num_of_sampled_actions=num_of_sampled_actions,
+                support_scale=300,
+                categorical_distribution=True,
+            ),
+        )
+    )
+    mcts = SampledEfficientZeroMCTSCtree(mcts_config)
+    model = MuZeroModelFake(action_num=action_dim * 2)
+    legal_actions = [[-1 for _ in range(num_of_sampled_actions)] for _ in range(batch_size)]
+    to_play = [-1 for _ in range(batch_size)]
+    total_time = 0.
+    with torch.no_grad():
+        for _ in range(num_searches):
+            output = model.initial_inference(torch.zeros(batch_size, 4))
+            roots = SampledEfficientZeroMCTSCtree.roots(
+                batch_size, legal_actions, action_dim, num_of_sampled_actions, True
+            )
+            reward_hidden_state_roots = [state.numpy() for state in output.reward_hidden_state]
+            t0 = time.perf_counter()
+            if sample_actions_in_torch:
+                sampled_actions, sampled_priors = mcts.sample_actions(output.policy_logits)
+                roots.prepare_with_sampled_actions(
+                    0., [], output.value_prefix, sampled_actions, sampled_priors, to_play
+                )
+            else:
+                roots.prepare_no_noise(output.value_prefix, output.policy_logits.numpy().tolist(), to_play)
+            mcts.search(roots, model, output.latent_state.numpy(), reward_hidden_state_roots, to_play)
+            total_time += time.perf_counter() - t0
+    return total_time / num_searches
+
+
+if __name__ == "__main__":
+    torch.set_num_threads(1)
+    np.random.seed(0)
+    for batch_size in [8, 64, 256]:
+        ctree_time = search_time(batch_size, False)
+        torch_time = search_time(batch_size, True)
+        print(
+            f'batch_size={batch_size}: C++ sampling {ctree_time * 1000:.1f} ms, batched torch sampling '
+            f'{torch_time * 1000:.1f} ms per search of 50 simulations ({ctree_time / torch_time:.2f}x)'
+        )
@@ -0,0 +1,79 @@
+"""
+Overview:
+    Benchmark of the subtree reuse of the MuZero and EfficientZero ctree searches. It steps a few CartPole envs with
+    the collect mode of a randomly initialized policy, with and without ``use_subtree_reuse``, and reports the number of
+    batched ``recurrent_inference`` calls of the search per env step, the time per env step, and the mean number of
+    visits of the roots, which stays ``num_simulations`` or more with the reuse.
+"""
+import copy
+import importlib
+import time
+
+import numpy as np
+import torch
+from ding.config import compile_config
+from ding.policy import create_policy
+
+from zoo.classic_control.cartpole.envs.cartpole_lightzero_env import CartPoleEnv
+
+
+def run(algo: str, use_subtree_reuse: bool, env_num: int = 8, num_steps: int = 200, seed: int = 0) -> dict:
+    config_module = importlib.import_module(f'zoo.classic_control.cartpole.config.cartpole_{algo}_config')
+    cfg, create_cfg = copy.deepcopy(config_module.main_config), copy.deepcopy(config_module.create_config)
+    cfg.policy.update(dict(cuda=False, device='cpu', use_subtree_reuse=use_subtree_reuse))
+    cfg = compile_config(cfg, seed=seed, env=None, auto=True, create_cfg=create_cfg, save_cfg=False)
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    policy = create_policy(cfg.policy, enable_field=['learn', 'collect'])
+    policy.collect_mode.reset()
+
+    # count the batched recurrent inferences of the search
+    model = policy._collect_model
+    recurrent_inference, num_calls = model.recurrent_inference, [0]
+
+    def counted_recurrent_inference(*args, **kwargs):
+        num_calls[0] += 1
+        return recurrent_inference(*args, **kwargs)
+
+    model.recurrent_inference = counted_recurrent_inference
+
+    envs = [CartPoleEnv(cfg.env) for _ in range(env_num)]
+    for i, env in enumerate(envs):
+        env.seed(seed + i)
+    obs = [env.reset() for env in envs]
+    ready_env_id = list(range(env_num))
+    visits = []
+    start = time.time()
+    for _ in range(num_steps):
+        data = torch.from_numpy(np.stack([o['observation'] for o in obs])).float()
+        action_mask = [o['action_mask'] for o in obs]
+        output = policy.collect_mode.forward(
+            data, action_mask=action_mask, temperature=1, to_play=[-1] * env_num, epsilon=0., ready_env_id=ready_env_id
+        )
+        for env_id in ready_env_id:
+            visits.append(sum(output[env_id]['visit_count_distributions']))
+            timestep = envs[env_id].step(output[env_id]['action'])
+            if timestep.done:
+                policy.collect_mode.reset([env_id])
+                obs[env_id] = envs[env_id].reset()
+            else:
+                obs[env_id] = timestep.obs
+    duration = time.time() - start
+    return dict(
+        calls_per_step=num_calls[0] / num_steps,
+        ms_per_step=duration / num_steps * 1e3,
+        mean_visits=float(np.mean(visits)),
+        num_simulations=cfg.policy.num_simulations,
+    )
+
+
+if __name__ == "__main__":
+    for algo in ['muzero', 'efficientzero']:
+        for use_subtree_reuse in [False, True]:
+            result = run(algo, use_subtree_reuse)
+            print(
+                f'{algo}, use_subtree_reuse={use_subtree_reuse}: '
+                f'recurrent_inference calls per env step: {result["calls_per_step"]:.2f} '
+                f'(num_simulations={result["num_simulations"]}), time per env step: {result["ms_per_step"]:.1f} ms, '
+                f'mean root visits: {result["mean_visits"]:.1f}'
+            )
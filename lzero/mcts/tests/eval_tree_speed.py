@@ -6,6 +6,7 @@ import random
 
 from lzero.mcts.tree_search.mcts_ptree import EfficientZeroMCTSPtree as MCTSPtree
 from lzero.mcts.tree_search.mcts_ctree import EfficientZeroMCTSCtree as MCTSCtree
+from lzero.mcts.ctree.ctree_muzero import mz_tree as tree_muzero
 import time
 
 
@@ -249,6 +250,51 @@ def ctree_func(policy_config, num_simulations):
     return build_time, prepare_time, search_time, total_time
 
 
+def ctree_traverse_backpropagate_func(action_space_size, batch_size=256, num_simulations=50, seed=0):
+    """
+        Overview:
+            Search on the MuZero tree of the C++ implementation with random network outputs, and record the time \
+            spent in ``batch_traverse`` and ``batch_backpropagate``, i.e. in the tree itself.
+        Arguments:
+            - action_space_size: Size of the action space.
+            - batch_size: Number of roots.
+            - num_simulations: Number of simulations.
+            - seed: Seed of the random network outputs.
+        Returns:
+            - time_per_simulation: Time spent in the tree per simulation of the batch, in milliseconds.
+        """
+    rng = np.random.RandomState(seed)
+    legal_actions_list = [list(range(action_space_size)) for _ in range(batch_size)]
+    to_play = [-1 for _ in range(batch_size)]
+    noises = [
+        rng.dirichlet([0.3] * action_space_size).astype(np.float32).tolist() for _ in range(batch_size)
+    ]
+    # the network outputs are prepared before the search, so that only the tree operations are timed
+    reward_batches = rng.randn(num_simulations, batch_size).tolist()
+    value_batches = rng.randn(num_simulations, batch_size).tolist()
+    policy_logits_batches = rng.randn(num_simulations, batch_size, action_space_size).tolist()
+
+    roots = tree_muzero.Roots(batch_size, legal_actions_list)
+    roots.prepare(0.25, noises, [0. for _ in range(batch_size)], rng.randn(batch_size, action_space_size).tolist(), to_play)
+    roots.reserve(num_simulations)
+    min_max_stats_lst = tree_muzero.MinMaxStatsList(batch_size)
+    min_max_stats_lst.set_delta(0.01)
+
+    tree_time = 0.
+    for simulation_index in range(num_simulations):
+        results = tree_muzero.ResultsWrapper(num=batch_size)
+        t1 = time.time()
+        _, _, _, virtual_to_play_batch = tree_muzero.batch_traverse(
+            roots, 19652, 1.25, 0.997, min_max_stats_lst, results, to_play
+        )
+        tree_muzero.batch_backpropagate(
+            simulation_index + 1, 0.997, reward_batches[simulation_index], value_batches[simulation_index],
+            policy_logits_batches[simulation_index], min_max_stats_lst, results, virtual_to_play_batch
+        )
+        tree_time += time.time() - t1
+    return tree_time / num_simulations * 1000
+
+
 def plot(ctree_time, ptree_time, iters, label):
     import numpy as np
     import matplotlib.pyplot as plt
@@ -293,6 +339,15 @@ if __name__ == "__main__":
     # cProfile.run("ctree_func()", filename="ctree_result.out", sort="cumulative")
     # cProfile.run("ptree_func()", filename="ptree_result.out", sort="cumulative")
 
+    # time of the tree operations of the MuZero ctree per simulation, at a batch of 256 roots
+    for action_space_size in [18, 361]:
+        time_per_simulation = np.mean([ctree_traverse_backpropagate_func(action_space_size, seed=i) for i in range(3)])
+        print(
+            'action_space_size={}, batch_size=256: batch_traverse + batch_backpropagate {:.3f} ms/simulation'.format(
+                action_space_size, time_per_simulation
+            )
+        )
+
     policy_config = EasyDict(
         dict(
             lstm_horizon_len=5,
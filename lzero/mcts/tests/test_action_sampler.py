@@ -0,0 +1,124 @@
+import itertools
+
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.tests.test_mcts_sampled_ctree import MuZeroModelFake
+from lzero.mcts.tree_search.action_sampler import SampledActionSampler
+from lzero.mcts.tree_search.mcts_ctree_sampled import SampledEfficientZeroMCTSCtree
+
+
+def continuous_policy_logits(batch_size: int, action_dim: int) -> torch.Tensor:
+    torch.manual_seed(0)
+    mu = torch.randn(batch_size, action_dim) * 0.5
+    sigma = torch.rand(batch_size, action_dim) * 0.5 + 0.1
+    return torch.cat([mu, sigma], dim=-1)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('continuous_action_space', [False, True])
+def test_seeded_sampler_reproducible(monkeypatch, continuous_action_space):
+    policy_logits = continuous_policy_logits(8, 3) if continuous_action_space else torch.randn(8, 6)
+    samples = []
+    for _ in range(2):
+        # the samples only depend on the seed, the index of the sampler in the process and the number of calls
+        monkeypatch.setattr(SampledActionSampler, '_stream_counter', itertools.count())
+        sampler = SampledActionSampler(4, continuous_action_space, seed=7)
+        samples.append([sampler.sample(policy_logits) for _ in range(2)])
+    for (actions, priors), (expected_actions, expected_priors) in zip(*samples):
+        assert actions.dtype == np.float32 and actions.flags['C_CONTIGUOUS']
+        assert actions.shape == (8, 4, 3 if continuous_action_space else 1) and priors.shape == (8, 4)
+        np.testing.assert_array_equal(actions, expected_actions)
+        np.testing.assert_array_equal(priors, expected_priors)
+    # the successive calls and the other samplers have different streams
+    assert not np.array_equal(samples[0][0][0], samples[0][1][0])
+    other_sampler = SampledActionSampler(4, continuous_action_space, seed=7)
+    assert not np.array_equal(other_sampler.sample(policy_logits)[0], samples[0][0][0])
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('seed', [None, 0])
+def test_discrete_sampler(seed):
+    torch.manual_seed(0)
+    policy_logits = torch.randn(64, 6)
+    policy_logits[:, 2] = 20.
+    actions, priors = SampledActionSampler(4, False, seed=seed).sample(policy_logits)
+    actions = actions[..., 0].astype(np.int64)
+    probs = torch.exp(policy_logits)
+    probs = (probs / (probs.sum(-1, keepdim=True) + 1e-6)).numpy()
+    for i in range(len(actions)):
+        # sampled without replacement, and the dominant action is always sampled first
+        assert len(set(actions[i])) == 4 and actions[i][0] == 2
+        np.testing.assert_allclose(priors[i], probs[i][actions[i]], rtol=1e-6)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('seed', [None, 0])
+def test_continuous_sampler(seed):
+    policy_logits = continuous_policy_logits(4, 2)
+    actions, priors = SampledActionSampler(5000, True, seed=seed).sample(policy_logits)
+    actions, priors = torch.from_numpy(actions).double(), torch.from_numpy(priors).double()
+    mu, sigma = policy_logits[:, None, :2].double(), policy_logits[:, None, 2:].double()
+    actions_before_tanh = torch.atanh(actions)
+    # the normal samples before tanh follow N(mu, sigma)
+    noise = (actions_before_tanh - mu) / sigma
+    assert noise.mean().abs() < 0.03 and (noise.std() - 1).abs() < 0.03
+    # the priors of ``CNode::expand``
+    expected_priors = torch.distributions.Normal(mu, sigma).log_prob(actions_before_tanh).sum(-1) - \
+        torch.log((1 - actions ** 2 + 1e-6).sum(-1))
+    np.testing.assert_allclose(priors.numpy(), expected_priors.numpy(), atol=1e-3)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('continuous_action_space', [False, True])
+def test_search_with_sampled_actions(continuous_action_space):
+    batch_size, action_space_size, num_of_sampled_actions = 5, 4, 3
+    mcts_config = EasyDict(
+        dict(
+            lstm_horizon_len=5,
+            num_simulations=50,
+            discount_factor=0.9,
+            device='cpu',
+            value_delta_max=0,
+            env_type='not_board_games',
+            sample_actions_in_torch=True,
+            sampled_actions_seed=0,
+            model=dict(
+                continuous_action_space=continuous_action_space,
+                num_of_sampled_actions=num_of_sampled_actions,
+                support_scale=300,
+                categorical_distribution=True,
+            ),
+        )
+    )
+    mcts = SampledEfficientZeroMCTSCtree(mcts_config)
+    model = MuZeroModelFake(action_num=action_space_size * 2 if continuous_action_space else action_space_size)
+    network_output = model.initial_inference(torch.zeros(batch_size, 4))
+
+    legal_actions = [[-1 for _ in range(action_space_size)] for _ in range(batch_size)]
+    roots = SampledEfficientZeroMCTSCtree.roots(
+        batch_size, legal_actions, action_space_size, num_of_sampled_actions, continuous_action_space
+    )
+    to_play = [-1 for _ in range(batch_size)]
+    sampled_actions, sampled_priors = mcts.sample_actions(network_output.policy_logits)
+    noises = [
+        np.random.dirichlet([0.3] * num_of_sampled_actions).astype(np.float32).tolist() for _ in range(batch_size)
+    ]
+    roots.prepare_with_sampled_actions(
+        0.25, noises, network_output.value_prefix, sampled_actions, sampled_priors, to_play
+    )
+    reward_hidden_state_roots = [state.numpy() for state in network_output.reward_hidden_state]
+    mcts.search(roots, model, network_output.latent_state.numpy(), reward_hidden_state_roots, to_play)
+
+    distributions = np.array(roots.get_distributions())
+    assert distributions.shape == (batch_size, num_of_sampled_actions)
+    assert (distributions.sum(axis=1) == mcts_config.num_simulations).all()
+    root_sampled_actions = np.array(roots.get_sampled_actions(), dtype=np.float32).reshape(sampled_actions.shape)
+    np.testing.assert_allclose(root_sampled_actions, sampled_actions)
+
+    with pytest.raises(ValueError):
+        roots.prepare_with_sampled_actions(
+            0., [], network_output.value_prefix, sampled_actions[:-1], sampled_priors[:-1], to_play
+        )
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.buffer.alphazero_replay_buffer import AlphaZeroReplayBuffer
+
+board_size = 5
+
+
+def make_transitions(num: int, start: int = 0, pass_action: bool = False):
+    transitions = []
+    for i in range(start, start + num):
+        # the first plane and the board probs number the cells, so that the symmetries can be checked
+        cells = np.arange(board_size * board_size, dtype=np.float32).reshape(board_size, board_size) + 100 * i
+        observation = np.stack([cells, -cells, np.full_like(cells, i)])
+        probs = cells.flatten()
+        if pass_action:
+            probs = np.append(probs, -1.)
+        transitions.append({'obs': {'observation': observation, 'action_mask': None}, 'probs': probs, 'reward': i})
+    return transitions
+
+
+@pytest.mark.unittest
+def test_push_and_sample():
+    buffer = AlphaZeroReplayBuffer(EasyDict(dict(replay_buffer_size=10)))
+    buffer.push(make_transitions(4))
+    assert buffer.count() == 4
+    assert buffer.sample(5) is None
+
+    # the oldest transitions are overwritten once the buffer is full
+    buffer.push(make_transitions(9, start=4))
+    assert buffer.count() == 10
+    batch = buffer.sample(10)
+    assert batch['obs']['observation'].shape == (10, 3, board_size, board_size)
+    assert batch['probs'].shape == (10, board_size * board_size) and batch['reward'].dtype == torch.float32
+    assert set(batch['reward'].tolist()) <= set(range(3, 13))
+    for observation, probs, reward in zip(batch['obs']['observation'], batch['probs'], batch['reward']):
+        assert (observation[2] == reward).all()
+        assert torch.equal(probs, observation[0].flatten())
+
+    buffer.push(make_transitions(25, start=13))
+    assert set(buffer.sample(10)['reward'].tolist()) <= set(range(28, 38))
+    buffer.clear()
+    assert buffer.count() == 0
+
+
+@pytest.mark.unittest
+def test_symmetry_augmentation():
+    np.random.seed(0)
+    buffer = AlphaZeroReplayBuffer(EasyDict(dict(replay_buffer_size=16, symmetry_augmentation=True)))
+    buffer.push(make_transitions(16, pass_action=True))
+    batches = [buffer.sample(16) for _ in range(16)]
+    observations = np.concatenate([batch['obs']['observation'].numpy() for batch in batches])
+    probs_batch = np.concatenate([batch['probs'].numpy() for batch in batches])
+    symmetries_seen = set()
+    for observation, probs in zip(observations, probs_batch):
+        # the probs are transformed as the board planes, and the pass action is kept
+        np.testing.assert_array_equal(probs[:-1], observation[0].flatten())
+        np.testing.assert_array_equal(observation[1], -observation[0])
+        assert probs[-1] == -1.
+        cells = make_transitions(1, start=int(observation[2, 0, 0]))[0]['obs']['observation'][0]
+        symmetries = [np.rot90(cells, k) for k in range(4)] + [np.fliplr(np.rot90(cells, k)) for k in range(4)]
+        matches = [s for s in range(8) if np.array_equal(observation[0], symmetries[s])]
+        assert len(matches) == 1
+        symmetries_seen.add(matches[0])
+    assert symmetries_seen == set(range(8))
+    # the stored transitions are not transformed
+    assert np.array_equal(buffer._obs[0, 0], make_transitions(1)[0]['obs']['observation'][0])
@@ -0,0 +1,102 @@
+import copy
+from typing import List
+
+import numpy as np
+import pytest
+
+from lzero.mcts.buffer.frame_store import FrameView
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.policy.muzero import MuZeroPolicy
+
+config = MuZeroPolicy.default_config()
+config.model.update(
+    dict(model_type='conv', observation_shape=(4, 8, 8), image_channel=1, frame_stack_num=4, action_space_size=2)
+)
+config.update(
+    dict(
+        device='cpu',
+        game_segment_length=10,
+        num_unroll_steps=3,
+        td_steps=3,
+        batch_size=4,
+        reanalyze_ratio=0.,
+        replay_buffer_size=80,
+    )
+)
+
+
+def make_episode(seed: int, episode_length: int, cfg=config) -> List[GameSegment]:
+    """
+    Split an episode of random frames into game segments as the collector does: each game segment starts with the
+    last ``frame_stack_num`` frames of the previous one and is padded with the first frames of the next one.
+    """
+    rng = np.random.RandomState(seed)
+    stack, unroll = cfg.model.frame_stack_num, cfg.num_unroll_steps
+    frames = rng.randint(0, 256, size=(episode_length + stack, 1, 8, 8)).astype(np.uint8)
+    game_segments = []
+    for start in range(0, episode_length, cfg.game_segment_length):
+        game_segment = GameSegment(cfg.model.action_space_size, cfg.game_segment_length, cfg)
+        game_segment.reset(list(frames[start:start + stack]))
+        for t in range(start, min(start + cfg.game_segment_length, episode_length)):
+            game_segment.append(rng.randint(2), frames[t + stack], rng.rand(), np.ones(2, dtype=np.int8))
+            game_segment.store_search_stats(rng.randint(1, 10, size=2).tolist(), rng.rand())
+        game_segments.append(game_segment)
+    for last, game_segment in zip(game_segments[:-1], game_segments[1:]):
+        last.pad_over(
+            game_segment.obs_segment[stack:stack + unroll], game_segment.reward_segment[:unroll + 2],
+            game_segment.root_value_segment[:unroll + 3], game_segment.child_visit_segment[:unroll]
+        )
+    for game_segment in game_segments:
+        game_segment.game_segment_to_array()
+    return game_segments
+
+
+def push_episodes(buffer: MuZeroGameBuffer, num_episodes: int) -> None:
+    for seed in range(num_episodes):
+        game_segments = make_episode(seed, 35)
+        metas = [
+            dict(priorities=None, done=i == len(game_segments) - 1, unroll_plus_td_steps=6)
+            for i in range(len(game_segments))
+        ]
+        buffer.push_game_segments((game_segments, metas))
+        buffer.remove_oldest_data_to_fit()
+
+
+@pytest.mark.unittest
+def test_frame_store_unroll_obs():
+    reference = MuZeroGameBuffer(copy.deepcopy(config))
+    cfg = copy.deepcopy(config)
+    cfg.update(dict(use_frame_store=True))
+    buffer = MuZeroGameBuffer(cfg)
+    push_episodes(reference, 2)
+    push_episodes(buffer, 2)
+
+    assert len(buffer.game_segment_buffer) == len(reference.game_segment_buffer) == 8
+    for game_segment, expected in zip(buffer.game_segment_buffer, reference.game_segment_buffer):
+        assert isinstance(game_segment.obs_segment, FrameView)
+        assert np.array_equal(np.asarray(game_segment.obs_segment), expected.obs_segment)
+        for t in range(len(game_segment)):
+            obs = game_segment.get_unroll_obs(t, config.num_unroll_steps, padding=True)
+            assert np.array_equal(obs, expected.get_unroll_obs(t, config.num_unroll_steps, padding=True))
+    # each frame of an episode is kept once: the episode frames and the initial stacked frames
+    assert buffer.frame_store.num_frames == 2 * (35 + config.model.frame_stack_num)
+    stats = buffer.get_memory_usage()
+    assert stats['frame_store'] == buffer.frame_store.nbytes
+    assert stats['total'] < reference.get_memory_usage()['total'] + stats['frame_store']
+
+
+@pytest.mark.unittest
+def test_frame_store_eviction():
+    cfg = copy.deepcopy(config)
+    cfg.update(dict(use_frame_store=True))
+    buffer = MuZeroGameBuffer(cfg)
+    push_episodes(buffer, 6)
+    assert buffer.base_idx > 0
+
+    # the frames used by the game segments left in the buffer are kept, and the others are released
+    ids = np.concatenate([game_segment.obs_segment.ids for game_segment in buffer.game_segment_buffer])
+    assert buffer.frame_store.num_frames == len(np.unique(ids)) < len(ids)
+    buffer._remove(len(buffer.game_segment_buffer))
+    assert buffer.frame_store.num_frames == 0
+    assert len(buffer.frame_store._tails) == 0
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.tree_search.latent_state_pool import LatentStatePool
+from lzero.mcts.tree_search.mcts_ctree import MuZeroMCTSCtree, EfficientZeroMCTSCtree, GumbelMuZeroMCTSCtree
+from lzero.mcts.tree_search.mcts_ctree_sampled import SampledEfficientZeroMCTSCtree
+from lzero.mcts.tree_search.mcts_ctree_stochastic import StochasticMuZeroMCTSCtree
+
+batch_size = 6
+action_space_size = 4
+num_simulations = 30
+support_size = 21
+mcts_config = EasyDict(
+    dict(
+        num_simulations=num_simulations,
+        lstm_horizon_len=3,
+        max_num_considered_actions=4,
+        discount_factor=0.97,
+        device='cpu',
+        env_type='not_board_games',
+        model=dict(support_scale=10, categorical_distribution=True, continuous_action_space=False),
+    )
+)
+
+
+class ModelFake(torch.nn.Module):
+    """
+    Overview:
+        Fake model whose latent state records the path from the root, i.e. ``[root_index, option_1 + 1, option_2 + 1,
+        ...]``. It checks that every leaf state fed to ``recurrent_inference`` is the state of an expanded node of the
+        same root, and that no node is expanded twice. The C++ trees break ties randomly, so the searches with and
+        without the latent state pool can not be compared visit by visit.
+    Interfaces:
+        __init__, initial_inference, recurrent_inference
+    """
+
+    def __init__(self, lstm: bool = False, width: int = num_simulations + 2) -> None:
+        super().__init__()
+        self.lstm = lstm
+        self.width = width
+        self.policy = torch.nn.Linear(width, action_space_size)
+        self.value = torch.nn.Linear(width, support_size)
+        self.expanded = set()
+        self.num_recurrent_inference = 0
+
+    def _predict(self, latent_state, reward_hidden_state=None):
+        output = EasyDict(
+            latent_state=latent_state,
+            policy_logits=self.policy(torch.sin(latent_state)),
+            value=self.value(torch.sin(latent_state)),
+            reward=self.value(torch.cos(latent_state)),
+        )
+        if self.lstm:
+            output.value_prefix = output.reward
+            output.reward_hidden_state = reward_hidden_state
+        return output
+
+    def initial_inference(self, obs):
+        latent_state = torch.zeros(obs.shape[0], self.width)
+        latent_state[:, 0] = torch.arange(obs.shape[0])
+        self.expanded = set(tuple(state) for state in latent_state.tolist())
+        hidden_state = torch.zeros(1, obs.shape[0], 8)
+        return self._predict(latent_state, (hidden_state, hidden_state))
+
+    def recurrent_inference(self, latent_state, *args, afterstate=False):
+        self.num_recurrent_inference += 1
+        if self.lstm:
+            reward_hidden_state, option = args
+        else:
+            reward_hidden_state, option = None, args[0]
+        option = option.reshape(-1)
+        if len(latent_state) == batch_size:
+            # every root has one leaf node in each simulation
+            assert (latent_state[:, 0] == torch.arange(batch_size)).all()
+        next_latent_state = latent_state.clone()
+        for state, next_state, o in zip(latent_state.tolist(), next_latent_state, option.tolist()):
+            assert tuple(state) in self.expanded
+            depth = int(np.count_nonzero(state[1:])) + 1
+            next_state[depth] = o + 1 + action_space_size * int(afterstate)
+            assert tuple(next_state.tolist()) not in self.expanded
+            self.expanded.add(tuple(next_state.tolist()))
+        if self.lstm:
+            # the hidden states count the steps since the last reset, every ``lstm_horizon_len`` steps
+            assert reward_hidden_state[0].shape == (1, len(latent_state), 8)
+            assert (reward_hidden_state[0] < mcts_config.lstm_horizon_len).all()
+            reward_hidden_state = (reward_hidden_state[0] + 1, reward_hidden_state[1] - 1)
+        return self._predict(next_latent_state, reward_hidden_state)
+
+
+def run_search(mcts_type, model, obs, use_latent_state_pool, roots_args=(), gumbel=False):
+    mcts = mcts_type(EasyDict(dict(mcts_config, use_latent_state_pool=use_latent_state_pool)))
+    legal_actions = [list(range(action_space_size)) for _ in range(batch_size)]
+    to_play = [-1 for _ in range(batch_size)]
+    with torch.no_grad():
+        output = model.initial_inference(obs)
+        policy_logits = output.policy_logits.numpy().tolist()
+        rewards = [0. for _ in range(batch_size)]
+        roots = mcts_type.roots(batch_size, legal_actions, *roots_args)
+        if gumbel:
+            pred_values = mcts.inverse_scalar_transform_handle(output.value).numpy().reshape(-1).tolist()
+            roots.prepare_no_noise(rewards, pred_values, policy_logits, to_play)
+        else:
+            roots.prepare_no_noise(rewards, policy_logits, to_play)
+        if model.lstm:
+            reward_hidden_state = (output.reward_hidden_state[0].numpy(), output.reward_hidden_state[1].numpy())
+            mcts.search(roots, model, output.latent_state.numpy(), reward_hidden_state, to_play)
+        else:
+            mcts.search(roots, model, output.latent_state.numpy(), to_play)
+    return roots.get_distributions(), roots.get_values()
+
+
+@pytest.mark.unittest
+def test_latent_state_pool():
+    roots = torch.randn(4, 2, 3)
+    pool = LatentStatePool(roots.numpy(), num_simulations=2, device='cpu')
+    pool.store(1, roots + 1)
+    pool.store(2, roots[[0, 2]] + 2, index_in_batch=[0, 2])
+    states = pool.gather([0, 1, 2, 2], [3, 1, 0, 2])
+    assert states.shape == (4, 2, 3)
+    assert torch.equal(states, torch.stack([roots[3], roots[1] + 1, roots[0] + 2, roots[2] + 2]))
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    'mcts_type, lstm, roots_args, gumbel', [
+        (MuZeroMCTSCtree, False, (), False),
+        (EfficientZeroMCTSCtree, True, (), False),
+        (GumbelMuZeroMCTSCtree, False, (), True),
+        (SampledEfficientZeroMCTSCtree, True, (action_space_size, action_space_size, False), False),
+        (StochasticMuZeroMCTSCtree, False, (), False),
+    ]
+)
+@pytest.mark.parametrize('use_latent_state_pool', [False, True])
+def test_search_with_latent_state_pool(mcts_type, lstm, roots_args, gumbel, use_latent_state_pool):
+    torch.manual_seed(0)
+    model = ModelFake(lstm)
+    obs = torch.randn(batch_size, 4)
+    distributions, values = run_search(mcts_type, model, obs, use_latent_state_pool, roots_args, gumbel)
+    assert len(model.expanded) == batch_size * (num_simulations + 1)
+    assert np.array(distributions).shape == (batch_size, action_space_size)
+    assert np.array(values).shape == (batch_size, )
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.tree_search.mcts_ctree_stochastic import StochasticMuZeroMCTSCtree
+
+batch_size = 16
+action_space_size = 4
+chance_space_size = 3
+num_simulations = 25
+support_size = 21
+mcts_config = EasyDict(
+    dict(
+        num_simulations=num_simulations,
+        discount_factor=0.97,
+        device='cpu',
+        env_type='not_board_games',
+        model=dict(support_scale=10, categorical_distribution=True, continuous_action_space=False),
+    )
+)
+
+
+class StochasticModelFake(torch.nn.Module):
+    """
+    Overview:
+        Fake Stochastic MuZero model whose latent state ends with a flag telling whether it is an afterstate. It checks
+        that ``afterstate=True`` (the dynamics from an afterstate and a chance outcome) is only used on afterstates and
+        ``afterstate=False`` (the afterstate dynamics from a state and an action) only on states, and predicts chance
+        logits for the afterstates and policy logits of another size for the states.
+    Interfaces:
+        __init__, initial_inference, recurrent_inference
+    """
+
+    def __init__(self, width: int = 8) -> None:
+        super().__init__()
+        self.transition = torch.nn.Linear(width + 1, width)
+        self.policy = torch.nn.Linear(width, action_space_size)
+        self.chance = torch.nn.Linear(width, chance_space_size)
+        self.value = torch.nn.Linear(width, support_size)
+        self.recurrent_batch_sizes = []
+
+    def _predict(self, latent_state, is_afterstate):
+        features = torch.sin(latent_state[:, :-1])
+        return EasyDict(
+            latent_state=latent_state,
+            policy_logits=(self.chance if is_afterstate else self.policy)(features),
+            value=self.value(features),
+            reward=self.value(torch.cos(features)),
+        )
+
+    def initial_inference(self, obs):
+        latent_state = torch.cat([obs, torch.zeros(obs.shape[0], 1)], dim=1)
+        return self._predict(latent_state, False)
+
+    def recurrent_inference(self, latent_state, action, afterstate=False):
+        self.recurrent_batch_sizes.append(len(latent_state))
+        assert (latent_state[:, -1] == float(afterstate)).all()
+        next_latent_state = torch.tanh(self.transition(torch.cat([latent_state[:, :-1], action[:, None].float()], 1)))
+        flag = torch.full((len(latent_state), 1), float(not afterstate))
+        return self._predict(torch.cat([next_latent_state, flag], dim=1), not afterstate)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('use_latent_state_pool', [False, True])
+def test_stochastic_search_leaf_dispatch(use_latent_state_pool):
+    torch.manual_seed(0)
+    model = StochasticModelFake()
+    mcts = StochasticMuZeroMCTSCtree(EasyDict(dict(mcts_config, use_latent_state_pool=use_latent_state_pool)))
+    legal_actions = [list(range(action_space_size)) for _ in range(batch_size)]
+    to_play = [-1 for _ in range(batch_size)]
+    with torch.no_grad():
+        output = model.initial_inference(torch.randn(batch_size, 8))
+        roots = StochasticMuZeroMCTSCtree.roots(batch_size, legal_actions, chance_space_size)
+        roots.prepare_no_noise([0. for _ in range(batch_size)], output.policy_logits.numpy().tolist(), to_play)
+        mcts.search(roots, model, output.latent_state.numpy(), to_play)
+
+    # at most one inference of each kind of leaves per simulation, which together cover the batch
+    assert len(model.recurrent_batch_sizes) <= 2 * num_simulations
+    assert sum(model.recurrent_batch_sizes) == batch_size * num_simulations
+    distributions = np.array(roots.get_distributions())
+    assert distributions.shape == (batch_size, action_space_size)
+    assert (distributions.sum(axis=1) > 0).all()
+    assert np.isfinite(roots.get_values()).all()
@@ -0,0 +1,84 @@
+import copy
+import zlib
+
+import numpy as np
+import pytest
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.buffer.memory_usage import game_segment_nbytes
+from lzero.policy.muzero import MuZeroPolicy
+
+config = MuZeroPolicy.default_config()
+config.model.update(dict(model_type='mlp', observation_shape=4, action_space_size=2))
+config.update(
+    dict(
+        device='cpu',
+        game_segment_length=20,
+        num_unroll_steps=3,
+        td_steps=3,
+        batch_size=8,
+        reanalyze_ratio=0.,
+        replay_buffer_size=60,
+        segment_storage_slots=2,
+    )
+)
+
+
+def make_game_segment(seed: int, cfg=config) -> GameSegment:
+    rng = np.random.RandomState(seed)
+    game_segment = GameSegment(cfg.model.action_space_size, cfg.game_segment_length, cfg)
+    game_segment.reset([np.zeros(4, dtype=np.float32)])
+    for _ in range(cfg.game_segment_length):
+        game_segment.append(rng.randint(2), rng.randn(4).astype(np.float32), rng.rand(), np.ones(2, dtype=np.int8))
+        game_segment.store_search_stats(rng.randint(1, 10, size=2).tolist(), rng.rand())
+    game_segment.game_segment_to_array()
+    return game_segment
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('use_segment_storage', [False, True])
+@pytest.mark.parametrize('use_sum_tree', [False, True])
+def test_memory_usage(use_segment_storage, use_sum_tree):
+    cfg = copy.deepcopy(config)
+    cfg.update(dict(use_segment_storage=use_segment_storage, use_sum_tree=use_sum_tree))
+    buffer = MuZeroGameBuffer(cfg)
+    assert buffer.get_memory_usage()['total'] == 0
+
+    for i in range(6):
+        buffer.push_game_segments(([make_game_segment(i)], [dict(priorities=None, done=True, unroll_plus_td_steps=6)]))
+        buffer.remove_oldest_data_to_fit()
+        # the byte counts are those of the game segments in the buffer
+        stats = buffer.get_memory_usage()
+        expected = [game_segment_nbytes(game_segment) for game_segment in buffer.game_segment_buffer]
+        for field in ['obs', 'obs_raw', 'policy', 'action_mask', 'other']:
+            assert stats[field] == sum(nbytes[field] for nbytes in expected)
+        assert stats['obs'] == stats['obs_raw'] and stats['game_segments'] == stats['game_segments_raw']
+        private = sum(
+            nbytes['obs'] + nbytes['policy'] + nbytes['action_mask'] + nbytes['other']
+            for nbytes, game_segment in zip(expected, buffer.game_segment_buffer)
+            if game_segment.storage_slot is None
+        )
+        assert stats['total'] == stats['segment_storage'] + private
+    assert len(buffer.game_segment_buffer) < 6
+    if use_segment_storage:
+        assert stats['segment_storage'] == buffer.segment_storage.nbytes > 0
+        assert stats['total'] < stats['segment_storage'] + stats['game_segments']
+
+    assert 'deep_walk' not in stats
+    assert buffer.get_memory_usage(deep=True)['deep_walk'] >= stats['segment_storage']
+
+
+@pytest.mark.unittest
+def test_compressed_obs_nbytes():
+    cfg = copy.deepcopy(config)
+    cfg.update(dict(transform2string=True))
+    cfg.model.update(dict(model_type='conv', observation_shape=(3, 32, 32), image_channel=3))
+    game_segment = make_game_segment(0, cfg)
+    # the compressed frames are bytes strings, as the jpeg frames of ``transform2string``
+    game_segment.obs_segment = np.array(
+        [zlib.compress(np.zeros((3, 32, 32), dtype=np.uint8).tobytes()) for _ in range(len(game_segment.obs_segment))]
+    )
+    nbytes = game_segment_nbytes(game_segment)
+    assert nbytes['obs_raw'] == len(game_segment.obs_segment) * 3 * 32 * 32
+    assert 0 < nbytes['obs'] < nbytes['obs_raw']
@@ -0,0 +1,130 @@
+import copy
+import pickle
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.buffer.obs_codec import EncodedFrames, ObsDecoder, create_obs_codec
+from lzero.policy.muzero import MuZeroPolicy
+
+config = MuZeroPolicy.default_config()
+config.model.update(
+    dict(model_type='conv', observation_shape=(4, 8, 8), image_channel=1, frame_stack_num=4, action_space_size=2)
+)
+config.update(
+    dict(
+        device='cpu',
+        game_segment_length=20,
+        num_unroll_steps=3,
+        td_steps=3,
+        batch_size=8,
+        reanalyze_ratio=0.,
+        replay_buffer_size=100,
+    )
+)
+
+
+def make_frames(seed: int, num: int) -> np.ndarray:
+    # frames which change a little from one step to the next, as the frames of a game
+    rng = np.random.RandomState(seed)
+    frames = np.repeat(rng.randint(0, 256, size=(1, 1, 8, 8)), num, axis=0)
+    for t in range(1, num):
+        frames[t] = frames[t - 1]
+        frames[t, 0, rng.randint(8), rng.randint(8)] = rng.randint(256)
+    return frames.astype(np.uint8)
+
+
+def make_game_segment(seed: int) -> GameSegment:
+    rng = np.random.RandomState(seed)
+    frames = make_frames(seed, config.game_segment_length + config.model.frame_stack_num)
+    game_segment = GameSegment(config.model.action_space_size, config.game_segment_length, config)
+    game_segment.reset(list(frames[:config.model.frame_stack_num]))
+    for t in range(config.game_segment_length):
+        game_segment.append(
+            rng.randint(2), frames[t + config.model.frame_stack_num], rng.rand(), np.ones(2, dtype=np.int8)
+        )
+        game_segment.store_search_stats(rng.randint(1, 10, size=2).tolist(), rng.rand())
+    game_segment.game_segment_to_array()
+    return game_segment
+
+
+def make_meta() -> dict:
+    return {'done': True, 'unroll_plus_td_steps': 6, 'priorities': None}
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('name', ['zlib', 'lz4', 'zstd'])
+@pytest.mark.parametrize('delta', [False, True])
+def test_lossless_codec(name, delta):
+    if name == 'lz4':
+        pytest.importorskip('lz4')
+    elif name == 'zstd':
+        pytest.importorskip('zstandard')
+    codec = create_obs_codec(name, delta=delta, keyframe_interval=4)
+    obs = make_frames(0, 23)
+    encoded = codec.encode(obs)
+    assert isinstance(encoded, EncodedFrames) and encoded.shape == obs.shape and len(encoded) == len(obs)
+    assert encoded.raw_nbytes == obs.nbytes
+    assert np.array_equal(np.asarray(encoded), obs)
+    # the frames of any range are decoded from the nearest keyframe
+    for start in range(len(obs)):
+        for stop in range(start, len(obs) + 2):
+            assert np.array_equal(encoded[start:stop], obs[start:stop])
+    assert np.array_equal(encoded[-1], obs[-1])
+    assert np.array_equal(np.asarray(pickle.loads(pickle.dumps(encoded))), obs)
+
+
+@pytest.mark.unittest
+def test_delta_frames_compress_better():
+    obs = make_frames(0, 64)
+    assert create_obs_codec('zlib', delta=True).encode(obs).nbytes < create_obs_codec('zlib').encode(obs).nbytes
+
+
+@pytest.mark.unittest
+def test_obs_decoder():
+    codec = create_obs_codec('zlib', delta=True)
+    game_segments = [make_game_segment(i) for i in range(3)]
+    encoded_segments = copy.deepcopy(game_segments)
+    for game_segment in encoded_segments:
+        game_segment.obs_segment = codec.encode(game_segment.obs_segment)
+    timesteps = [0, 5, 19, 19]
+    segments = [game_segments[0], game_segments[1], game_segments[2], game_segments[0]]
+    encoded = [encoded_segments[0], encoded_segments[1], encoded_segments[2], encoded_segments[0]]
+
+    decoder = ObsDecoder(num_workers=2, cache_size=16)
+    for padding in [True, False, True]:
+        stacks = decoder.get_unroll_obs_batch(encoded, timesteps, config.num_unroll_steps, padding)
+        for stack, game_segment, timestep in zip(stacks, segments, timesteps):
+            assert np.array_equal(stack, game_segment.get_unroll_obs(timestep, config.num_unroll_steps, padding))
+    # the stacks which do not reach the end of the game segment are the same with and without padding
+    assert decoder.cache_misses == 4 + 2
+    assert decoder.cache_hits == 2 + 4
+    decoder.close()
+
+
+@pytest.mark.unittest
+def test_obs_codec_buffer():
+    buffer = MuZeroGameBuffer(EasyDict(dict(config, obs_codec='zlib', obs_codec_delta=True)))
+    reference_buffer = MuZeroGameBuffer(copy.deepcopy(config))
+    for i in range(4):
+        game_segment = make_game_segment(i)
+        reference_buffer._push_game_segment(copy.deepcopy(game_segment), make_meta())
+        buffer._push_game_segment(game_segment, make_meta())
+    assert all(isinstance(game_segment.obs_segment, EncodedFrames) for game_segment in buffer.game_segment_buffer)
+
+    np.random.seed(0)
+    context = buffer._make_batch(config.batch_size, 0.)
+    np.random.seed(0)
+    reference_context = reference_buffer._make_batch(config.batch_size, 0.)
+    for data, reference in zip(context[3][:5], reference_context[3][:5]):
+        assert np.array_equal(np.asarray(data), np.asarray(reference))
+    # the observations of the bootstrapped values
+    assert np.array_equal(np.asarray(context[0][0]), np.asarray(reference_context[0][0]))
+
+    stats = buffer.get_memory_usage()
+    assert stats['obs'] < stats['obs_raw'] == reference_buffer.get_memory_usage()['obs']
+    buffer.remove_oldest_data_to_fit()
+    buffer.obs_decoder.close()
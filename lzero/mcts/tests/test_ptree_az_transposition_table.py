@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.ptree.ptree_az import MCTS, TranspositionEntry, TranspositionTable
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+
+
+def make_env(**kwargs):
+    cfg = EasyDict(TicTacToeEnv.default_config())
+    cfg.update(dict(battle_mode='self_play_mode', **kwargs))
+    return TicTacToeEnv(cfg)
+
+
+class CountingPolicyValue(object):
+
+    def __init__(self):
+        self.num_states = 0
+
+    def __call__(self, env):
+        self.num_states += 1
+        legal_actions = env.legal_actions
+        return {a: 1. / len(legal_actions) for a in legal_actions}, 0.
+
+
+@pytest.mark.unittest
+def test_transposition_table():
+    table = TranspositionTable(capacity=2)
+    board = np.zeros((3, 3), dtype=np.int32)
+    keys = [table.zobrist_hash(board, 1), table.zobrist_hash(board, 2)]
+    board[0, 0], board[2, 2] = 1, 2
+    keys.append(table.zobrist_hash(board, 1))
+    assert len(set(keys)) == 3
+    # the hash only depends on the position
+    assert table.zobrist_hash(board.tolist(), 1) == keys[2]
+
+    for key in keys[:2]:
+        table.insert(key, TranspositionEntry({0: 1.}, 0.))
+    assert table.find(keys[0]) is not None and table.find(keys[2]) is None
+    # the least recently used position is evicted
+    table.insert(keys[2], TranspositionEntry({0: 1.}, 0.))
+    assert len(table) == 2 and table.get(keys[1]) is None and table.get(keys[0]) is not None
+    assert (table.num_lookups, table.num_hits) == (2, 1)
+
+
+@pytest.mark.unittest
+def test_search_with_transposition_table():
+    env = make_env()
+    state_config = EasyDict(start_player_index=0, init_state=None)
+    num_states = []
+    for transposition_table_size in [0, 10000]:
+        mcts = MCTS(EasyDict(num_simulations=100, transposition_table_size=transposition_table_size), env)
+        policy_value = CountingPolicyValue()
+        for _ in range(2):
+            action, probs = mcts.get_next_action(state_config, policy_value, 1.0, True)
+            assert np.isclose(np.sum(probs), 1) and probs[action] > 0
+        num_states.append(policy_value.num_states)
+
+    stats = mcts.get_transposition_table_stats()
+    assert stats['num_moves'] == 2 and stats['num_hits'] > 0
+    assert num_states[1] == stats['num_lookups'] - stats['num_hits'] < num_states[0]
+    assert stats['network_calls_saved_per_move'] == stats['num_hits'] / 2
+    mcts.reset_transposition_table_stats()
+    mcts.clear_transposition_table()
+    assert mcts.get_transposition_table_stats()['num_lookups'] == 0
+    assert mcts.get_transposition_table_stats()['size'] == 0
+
+    # the table is disabled when the simulation is not deterministic
+    mcts = MCTS(EasyDict(num_simulations=10, transposition_table_size=10000), make_env(prob_random_agent=0.5))
+    assert mcts.get_transposition_table_stats()['capacity'] == 0
@@ -0,0 +1,109 @@
+import copy
+import multiprocessing as mp
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.buffer.segment_storage import SegmentStorage, SEGMENT_COLUMNS
+from lzero.policy.muzero import MuZeroPolicy
+
+config = MuZeroPolicy.default_config()
+config.model.update(dict(model_type='mlp', observation_shape=4, action_space_size=2))
+config.update(
+    dict(
+        device='cpu',
+        game_segment_length=20,
+        num_unroll_steps=3,
+        td_steps=3,
+        batch_size=8,
+        reanalyze_ratio=0.,
+        replay_buffer_size=60,
+        use_segment_storage=True,
+        segment_storage_slots=4,
+    )
+)
+
+
+def make_game_segment(seed: int) -> GameSegment:
+    rng = np.random.RandomState(seed)
+    game_segment = GameSegment(config.model.action_space_size, config.game_segment_length, config)
+    game_segment.reset([np.zeros(4, dtype=np.float32)])
+    for _ in range(config.game_segment_length):
+        game_segment.append(rng.randint(2), rng.randn(4).astype(np.float32), rng.rand(), np.ones(2, dtype=np.int8))
+        visits = rng.randint(1, 10, size=2)
+        game_segment.store_search_stats(visits.tolist(), rng.rand())
+    game_segment.game_segment_to_array()
+    return game_segment
+
+
+def make_meta() -> dict:
+    return {'done': True, 'unroll_plus_td_steps': 5, 'priorities': np.ones(config.game_segment_length)}
+
+
+def write_in_subprocess(handle, slot, seed, queue):
+    storage = SegmentStorage.attach(handle)
+    game_segment = make_game_segment(seed)
+    storage.write(slot, game_segment)
+    storage.strip(game_segment, slot)
+    queue.put(game_segment)
+
+
+@pytest.mark.unittest
+def test_segment_storage_views():
+    buffer = MuZeroGameBuffer(config)
+    reference_buffer = MuZeroGameBuffer(EasyDict(dict(config, use_segment_storage=False)))
+    for i in range(3):
+        game_segment = make_game_segment(i)
+        reference_buffer._push_game_segment(copy.deepcopy(game_segment), make_meta())
+        buffer._push_game_segment(game_segment, make_meta())
+
+    storage = buffer.segment_storage
+    assert storage.num_free_slots == 1
+    for game_segment, reference in zip(buffer.game_segment_buffer, reference_buffer.game_segment_buffer):
+        for name in SEGMENT_COLUMNS:
+            column = getattr(game_segment, name)
+            assert np.shares_memory(column, storage._columns[name])
+            assert (column == getattr(reference, name)).all()
+
+    np.random.seed(0)
+    context = buffer._make_batch(config.batch_size, 0.)
+    np.random.seed(0)
+    reference_context = reference_buffer._make_batch(config.batch_size, 0.)
+    # obs, action, mask, batch_index and weights of the current batch
+    for data, reference in zip(context[3][:5], reference_context[3][:5]):
+        assert (np.asarray(data) == np.asarray(reference)).all()
+    assert (np.asarray(context[0][0]) == np.asarray(reference_context[0][0])).all()
+
+    # the slots of the removed game segments are reused, and the segments beyond the capacity keep their own arrays
+    buffer._push_game_segment(make_game_segment(3), make_meta())
+    buffer._push_game_segment(make_game_segment(4), make_meta())
+    assert buffer.game_segment_buffer[-1].storage_slot is None
+    buffer.remove_oldest_data_to_fit()
+    assert storage.num_free_slots == 2
+    buffer._push_game_segment(make_game_segment(5), make_meta())
+    assert buffer.game_segment_buffer[-1].storage_slot == 0
+
+
+@pytest.mark.unittest
+def test_segment_storage_write_from_other_process():
+    buffer = MuZeroGameBuffer(config)
+    buffer._push_game_segment(make_game_segment(0), make_meta())
+    storage = buffer.segment_storage
+    slot = storage.reserve(1)[0]
+
+    queue = mp.Queue()
+    process = mp.Process(target=write_in_subprocess, args=(storage.handle, slot, 1, queue))
+    process.start()
+    game_segment = queue.get(timeout=60)
+    process.join()
+    assert game_segment.obs_segment is None
+
+    buffer.push_game_segments([[game_segment], [make_meta()]])
+    reference = make_game_segment(1)
+    for name in SEGMENT_COLUMNS:
+        assert np.shares_memory(getattr(game_segment, name), storage._columns[name])
+        assert (getattr(game_segment, name) == getattr(reference, name)).all()
+    assert buffer.get_num_of_transitions() == 2 * config.game_segment_length
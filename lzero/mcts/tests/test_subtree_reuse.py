@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+
+from lzero.mcts.tests.test_latent_state_pool import ModelFake, batch_size, action_space_size, num_simulations, \
+    mcts_config
+from lzero.mcts.tree_search.mcts_ctree import MuZeroMCTSCtree, EfficientZeroMCTSCtree
+from lzero.policy.tests.test_fused_learn_step import make_policy
+
+num_moves = 5
+
+
+def search_move(mcts, model, roots, latent_state_roots, reused_subtrees):
+    to_play = [-1 for _ in range(batch_size)]
+    if model.lstm:
+        hidden_state = np.zeros((1, batch_size, 8), dtype=np.float32)
+        mcts.search(roots, model, latent_state_roots, (hidden_state, hidden_state), to_play, reused_subtrees)
+    else:
+        mcts.search(roots, model, latent_state_roots, to_play, reused_subtrees)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('mcts_type, lstm', [(MuZeroMCTSCtree, False), (EfficientZeroMCTSCtree, True)])
+@pytest.mark.parametrize('use_latent_state_pool', [False, True])
+@pytest.mark.parametrize('max_depth', [None, 2])
+def test_subtree_reuse(mcts_type, lstm, use_latent_state_pool, max_depth):
+    torch.manual_seed(0)
+    # the latent states record the paths from the first roots, which grow by one action in each move
+    model = ModelFake(lstm, width=num_moves * (num_simulations + 1) + 1)
+    mcts = mcts_type(
+        EasyDict(dict(mcts_config, use_latent_state_pool=use_latent_state_pool, subtree_reuse_max_depth=max_depth))
+    )
+    legal_actions = [list(range(action_space_size)) for _ in range(batch_size)]
+    env_ids = list(range(batch_size))
+    latent_state_roots = model.initial_inference(torch.randn(batch_size, 4)).latent_state
+    last_visits = None
+
+    for move in range(num_moves):
+        with torch.no_grad():
+            policy_logits = model._predict(latent_state_roots).policy_logits.numpy().tolist()
+        roots = mcts_type.roots(batch_size, legal_actions)
+        roots.prepare_no_noise([0. for _ in range(batch_size)], policy_logits, [-1 for _ in range(batch_size)])
+        reused_subtrees = mcts.reuse_subtrees(roots, env_ids)
+        if reused_subtrees is None:
+            # a fresh search expands the nodes again from the encoded roots
+            model.expanded = set(tuple(state) for state in latent_state_roots.tolist())
+        num_recurrent_inference = model.num_recurrent_inference
+        search_move(mcts, model, roots, latent_state_roots.numpy(), reused_subtrees)
+        num_calls = model.num_recurrent_inference - num_recurrent_inference
+
+        distributions = np.array(roots.get_distributions())
+        # the roots are reused in every move but the first one, or in ``max_depth`` moves in a row after a fresh root
+        root_depth = move if max_depth is None else move % (max_depth + 1)
+        if root_depth == 0:
+            assert reused_subtrees is None
+            assert num_calls == num_simulations
+        else:
+            # the subtrees keep the visits of their children, and only the missing simulations are run
+            assert reused_subtrees.is_reused.all()
+            assert (reused_subtrees.root_depths == root_depth).all()
+            assert reused_subtrees.num_simulations == (last_visits - 1).min()
+            assert num_calls == num_simulations - reused_subtrees.num_simulations
+            assert (distributions.sum(-1) == last_visits - 1 + num_calls).all()
+        assert distributions.sum(-1).min() == num_simulations
+
+        actions = distributions.argmax(-1)
+        last_visits = distributions[np.arange(batch_size), actions]
+        mcts.save_subtrees(roots, env_ids, actions)
+        latent_state_roots = latent_state_roots.clone()
+        latent_state_roots[:, move + 1] = torch.from_numpy(actions) + 1
+
+    # the subtrees of the reset envs are not reused
+    mcts.reset_subtrees([0, 1])
+    roots = mcts_type.roots(batch_size, legal_actions)
+    roots.prepare_no_noise([0. for _ in range(batch_size)], policy_logits, [-1 for _ in range(batch_size)])
+    reused_subtrees = mcts.reuse_subtrees(roots, env_ids)
+    assert reused_subtrees.is_reused.tolist() == [False, False] + [True] * (batch_size - 2)
+    assert (reused_subtrees.root_depths[:2] == 0).all()
+    assert reused_subtrees.num_simulations == 0
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('algo', ['muzero', 'efficientzero'])
+def test_subtree_reuse_collect(algo):
+    torch.manual_seed(0)
+    policy, cfg = make_policy(algo, use_subtree_reuse=True, subtree_reuse_max_depth=2)
+    # record the depths of the roots reused by the collect searches
+    mcts, root_depths = policy._mcts_collect, []
+    reuse_subtrees = mcts.reuse_subtrees
+
+    def recording_reuse_subtrees(*args, **kwargs):
+        reused_subtrees = reuse_subtrees(*args, **kwargs)
+        root_depths.append(None if reused_subtrees is None else reused_subtrees.root_depths.tolist())
+        return reused_subtrees
+
+    mcts.reuse_subtrees = recording_reuse_subtrees
+    env_num, action_space_size = 2, cfg.model.action_space_size
+
+    def collect():
+        policy.collect_mode.forward(
+            torch.randn(env_num, cfg.model.observation_shape),
+            action_mask=[np.ones(action_space_size) for _ in range(env_num)],
+            temperature=1,
+            to_play=[-1 for _ in range(env_num)],
+            epsilon=0.,
+            ready_env_id=np.arange(env_num)
+        )
+
+    for _ in range(5):
+        collect()
+    # the roots are reused twice in a row, then encoded again from the observations
+    assert root_depths == [None, [1, 1], [2, 2], None, [1, 1]]
+    # the subtrees of the envs whose episodes end are dropped
+    policy.collect_mode.reset([0])
+    collect()
+    assert root_depths[-1] == [0, 2]
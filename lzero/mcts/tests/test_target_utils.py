@@ -0,0 +1,301 @@
+"""
+Overview:
+    Check that the vectorized target construction of ``lzero.mcts.buffer.target_utils`` produces the same targets, bit
+    for bit, as the original nested python loops of the MuZero-family game buffers, which are kept below as reference.
+    The benchmark ``eval_buffer_target_speed.py`` times both implementations on the same synthetic game segments.
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytest
+
+from lzero.mcts.buffer.target_utils import compute_target_reward_value, compute_target_policy_non_reanalyzed, \
+    compute_target_policy_reanalyzed
+
+
+def make_fake_context(
+        batch_size: int,
+        game_segment_length: int = 400,
+        num_unroll_steps: int = 5,
+        td_steps: int = 5,
+        action_space_size: int = 18,
+        varied_action_space: bool = False,
+        reward_dtype: type = np.float64,
+        terminal_ratio: float = 0.2,
+        seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Overview:
+        Build the contexts of ``batch_size`` sampled positions in synthetic game segments, with the same layout as
+        ``_prepare_reward_value_context`` and ``_prepare_policy_*_context`` of ``MuZeroGameBuffer``.
+        As in the replay buffer, a ``terminal_ratio`` fraction of the game segments end the episode, they can be
+        shorter than ``game_segment_length`` and are not padded. The other game segments are padded by the rewards
+        and the root values of the next game segment, which can be shorter than the full padding.
+    """
+    rng = np.random.RandomState(seed)
+    unroll_len = num_unroll_steps + 1
+    rewards_list, to_play_segment, child_visits, root_values, game_segment_lens, action_masks = [], [], [], [], [], []
+    pos_in_game_segment_list, td_steps_list, value_mask = [], [], []
+    for _ in range(batch_size):
+        if rng.rand() < terminal_ratio:
+            game_segment_len = rng.randint(1, game_segment_length + 1)
+            pad_len = 0
+        else:
+            game_segment_len = game_segment_length
+            pad_len = num_unroll_steps + td_steps - 1
+            if rng.rand() < 0.2:
+                pad_len = rng.randint(0, pad_len)
+        pos = rng.randint(0, game_segment_len)
+        rewards_list.append(rng.uniform(-2, 2, size=game_segment_len + pad_len).astype(reward_dtype))
+        # the reference loops read the players of the padding positions (for the value prefix of two player games),
+        # although the values of these positions are masked out
+        to_play_segment.append(np.tile([1, 2], game_segment_len + pad_len)[:game_segment_len + pad_len])
+        root_values.append(rng.randn(game_segment_len + pad_len))
+        if varied_action_space:
+            masks = (rng.rand(game_segment_len, action_space_size) < 0.5).astype(np.int8)
+            masks[:, 0] = 1
+            visits = [rng.dirichlet(np.ones(int(m.sum()))).tolist() for m in masks]
+            child_visits.append(np.array(visits + [None], dtype=object)[:-1])
+            action_masks.append(masks)
+        else:
+            child_visits.append(rng.dirichlet(np.ones(action_space_size), size=game_segment_len + pad_len))
+        game_segment_lens.append(game_segment_len)
+        pos_in_game_segment_list.append(pos)
+        td = int(np.clip(td_steps, 1, max(1, game_segment_len - pos)))
+        for current_index in range(pos, pos + unroll_len):
+            td_steps_list.append(np.int32(td))
+            value_mask.append(1 if current_index + td < game_segment_len else 0)
+
+    transition_batch_size = batch_size * unroll_len
+    legal_action_mask = None
+    roots_distributions = []
+    if varied_action_space:
+        legal_action_mask = []
+        for b in range(batch_size):
+            pos = pos_in_game_segment_list[b]
+            masks = action_masks[b][pos:pos + unroll_len].tolist()
+            masks += [[1] * action_space_size for _ in range(unroll_len - len(masks))]
+            legal_action_mask += masks
+    for k in range(transition_batch_size):
+        num_legal = sum(legal_action_mask[k]) if varied_action_space else action_space_size
+        roots_distributions.append(rng.randint(0, 50, size=num_legal).tolist() if rng.rand() > 0.01 else None)
+        if roots_distributions[-1] is not None and sum(roots_distributions[-1]) == 0:
+            roots_distributions[-1][0] = 1
+    policy_mask = [
+        1 if pos + u < game_segment_lens[b] else 0 for b, pos in enumerate(pos_in_game_segment_list)
+        for u in range(unroll_len)
+    ]
+    return dict(
+        value_list=rng.randn(transition_batch_size).astype(np.float32),
+        value_mask=value_mask,
+        rewards_list=rewards_list,
+        to_play_segment=to_play_segment,
+        pos_in_game_segment_list=pos_in_game_segment_list,
+        game_segment_lens=game_segment_lens,
+        td_steps_list=td_steps_list,
+        child_visits=child_visits,
+        root_values=root_values,
+        legal_action_mask=legal_action_mask,
+        roots_distributions=roots_distributions,
+        roots_values=rng.randn(transition_batch_size).tolist(),
+        policy_mask=policy_mask,
+    )
+
+
+def reference_target_reward_value(
+        value_list: np.ndarray, value_mask: List[int], rewards_list: List[np.ndarray], to_play_segment: List[Any],
+        pos_in_game_segment_list: List[int], game_segment_lens: List[int], td_steps_list: List[int],
+        num_unroll_steps: int, discount_factor: float, two_player_game: bool, lstm_horizon_len: Optional[int] = None
+) -> List[np.ndarray]:
+    """
+    Overview:
+        The original loops of ``MuZeroGameBuffer._compute_target_reward_value`` (``lstm_horizon_len=None``) and of
+        ``EfficientZeroGameBuffer._compute_target_reward_value``, after the network inference.
+    """
+    transition_batch_size = len(value_list)
+    if two_player_game:
+        value_list = value_list.reshape(-1) * np.array(
+            [
+                discount_factor ** td_steps_list[i] if int(td_steps_list[i]) % 2 == 0 else -discount_factor **
+                td_steps_list[i] for i in range(transition_batch_size)
+            ]
+        )
+    else:
+        value_list = value_list.reshape(-1) * (
+            np.array([discount_factor for _ in range(transition_batch_size)]) ** td_steps_list
+        )
+    value_list = value_list * np.array(value_mask)
+    value_list = value_list.tolist()
+    batch_rewards, batch_target_values = [], []
+    horizon_id, value_index = 0, 0
+    for game_segment_len_non_re, reward_list, state_index, to_play_list in zip(game_segment_lens, rewards_list,
+                                                                               pos_in_game_segment_list,
+                                                                               to_play_segment):
+        target_values = []
+        target_rewards = []
+        value_prefix = 0.0
+        base_index = state_index
+        for current_index in range(state_index, state_index + num_unroll_steps + 1):
+            bootstrap_index = current_index + td_steps_list[value_index]
+            for i, reward in enumerate(reward_list[current_index:bootstrap_index]):
+                if two_player_game:
+                    if to_play_list[base_index] == to_play_list[i]:
+                        value_list[value_index] += reward * discount_factor ** i
+                    else:
+                        value_list[value_index] += -reward * discount_factor ** i
+                else:
+                    value_list[value_index] += reward * discount_factor ** i
+            if lstm_horizon_len is not None and horizon_id % lstm_horizon_len == 0:
+                value_prefix = 0.0
+                base_index = current_index
+            horizon_id += 1
+
+            if current_index < game_segment_len_non_re:
+                target_values.append(value_list[value_index])
+                if lstm_horizon_len is None:
+                    target_rewards.append(reward_list[current_index])
+                else:
+                    value_prefix += reward_list[current_index]
+                    target_rewards.append(value_prefix)
+            else:
+                target_values.append(0)
+                target_rewards.append(0.0 if lstm_horizon_len is None else value_prefix)
+            value_index += 1
+        batch_rewards.append(target_rewards)
+        batch_target_values.append(target_values)
+    return [np.asarray(batch_rewards, dtype=object), np.asarray(batch_target_values, dtype=object)]
+
+
+def reference_target_policy_non_reanalyzed(
+        child_visits: List[Any], pos_in_game_segment_list: List[int], game_segment_lens: List[int],
+        num_unroll_steps: int, policy_shape: int, legal_action_mask: Optional[List[List[int]]] = None
+) -> np.ndarray:
+    """
+    Overview:
+        The original loop of ``MuZeroGameBuffer._compute_target_policy_non_reanalyzed``.
+    """
+    batch_target_policies_non_re = []
+    policy_index = 0
+    for game_segment_len, child_visit, state_index in zip(game_segment_lens, child_visits, pos_in_game_segment_list):
+        target_policies = []
+        for current_index in range(state_index, state_index + num_unroll_steps + 1):
+            if current_index < game_segment_len:
+                distributions = child_visit[current_index]
+                if legal_action_mask is None:
+                    target_policies.append(distributions)
+                else:
+                    legal_actions = [i for i, x in enumerate(legal_action_mask[policy_index]) if x == 1]
+                    policy_tmp = [0 for _ in range(policy_shape)]
+                    for index, legal_action in enumerate(legal_actions):
+                        policy_tmp[legal_action] = distributions[index]
+                    target_policies.append(policy_tmp)
+            else:
+                target_policies.append([0 for _ in range(policy_shape)])
+            policy_index += 1
+        batch_target_policies_non_re.append(target_policies)
+    return np.asarray(batch_target_policies_non_re)
+
+
+def reference_target_policy_reanalyzed(
+        roots_distributions: List[Optional[List[int]]], roots_values: List[float], policy_mask: List[int],
+        child_visits: List[Any], root_values: List[np.ndarray], pos_in_game_segment_list: List[int],
+        num_unroll_steps: int, policy_shape: int, legal_action_mask: Optional[List[List[int]]] = None
+) -> np.ndarray:
+    """
+    Overview:
+        The original loop of ``MuZeroGameBuffer._compute_target_policy_reanalyzed``, after the search.
+    """
+    batch_target_policies_re = []
+    policy_index = 0
+    for state_index, child_visit, root_value in zip(pos_in_game_segment_list, child_visits, root_values):
+        target_policies = []
+        for current_index in range(state_index, state_index + num_unroll_steps + 1):
+            distributions = roots_distributions[policy_index]
+            searched_value = roots_values[policy_index]
+            if policy_mask[policy_index] == 0:
+                target_policies.append([0 for _ in range(policy_shape)])
+            elif distributions is None:
+                target_policies.append(list(np.ones(policy_shape) / policy_shape))
+            else:
+                sim_num = sum(distributions)
+                child_visit[current_index] = [visit_count / sim_num for visit_count in distributions]
+                root_value[current_index] = searched_value
+                sum_visits = sum(distributions)
+                policy = [visit_count / sum_visits for visit_count in distributions]
+                if legal_action_mask is None:
+                    target_policies.append(policy)
+                else:
+                    legal_actions = [i for i, x in enumerate(legal_action_mask[policy_index]) if x == 1]
+                    policy_tmp = [0 for _ in range(policy_shape)]
+                    for index, legal_action in enumerate(legal_actions):
+                        policy_tmp[legal_action] = policy[index]
+                    target_policies.append(policy_tmp)
+            policy_index += 1
+        batch_target_policies_re.append(target_policies)
+    return np.array(batch_target_policies_re)
+
+
+def copy_segments(segments: List[Any]) -> List[Any]:
+    return [segment.copy() for segment in segments]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('reward_dtype', [np.float64, np.float32])
+@pytest.mark.parametrize('terminal_ratio', [0., 0.2, 1.])
+@pytest.mark.parametrize(
+    'kwargs', [
+        dict(),
+        dict(lstm_horizon_len=5),
+        dict(varied_action_space=True, two_player_game=True),
+        dict(varied_action_space=True, two_player_game=True, lstm_horizon_len=5),
+    ]
+)
+def test_vectorized_targets_match_reference(kwargs, terminal_ratio, reward_dtype):
+    batch_size, num_unroll_steps, discount_factor = 32, 5, 0.997
+    varied_action_space = kwargs.get('varied_action_space', False)
+    two_player_game = kwargs.get('two_player_game', False)
+    action_space_size = 361 if varied_action_space else 18
+    ctx = make_fake_context(
+        batch_size,
+        game_segment_length=50,
+        num_unroll_steps=num_unroll_steps,
+        action_space_size=action_space_size,
+        varied_action_space=varied_action_space,
+        reward_dtype=reward_dtype,
+        terminal_ratio=terminal_ratio
+    )
+
+    reward_value_args = (
+        ctx['value_list'], ctx['value_mask'], ctx['rewards_list'], ctx['to_play_segment'],
+        ctx['pos_in_game_segment_list'], ctx['game_segment_lens'], ctx['td_steps_list'], num_unroll_steps,
+        discount_factor, two_player_game, kwargs.get('lstm_horizon_len', None)
+    )
+    ref_rewards, ref_values = reference_target_reward_value(*reward_value_args)
+    rewards, values = compute_target_reward_value(*reward_value_args)
+    assert np.array_equal(ref_rewards.astype(np.float32), rewards)
+    assert np.array_equal(ref_values.astype(np.float32), values)
+
+    non_re_args = (
+        ctx['child_visits'], ctx['pos_in_game_segment_list'], ctx['game_segment_lens'], num_unroll_steps,
+        action_space_size, ctx['legal_action_mask']
+    )
+    ref_policies = reference_target_policy_non_reanalyzed(*non_re_args)
+    assert np.array_equal(ref_policies.astype(np.float32), compute_target_policy_non_reanalyzed(*non_re_args))
+
+    # the reanalyzed targets also write the searched policies and values back into the game segments
+    ref_child_visits, ref_root_values = copy_segments(ctx['child_visits']), copy_segments(ctx['root_values'])
+    child_visits, root_values = copy_segments(ctx['child_visits']), copy_segments(ctx['root_values'])
+    common_args = (ctx['roots_distributions'], ctx['roots_values'], ctx['policy_mask'])
+    ref_policies = reference_target_policy_reanalyzed(
+        *common_args, ref_child_visits, ref_root_values, ctx['pos_in_game_segment_list'], num_unroll_steps,
+        action_space_size, ctx['legal_action_mask']
+    )
+    policies = compute_target_policy_reanalyzed(
+        *common_args, child_visits, root_values, ctx['pos_in_game_segment_list'], num_unroll_steps,
+        action_space_size, ctx['legal_action_mask']
+    )
+    assert np.array_equal(ref_policies.astype(np.float32), policies)
+    for b in range(batch_size):
+        assert np.array_equal(ref_root_values[b], root_values[b])
+        for ref_row, row in zip(ref_child_visits[b], child_visits[b]):
+            assert np.array_equal(np.asarray(ref_row), np.asarray(row))
@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer import game_buffer
+from lzero.mcts.buffer.game_buffer_efficientzero import EfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_sampled_efficientzero import SampledEfficientZeroGameBuffer
+from lzero.mcts.buffer.game_buffer_stochastic_muzero import StochasticMuZeroGameBuffer
+from lzero.mcts.buffer.segment_tree import SumSegmentTree, MaxSegmentTree
+from lzero.mcts.buffer.transition_index import TransitionIndex
+
+config = EasyDict(
+    dict(
+        batch_size=10,
+        transition_num=20,
+        priority_prob_alpha=0.6,
+        priority_prob_beta=0.4,
+        replay_buffer_size=64,
+        env_type='not_board_games',
+        use_priority=True,
+        action_type='fixed_action_space',
+        use_sum_tree=True,
+    )
+)
+
+
+@pytest.mark.unittest
+def test_segment_tree():
+    sum_tree = SumSegmentTree(5)
+    max_tree = MaxSegmentTree(5)
+    assert sum_tree.capacity == 8
+    sum_tree.update(np.arange(5), np.array([1., 0., 2., 0., 3.]))
+    max_tree.update(np.arange(5), np.array([1., 0., 2., 0., 3.]))
+    assert sum_tree.reduce() == 6.
+    assert max_tree.reduce() == 3.
+    # the descent never returns a leaf with zero priority
+    idx = sum_tree.find_prefixsum_idx(np.array([0., 0.99, 1., 2.99, 3., 5.99, 6.]))
+    assert idx.tolist() == [0, 0, 2, 2, 4, 4, 4]
+
+    max_tree.update(np.array([4]), 0.)
+    assert max_tree.reduce() == 2.
+
+
+@pytest.mark.unittest
+def test_transition_index_ring():
+    index = TransitionIndex(capacity=8, alpha=0.6)
+    index.push(0, np.array([1., 2., 3., 0.]))
+    index.push(1, np.array([1., 1., 1., 1., 5.]))
+    # the ring grows when the transitions exceed the capacity
+    assert len(index) == 9
+    assert index.max_priority() == 5.
+
+    index.pop_front(4)
+    segment_ids, positions = index.lookup(np.arange(len(index)))
+    assert segment_ids.tolist() == [1] * 5
+    assert positions.tolist() == [0, 1, 2, 3, 4]
+
+    index.update_priority(np.array([0, 1, 100]), np.array([9., 8., 7.]))
+    assert index.get_priority(np.array([0, 1, 2])).tolist() == [9., 8., 1.]
+    assert index.max_priority() == 9.
+
+    logical_idx, weights = index.sample(16, beta=0.4)
+    assert ((logical_idx >= 0) & (logical_idx < len(index))).all()
+    assert weights.max() == 1.
+
+
+@pytest.mark.unittest
+def test_push_sample_remove_with_sum_tree():
+    buffer = EfficientZeroGameBuffer(config)
+    data = [[1, 1, 1] for _ in range(10)]
+    meta = {'done': True, 'unroll_plus_td_steps': 5, 'priorities': np.array([0.9 for _ in range(10)])}
+
+    for _ in range(8):
+        buffer._push_game_segment(data, meta)
+    assert buffer.get_num_of_transitions() == 80
+
+    game_segment_list, pos_in_game_segment_list, batch_index_list, weights_list, make_time = \
+        buffer._sample_orig_data(batch_size=10)
+    assert len(game_segment_list) == len(pos_in_game_segment_list) == 10
+    assert (np.diff(batch_index_list) >= 0).all()
+    assert (batch_index_list % 10 == np.array(pos_in_game_segment_list)).all()
+
+    buffer.remove_oldest_data_to_fit()
+    assert buffer.get_num_of_transitions() <= config.replay_buffer_size
+    assert buffer.get_num_of_transitions() == 10 * buffer.get_num_of_game_segments()
+
+    # the priorities of data sampled before the removal of old game segments are not updated
+    train_data = [[[], [], [], np.array([0, 1]), [], np.array([999, 1000])], []]
+    buffer.update_priority(train_data, np.array([0.1, 0.1]))
+    assert buffer.transition_index.get_priority(np.array([0, 1])).tolist() == [0.9, 0.9]
+
+    train_data = [[[], [], [], np.array([0, 1]), [], np.array([time.time() + 1] * 2)], []]
+    buffer.update_priority(train_data, np.array([0.999, 0.8]))
+    assert buffer.transition_index.get_priority(np.array([0, 1])).tolist() == [0.999, 0.8]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize(
+    'buffer_type',
+    [MuZeroGameBuffer, EfficientZeroGameBuffer, SampledEfficientZeroGameBuffer, StochasticMuZeroGameBuffer]
+)
+def test_transition_index_built_once(buffer_type, monkeypatch):
+    num_built = []
+
+    def build(*args, **kwargs):
+        num_built.append(1)
+        return TransitionIndex(*args, **kwargs)
+
+    monkeypatch.setattr(game_buffer, 'TransitionIndex', build)
+    buffer = buffer_type(config)
+    assert len(num_built) == 1 and buffer.transition_index is not None
@@ -0,0 +1,126 @@
+import itertools
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+import torch
+
+_MASK32 = 0xffffffff
+
+
+def _mul32(x: torch.Tensor, c: int) -> torch.Tensor:
+    # (x * c) mod 2 ** 32 of the int64 tensor x in [0, 2 ** 32), without the overflow of int64.
+    return ((x & 0xffff) * c + ((((x >> 16) * c) & 0xffff) << 16)) & _MASK32
+
+
+def _hash32(x: torch.Tensor) -> torch.Tensor:
+    # the 32-bit integer hash ``lowbias32`` of Chris Wellons, a bijection of [0, 2 ** 32).
+    x = x ^ (x >> 16)
+    x = _mul32(x, 0x7feb352d)
+    x = x ^ (x >> 15)
+    x = _mul32(x, 0x846ca68b)
+    return x ^ (x >> 16)
+
+
+def _hash32_int(x: int) -> int:
+    return int(_hash32(torch.tensor(x & _MASK32, dtype=torch.int64)))
+
+
+class SampledActionSampler(object):
+    """
+    Overview:
+        The batched sampler of the ``num_of_sampled_actions`` (K) actions of the nodes expanded in the Sampled
+        EfficientZero ctree search. It samples the actions of all the nodes of a batch, e.g. all the leaf nodes of a
+        simulation, in a few vectorized torch ops on the device of the policy logits, in the same way as the per-node
+        sampling of ``CNode::expand`` in ``ctree_sampled_efficientzero``:
+
+        - continuous action space: the policy logits are ``[mu, sigma]``. Each action is ``tanh(x)`` with \
+            ``x ~ N(mu, sigma)``, and its prior is ``log N(x; mu, sigma) - log(sum(1 - tanh(x) ** 2 + 1e-6))``.
+        - discrete action space: K distinct actions are sampled without replacement from the softmax of the policy \
+            logits, by the top-K of the keys ``u ** (1 / p)`` with ``u ~ U(0, 1)``, and their priors are their probs.
+
+        With a ``seed``, the uniform samples come from a counter-based RNG, i.e. a hash of the seed, the index of the
+        sampler in the process, the index of the call and the index of the sample, so that the sampled actions are
+        reproducible and do not depend on the device or on the other users of the torch RNG. Without a ``seed``, the
+        default torch generator of the device is used.
+    Interfaces:
+        ``__init__``, ``sample``
+    """
+    # the index of each sampler in the process, which separates the random streams of the samplers with the same seed.
+    _stream_counter = itertools.count()
+
+    def __init__(self, num_of_sampled_actions: int, continuous_action_space: bool, seed: Optional[int] = None) -> None:
+        """
+        Overview:
+            Initialize the sampler.
+        Arguments:
+            - num_of_sampled_actions (:obj:`int`): The number of sampled actions K of each node.
+            - continuous_action_space (:obj:`bool`): Whether the action space is continuous.
+            - seed (:obj:`Optional[int]`): The seed of the counter-based RNG. None means the default torch generator.
+        """
+        self._num_of_sampled_actions = num_of_sampled_actions
+        self._continuous_action_space = continuous_action_space
+        self._seed = seed
+        self._stream = next(self._stream_counter)
+        self._counter = 0
+
+    def sample(self, policy_logits: torch.Tensor) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Sample the K actions of each node of a batch, and compute their priors.
+        Arguments:
+            - policy_logits (:obj:`torch.Tensor`): The policy logits of the nodes, i.e. ``[mu, sigma]`` for the \
+                continuous action space and the logits of each action for the discrete action space.
+        Returns:
+            - sampled_actions (:obj:`np.ndarray`): The contiguous float32 array of the sampled actions, i.e. the \
+                actions after tanh (continuous) or the action indices (discrete).
+            - sampled_priors (:obj:`np.ndarray`): The contiguous float32 array of the priors of the sampled actions, \
+                i.e. the log-probs after tanh (continuous) or the probs (discrete).
+        Shapes:
+            - policy_logits (:obj:`torch.Tensor`): :math:`(B, 2 * action_dim)` or :math:`(B, action_space_size)`.
+            - sampled_actions (:obj:`np.ndarray`): :math:`(B, K, action_dim)`, where ``action_dim=1`` for discrete.
+            - sampled_priors (:obj:`np.ndarray`): :math:`(B, K)`.
+        """
+        policy_logits = policy_logits.detach().float()
+        batch_size, num_of_sampled_actions = policy_logits.shape[0], self._num_of_sampled_actions
+        if self._continuous_action_space:
+            action_dim = policy_logits.shape[-1] // 2
+            mu = policy_logits[:, None, :action_dim]
+            sigma = policy_logits[:, None, action_dim:]
+            noise = self._normal((batch_size, num_of_sampled_actions, action_dim), policy_logits.device)
+            sampled_actions_before_tanh = mu + sigma * noise
+            log_probs_before_tanh = (
+                -(sampled_actions_before_tanh - mu) ** 2 / (2 * sigma ** 2) - torch.log(sigma) -
+                math.log(math.sqrt(2 * math.pi))
+            ).sum(-1)
+            sampled_actions = torch.tanh(sampled_actions_before_tanh)
+            sampled_priors = log_probs_before_tanh - torch.log((1 - sampled_actions ** 2 + 1e-6).sum(-1))
+        else:
+            probs = torch.exp(policy_logits)
+            probs = probs / (probs.sum(-1, keepdim=True) + 1e-6)
+            # log(u) / p is increasing in u ** (1 / p), and is -inf for the actions of zero prob.
+            keys = torch.log(self._uniform(probs.shape, probs.device)) / probs
+            sampled_index = torch.topk(keys, num_of_sampled_actions, dim=-1).indices
+            sampled_actions = sampled_index.float().unsqueeze(-1)
+            sampled_priors = probs.gather(-1, sampled_index)
+        self._counter += 1
+        return (
+            np.ascontiguousarray(sampled_actions.cpu().numpy(), dtype=np.float32),
+            np.ascontiguousarray(sampled_priors.cpu().numpy(), dtype=np.float32),
+        )
+
+    def _uniform(self, shape: Tuple[int, ...], device: torch.device) -> torch.Tensor:
+        # float64 samples of U(0, 1), excluding 0 and 1.
+        if self._seed is None:
+            return torch.rand(shape, dtype=torch.float64, device=device).clamp_(min=2 ** -53)
+        key = _hash32_int(_hash32_int(_hash32_int(self._seed) ^ self._stream) ^ self._counter)
+        index = torch.arange(int(np.prod(shape)), dtype=torch.int64, device=device)
+        bits = _hash32(_hash32(index ^ key) ^ _hash32_int(key))
+        return ((bits.double() + 0.5) / 2 ** 32).view(shape)
+
+    def _normal(self, shape: Tuple[int, ...], device: torch.device) -> torch.Tensor:
+        # float32 samples of N(0, 1), by the Box-Muller transform of the uniform samples in the counter-based case.
+        if self._seed is None:
+            return torch.randn(shape, device=device)
+        u = self._uniform((2, ) + tuple(shape), device)
+        return (torch.sqrt(-2 * torch.log(u[0])) * torch.cos(2 * math.pi * u[1])).float()
@@ -0,0 +1,71 @@
+from typing import Any, List, Optional, Union
+
+import numpy as np
+import torch
+
+
+class LatentStatePool(object):
+    """
+    Overview:
+        The device-resident storage of the latent states of all the nodes expanded in one batched search. The states
+        live in one preallocated tensor of shape ``(num_simulations + 1, batch_size, *state_shape)`` on the model's
+        device, where the first index is the ``latent_state_index_in_search_path`` (0 for the roots, and
+        ``simulation_index + 1`` for the nodes expanded in each simulation) and the second index is the
+        ``latent_state_index_in_batch``, as returned by ``batch_traverse``.
+        The leaf states of a simulation are then gathered with a single ``index_select``, instead of a device to host
+        copy of every expanded state and a host to device copy of the leaf states in each simulation.
+    Interfaces:
+        ``__init__``, ``gather``, ``store``
+    """
+
+    def __init__(self, roots: Union[np.ndarray, torch.Tensor], num_simulations: int, device: str) -> None:
+        """
+        Overview:
+            Allocate the pool and put the states of the roots at index 0.
+        Arguments:
+            - roots (:obj:`Union[np.ndarray, torch.Tensor]`): The states of the roots, of shape \
+                ``(batch_size, *state_shape)``.
+            - num_simulations (:obj:`int`): The number of simulations of the search.
+            - device (:obj:`str`): The device of the model.
+        """
+        roots = torch.as_tensor(roots, device=device)
+        self._batch_size = roots.shape[0]
+        self._device = roots.device
+        self._pool = torch.empty((num_simulations + 1, ) + tuple(roots.shape), dtype=roots.dtype, device=self._device)
+        self._pool[0] = roots
+        self._flat_pool = self._pool.view((-1, ) + tuple(roots.shape[1:]))
+
+    def gather(self, index_in_search_path: List[int], index_in_batch: List[int]) -> torch.Tensor:
+        """
+        Overview:
+            Gather the states of the leaf nodes selected by ``batch_traverse``.
+        Arguments:
+            - index_in_search_path (:obj:`List[int]`): The ``latent_state_index_in_search_path`` of the leaf nodes.
+            - index_in_batch (:obj:`List[int]`): The ``latent_state_index_in_batch`` of the leaf nodes.
+        Returns:
+            - states (:obj:`torch.Tensor`): The states of the leaf nodes, of shape ``(len(index_in_batch), *state_shape)``.
+        """
+        index = np.asarray(index_in_search_path, dtype=np.int64) * self._batch_size + \
+            np.asarray(index_in_batch, dtype=np.int64)
+        return self._flat_pool.index_select(0, torch.from_numpy(index).to(self._device))
+
+    def store(
+            self,
+            index_in_search_path: Union[int, slice],
+            states: torch.Tensor,
+            index_in_batch: Optional[Any] = None
+    ) -> None:
+        """
+        Overview:
+            Store the states of the nodes expanded in one simulation.
+        Arguments:
+            - index_in_search_path (:obj:`Union[int, slice]`): The index of the expanded nodes in the search path, \
+                i.e. ``simulation_index + 1``, or a slice of indices to store several simulations at once.
+            - states (:obj:`torch.Tensor`): The states of the expanded nodes.
+            - index_in_batch (:obj:`Optional[Any]`): The batch indices of the states, if only part of the batch is \
+                stored. None means the states of the whole batch.
+        """
+        if index_in_batch is None:
+            self._pool[index_in_search_path] = states
+        else:
+            self._pool[index_in_search_path, index_in_batch] = states
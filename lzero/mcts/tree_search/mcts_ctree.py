@@ -1,5 +1,5 @@
 import copy
-from typing import TYPE_CHECKING, List, Any, Union
+from typing import TYPE_CHECKING, List, Any, Optional, Sequence, Union
 
 import numpy as np
 import torch
@@ -8,6 +8,8 @@ from easydict import EasyDict
 from lzero.mcts.ctree.ctree_efficientzero import ez_tree as tree_efficientzero
 from lzero.mcts.ctree.ctree_muzero import mz_tree as tree_muzero
 from lzero.mcts.ctree.ctree_gumbel_muzero import gmz_tree as tree_gumbel_muzero
+from lzero.mcts.tree_search.latent_state_pool import LatentStatePool
+from lzero.mcts.tree_search.subtree_reuse import ReusedSubtrees, SubtreeCache
 from lzero.policy import InverseScalarTransform, to_detach_cpu_numpy
 
 if TYPE_CHECKING:
@@ -23,7 +25,7 @@ class MuZeroMCTSCtree(object):
         It completes the ``roots``and ``search`` methods by calling functions in module ``ctree_muzero``, \
         which are implemented in C++.
     Interfaces:
-        ``__init__``, ``roots``, ``search``
+        ``__init__``, ``roots``, ``search``, ``reuse_subtrees``, ``save_subtrees``, ``reset_subtrees``
 
     ..note::
         The benefit of searching for a batch of nodes at the same time is that \
@@ -41,6 +43,13 @@ class MuZeroMCTSCtree(object):
         pb_c_init=1.25,
         # (float) The maximum change in value allowed during the backup step of the search tree update.
         value_delta_max=0.01,
+        # (bool) Whether to keep the latent states of the search in one preallocated tensor on the model's device and
+        # gather the leaf states with a single ``index_select``, instead of copying them to and from the host in every
+        # simulation. It takes the device memory of (num_simulations + 1) * batch_size latent states.
+        use_latent_state_pool=False,
+        # (int) The max number of moves in a row whose searches start from the reused subtrees of the last ones, after
+        # which the root is encoded again from the observation. Only used by ``reuse_subtrees``, None means no limit.
+        subtree_reuse_max_depth=5,
     )
 
     @classmethod
@@ -74,6 +83,9 @@ class MuZeroMCTSCtree(object):
         self.inverse_scalar_transform_handle = InverseScalarTransform(
             self._cfg.model.support_scale, self._cfg.device, self._cfg.model.categorical_distribution
         )
+        # the subtrees of the taken actions, and the state storages of the last search
+        self._subtree_cache = SubtreeCache(self._cfg.subtree_reuse_max_depth)
+        self._search_states = None
 
     @classmethod
     def roots(cls: int, active_collect_env_num: int, legal_actions: List[Any]) -> "mz_ctree":
@@ -89,9 +101,55 @@ class MuZeroMCTSCtree(object):
         """
         return tree_muzero.Roots(active_collect_env_num, legal_actions)
 
+    def reuse_subtrees(
+            self,
+            roots: Any,
+            env_ids: Sequence[int],
+            root_noise_weight: float = 0.,
+            noises: Optional[List[List[float]]] = None
+    ) -> Optional[ReusedSubtrees]:
+        """
+        Overview:
+            Replace the prepared roots with the subtrees of the actions taken after the last search of their envs, \
+            keeping their visit counts, values and latent states. A subtree is not reused if it is not expanded or \
+            some of its visited children are illegal at the new root. The result is passed to ``search``.
+        Arguments:
+            - roots (:obj:`Any`): a batch of prepared root nodes.
+            - env_ids (:obj:`Sequence[int]`): the env id of each root.
+            - root_noise_weight (:obj:`float`): the exploration fraction of the noise added to the reused roots.
+            - noises (:obj:`Optional[List[List[float]]]`): the noise added to each root, None means no noise.
+        Returns:
+            - reused_subtrees (:obj:`Optional[ReusedSubtrees]`): the states of the reused subtrees, or None if no \
+                subtree is reused.
+        """
+        return self._subtree_cache.reuse(roots, env_ids, root_noise_weight, noises)
+
+    def save_subtrees(self, roots: Any, env_ids: Sequence[int], actions: Sequence[int]) -> None:
+        """
+        Overview:
+            Keep the subtrees of the actions taken at the roots of the last search, to be reused in the next search \
+            of each env.
+        Arguments:
+            - roots (:obj:`Any`): the roots of the last search.
+            - env_ids (:obj:`Sequence[int]`): the env id of each root.
+            - actions (:obj:`Sequence[int]`): the action taken at each root.
+        """
+        self._subtree_cache.save(roots, env_ids, actions, self._search_states)
+
+    def reset_subtrees(self, env_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        Overview:
+            Drop the kept subtrees of the given envs, or of all the envs if None, e.g. when their episodes end.
+        """
+        self._subtree_cache.reset(env_ids)
+
     def search(
-            self, roots: Any, model: torch.nn.Module, latent_state_roots: List[Any], to_play_batch: Union[int,
-            List[Any]]
+            self,
+            roots: Any,
+            model: torch.nn.Module,
+            latent_state_roots: List[Any],
+            to_play_batch: Union[int, List[Any]],
+            reused_subtrees: Optional[ReusedSubtrees] = None
     ) -> None:
         """
         Overview:
@@ -102,6 +160,8 @@ class MuZeroMCTSCtree(object):
             - latent_state_roots (:obj:`list`): the hidden states of the roots.
             - model (:obj:`torch.nn.Module`): The model used for inference.
             - to_play (:obj:`list`): the to_play list used in in self-play-mode board games.
+            - reused_subtrees (:obj:`Optional[ReusedSubtrees]`): the subtrees reused as the roots, returned by \
+                ``reuse_subtrees``. The search then only runs the simulations the roots still lack.
 
         .. note::
             The core functions ``batch_traverse`` and ``batch_backpropagate`` are implemented in C++.
@@ -112,14 +172,36 @@ class MuZeroMCTSCtree(object):
             # preparation some constant
             batch_size = roots.num
             pb_c_base, pb_c_init, discount_factor = self._cfg.pb_c_base, self._cfg.pb_c_init, self._cfg.discount_factor
+            use_latent_state_pool = self._cfg.use_latent_state_pool
+            # the nodes of the reused subtrees take the first ``num_reused_layers`` indices after the roots.
+            num_simulations, num_reused_layers = self._cfg.num_simulations, 0
+            if reused_subtrees is not None:
+                num_reused_layers = len(reused_subtrees.states[0]) - 1
+                num_simulations = max(num_simulations - reused_subtrees.num_simulations, 1)
             # the data storage of latent states: storing the latent state of all the nodes in the search.
-            latent_state_batch_in_search_path = [latent_state_roots]
-
+            if use_latent_state_pool:
+                latent_state_pool = LatentStatePool(
+                    latent_state_roots, num_reused_layers + num_simulations, self._cfg.device
+                )
+                if num_reused_layers > 0:
+                    latent_state_pool.store(
+                        slice(1, num_reused_layers + 1),
+                        torch.from_numpy(reused_subtrees.states[0][1:]).to(self._cfg.device)
+                    )
+                self._search_states = [latent_state_pool]
+            else:
+                latent_state_batch_in_search_path = [latent_state_roots]
+                if num_reused_layers > 0:
+                    latent_state_batch_in_search_path.extend(reused_subtrees.states[0][1:])
+                self._search_states = [latent_state_batch_in_search_path]
+
+            # preallocate the children of the nodes expanded in the search in the arena of the roots
+            roots.reserve(num_simulations)
             # minimax value storage
             min_max_stats_lst = tree_muzero.MinMaxStatsList(batch_size)
             min_max_stats_lst.set_delta(self._cfg.value_delta_max)
 
-            for simulation_index in range(self._cfg.num_simulations):
+            for simulation_index in range(num_simulations):
                 # In each simulation, we expanded a new node, so in one search, we have ``num_simulations`` num of nodes at most.
 
                 latent_states = []
@@ -148,10 +230,15 @@ class MuZeroMCTSCtree(object):
                     )
 
                 # obtain the latent state for leaf node
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
+                if use_latent_state_pool:
+                    latent_states = latent_state_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    )
+                else:
+                    for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
+                        latent_states.append(latent_state_batch_in_search_path[ix][iy])
 
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device)
+                    latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device)
 
                 # .long() is only for discrete action
                 last_actions = torch.from_numpy(np.asarray(last_actions)).to(self._cfg.device).long()
@@ -164,12 +251,15 @@ class MuZeroMCTSCtree(object):
                 """
                 network_output = model.recurrent_inference(latent_states, last_actions)
 
-                network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
+                if use_latent_state_pool:
+                    latent_state_pool.store(num_reused_layers + simulation_index + 1, network_output.latent_state)
+                else:
+                    network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
+                    latent_state_batch_in_search_path.append(network_output.latent_state)
                 network_output.policy_logits = to_detach_cpu_numpy(network_output.policy_logits)
                 network_output.value = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value))
                 network_output.reward = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.reward))
 
-                latent_state_batch_in_search_path.append(network_output.latent_state)
                 # tolist() is to be compatible with cpp datatype.
                 reward_batch = network_output.reward.reshape(-1).tolist()
                 value_batch = network_output.value.reshape(-1).tolist()
@@ -180,7 +270,8 @@ class MuZeroMCTSCtree(object):
                 # statistics.
 
                 # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
-                current_latent_state_index = simulation_index + 1
+                # The nodes of the reused subtrees take the indices before it.
+                current_latent_state_index = num_reused_layers + simulation_index + 1
                 tree_muzero.batch_backpropagate(
                     current_latent_state_index, discount_factor, reward_batch, value_batch, policy_logits_batch,
                     min_max_stats_lst, results, virtual_to_play_batch
@@ -194,7 +285,7 @@ class EfficientZeroMCTSCtree(object):
         It completes the ``roots``and ``search`` methods by calling functions in module ``ctree_efficientzero``, \
         which are implemented in C++.
     Interfaces:
-        ``__init__``, ``roots``, ``search``
+        ``__init__``, ``roots``, ``search``, ``reuse_subtrees``, ``save_subtrees``, ``reset_subtrees``
     
     ..note::
         The benefit of searching for a batch of nodes at the same time is that \
@@ -212,6 +303,13 @@ class EfficientZeroMCTSCtree(object):
         pb_c_init=1.25,
         # (float) The maximum change in value allowed during the backup step of the search tree update.
         value_delta_max=0.01,
+        # (bool) Whether to keep the latent states of the search in one preallocated tensor on the model's device and
+        # gather the leaf states with a single ``index_select``, instead of copying them to and from the host in every
+        # simulation. It takes the device memory of (num_simulations + 1) * batch_size latent states.
+        use_latent_state_pool=False,
+        # (int) The max number of moves in a row whose searches start from the reused subtrees of the last ones, after
+        # which the root is encoded again from the observation. Only used by ``reuse_subtrees``, None means no limit.
+        subtree_reuse_max_depth=5,
     )
 
     @classmethod
@@ -245,6 +343,9 @@ class EfficientZeroMCTSCtree(object):
         self.inverse_scalar_transform_handle = InverseScalarTransform(
             self._cfg.model.support_scale, self._cfg.device, self._cfg.model.categorical_distribution
         )
+        # the subtrees of the taken actions, and the state storages of the last search
+        self._subtree_cache = SubtreeCache(self._cfg.subtree_reuse_max_depth)
+        self._search_states = None
 
     @classmethod
     def roots(cls: int, active_collect_env_num: int, legal_actions: List[Any]) -> "ez_ctree.Roots":
@@ -260,9 +361,56 @@ class EfficientZeroMCTSCtree(object):
         """
         return tree_efficientzero.Roots(active_collect_env_num, legal_actions)
 
+    def reuse_subtrees(
+            self,
+            roots: Any,
+            env_ids: Sequence[int],
+            root_noise_weight: float = 0.,
+            noises: Optional[List[List[float]]] = None
+    ) -> Optional[ReusedSubtrees]:
+        """
+        Overview:
+            Replace the prepared roots with the subtrees of the actions taken after the last search of their envs, \
+            keeping their visit counts, values and latent states. A subtree is not reused if it is not expanded or \
+            some of its visited children are illegal at the new root. The result is passed to ``search``.
+        Arguments:
+            - roots (:obj:`Any`): a batch of prepared root nodes.
+            - env_ids (:obj:`Sequence[int]`): the env id of each root.
+            - root_noise_weight (:obj:`float`): the exploration fraction of the noise added to the reused roots.
+            - noises (:obj:`Optional[List[List[float]]]`): the noise added to each root, None means no noise.
+        Returns:
+            - reused_subtrees (:obj:`Optional[ReusedSubtrees]`): the states of the reused subtrees, or None if no \
+                subtree is reused.
+        """
+        return self._subtree_cache.reuse(roots, env_ids, root_noise_weight, noises)
+
+    def save_subtrees(self, roots: Any, env_ids: Sequence[int], actions: Sequence[int]) -> None:
+        """
+        Overview:
+            Keep the subtrees of the actions taken at the roots of the last search, to be reused in the next search \
+            of each env.
+        Arguments:
+            - roots (:obj:`Any`): the roots of the last search.
+            - env_ids (:obj:`Sequence[int]`): the env id of each root.
+            - actions (:obj:`Sequence[int]`): the action taken at each root.
+        """
+        self._subtree_cache.save(roots, env_ids, actions, self._search_states)
+
+    def reset_subtrees(self, env_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        Overview:
+            Drop the kept subtrees of the given envs, or of all the envs if None, e.g. when their episodes end.
+        """
+        self._subtree_cache.reset(env_ids)
+
     def search(
-            self, roots: Any, model: torch.nn.Module, latent_state_roots: List[Any],
-            reward_hidden_state_roots: List[Any], to_play_batch: Union[int, List[Any]]
+            self,
+            roots: Any,
+            model: torch.nn.Module,
+            latent_state_roots: List[Any],
+            reward_hidden_state_roots: List[Any],
+            to_play_batch: Union[int, List[Any]],
+            reused_subtrees: Optional[ReusedSubtrees] = None
     ) -> None:
         """
         Overview:
@@ -274,6 +422,8 @@ class EfficientZeroMCTSCtree(object):
             - reward_hidden_state_roots (:obj:`list`): the value prefix hidden states in LSTM of the roots.
             - model (:obj:`torch.nn.Module`): The model used for inference.
             - to_play (:obj:`list`): the to_play list used in in self-play-mode board games.
+            - reused_subtrees (:obj:`Optional[ReusedSubtrees]`): the subtrees reused as the roots, returned by \
+                ``reuse_subtrees``. The search then only runs the simulations the roots still lack.
         
         .. note::
             The core functions ``batch_traverse`` and ``batch_backpropagate`` are implemented in C++.
@@ -285,17 +435,58 @@ class EfficientZeroMCTSCtree(object):
             batch_size = roots.num
             pb_c_base, pb_c_init, discount_factor = self._cfg.pb_c_base, self._cfg.pb_c_init, self._cfg.discount_factor
 
-            # the data storage of latent states: storing the latent state of all the nodes in one search.
-            latent_state_batch_in_search_path = [latent_state_roots]
-            # the data storage of value prefix hidden states in LSTM
-            reward_hidden_state_c_batch = [reward_hidden_state_roots[0]]
-            reward_hidden_state_h_batch = [reward_hidden_state_roots[1]]
-
+            use_latent_state_pool = self._cfg.use_latent_state_pool
+            # the nodes of the reused subtrees take the first ``num_reused_layers`` indices after the roots.
+            num_simulations, num_reused_layers = self._cfg.num_simulations, 0
+            # the hidden states in LSTM of the reused subtrees are reset every ``lstm_horizon_len`` steps from the
+            # last root that was not reused, which the new nodes keep doing.
+            search_len_offset = np.zeros(batch_size, dtype=np.int64)
+            if reused_subtrees is not None:
+                num_reused_layers = len(reused_subtrees.states[0]) - 1
+                num_simulations = max(num_simulations - reused_subtrees.num_simulations, 1)
+                search_len_offset = reused_subtrees.root_depths
+                # the reused roots keep their value prefix, and so their hidden states in LSTM.
+                reward_hidden_state_roots = tuple(
+                    np.where(
+                        reused_subtrees.is_reused[None, :, None], reused_states[:1], np.asarray(hidden_state_roots)
+                    ) for reused_states, hidden_state_roots in zip(reused_subtrees.states[1:], reward_hidden_state_roots)
+                )
+            if use_latent_state_pool:
+                # the pools of the latent states and of the value prefix hidden states in LSTM, whose roots have the
+                # shape (1, batch_size, hidden_size).
+                latent_state_pool = LatentStatePool(
+                    latent_state_roots, num_reused_layers + num_simulations, self._cfg.device
+                )
+                reward_hidden_state_c_pool = LatentStatePool(
+                    reward_hidden_state_roots[0][0], num_reused_layers + num_simulations, self._cfg.device
+                )
+                reward_hidden_state_h_pool = LatentStatePool(
+                    reward_hidden_state_roots[1][0], num_reused_layers + num_simulations, self._cfg.device
+                )
+                self._search_states = [latent_state_pool, reward_hidden_state_c_pool, reward_hidden_state_h_pool]
+                if num_reused_layers > 0:
+                    for pool, reused_states in zip(self._search_states, reused_subtrees.states):
+                        pool.store(
+                            slice(1, num_reused_layers + 1), torch.from_numpy(reused_states[1:]).to(self._cfg.device)
+                        )
+            else:
+                # the data storage of latent states: storing the latent state of all the nodes in one search.
+                latent_state_batch_in_search_path = [latent_state_roots]
+                # the data storage of value prefix hidden states in LSTM
+                reward_hidden_state_c_batch = [reward_hidden_state_roots[0]]
+                reward_hidden_state_h_batch = [reward_hidden_state_roots[1]]
+                if num_reused_layers > 0:
+                    latent_state_batch_in_search_path.extend(reused_subtrees.states[0][1:])
+                    reward_hidden_state_c_batch.extend(reused_subtrees.states[1][1:, None])
+                    reward_hidden_state_h_batch.extend(reused_subtrees.states[2][1:, None])
+
+            # preallocate the children of the nodes expanded in the search in the arena of the roots
+            roots.reserve(num_simulations)
             # minimax value storage
             min_max_stats_lst = tree_efficientzero.MinMaxStatsList(batch_size)
             min_max_stats_lst.set_delta(self._cfg.value_delta_max)
 
-            for simulation_index in range(self._cfg.num_simulations):
+            for simulation_index in range(num_simulations):
                 # In each simulation, we expanded a new node, so in one search, we have ``num_simulations`` num of nodes at most.
 
                 latent_states = []
@@ -328,16 +519,27 @@ class EfficientZeroMCTSCtree(object):
                 search_lens = results.get_search_len()
 
                 # obtain the latent state for leaf node
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
-                    hidden_states_c_reward.append(reward_hidden_state_c_batch[ix][0][iy])
-                    hidden_states_h_reward.append(reward_hidden_state_h_batch[ix][0][iy])
-
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device)
-                hidden_states_c_reward = torch.from_numpy(np.asarray(hidden_states_c_reward)).to(self._cfg.device
-                                                                                                 ).unsqueeze(0)
-                hidden_states_h_reward = torch.from_numpy(np.asarray(hidden_states_h_reward)).to(self._cfg.device
-                                                                                                 ).unsqueeze(0)
+                if use_latent_state_pool:
+                    latent_states = latent_state_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    )
+                    hidden_states_c_reward = reward_hidden_state_c_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    ).unsqueeze(0)
+                    hidden_states_h_reward = reward_hidden_state_h_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    ).unsqueeze(0)
+                else:
+                    for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
+                        latent_states.append(latent_state_batch_in_search_path[ix][iy])
+                        hidden_states_c_reward.append(reward_hidden_state_c_batch[ix][0][iy])
+                        hidden_states_h_reward.append(reward_hidden_state_h_batch[ix][0][iy])
+
+                    latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device)
+                    hidden_states_c_reward = torch.from_numpy(np.asarray(hidden_states_c_reward)).to(self._cfg.device
+                                                                                                     ).unsqueeze(0)
+                    hidden_states_h_reward = torch.from_numpy(np.asarray(hidden_states_h_reward)).to(self._cfg.device
+                                                                                                     ).unsqueeze(0)
                 # .long() is only for discrete action
                 last_actions = torch.from_numpy(np.asarray(last_actions)).to(self._cfg.device).long()
                 """
@@ -351,45 +553,62 @@ class EfficientZeroMCTSCtree(object):
                     latent_states, (hidden_states_c_reward, hidden_states_h_reward), last_actions
                 )
 
-                network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
                 network_output.policy_logits = to_detach_cpu_numpy(network_output.policy_logits)
                 network_output.value = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value))
                 network_output.value_prefix = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value_prefix))
 
-                network_output.reward_hidden_state = (
-                    network_output.reward_hidden_state[0].detach().cpu().numpy(),
-                    network_output.reward_hidden_state[1].detach().cpu().numpy()
-                )
-
-                latent_state_batch_in_search_path.append(network_output.latent_state)
                 # tolist() is to be compatible with cpp datatype.
                 value_prefix_batch = network_output.value_prefix.reshape(-1).tolist()
                 value_batch = network_output.value.reshape(-1).tolist()
                 policy_logits_batch = network_output.policy_logits.tolist()
 
-                reward_latent_state_batch = network_output.reward_hidden_state
                 # reset the hidden states in LSTM every ``lstm_horizon_len`` steps in one search.
                 # which enable the model only need to predict the value prefix in a range (e.g.: [s0,...,s5])
                 assert self._cfg.lstm_horizon_len > 0
-                reset_idx = (np.array(search_lens) % self._cfg.lstm_horizon_len == 0)
+                reset_idx = ((np.array(search_lens) + search_len_offset) % self._cfg.lstm_horizon_len == 0)
                 assert len(reset_idx) == batch_size
-                reward_latent_state_batch[0][:, reset_idx, :] = 0
-                reward_latent_state_batch[1][:, reset_idx, :] = 0
                 is_reset_list = reset_idx.astype(np.int32).tolist()
-                reward_hidden_state_c_batch.append(reward_latent_state_batch[0])
-                reward_hidden_state_h_batch.append(reward_latent_state_batch[1])
+                if use_latent_state_pool:
+                    not_reset = torch.from_numpy(~reset_idx).to(self._cfg.device).unsqueeze(-1)
+                    latent_state_pool.store(num_reused_layers + simulation_index + 1, network_output.latent_state)
+                    reward_hidden_state_c_pool.store(
+                        num_reused_layers + simulation_index + 1, network_output.reward_hidden_state[0][0] * not_reset
+                    )
+                    reward_hidden_state_h_pool.store(
+                        num_reused_layers + simulation_index + 1, network_output.reward_hidden_state[1][0] * not_reset
+                    )
+                else:
+                    network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
+                    network_output.reward_hidden_state = (
+                        network_output.reward_hidden_state[0].detach().cpu().numpy(),
+                        network_output.reward_hidden_state[1].detach().cpu().numpy()
+                    )
+                    latent_state_batch_in_search_path.append(network_output.latent_state)
+
+                    reward_latent_state_batch = network_output.reward_hidden_state
+                    reward_latent_state_batch[0][:, reset_idx, :] = 0
+                    reward_latent_state_batch[1][:, reset_idx, :] = 0
+                    reward_hidden_state_c_batch.append(reward_latent_state_batch[0])
+                    reward_hidden_state_h_batch.append(reward_latent_state_batch[1])
 
                 # In ``batch_backpropagate()``, we first expand the leaf node using ``the policy_logits`` and
                 # ``reward`` predicted by the model, then perform backpropagation along the search path to update the
                 # statistics.
 
                 # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
-                current_latent_state_index = simulation_index + 1
+                # The nodes of the reused subtrees take the indices before it.
+                current_latent_state_index = num_reused_layers + simulation_index + 1
                 tree_efficientzero.batch_backpropagate(
                     current_latent_state_index, discount_factor, value_prefix_batch, value_batch, policy_logits_batch,
                     min_max_stats_lst, results, is_reset_list, virtual_to_play_batch
                 )
 
+            if not use_latent_state_pool:
+                self._search_states = [
+                    latent_state_batch_in_search_path, [c[0] for c in reward_hidden_state_c_batch],
+                    [h[0] for h in reward_hidden_state_h_batch]
+                ]
+
 
 class GumbelMuZeroMCTSCtree(object):
     """
@@ -413,6 +632,10 @@ class GumbelMuZeroMCTSCtree(object):
         root_noise_weight=0.25,
         # (float) The maximum change in value allowed during the backup step of the search tree update.
         value_delta_max=0.01,
+        # (bool) Whether to keep the latent states of the search in one preallocated tensor on the model's device and
+        # gather the leaf states with a single ``index_select``, instead of copying them to and from the host in every
+        # simulation. It takes the device memory of (num_simulations + 1) * batch_size latent states.
+        use_latent_state_pool=False,
     )
 
     @classmethod
@@ -484,9 +707,15 @@ class GumbelMuZeroMCTSCtree(object):
             batch_size = roots.num
             device = self._cfg.device
             discount_factor = self._cfg.discount_factor
+            use_latent_state_pool = self._cfg.use_latent_state_pool
             # the data storage of hidden states: storing the states of all the tree nodes
-            latent_state_batch_in_search_path = [latent_state_roots]
+            if use_latent_state_pool:
+                latent_state_pool = LatentStatePool(latent_state_roots, self._cfg.num_simulations, device)
+            else:
+                latent_state_batch_in_search_path = [latent_state_roots]
 
+            # preallocate the children of the nodes expanded in the search in the arena of the roots
+            roots.reserve(self._cfg.num_simulations)
             # minimax value storage
             min_max_stats_lst = tree_gumbel_muzero.MinMaxStatsList(batch_size)
             min_max_stats_lst.set_delta(self._cfg.value_delta_max)
@@ -520,10 +749,15 @@ class GumbelMuZeroMCTSCtree(object):
                     )
 
                 # obtain the states for leaf nodes
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
+                if use_latent_state_pool:
+                    latent_states = latent_state_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    )
+                else:
+                    for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
+                        latent_states.append(latent_state_batch_in_search_path[ix][iy])
 
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(device)
+                    latent_states = torch.from_numpy(np.asarray(latent_states)).to(device)
                 # .long() is only for discrete action
                 last_actions = torch.from_numpy(np.asarray(last_actions)).to(device).unsqueeze(1).long()
                 """
@@ -535,12 +769,15 @@ class GumbelMuZeroMCTSCtree(object):
                 """
                 network_output = model.recurrent_inference(latent_states, last_actions)
 
-                network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
+                if use_latent_state_pool:
+                    latent_state_pool.store(simulation_index + 1, network_output.latent_state)
+                else:
+                    network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
+                    latent_state_batch_in_search_path.append(network_output.latent_state)
                 network_output.policy_logits = to_detach_cpu_numpy(network_output.policy_logits)
                 network_output.value = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.value))
                 network_output.reward = to_detach_cpu_numpy(self.inverse_scalar_transform_handle(network_output.reward))
 
-                latent_state_batch_in_search_path.append(network_output.latent_state)
                 # tolist() is to be compatible with cpp datatype.
                 reward_batch = network_output.reward.reshape(-1).tolist()
                 value_batch = network_output.value.reshape(-1).tolist()
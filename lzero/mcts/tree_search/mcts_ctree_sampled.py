@@ -1,11 +1,13 @@
 import copy
-from typing import TYPE_CHECKING, List, Any, Union
+from typing import TYPE_CHECKING, List, Any, Tuple, Union
 
 import numpy as np
 import torch
 from easydict import EasyDict
 
 from lzero.mcts.ctree.ctree_sampled_efficientzero import ezs_tree as tree_efficientzero
+from lzero.mcts.tree_search.action_sampler import SampledActionSampler
+from lzero.mcts.tree_search.latent_state_pool import LatentStatePool
 from lzero.policy import InverseScalarTransform, to_detach_cpu_numpy
 
 if TYPE_CHECKING:
@@ -19,7 +21,7 @@ class SampledEfficientZeroMCTSCtree(object):
         It completes the ``roots``and ``search`` methods by calling functions in module ``ctree_sampled_efficientzero``, \
         which are implemented in C++.
     Interfaces:
-        ``__init__``, ``roots``, ``search``
+        ``__init__``, ``roots``, ``sample_actions``, ``search``
     
     ..note::
         The benefit of searching for a batch of nodes at the same time is that \
@@ -38,6 +40,17 @@ class SampledEfficientZeroMCTSCtree(object):
         pb_c_init=1.25,
         # (float) The maximum change in value allowed during the backup step of the search tree update.
         value_delta_max=0.01,
+        # (bool) Whether to keep the latent states of the search in one preallocated tensor on the model's device and
+        # gather the leaf states with a single ``index_select``, instead of copying them to and from the host in every
+        # simulation. It takes the device memory of (num_simulations + 1) * batch_size latent states.
+        use_latent_state_pool=False,
+        # (bool) Whether to sample the actions of all the nodes expanded in a simulation in one batched torch op after
+        # ``recurrent_inference``, and pass them with their priors to the tree as a contiguous array, instead of
+        # sampling them node by node from the policy logits in the C++ tree.
+        sample_actions_in_torch=False,
+        # (int) The seed of the counter-based RNG of the batched action sampling, which makes the sampled actions
+        # reproducible. None means the default torch generator. Only used when ``sample_actions_in_torch=True``.
+        sampled_actions_seed=None,
     )
 
     @classmethod
@@ -71,6 +84,13 @@ class SampledEfficientZeroMCTSCtree(object):
         self.inverse_scalar_transform_handle = InverseScalarTransform(
             self._cfg.model.support_scale, self._cfg.device, self._cfg.model.categorical_distribution
         )
+        if self._cfg.sample_actions_in_torch:
+            self._action_sampler = SampledActionSampler(
+                self._cfg.model.num_of_sampled_actions, self._cfg.model.continuous_action_space,
+                self._cfg.sampled_actions_seed
+            )
+        else:
+            self._action_sampler = None
 
     @classmethod
     def roots(
@@ -94,6 +114,20 @@ class SampledEfficientZeroMCTSCtree(object):
             root_num, legal_action_lis, action_space_size, num_of_sampled_actions, continuous_action_space
         )
 
+    def sample_actions(self, policy_logits: torch.Tensor) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Sample the actions of a batch of nodes and their priors in one batched torch op, e.g. for the roots to be
+            prepared by ``Roots.prepare_with_sampled_actions``. Only available when ``sample_actions_in_torch=True``.
+        Arguments:
+            - policy_logits (:obj:`torch.Tensor`): The policy logits of the nodes.
+        Returns:
+            - sampled_actions (:obj:`np.ndarray`): The sampled actions, of shape (B, K, action_dim).
+            - sampled_priors (:obj:`np.ndarray`): The priors of the sampled actions, of shape (B, K).
+        """
+        assert self._action_sampler is not None, 'sample_actions needs sample_actions_in_torch=True'
+        return self._action_sampler.sample(policy_logits)
+
     def search(
             self, roots: Any, model: torch.nn.Module, latent_state_roots: List[Any],
             reward_hidden_state_roots: List[Any], to_play_batch: Union[int, List[Any]]
@@ -120,12 +154,26 @@ class SampledEfficientZeroMCTSCtree(object):
             device = self._cfg.device
             pb_c_base, pb_c_init, discount_factor = self._cfg.pb_c_base, self._cfg.pb_c_init, self._cfg.discount_factor
 
-            # the data storage of latent states: storing the latent state of all the nodes in one search.
-            latent_state_batch_in_search_path = [latent_state_roots]
-            # the data storage of value prefix hidden states in LSTM
-            reward_hidden_state_c_pool = [reward_hidden_state_roots[0]]
-            reward_hidden_state_h_pool = [reward_hidden_state_roots[1]]
+            use_latent_state_pool = self._cfg.use_latent_state_pool
+            if use_latent_state_pool:
+                # the pools of the latent states and of the value prefix hidden states in LSTM, whose roots have the
+                # shape (1, batch_size, hidden_size).
+                latent_state_pool = LatentStatePool(latent_state_roots, self._cfg.num_simulations, device)
+                reward_hidden_state_c_pool = LatentStatePool(
+                    reward_hidden_state_roots[0][0], self._cfg.num_simulations, device
+                )
+                reward_hidden_state_h_pool = LatentStatePool(
+                    reward_hidden_state_roots[1][0], self._cfg.num_simulations, device
+                )
+            else:
+                # the data storage of latent states: storing the latent state of all the nodes in one search.
+                latent_state_batch_in_search_path = [latent_state_roots]
+                # the data storage of value prefix hidden states in LSTM
+                reward_hidden_state_c_batch = [reward_hidden_state_roots[0]]
+                reward_hidden_state_h_batch = [reward_hidden_state_roots[1]]
 
+            # preallocate the children of the nodes expanded in the search in the arena of the roots
+            roots.reserve(self._cfg.num_simulations)
             # minimax value storage
             min_max_stats_lst = tree_efficientzero.MinMaxStatsList(batch_size)
             min_max_stats_lst.set_delta(self._cfg.value_delta_max)
@@ -162,13 +210,24 @@ class SampledEfficientZeroMCTSCtree(object):
                 # obtain the search horizon for leaf nodes
                 search_lens = results.get_search_len()
                 # obtain the latent state for leaf node
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
-                    hidden_states_c_reward.append(reward_hidden_state_c_pool[ix][0][iy])
-                    hidden_states_h_reward.append(reward_hidden_state_h_pool[ix][0][iy])
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(device)
-                hidden_states_c_reward = torch.from_numpy(np.asarray(hidden_states_c_reward)).to(device).unsqueeze(0)
-                hidden_states_h_reward = torch.from_numpy(np.asarray(hidden_states_h_reward)).to(device).unsqueeze(0)
+                if use_latent_state_pool:
+                    latent_states = latent_state_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    )
+                    hidden_states_c_reward = reward_hidden_state_c_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    ).unsqueeze(0)
+                    hidden_states_h_reward = reward_hidden_state_h_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    ).unsqueeze(0)
+                else:
+                    for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
+                        latent_states.append(latent_state_batch_in_search_path[ix][iy])
+                        hidden_states_c_reward.append(reward_hidden_state_c_batch[ix][0][iy])
+                        hidden_states_h_reward.append(reward_hidden_state_h_batch[ix][0][iy])
+                    latent_states = torch.from_numpy(np.asarray(latent_states)).to(device)
+                    hidden_states_c_reward = torch.from_numpy(np.asarray(hidden_states_c_reward)).to(device).unsqueeze(0)
+                    hidden_states_h_reward = torch.from_numpy(np.asarray(hidden_states_h_reward)).to(device).unsqueeze(0)
 
                 if self._cfg.model.continuous_action_space is True:
                     # continuous action
@@ -186,39 +245,50 @@ class SampledEfficientZeroMCTSCtree(object):
                 network_output = model.recurrent_inference(
                     latent_states, (hidden_states_c_reward, hidden_states_h_reward), last_actions
                 )
+                if self._action_sampler is not None:
+                    sampled_actions, sampled_priors = self._action_sampler.sample(network_output.policy_logits)
 
-                [
-                    network_output.latent_state, network_output.policy_logits, network_output.value,
-                    network_output.value_prefix
-                ] = to_detach_cpu_numpy(
+                [network_output.policy_logits, network_output.value, network_output.value_prefix] = to_detach_cpu_numpy(
                     [
-                        network_output.latent_state,
                         network_output.policy_logits,
                         self.inverse_scalar_transform_handle(network_output.value),
                         self.inverse_scalar_transform_handle(network_output.value_prefix),
                     ]
                 )
-                network_output.reward_hidden_state = (
-                    network_output.reward_hidden_state[0].detach().cpu().numpy(),
-                    network_output.reward_hidden_state[1].detach().cpu().numpy()
-                )
-                latent_state_batch_in_search_path.append(network_output.latent_state)
                 # tolist() is to be compatible with cpp datatype.
                 value_prefix_pool = network_output.value_prefix.reshape(-1).tolist()
                 value_pool = network_output.value.reshape(-1).tolist()
-                policy_logits_pool = network_output.policy_logits.tolist()
-                reward_latent_state_batch = network_output.reward_hidden_state
+                if self._action_sampler is None:
+                    policy_logits_pool = network_output.policy_logits.tolist()
 
                 # reset the hidden states in LSTM every ``lstm_horizon_len`` steps in one search.
                 # which enable the model only need to predict the value prefix in a range (e.g.: [s0,...,s5]).
                 assert self._cfg.lstm_horizon_len > 0
                 reset_idx = (np.array(search_lens) % self._cfg.lstm_horizon_len == 0)
                 assert len(reset_idx) == batch_size
-                reward_latent_state_batch[0][:, reset_idx, :] = 0
-                reward_latent_state_batch[1][:, reset_idx, :] = 0
                 is_reset_list = reset_idx.astype(np.int32).tolist()
-                reward_hidden_state_c_pool.append(reward_latent_state_batch[0])
-                reward_hidden_state_h_pool.append(reward_latent_state_batch[1])
+                if use_latent_state_pool:
+                    not_reset = torch.from_numpy(~reset_idx).to(device).unsqueeze(-1)
+                    latent_state_pool.store(simulation_index + 1, network_output.latent_state)
+                    reward_hidden_state_c_pool.store(
+                        simulation_index + 1, network_output.reward_hidden_state[0][0] * not_reset
+                    )
+                    reward_hidden_state_h_pool.store(
+                        simulation_index + 1, network_output.reward_hidden_state[1][0] * not_reset
+                    )
+                else:
+                    network_output.latent_state = to_detach_cpu_numpy(network_output.latent_state)
+                    network_output.reward_hidden_state = (
+                        network_output.reward_hidden_state[0].detach().cpu().numpy(),
+                        network_output.reward_hidden_state[1].detach().cpu().numpy()
+                    )
+                    latent_state_batch_in_search_path.append(network_output.latent_state)
+
+                    reward_latent_state_batch = network_output.reward_hidden_state
+                    reward_latent_state_batch[0][:, reset_idx, :] = 0
+                    reward_latent_state_batch[1][:, reset_idx, :] = 0
+                    reward_hidden_state_c_batch.append(reward_latent_state_batch[0])
+                    reward_hidden_state_h_batch.append(reward_latent_state_batch[1])
 
                 # In ``batch_backpropagate()``, we first expand the leaf node using ``the policy_logits`` and
                 # ``reward`` predicted by the model, then perform backpropagation along the search path to update the
@@ -226,7 +296,13 @@ class SampledEfficientZeroMCTSCtree(object):
 
                 # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
                 current_latent_state_index = simulation_index + 1
-                tree_efficientzero.batch_backpropagate(
-                    current_latent_state_index, discount_factor, value_prefix_pool, value_pool, policy_logits_pool,
-                    min_max_stats_lst, results, is_reset_list, virtual_to_play_batch
-                )
+                if self._action_sampler is not None:
+                    tree_efficientzero.batch_backpropagate_with_sampled_actions(
+                        current_latent_state_index, discount_factor, value_prefix_pool, value_pool, sampled_actions,
+                        sampled_priors, min_max_stats_lst, results, is_reset_list, virtual_to_play_batch
+                    )
+                else:
+                    tree_efficientzero.batch_backpropagate(
+                        current_latent_state_index, discount_factor, value_prefix_pool, value_pool,
+                        policy_logits_pool, min_max_stats_lst, results, is_reset_list, virtual_to_play_batch
+                    )
@@ -5,7 +5,8 @@ import numpy as np
 import torch
 from easydict import EasyDict
 
-from lzero.policy import InverseScalarTransform
+from lzero.mcts.tree_search.latent_state_pool import LatentStatePool
+from lzero.policy import InverseScalarTransform, to_detach_cpu_numpy
 from lzero.mcts.ctree.ctree_stochastic_muzero import stochastic_mz_tree
 
 
@@ -34,6 +35,10 @@ class StochasticMuZeroMCTSCtree(object):
         pb_c_init=1.25,
         # (float) The maximum change in value allowed during the backup step of the search tree update.
         value_delta_max=0.01,
+        # (bool) Whether to keep the latent states of the search in one preallocated tensor on the model's device and
+        # gather the leaf states with a single ``index_select``, instead of copying them to and from the host in every
+        # simulation. It takes the device memory of (num_simulations + 1) * batch_size latent states.
+        use_latent_state_pool=False,
     )
 
     @classmethod
@@ -106,9 +111,15 @@ class StochasticMuZeroMCTSCtree(object):
             # preparation some constant
             batch_size = roots.num
             pb_c_base, pb_c_init, discount_factor = self._cfg.pb_c_base, self._cfg.pb_c_init, self._cfg.discount_factor
+            use_latent_state_pool = self._cfg.use_latent_state_pool
             # the data storage of latent states: storing the latent state of all the nodes in the search.
-            latent_state_batch_in_search_path = [latent_state_roots]
+            if use_latent_state_pool:
+                latent_state_pool = LatentStatePool(latent_state_roots, self._cfg.num_simulations, self._cfg.device)
+            else:
+                latent_state_batch_in_search_path = [latent_state_roots]
 
+            # preallocate the children of the nodes expanded in the search in the arena of the roots
+            roots.reserve(self._cfg.num_simulations)
             # minimax value storage
             min_max_stats_lst = stochastic_mz_tree.MinMaxStatsList(batch_size)
             min_max_stats_lst.set_delta(self._cfg.value_delta_max)
@@ -142,10 +153,15 @@ class StochasticMuZeroMCTSCtree(object):
                     )
 
                 # obtain the latent state for leaf node
-                for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
-                    latent_states.append(latent_state_batch_in_search_path[ix][iy])
+                if use_latent_state_pool:
+                    latent_states = latent_state_pool.gather(
+                        latent_state_index_in_search_path, latent_state_index_in_batch
+                    )
+                else:
+                    for ix, iy in zip(latent_state_index_in_search_path, latent_state_index_in_batch):
+                        latent_states.append(latent_state_batch_in_search_path[ix][iy])
 
-                latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device)
+                    latent_states = torch.from_numpy(np.asarray(latent_states)).to(self._cfg.device)
                 # .long() is only for discrete action
                 last_actions = torch.from_numpy(np.asarray(last_actions)).to(self._cfg.device).long()
                 """
@@ -155,97 +171,53 @@ class StochasticMuZeroMCTSCtree(object):
                 MCTS stage 3: Backup
                     At the end of the simulation, the statistics along the trajectory are updated.
                 """
-                # network_output = model.recurrent_inference(latent_states, last_actions)
-
+                # The chance leaves are expanded by the dynamics function from their afterstate and chance outcome, the
+                # decision leaves by the afterstate dynamics function from their state and action. Each group is
+                # inferred in one batch, and the outputs are scattered back to the order of the leaves by index.
                 num = len(leaf_node_is_chance)
-                leaf_idx_list = list(range(num))
-                latent_state_batch = [None] * num
-                value_batch = [None] * num
-                reward_batch = [None] * num
+                leaf_node_is_chance = np.asarray(leaf_node_is_chance, dtype=bool)
+                value_batch = np.zeros(num, dtype=np.float32)
+                reward_batch = np.zeros(num, dtype=np.float32)
                 policy_logits_batch = [None] * num
-                child_is_chance_batch = [None] * num
-                chance_nodes_index = []
-                decision_nodes_index = []
-
-                for i, leaf_node_is_chance_ in enumerate(leaf_node_is_chance):
-                    if leaf_node_is_chance_:
-                        chance_nodes_index.append(i)
-                    else:
-                        decision_nodes_index.append(i)
-
-                def process_nodes(nodes_index, is_chance):
-                    # Return early if nodes_index is empty
-                    if not nodes_index:
-                        return
-
-                    # Slice and stack latent_states and last_actions based on nodes_index
-                    latent_states_stack = torch.stack([latent_states[i] for i in nodes_index], dim=0)
-                    last_actions_stack = torch.stack([last_actions[i] for i in nodes_index], dim=0)
-
-                    # Pass the stacked batch through the recurrent_inference function
-                    network_output_batch = model.recurrent_inference(latent_states_stack,
-                                                                     last_actions_stack,
-                                                                     afterstate=not is_chance)
-
-                    # Split the batch output into separate nodes
-                    latent_state_splits = torch.split(network_output_batch.latent_state, 1, dim=0)
-                    value_splits = torch.split(network_output_batch.value, 1, dim=0)
-                    reward_splits = torch.split(network_output_batch.reward, 1, dim=0)
-                    policy_logits_splits = torch.split(network_output_batch.policy_logits, 1, dim=0)
-
-                    for i, (latent_state, value, reward, policy_logits) in zip(nodes_index,
-                                                                               zip(latent_state_splits, value_splits,
-                                                                                   reward_splits,
-                                                                                   policy_logits_splits)):
-                        if not model.training:
-                            value = self.inverse_scalar_transform_handle(value).detach().cpu().numpy()
-                            reward = self.inverse_scalar_transform_handle(reward).detach().cpu().numpy()
-                            latent_state = latent_state.detach().cpu().numpy()
-                            policy_logits = policy_logits.detach().cpu().numpy()
-
-                        latent_state_batch[i] = latent_state
-                        value_batch[i] = value.reshape(-1).tolist()
-                        reward_batch[i] = reward.reshape(-1).tolist()
-                        policy_logits_batch[i] = policy_logits.tolist()
-                        child_is_chance_batch[i] = is_chance
-
-                process_nodes(chance_nodes_index, True)
-                process_nodes(decision_nodes_index, False)
-                chance_nodes = chance_nodes_index
-                decision_nodes = decision_nodes_index
-
-                value_batch_chance = [value_batch[leaf_idx] for leaf_idx in chance_nodes]
-                value_batch_decision = [value_batch[leaf_idx] for leaf_idx in decision_nodes]
-                reward_batch_chance = [reward_batch[leaf_idx] for leaf_idx in chance_nodes]
-                reward_batch_decision = [reward_batch[leaf_idx] for leaf_idx in decision_nodes]
-                policy_logits_batch_chance = [policy_logits_batch[leaf_idx] for leaf_idx in chance_nodes]
-                policy_logits_batch_decision = [policy_logits_batch[leaf_idx] for leaf_idx in decision_nodes]
-
-                latent_state_batch = np.concatenate(latent_state_batch, axis=0)
-                latent_state_batch_in_search_path.append(latent_state_batch)
+                next_latent_states = None
+                for is_chance in [True, False]:
+                    nodes_index = np.flatnonzero(leaf_node_is_chance == is_chance)
+                    if len(nodes_index) == 0:
+                        continue
+                    nodes_index_tensor = torch.from_numpy(nodes_index).to(self._cfg.device)
+                    network_output = model.recurrent_inference(
+                        latent_states[nodes_index_tensor], last_actions[nodes_index_tensor], afterstate=not is_chance
+                    )
+                    if next_latent_states is None:
+                        next_latent_states = network_output.latent_state.new_empty(
+                            (num, ) + tuple(network_output.latent_state.shape[1:])
+                        )
+                    next_latent_states[nodes_index_tensor] = network_output.latent_state
+                    value_batch[nodes_index] = to_detach_cpu_numpy(
+                        self.inverse_scalar_transform_handle(network_output.value)
+                    ).reshape(-1)
+                    reward_batch[nodes_index] = to_detach_cpu_numpy(
+                        self.inverse_scalar_transform_handle(network_output.reward)
+                    ).reshape(-1)
+                    # the policy logits of the chance and decision leaves have different sizes.
+                    for i, policy_logits in zip(nodes_index.tolist(),
+                                                to_detach_cpu_numpy(network_output.policy_logits).tolist()):
+                        policy_logits_batch[i] = policy_logits
+
+                if use_latent_state_pool:
+                    latent_state_pool.store(simulation_index + 1, next_latent_states)
+                else:
+                    latent_state_batch_in_search_path.append(to_detach_cpu_numpy(next_latent_states))
 
                 # In ``batch_backpropagate()``, we first expand the leaf node using ``the policy_logits`` and
                 # ``reward`` predicted by the model, then perform backpropagation along the search path to update the
-                # statistics.
+                # statistics. The chance mask tells whether the child of each leaf is a chance node. As the trees of
+                # the batch are independent, one call over all the leaves gives the same trees as one call per group.
 
                 # NOTE: simulation_index + 1 is very important, which is the depth of the current leaf node.
                 current_latent_state_index = simulation_index + 1
-
-                if (len(chance_nodes) > 0):
-                    value_batch_chance = np.concatenate(value_batch_chance, axis=0).reshape(-1).tolist()
-                    reward_batch_chance = np.concatenate(reward_batch_chance, axis=0).reshape(-1).tolist()
-                    policy_logits_batch_chance = np.concatenate(policy_logits_batch_chance, axis=0).tolist()
-                    stochastic_mz_tree.batch_backpropagate(
-                        current_latent_state_index, discount_factor, reward_batch_chance, value_batch_chance,
-                        policy_logits_batch_chance,
-                        min_max_stats_lst, results, virtual_to_play_batch, child_is_chance_batch, chance_nodes
-                    )
-                if (len(decision_nodes) > 0):
-                    value_batch_decision = np.concatenate(value_batch_decision, axis=0).reshape(-1).tolist()
-                    reward_batch_decision = np.concatenate(reward_batch_decision, axis=0).reshape(-1).tolist()
-                    policy_logits_batch_decision = np.concatenate(policy_logits_batch_decision, axis=0).tolist()
-                    stochastic_mz_tree.batch_backpropagate(
-                        current_latent_state_index, discount_factor, reward_batch_decision, value_batch_decision,
-                        policy_logits_batch_decision,
-                        min_max_stats_lst, results, virtual_to_play_batch, child_is_chance_batch, decision_nodes
-                    )
+                stochastic_mz_tree.batch_backpropagate(
+                    current_latent_state_index, discount_factor, reward_batch.tolist(), value_batch.tolist(),
+                    policy_logits_batch, min_max_stats_lst, results, virtual_to_play_batch,
+                    leaf_node_is_chance.tolist(), list(range(num))
+                )
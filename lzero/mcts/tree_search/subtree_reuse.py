@@ -0,0 +1,134 @@
+from collections import namedtuple
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from lzero.mcts.tree_search.latent_state_pool import LatentStatePool
+from lzero.policy import to_detach_cpu_numpy
+
+# The states of the subtrees carried over as the roots of a search. ``states`` holds one array of shape
+# ``(num_layers + 1, batch_size, *state_shape)`` per kind of state (the latent states, and the value prefix hidden
+# states in LSTM for EfficientZero), where layer 0 holds the states of the reused roots and layer k holds the state of
+# the k-th node of each subtree. ``is_reused`` marks the roots that are subtrees of the previous search,
+# ``root_depths`` counts the moves of each env since its last root that was not reused (0 for the fresh roots), and
+# ``num_simulations`` is the smallest number of simulations already spent on a root.
+ReusedSubtrees = namedtuple('ReusedSubtrees', ['states', 'is_reused', 'root_depths', 'num_simulations'])
+
+
+def gather_search_states(storage: Any, index_in_search_path: List[int], index_in_batch: List[int]) -> np.ndarray:
+    """
+    Overview:
+        Gather the states at the given indices from the state storage of a search, i.e. a ``LatentStatePool`` or the
+        list of the batched states of each simulation.
+    Arguments:
+        - storage (:obj:`Union[LatentStatePool, List[np.ndarray]]`): The state storage of the search.
+        - index_in_search_path (:obj:`List[int]`): The ``current_latent_state_index`` of the nodes.
+        - index_in_batch (:obj:`List[int]`): The ``batch_index`` of the nodes.
+    Returns:
+        - states (:obj:`np.ndarray`): The states of the nodes.
+    """
+    if isinstance(storage, LatentStatePool):
+        return to_detach_cpu_numpy(storage.gather(index_in_search_path, index_in_batch))
+    return np.stack([storage[ix][iy] for ix, iy in zip(index_in_search_path, index_in_batch)])
+
+
+class SubtreeCache(object):
+    """
+    Overview:
+        The subtrees of the actions taken after the last search of each env, kept to be reused as the roots of the
+        next search of the env, together with the state storage of the search they come from.
+        The latent states of a reused subtree are predicted by the dynamics model from the last root which was not
+        reused, and not encoded from the new observations. So an env starts from a fresh root, encoded from its
+        observation, once its roots have been reused ``max_depth`` times in a row.
+    Interfaces:
+        ``__init__``, ``save``, ``reuse``, ``reset``
+    """
+
+    def __init__(self, max_depth: Optional[int] = None) -> None:
+        """
+        Arguments:
+            - max_depth (:obj:`Optional[int]`): The max number of moves in a row whose roots are reused subtrees, \
+                None means no limit.
+        """
+        self._max_depth = max_depth
+        self._subtrees = {}
+        self._root_depths = {}
+
+    def save(self, roots: Any, env_ids: Sequence[int], actions: Sequence[int], storages: List[Any]) -> None:
+        """
+        Overview:
+            Keep the subtrees of the actions taken at the roots of a finished search.
+        Arguments:
+            - roots (:obj:`Any`): The searched roots.
+            - env_ids (:obj:`Sequence[int]`): The env id of each root.
+            - actions (:obj:`Sequence[int]`): The action taken at each root.
+            - storages (:obj:`List[Any]`): The state storages of the search, see ``gather_search_states``.
+        """
+        for i, (env_id, action) in enumerate(zip(env_ids, actions)):
+            self._subtrees[env_id] = (roots, i, int(action), storages, self._root_depths.get(env_id, 0))
+
+    def reuse(
+            self,
+            roots: Any,
+            env_ids: Sequence[int],
+            root_noise_weight: float = 0.,
+            noises: Optional[List[List[float]]] = None
+    ) -> Optional[ReusedSubtrees]:
+        """
+        Overview:
+            Replace the prepared roots with the kept subtrees of their envs, when they can be reused.
+        Arguments:
+            - roots (:obj:`Any`): The prepared roots of the next search.
+            - env_ids (:obj:`Sequence[int]`): The env id of each root.
+            - root_noise_weight (:obj:`float`): The exploration fraction of the noise added to the reused roots.
+            - noises (:obj:`Optional[List[List[float]]]`): The noise added to each root.
+        Returns:
+            - reused_subtrees (:obj:`Optional[ReusedSubtrees]`): The states of the reused subtrees, or None if no \
+                subtree is reused.
+        """
+        reused_states = [None for _ in range(roots.num)]
+        root_depths = np.zeros(roots.num, dtype=np.int64)
+        for i, env_id in enumerate(env_ids):
+            self._root_depths[env_id] = 0
+            subtree = self._subtrees.pop(env_id, None)
+            if subtree is None:
+                continue
+            last_roots, root_index, action, storages, last_root_depth = subtree
+            if self._max_depth is not None and last_root_depth >= self._max_depth:
+                continue
+            index_in_search_path, index_in_batch = roots.reuse(
+                i, last_roots, root_index, action, root_noise_weight, None if noises is None else noises[i]
+            )
+            if len(index_in_search_path) > 0:
+                reused_states[i] = [
+                    gather_search_states(storage, index_in_search_path, index_in_batch) for storage in storages
+                ]
+                root_depths[i] = self._root_depths[env_id] = last_root_depth + 1
+        is_reused = np.array([states is not None for states in reused_states])
+        if not is_reused.any():
+            return None
+
+        num_layers = max(len(states[0]) for states in reused_states if states is not None)
+        states = []
+        for k, template in enumerate(reused_states[int(np.argmax(is_reused))]):
+            layers = np.zeros((num_layers, roots.num) + template.shape[1:], dtype=template.dtype)
+            for i, subtree_states in enumerate(reused_states):
+                if subtree_states is not None:
+                    layers[:len(subtree_states[k]), i] = subtree_states[k]
+            states.append(layers)
+        # every simulation through a root visits one of its children
+        num_simulations = min(sum(distribution) for distribution in roots.get_distributions())
+        return ReusedSubtrees(states, is_reused, root_depths, num_simulations)
+
+    def reset(self, env_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        Overview:
+            Drop the kept subtrees of the given envs, e.g. when their episodes end, or of all the envs if None.
+        """
+        if env_ids is None:
+            self._subtrees.clear()
+            self._root_depths.clear()
+        else:
+            for env_id in env_ids:
+                self._subtrees.pop(env_id, None)
+                self._root_depths.pop(env_id, None)
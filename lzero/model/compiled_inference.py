@@ -0,0 +1,186 @@
+"""
+Overview:
+    In this file, we provide the compiled inference mode of the MuZero models (``MuZeroModel`` and
+    ``MuZeroModelMLP``). The MCTS search and the reanalyze of the replay buffer call ``initial_inference`` and
+    ``recurrent_inference`` of the model in eval mode with many small batches of varying sizes, so that the inference
+    is dominated by the eager dispatch of the small operators of the representation, dynamics and prediction networks
+    (e.g. ``DownSample``, ``RepresentationNetwork`` and ``PredictionNetwork``). In the compiled inference mode, every
+    batch is padded to the nearest of a few static batch sizes (buckets), and each inference step of each bucket runs
+    a TorchScript trace (or a ``torch.compile`` graph) of the whole step, which shares the parameters of the model.
+"""
+import copy
+import warnings
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+
+class _InitialInferenceStep(nn.Module):
+    """
+    Overview:
+        The tensor-only initial inference step of a MuZero model, i.e. the representation and prediction networks.
+    """
+
+    def __init__(self, model: nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, obs: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        latent_state = self.model._representation(obs)
+        policy_logits, value = self.model._prediction(latent_state)
+        return latent_state, policy_logits, value
+
+
+class _RecurrentInferenceStep(nn.Module):
+    """
+    Overview:
+        The tensor-only recurrent inference step of a MuZero model, i.e. the dynamics and prediction networks.
+    """
+
+    def __init__(self, model: nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, latent_state: torch.Tensor,
+                action: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        next_latent_state, reward = self.model._dynamics(latent_state, action)
+        policy_logits, value = self.model._prediction(next_latent_state)
+        return next_latent_state, reward, policy_logits, value
+
+
+class CompiledInference(object):
+    """
+    Overview:
+        The compiled inference steps of a MuZero model, with static-shape batch bucketing. The steps of a bucket are
+        traced (or compiled) lazily at the first batch which falls into it. The traced steps share the parameters of
+        the model, so that the in-place updates of the optimizer and ``load_state_dict`` are seen without retracing.
+        Because the traces record the eval-mode behaviour of the normalization layers, they are only used when the
+        model is not in training mode, and the compiled steps are dropped when the model is copied or pickled.
+    Interfaces:
+        ``__init__``, ``bucket_size``, ``initial_inference``, ``recurrent_inference``
+    """
+
+    def __init__(
+            self,
+            model: nn.Module,
+            batch_buckets: Sequence[int] = (8, 16, 32, 64, 128, 256),
+            backend: str = 'torchscript',
+    ) -> None:
+        """
+        Overview:
+            Build the compiled inference of ``model``.
+        Arguments:
+            - model (:obj:`nn.Module`): The MuZero model, which has the ``_representation``, ``_dynamics`` and \
+                ``_prediction`` methods.
+            - batch_buckets (:obj:`Sequence[int]`): The static batch sizes. A batch is padded to the smallest bucket \
+                which is no less than its size, and a batch larger than the largest bucket is split into chunks of it.
+            - backend (:obj:`str`): The compilation backend. Options are ['torchscript', 'torch_compile'].
+        """
+        assert backend in ['torchscript', 'torch_compile'], "backend must in ['torchscript', 'torch_compile']"
+        assert len(batch_buckets) > 0 and all(b > 0 for b in batch_buckets), "batch_buckets must be positive integers"
+        if backend == 'torch_compile':
+            assert hasattr(torch, 'compile'), "the torch_compile backend requires torch>=2.0"
+        self._model = model
+        self._batch_buckets = sorted(set(int(b) for b in batch_buckets))
+        self._backend = backend
+        self._steps = {'initial': _InitialInferenceStep(model), 'recurrent': _RecurrentInferenceStep(model)}
+        self._compiled_steps: Dict[Tuple, Callable] = {}
+
+    def __deepcopy__(self, memo: dict) -> 'CompiledInference':
+        return CompiledInference(copy.deepcopy(self._model, memo), self._batch_buckets, self._backend)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state['_compiled_steps'] = {}
+        return state
+
+    def bucket_size(self, batch_size: int) -> int:
+        """
+        Overview:
+            Return the static batch size which a batch of ``batch_size`` samples is padded to.
+        """
+        for bucket in self._batch_buckets:
+            if bucket >= batch_size:
+                return bucket
+        return self._batch_buckets[-1]
+
+    def initial_inference(self, obs: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Overview:
+            Run the initial inference step of the model on ``obs`` with the compiled step of its bucket.
+        Returns:
+            - latent_state (:obj:`torch.Tensor`): The encoding latent state of input state.
+            - policy_logits (:obj:`torch.Tensor`): The output logit to select discrete action.
+            - value (:obj:`torch.Tensor`): The output value of input state.
+        """
+        return self._run('initial', obs)
+
+    def recurrent_inference(self, latent_state: torch.Tensor,
+                            action: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Overview:
+            Run the recurrent inference step of the model on ``latent_state`` and ``action`` with the compiled step \
+            of their bucket.
+        Returns:
+            - next_latent_state (:obj:`torch.Tensor`): The predicted next latent state.
+            - reward (:obj:`torch.Tensor`): The predicted reward of input state and selected action.
+            - policy_logits (:obj:`torch.Tensor`): The output logit to select discrete action.
+            - value (:obj:`torch.Tensor`): The output value of the next latent state.
+        """
+        return self._run('recurrent', latent_state, action)
+
+    def _run(self, kind: str, *inputs: torch.Tensor) -> Tuple[torch.Tensor, ...]:
+        batch_size = inputs[0].shape[0]
+        max_bucket = self._batch_buckets[-1]
+        if batch_size > max_bucket:
+            chunks = [
+                self._run(kind, *[x[start:start + max_bucket] for x in inputs])
+                for start in range(0, batch_size, max_bucket)
+            ]
+            return tuple(torch.cat(outputs, dim=0) for outputs in zip(*chunks))
+
+        bucket = self.bucket_size(batch_size)
+        if bucket > batch_size:
+            # pad with zero observations / latent states and action 0, which are sliced off after the step. As the
+            # normalization layers are in eval mode, the padding samples do not change the outputs of the others.
+            inputs = [torch.cat([x, x.new_zeros((bucket - batch_size, ) + tuple(x.shape[1:]))]) for x in inputs]
+        outputs = self._compiled_step(kind, bucket, inputs)(*inputs)
+        return tuple(y[:batch_size] for y in outputs)
+
+    def _compiled_step(self, kind: str, bucket: int, inputs: Sequence[torch.Tensor]) -> Callable:
+        key = (kind, bucket) + tuple((x.device, x.dtype, tuple(x.shape[1:])) for x in inputs)
+        step = self._compiled_steps.get(key, None)
+        if step is None:
+            if self._backend == 'torchscript':
+                # the batch size of the action encoding is recorded as a constant, which the bucket makes static.
+                with torch.no_grad(), warnings.catch_warnings():
+                    warnings.simplefilter('ignore', torch.jit.TracerWarning)
+                    step = torch.jit.trace(self._steps[kind], tuple(inputs), check_trace=False)
+            else:
+                step = torch.compile(self._steps[kind], dynamic=False)
+            self._compiled_steps[key] = step
+        return step
+
+
+def enable_compiled_inference(
+        model: nn.Module,
+        batch_buckets: Sequence[int] = (8, 16, 32, 64, 128, 256),
+        backend: str = 'torchscript',
+) -> Optional[CompiledInference]:
+    """
+    Overview:
+        Turn on the compiled inference mode of a MuZero model, which is used by its ``initial_inference`` and \
+        ``recurrent_inference`` in eval mode. It is a no-op for the models without the compiled inference mode.
+    Arguments:
+        - model (:obj:`nn.Module`): The model, e.g. ``MuZeroModel`` or ``MuZeroModelMLP``.
+        - batch_buckets (:obj:`Sequence[int]`): The static batch sizes of the compiled steps.
+        - backend (:obj:`str`): The compilation backend. Options are ['torchscript', 'torch_compile'].
+    Returns:
+        - compiled_inference (:obj:`Optional[CompiledInference]`): The compiled inference of the model, or None if \
+            the model does not support it.
+    """
+    if not hasattr(model, 'compiled_inference'):
+        return None
+    model.compiled_inference = CompiledInference(model, batch_buckets, backend)
+    return model.compiled_inference
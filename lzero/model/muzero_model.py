@@ -114,6 +114,8 @@ class MuZeroModel(nn.Module):
         self.self_supervised_learning_loss = self_supervised_learning_loss
         self.last_linear_layer_init_zero = last_linear_layer_init_zero
         self.state_norm = state_norm
+        # the compiled inference steps used in eval mode, see ``lzero.model.compiled_inference``.
+        self.compiled_inference = None
         self.downsample = downsample
 
         flatten_output_size_for_reward_head = (
@@ -219,8 +221,11 @@ class MuZeroModel(nn.Module):
                 latent state, W_ is the width of latent state.
          """
         batch_size = obs.size(0)
-        latent_state = self._representation(obs)
-        policy_logits, value = self._prediction(latent_state)
+        if self.compiled_inference is not None and not self.training:
+            latent_state, policy_logits, value = self.compiled_inference.initial_inference(obs)
+        else:
+            latent_state = self._representation(obs)
+            policy_logits, value = self._prediction(latent_state)
         return MZNetworkOutput(
             value,
             [0. for _ in range(batch_size)],
@@ -256,8 +261,13 @@ class MuZeroModel(nn.Module):
             - next_latent_state (:obj:`torch.Tensor`): :math:`(B, H_, W_)`, where B is batch_size, H_ is the height of \
                 latent state, W_ is the width of latent state.
          """
-        next_latent_state, reward = self._dynamics(latent_state, action)
-        policy_logits, value = self._prediction(next_latent_state)
+        if self.compiled_inference is not None and not self.training:
+            next_latent_state, reward, policy_logits, value = self.compiled_inference.recurrent_inference(
+                latent_state, action
+            )
+        else:
+            next_latent_state, reward = self._dynamics(latent_state, action)
+            policy_logits, value = self._prediction(next_latent_state)
         return MZNetworkOutput(value, reward, policy_logits, next_latent_state)
 
     def _representation(self, observation: torch.Tensor) -> torch.Tensor:
@@ -99,6 +99,8 @@ class MuZeroModelMLP(nn.Module):
         self.self_supervised_learning_loss = self_supervised_learning_loss
         self.last_linear_layer_init_zero = last_linear_layer_init_zero
         self.state_norm = state_norm
+        # the compiled inference steps used in eval mode, see ``lzero.model.compiled_inference``.
+        self.compiled_inference = None
         self.res_connection_in_dynamics = res_connection_in_dynamics
 
         self.representation_network = RepresentationNetworkMLP(
@@ -167,8 +169,11 @@ class MuZeroModelMLP(nn.Module):
             - latent_state (:obj:`torch.Tensor`): :math:`(B, H)`, where B is batch_size, H is the dimension of latent state.
         """
         batch_size = obs.size(0)
-        latent_state = self._representation(obs)
-        policy_logits, value = self._prediction(latent_state)
+        if self.compiled_inference is not None and not self.training:
+            latent_state, policy_logits, value = self.compiled_inference.initial_inference(obs)
+        else:
+            latent_state = self._representation(obs)
+            policy_logits, value = self._prediction(latent_state)
         return MZNetworkOutput(
             value,
             [0. for _ in range(batch_size)],
@@ -199,8 +204,13 @@ class MuZeroModelMLP(nn.Module):
             - latent_state (:obj:`torch.Tensor`): :math:`(B, H)`, where B is batch_size, H is the dimension of latent state.
             - next_latent_state (:obj:`torch.Tensor`): :math:`(B, H)`, where B is batch_size, H is the dimension of latent state.
         """
-        next_latent_state, reward = self._dynamics(latent_state, action)
-        policy_logits, value = self._prediction(next_latent_state)
+        if self.compiled_inference is not None and not self.training:
+            next_latent_state, reward, policy_logits, value = self.compiled_inference.recurrent_inference(
+                latent_state, action
+            )
+        else:
+            next_latent_state, reward = self._dynamics(latent_state, action)
+            policy_logits, value = self._prediction(next_latent_state)
         return MZNetworkOutput(value, reward, policy_logits, next_latent_state)
 
     def _representation(self, observation: torch.Tensor) -> Tuple[torch.Tensor]:
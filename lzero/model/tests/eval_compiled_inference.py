@@ -0,0 +1,55 @@
+"""
+Overview:
+    CPU benchmark of the compiled inference mode of the MuZero models. For the Atari-sized ``MuZeroModel`` and the
+    CartPole-sized ``MuZeroModelMLP`` it reports the latency of ``recurrent_inference`` in eval mode at the batch sizes
+    8, 64 and 256, in eager mode and with the ``torchscript`` backend, the inference batches being padded to the
+    default batch buckets. The batch sizes 7 and 100 show the cost of padding to the next bucket.
+"""
+import copy
+import time
+
+import torch
+
+from lzero.model.compiled_inference import enable_compiled_inference
+from lzero.model.muzero_model import MuZeroModel
+from lzero.model.muzero_model_mlp import MuZeroModelMLP
+
+
+def recurrent_inference_latency(model: torch.nn.Module, latent_state: torch.Tensor, num_iters: int = 50) -> float:
+    """
+    Overview:
+        Return the mean latency in milliseconds of ``recurrent_inference`` on ``latent_state``, after warmup.
+    """
+    action = torch.randint(0, model.action_space_size, (latent_state.shape[0], ))
+    with torch.no_grad():
+        for _ in range(5):
+            model.recurrent_inference(latent_state, action)
+        t0 = time.perf_counter()
+        for _ in range(num_iters):
+            model.recurrent_inference(latent_state, action)
+    return (time.perf_counter() - t0) / num_iters * 1000
+
+
+if __name__ == "__main__":
+    torch.set_num_threads(4)
+    models = {
+        'MuZeroModel (atari)': (
+            MuZeroModel(observation_shape=(4, 96, 96), action_space_size=6, downsample=True), (64, 6, 6)
+        ),
+        'MuZeroModelMLP (cartpole)': (
+            MuZeroModelMLP(observation_shape=4, action_space_size=2, latent_state_dim=128), (128, )
+        ),
+    }
+    for name, (model, latent_shape) in models.items():
+        model.eval()
+        compiled_model = copy.deepcopy(model)
+        enable_compiled_inference(compiled_model, backend='torchscript')
+        print(name)
+        for batch_size in [7, 8, 64, 100, 256]:
+            latent_state = torch.randn(batch_size, *latent_shape)
+            eager_latency = recurrent_inference_latency(model, latent_state)
+            compiled_latency = recurrent_inference_latency(compiled_model, latent_state)
+            print(
+                f'  batch_size={batch_size}: eager {eager_latency:.2f} ms, torchscript {compiled_latency:.2f} ms '
+                f'({eager_latency / compiled_latency:.2f}x)'
+            )
@@ -0,0 +1,112 @@
+import copy
+import pickle
+
+import pytest
+import torch
+
+from lzero.model.compiled_inference import enable_compiled_inference
+from lzero.model.muzero_model import MuZeroModel
+from lzero.model.muzero_model_mlp import MuZeroModelMLP
+
+
+def make_model(model_type: str):
+    torch.manual_seed(0)
+    if model_type == 'conv':
+        model = MuZeroModel(
+            observation_shape=(3, 6, 6),
+            action_space_size=4,
+            num_res_blocks=1,
+            num_channels=8,
+            reward_head_channels=4,
+            value_head_channels=4,
+            policy_head_channels=4,
+            fc_reward_layers=[16],
+            fc_value_layers=[16],
+            fc_policy_layers=[16],
+            reward_support_size=21,
+            value_support_size=21,
+            last_linear_layer_init_zero=False,
+        )
+        obs_shape = (3, 6, 6)
+    else:
+        model = MuZeroModelMLP(
+            observation_shape=5,
+            action_space_size=4,
+            latent_state_dim=16,
+            reward_support_size=21,
+            value_support_size=21,
+            last_linear_layer_init_zero=False,
+        )
+        obs_shape = (5, )
+    return model.eval(), obs_shape
+
+
+def assert_outputs_close(output, expected_output):
+    for key in ['value', 'policy_logits', 'latent_state']:
+        assert torch.allclose(getattr(output, key), getattr(expected_output, key), atol=1e-5), key
+    if isinstance(expected_output.reward, torch.Tensor):
+        assert torch.allclose(output.reward, expected_output.reward, atol=1e-5)
+    else:
+        assert output.reward == expected_output.reward
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('model_type', ['conv', 'mlp'])
+@pytest.mark.parametrize('backend', ['torchscript', 'torch_compile'])
+def test_compiled_inference_parity(model_type, backend):
+    model, obs_shape = make_model(model_type)
+    compiled_model = copy.deepcopy(model)
+    compiled_inference = enable_compiled_inference(compiled_model, batch_buckets=[4, 8], backend=backend)
+    with torch.no_grad():
+        # batch sizes which are padded to a bucket, match a bucket, and are split into chunks of the largest bucket
+        for batch_size in [3, 8, 19]:
+            obs = torch.randn(batch_size, *obs_shape)
+            action = torch.randint(0, 4, (batch_size, ))
+            output = compiled_model.initial_inference(obs)
+            expected_output = model.initial_inference(obs)
+            assert_outputs_close(output, expected_output)
+
+            next_output = compiled_model.recurrent_inference(output.latent_state, action)
+            expected_next_output = model.recurrent_inference(expected_output.latent_state, action)
+            assert_outputs_close(next_output, expected_next_output)
+    assert compiled_inference.bucket_size(3) == 4 and compiled_inference.bucket_size(19) == 8
+    assert len(compiled_inference._compiled_steps) == 4
+
+
+@pytest.mark.unittest
+def test_compiled_inference_shares_parameters():
+    model, obs_shape = make_model('mlp')
+    compiled_inference = enable_compiled_inference(model, batch_buckets=[8])
+    obs = torch.randn(5, *obs_shape)
+    with torch.no_grad():
+        model.initial_inference(obs)
+        # the in-place updates of the optimizer and load_state_dict are seen by the traced steps
+        for param in model.parameters():
+            param.add_(0.1)
+        output = model.initial_inference(obs)
+        model.compiled_inference = None
+        expected_output = model.initial_inference(obs)
+    assert_outputs_close(output, expected_output)
+    assert len(compiled_inference._compiled_steps) == 1
+
+
+@pytest.mark.unittest
+def test_compiled_inference_copy():
+    model, obs_shape = make_model('mlp')
+    enable_compiled_inference(model, batch_buckets=[8])
+    obs = torch.randn(5, *obs_shape)
+    with torch.no_grad():
+        model.initial_inference(obs)
+        # the training mode runs the eager networks
+        model.train()
+        model.initial_inference(obs)
+    assert len(model.compiled_inference._compiled_steps) == 1
+
+    for copied_model in [copy.deepcopy(model), pickle.loads(pickle.dumps(model))]:
+        assert copied_model.compiled_inference._model is copied_model
+        assert len(copied_model.compiled_inference._compiled_steps) == 0
+        copied_model.eval()
+        with torch.no_grad():
+            output = copied_model.initial_inference(obs)
+            expected_output = model.eval().initial_inference(obs)
+        assert_outputs_close(output, expected_output)
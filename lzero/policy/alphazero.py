@@ -1,6 +1,6 @@
 import copy
 from collections import namedtuple
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 
 import numpy as np
 import torch.distributions
@@ -98,10 +98,30 @@ class AlphaZeroPolicy(Policy):
             pb_c_base=19652,
             # (float) The initialization constant used in the PUCT formula for balancing exploration and exploitation during tree search.
             pb_c_init=1.25,
+            # (int) The maximum number of leaves of one tree that the C++ MCTS evaluates in the same batch. The leaves
+            # of all the ready envs are evaluated together, so the batch size is up to env_num * this value.
+            max_pending_leaves_per_tree=1,
+            # (float) The virtual loss added along the paths of the pending leaves, so that the other leaves selected
+            # in the same tree before their evaluation take different paths.
+            virtual_loss=1.0,
+            # (bool) Whether the C++ MCTS steps a native copy of the game state (available for tictactoe, connect4 and
+            # gomoku in the self-play simulation) instead of the Python simulate_env in the simulations.
+            use_native_game_state=True,
+            # (int) The maximum number of positions in the transposition table of the MCTS, which caches the network
+            # evaluations of the positions across the simulations and the moves, and merges the statistics of the nodes
+            # reached by different move orders. 0 disables it. It is only used in the deterministic self-play
+            # simulation of tictactoe, connect4 and gomoku, and is cleared whenever the network is updated.
+            transposition_table_size=0,
         ),
         other=dict(replay_buffer=dict(
             replay_buffer_size=int(1e6),
             save_episode=False,
+            # (bool) Whether ``train_alphazero`` keeps the transitions in an ``AlphaZeroReplayBuffer``, i.e. in
+            # preallocated contiguous arrays sampled as ready tensors, instead of a DI-engine buffer of dicts.
+            columnar=False,
+            # (bool) Whether the columnar buffer transforms each sampled position by a random symmetry of the square
+            # board. Only for the games with the 8 symmetries of the board, e.g. Gomoku, TicTacToe and Go.
+            symmetry_augmentation=False,
         )),
     )
 
@@ -153,8 +173,10 @@ class AlphaZeroPolicy(Policy):
         if self._cfg.torch_compile:
             self._learn_model = torch.compile(self._learn_model)
 
-    def _forward_learn(self, inputs: Dict[str, torch.Tensor]) -> Dict[str, float]:
-        inputs = default_collate(inputs)
+    def _forward_learn(self, inputs: Union[List[Dict], Dict[str, torch.Tensor]]) -> Dict[str, float]:
+        if not isinstance(inputs, dict):
+            # the list of transitions of a DI-engine buffer, while ``AlphaZeroReplayBuffer`` samples collated tensors
+            inputs = default_collate(inputs)
         if self._cuda:
             inputs = to_device(inputs, self._device)
         self._learn_model.train()
@@ -197,6 +219,8 @@ class AlphaZeroPolicy(Policy):
         self._optimizer.step()
         if self._cfg.lr_piecewise_constant_decay is True:
             self.lr_scheduler.step()
+        # the cached evaluations of the previous network are stale
+        self._clear_transposition_tables()
 
         # =============
         # after update
@@ -225,7 +249,11 @@ class AlphaZeroPolicy(Policy):
             self._collect_mcts = mcts_alphazero.MCTS(self._cfg.mcts.max_moves, self._cfg.mcts.num_simulations,
                                                      self._cfg.mcts.pb_c_base,
                                                      self._cfg.mcts.pb_c_init, self._cfg.mcts.root_dirichlet_alpha,
-                                                     self._cfg.mcts.root_noise_weight, self.simulate_env)
+                                                     self._cfg.mcts.root_noise_weight, self.simulate_env,
+                                                     self._cfg.mcts.max_pending_leaves_per_tree,
+                                                     self._cfg.mcts.virtual_loss,
+                                                     self._cfg.mcts.use_native_game_state,
+                                                     self._cfg.mcts.transposition_table_size)
         else:
             if self._cfg.sampled_algo:
                 from lzero.mcts.ptree.ptree_az_sampled import MCTS
@@ -258,13 +286,25 @@ class AlphaZeroPolicy(Policy):
         start_player_index = {env_id: obs[env_id]['current_player_index'] for env_id in ready_env_id}
         output = {}
         self._policy_model = self._collect_model
-        for env_id in ready_env_id:
-            state_config_for_simulation_env_reset = EasyDict(dict(start_player_index=start_player_index[env_id],
-                                                                  init_state=init_state[env_id],
-                                                                  katago_policy_init=False,
-                                                                  katago_game_state=katago_game_state[env_id]))
-            action, mcts_probs = self._collect_mcts.get_next_action(state_config_for_simulation_env_reset, self._policy_value_fn, self.collect_mcts_temperature, True)
-
+        state_configs_for_simulation_env_reset = [
+            EasyDict(dict(start_player_index=start_player_index[env_id],
+                          init_state=init_state[env_id],
+                          katago_policy_init=False,
+                          katago_game_state=katago_game_state[env_id])) for env_id in ready_env_id
+        ]
+        if self._cfg.mcts_ctree:
+            # search the trees of all the ready envs together, with batched leaf evaluations
+            next_actions = self._collect_mcts.get_next_actions(
+                state_configs_for_simulation_env_reset, self._policy_value_batch_fn, self.collect_mcts_temperature,
+                True
+            )
+        else:
+            next_actions = [
+                self._collect_mcts.get_next_action(
+                    state_config_for_simulation_env_reset, self._policy_value_fn, self.collect_mcts_temperature, True
+                ) for state_config_for_simulation_env_reset in state_configs_for_simulation_env_reset
+            ]
+        for env_id, (action, mcts_probs) in zip(ready_env_id, next_actions):
             output[env_id] = {
                 'action': action,
                 'probs': mcts_probs,
@@ -286,7 +326,11 @@ class AlphaZeroPolicy(Policy):
                                                   min(800, self._cfg.mcts.num_simulations * 4),
                                                   self._cfg.mcts.pb_c_base,
                                                   self._cfg.mcts.pb_c_init, self._cfg.mcts.root_dirichlet_alpha,
-                                                  self._cfg.mcts.root_noise_weight, self.simulate_env)
+                                                  self._cfg.mcts.root_noise_weight, self.simulate_env,
+                                                  self._cfg.mcts.max_pending_leaves_per_tree,
+                                                  self._cfg.mcts.virtual_loss,
+                                                  self._cfg.mcts.use_native_game_state,
+                                                  self._cfg.mcts.transposition_table_size)
         else:
             if self._cfg.sampled_algo:
                 from lzero.mcts.ptree.ptree_az_sampled import MCTS
@@ -319,14 +363,23 @@ class AlphaZeroPolicy(Policy):
         start_player_index = {env_id: obs[env_id]['current_player_index'] for env_id in ready_env_id}
         output = {}
         self._policy_model = self._eval_model
-        for env_id in ready_env_id:
-            state_config_for_simulation_env_reset = EasyDict(dict(start_player_index=start_player_index[env_id],
-                                                                  init_state=init_state[env_id],
-                                                                  katago_policy_init=False,
-                                                                  katago_game_state=katago_game_state[env_id]))
-            action, mcts_probs = self._eval_mcts.get_next_action(
-                state_config_for_simulation_env_reset, self._policy_value_fn, 1.0, False
+        state_configs_for_simulation_env_reset = [
+            EasyDict(dict(start_player_index=start_player_index[env_id],
+                          init_state=init_state[env_id],
+                          katago_policy_init=False,
+                          katago_game_state=katago_game_state[env_id])) for env_id in ready_env_id
+        ]
+        if self._cfg.mcts_ctree:
+            # search the trees of all the ready envs together, with batched leaf evaluations
+            next_actions = self._eval_mcts.get_next_actions(
+                state_configs_for_simulation_env_reset, self._policy_value_batch_fn, 1.0, False
             )
+        else:
+            next_actions = [
+                self._eval_mcts.get_next_action(state_config_for_simulation_env_reset, self._policy_value_fn, 1.0, False)
+                for state_config_for_simulation_env_reset in state_configs_for_simulation_env_reset
+            ]
+        for env_id, (action, mcts_probs) in zip(ready_env_id, next_actions):
             output[env_id] = {
                 'action': action,
                 'probs': mcts_probs,
@@ -379,6 +432,45 @@ class AlphaZeroPolicy(Policy):
         action_probs_dict = dict(zip(legal_actions, action_probs.squeeze(0)[legal_actions].detach().cpu().numpy()))
         return action_probs_dict, value.item()
 
+    @torch.no_grad()
+    def _policy_value_batch_fn(self, states: Union[List[np.ndarray], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Overview:
+            Evaluate the states of the leaves selected by the batched C++ MCTS in one forward pass.
+        Arguments:
+            - states (:obj:`Union[List[np.ndarray], np.ndarray]`): The scaled states of the leaves, i.e. \
+                ``env.current_state()[1]``, as a list, or as one array with the native game state.
+        Returns:
+            - action_probs (:obj:`np.ndarray`): The action probabilities of the leaves, of shape (N, action_space_size).
+            - values (:obj:`np.ndarray`): The values of the leaves, of shape (N, ).
+        """
+        states = torch.from_numpy(np.stack(states)).to(device=self._device, dtype=torch.float)
+        action_probs, values = self._policy_model.compute_policy_value(states)
+        return action_probs.detach().cpu().numpy(), values.view(-1).detach().cpu().numpy()
+
+    def _clear_transposition_tables(self) -> None:
+        """
+        Overview:
+            Clear the transposition tables of the collect and eval MCTS, if they have one.
+        """
+        for mcts in [getattr(self, '_collect_mcts', None), getattr(self, '_eval_mcts', None)]:
+            if hasattr(mcts, 'clear_transposition_table'):
+                mcts.clear_transposition_table()
+
+    def _get_collect_transposition_table_stats(self) -> Optional[Dict[str, float]]:
+        """
+        Overview:
+            Return the statistics of the transposition table of the collect MCTS since the last call, i.e. its hit
+            rate and the number of network evaluations saved per move, or None if it has no enabled table.
+        """
+        if not hasattr(self._collect_mcts, 'get_transposition_table_stats'):
+            return None
+        stats = self._collect_mcts.get_transposition_table_stats()
+        self._collect_mcts.reset_transposition_table_stats()
+        if stats['capacity'] == 0:
+            return None
+        return stats
+
     def _monitor_vars_learn(self) -> List[str]:
         """
         Overview:
@@ -16,7 +16,7 @@ from lzero.model import ImageTransforms
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, select_action, to_torch_float_tensor, ez_network_output_unpack, negative_cosine_similarity, \
     prepare_obs, \
-    configure_optimizers
+    configure_optimizers, learn_autocast, unrolled_cross_entropy_loss, unrolled_entropy, tensors_to_host
 from lzero.policy.muzero import MuZeroPolicy
 
 
@@ -69,10 +69,24 @@ class EfficientZeroPolicy(MuZeroPolicy):
         gumbel_algo=False,
         # (bool) Whether to use C++ MCTS in policy. If False, use Python implementation.
         mcts_ctree=True,
+        # (bool) Whether the ctree search keeps its latent states in one preallocated tensor on the policy's device,
+        # instead of copying them to and from the host in every simulation.
+        use_latent_state_pool=False,
+        # (bool) Whether the ctree search of each env starts from the subtree of the action taken after its last search,
+        # keeping its visit counts, values and latent states, and only runs the simulations the root still lacks.
+        use_subtree_reuse=False,
+        # (int) The max number of moves in a row whose searches start from the reused subtrees of the last ones. The
+        # latent states of a reused subtree are predicted by the dynamics model instead of encoded from the new
+        # observations, so the root is encoded again from the observation after this number of moves. None means no
+        # limit. Only used when ``use_subtree_reuse=True``.
+        subtree_reuse_max_depth=5,
         # (bool) Whether to use cuda for network.
         cuda=True,
         # (int) The number of environments used in collecting data.
         collector_env_num=8,
+        # (bool) Whether the collector splits its envs into two groups and searches the ready envs of one group while
+        # the envs of the other group step, instead of stepping all the envs after the search of all the envs.
+        pipelined_collect=False,
         # (int) The number of environments used in evaluating policy.
         evaluator_env_num=3,
         # (str) The type of environment. The options are ['not_board_games', 'board_games'].
@@ -90,6 +104,13 @@ class EfficientZeroPolicy(MuZeroPolicy):
         # IMPORTANT: Setting eval_offline to True requires configuring the saving of checkpoints to align with the evaluation frequency.
         # This is done by setting the parameter learn.learner.hook.save_ckpt_after_iter to the same value as eval_freq in the train_muzero.py automatically.
         eval_offline=False,
+        # (dict) The config of the asynchronous evaluator (``MuZeroAsyncEvaluator``) of ``train_muzero``, which runs
+        # the evaluations in worker processes while the training continues, see its ``config`` for the other keys.
+        # It can not be used together with ``eval_offline``.
+        async_eval=dict(
+            # (int) The number of evaluation worker processes. 0 means the evaluations run inline in the training loop.
+            num_workers=0,
+        ),
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
@@ -129,6 +150,12 @@ class EfficientZeroPolicy(MuZeroPolicy):
         momentum=0.9,
         # (float) The maximum constraint value of gradient norm clipping.
         grad_clip_value=10,
+        # (bool) Whether the learn step stacks the network outputs of all the unroll steps, computes each loss once on
+        # the stacked tensors, and gathers the logging variables with a single device to host transfer.
+        fused_learn_step=False,
+        # (str) The autocast dtype of the network forward passes in the learn step, e.g. 'bfloat16'. None means float32.
+        # Only effective when ``fused_learn_step=True``, whose losses are computed in float32.
+        learn_autocast_dtype=None,
         # (int) The number of episodes in each collecting stage.
         n_episode=8,
         # (float) the number of simulations in MCTS.
@@ -166,6 +193,13 @@ class EfficientZeroPolicy(MuZeroPolicy):
         use_ture_chance_label_in_chance_encoder=False,
         # (bool) Whether to add noise to roots during reanalyze process.
         reanalyze_noise=False,
+        # (dict) The config of the background reanalyze service (``MuZeroReanalyzeService``) of ``train_muzero``,
+        # which computes the targets of the sampled batches in worker processes, see its ``config`` for the other keys.
+        reanalyze_service=dict(
+            # (int) The number of reanalyze worker processes. 0 means the learner reanalyzes every batch synchronously
+            # through ``replay_buffer.sample``.
+            num_workers=0,
+        ),
 
         # ****** Priority ******
         # (bool) Whether to use priority when sampling training data from the buffer.
@@ -265,6 +299,7 @@ class EfficientZeroPolicy(MuZeroPolicy):
             update_kwargs={'freq': self._cfg.target_update_freq}
         )
         self._learn_model = self._model
+        self._learn_autocast_dtype = self._cfg.learn_autocast_dtype if self._cfg.fused_learn_step else None
 
         if self._cfg.use_augmentation:
             self.image_transforms = ImageTransforms(
@@ -332,17 +367,21 @@ class EfficientZeroPolicy(MuZeroPolicy):
         # ==============================================================
         # the core initial_inference in EfficientZero policy.
         # ==============================================================
-        network_output = self._learn_model.initial_inference(obs_batch)
+        with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+            network_output = self._learn_model.initial_inference(obs_batch)
         # value_prefix shape: (batch_size, 10), the ``value_prefix`` at the first step is zero padding.
         latent_state, value_prefix, reward_hidden_state, value, policy_logits = ez_network_output_unpack(network_output)
 
         # transform the scaled value or its categorical representation to its original value,
         # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-        original_value = self.inverse_scalar_transform_handle(value)
+        original_value = self.inverse_scalar_transform_handle(value.float())
 
         # Note: The following lines are just for debugging.
         predicted_value_prefixs = []
-        if self._cfg.monitor_extra_statistics:
+        if self._cfg.fused_learn_step:
+            # the outputs of the unroll steps, whose losses are computed at once after the unroll.
+            policy_logits_steps, value_steps, value_prefix_steps = [policy_logits], [value], []
+        elif self._cfg.monitor_extra_statistics:
             predicted_values, predicted_policies = original_value.detach().cpu(), torch.softmax(
                 policy_logits, dim=1
             ).detach().cpu()
@@ -350,32 +389,33 @@ class EfficientZeroPolicy(MuZeroPolicy):
         # calculate the new priorities for each transition.
         value_priority = L1Loss(reduction='none')(original_value.squeeze(-1), target_value[:, 0]) + 1e-6
 
-        prob = torch.softmax(policy_logits, dim=-1)
-        policy_entropy = -(prob * prob.log()).sum(-1).mean()
+        if not self._cfg.fused_learn_step:
+            prob = torch.softmax(policy_logits, dim=-1)
+            policy_entropy = -(prob * prob.log()).sum(-1).mean()
 
-        # ==============================================================
-        # calculate policy and value loss for the first step.
-        # ==============================================================
-        policy_loss = cross_entropy_loss(policy_logits, target_policy[:, 0])
+            # ==============================================================
+            # calculate policy and value loss for the first step.
+            # ==============================================================
+            policy_loss = cross_entropy_loss(policy_logits, target_policy[:, 0])
 
-        # Here we take the init hypothetical step k=0.
-        target_normalized_visit_count_init_step = target_policy[:, 0]
+            # Here we take the init hypothetical step k=0.
+            target_normalized_visit_count_init_step = target_policy[:, 0]
 
-        # ******* NOTE: target_policy_entropy is only for debug.  ******
-        non_masked_indices = torch.nonzero(mask_batch[:, 0]).squeeze(-1)
-        # Check if there are any unmasked rows
-        if len(non_masked_indices) > 0:
-            target_normalized_visit_count_masked = torch.index_select(
-                target_normalized_visit_count_init_step, 0, non_masked_indices
-            )
-            target_policy_entropy = -((target_normalized_visit_count_masked+1e-6) * (target_normalized_visit_count_masked+1e-6).log()).sum(-1).mean()
-        else:
-            # Set target_policy_entropy to log(|A|) if all rows are masked
-            target_policy_entropy = torch.log(torch.tensor(target_normalized_visit_count_init_step.shape[-1]))
+            # ******* NOTE: target_policy_entropy is only for debug.  ******
+            non_masked_indices = torch.nonzero(mask_batch[:, 0]).squeeze(-1)
+            # Check if there are any unmasked rows
+            if len(non_masked_indices) > 0:
+                target_normalized_visit_count_masked = torch.index_select(
+                    target_normalized_visit_count_init_step, 0, non_masked_indices
+                )
+                target_policy_entropy = -((target_normalized_visit_count_masked+1e-6) * (target_normalized_visit_count_masked+1e-6).log()).sum(-1).mean()
+            else:
+                # Set target_policy_entropy to log(|A|) if all rows are masked
+                target_policy_entropy = torch.log(torch.tensor(target_normalized_visit_count_init_step.shape[-1]))
 
-        value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
+            value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
 
-        value_prefix_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            value_prefix_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
         consistency_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
 
         # ==============================================================
@@ -385,35 +425,47 @@ class EfficientZeroPolicy(MuZeroPolicy):
             # unroll with the dynamics function: predict the next ``latent_state``, ``reward_hidden_state``,
             # `` value_prefix`` given current ``latent_state`` ``reward_hidden_state`` and ``action``.
             # And then predict policy_logits and value  with the prediction function.
-            network_output = self._learn_model.recurrent_inference(
-                latent_state, reward_hidden_state, action_batch[:, step_k]
-            )
+            with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                network_output = self._learn_model.recurrent_inference(
+                    latent_state, reward_hidden_state, action_batch[:, step_k]
+                )
             latent_state, value_prefix, reward_hidden_state, value, policy_logits = ez_network_output_unpack(
                 network_output
             )
 
-            # transform the scaled value or its categorical representation to its original value,
-            # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-            original_value = self.inverse_scalar_transform_handle(value)
-
             # ==============================================================
             # calculate consistency loss for the next ``num_unroll_steps`` unroll steps.
             # ==============================================================
             if self._cfg.ssl_loss_weight > 0:
                 # obtain the oracle latent states from representation function.
                 beg_index, end_index = self._get_target_obs_index_in_step_k(step_k)
-                network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
+                with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                    network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
 
-                latent_state = to_tensor(latent_state)
-                representation_state = to_tensor(network_output.latent_state)
+                    latent_state = to_tensor(latent_state)
+                    representation_state = to_tensor(network_output.latent_state)
 
-                # NOTE: no grad for the representation_state branch.
-                dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
-                observation_proj = self._learn_model.project(representation_state, with_grad=False)
-                temp_loss = negative_cosine_similarity(dynamic_proj, observation_proj) * mask_batch[:, step_k]
+                    # NOTE: no grad for the representation_state branch.
+                    dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
+                    observation_proj = self._learn_model.project(representation_state, with_grad=False)
+                temp_loss = negative_cosine_similarity(
+                    dynamic_proj.float(), observation_proj.float()
+                ) * mask_batch[:, step_k]
 
                 consistency_loss += temp_loss
 
+            if self._cfg.fused_learn_step:
+                policy_logits_steps.append(policy_logits)
+                value_steps.append(value)
+                value_prefix_steps.append(value_prefix)
+                # reset hidden states every ``lstm_horizon_len`` unroll steps.
+                if (step_k + 1) % self._cfg.lstm_horizon_len == 0:
+                    reward_hidden_state = (
+                        torch.zeros(1, self._cfg.batch_size, self._cfg.model.lstm_hidden_size).to(self._cfg.device),
+                        torch.zeros(1, self._cfg.batch_size, self._cfg.model.lstm_hidden_size).to(self._cfg.device)
+                    )
+                continue
+
             # NOTE: the target policy, target_value_categorical, target_value_prefix_categorical is calculated in
             # game buffer now.
             # ==============================================================
@@ -459,6 +511,25 @@ class EfficientZeroPolicy(MuZeroPolicy):
                 predicted_value_prefixs.append(original_value_prefixs_cpu)
                 predicted_policies = torch.cat((predicted_policies, torch.softmax(policy_logits, dim=1).detach().cpu()))
 
+        if self._cfg.fused_learn_step:
+            # ==============================================================
+            # calculate the losses of all the unroll steps on the stacked outputs.
+            # ==============================================================
+            policy_loss = unrolled_cross_entropy_loss(policy_logits_steps, target_policy).sum(-1)
+            value_loss = unrolled_cross_entropy_loss(value_steps, target_value_categorical).sum(-1)
+            value_prefix_loss = unrolled_cross_entropy_loss(value_prefix_steps, target_value_prefix_categorical).sum(-1)
+            policy_entropy = unrolled_entropy(policy_logits_steps).mean(0).sum()
+
+            # ******* NOTE: target_policy_entropy is only for debug.  ******
+            # the mean entropy of the unmasked targets of each step, log(|A|) for the steps whose rows are all masked.
+            step_mask = mask_batch[:, :self._cfg.num_unroll_steps + 1]
+            step_count = step_mask.sum(0)
+            target_entropy = -((target_policy + 1e-6) * (target_policy + 1e-6).log()).sum(-1)
+            target_policy_entropy = torch.where(
+                step_count > 0, (target_entropy * step_mask).sum(0) / step_count.clamp(min=1),
+                torch.full_like(step_count, np.log(target_policy.shape[-1]))
+            ).sum()
+
         # ==============================================================
         # the core learn model update step.
         # ==============================================================
@@ -487,6 +558,37 @@ class EfficientZeroPolicy(MuZeroPolicy):
         # ==============================================================
         self._target_model.update(self._learn_model.state_dict())
 
+        if self._cfg.fused_learn_step:
+            with torch.no_grad():
+                predicted_values = self.inverse_scalar_transform_handle(torch.cat(value_steps).float())
+                predicted_value_prefixs = self.inverse_scalar_transform_handle(torch.cat(value_prefix_steps).float())
+            # all the logging scalars are moved to the host at once.
+            log_vars = tensors_to_host(dict(
+                weighted_total_loss=weighted_total_loss,
+                total_loss=loss.mean(),
+                policy_loss=policy_loss.mean(),
+                policy_entropy=policy_entropy / (self._cfg.num_unroll_steps + 1),
+                target_policy_entropy=target_policy_entropy / (self._cfg.num_unroll_steps + 1),
+                value_prefix_loss=value_prefix_loss.mean(),
+                value_loss=value_loss.mean(),
+                consistency_loss=consistency_loss.mean() / self._cfg.num_unroll_steps,
+                target_value_prefix=target_value_prefix.mean(),
+                target_value=target_value.mean(),
+                transformed_target_value_prefix=transformed_target_value_prefix.mean(),
+                transformed_target_value=transformed_target_value.mean(),
+                predicted_value_prefixs=predicted_value_prefixs.mean(),
+                predicted_values=predicted_values.mean(),
+                total_grad_norm_before_clip=total_grad_norm_before_clip,
+                value_priority=value_priority.mean(),
+            ))
+            return {
+                'collect_mcts_temperature': self._collect_mcts_temperature,
+                'collect_epsilon': self.collect_epsilon,
+                'cur_lr': self._optimizer.param_groups[0]['lr'],
+                **log_vars,
+                'value_priority_orig': value_priority,  # torch.tensor compatible with ddp settings
+            }
+
         if self._cfg.monitor_extra_statistics:
             predicted_value_prefixs = torch.stack(predicted_value_prefixs).transpose(1, 0).squeeze(-1)
             predicted_value_prefixs = predicted_value_prefixs.reshape(-1).unsqueeze(-1)
@@ -593,18 +695,29 @@ class EfficientZeroPolicy(MuZeroPolicy):
             else:
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_collect_env_num, legal_actions)
+            if ready_env_id is None:
+                ready_env_id = np.arange(active_collect_env_num)
+            use_subtree_reuse = self._cfg.mcts_ctree and self._cfg.use_subtree_reuse
+
             roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_roots, policy_logits, to_play)
-            self._mcts_collect.search(
-                roots, self._collect_model, latent_state_roots, reward_hidden_state_roots, to_play
-            )
+            if use_subtree_reuse:
+                reused_subtrees = self._mcts_collect.reuse_subtrees(
+                    roots, ready_env_id, self._cfg.root_noise_weight, noises
+                )
+                self._mcts_collect.search(
+                    roots, self._collect_model, latent_state_roots, reward_hidden_state_roots, to_play,
+                    reused_subtrees
+                )
+            else:
+                self._mcts_collect.search(
+                    roots, self._collect_model, latent_state_roots, reward_hidden_state_roots, to_play
+                )
 
             roots_visit_count_distributions = roots.get_distributions()
             roots_values = roots.get_values()  # shape: {list: batch_size}
 
             data_id = [i for i in range(active_collect_env_num)]
             output = {i: None for i in data_id}
-            if ready_env_id is None:
-                ready_env_id = np.arange(active_collect_env_num)
 
             for i, env_id in enumerate(ready_env_id):
                 distributions, value = roots_visit_count_distributions[i], roots_values[i]
@@ -633,6 +746,10 @@ class EfficientZeroPolicy(MuZeroPolicy):
                     'predicted_value': pred_values[i],
                     'predicted_policy_logits': policy_logits[i],
                 }
+            if use_subtree_reuse:
+                self._mcts_collect.save_subtrees(
+                    roots, ready_env_id, [output[env_id]['action'] for env_id in ready_env_id]
+                )
 
         return output
 
@@ -695,8 +812,18 @@ class EfficientZeroPolicy(MuZeroPolicy):
             else:
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_eval_env_num, legal_actions)
+            if ready_env_id is None:
+                ready_env_id = np.arange(active_eval_env_num)
+            use_subtree_reuse = self._cfg.mcts_ctree and self._cfg.use_subtree_reuse
+
             roots.prepare_no_noise(value_prefix_roots, policy_logits, to_play)
-            self._mcts_eval.search(roots, self._eval_model, latent_state_roots, reward_hidden_state_roots, to_play)
+            if use_subtree_reuse:
+                reused_subtrees = self._mcts_eval.reuse_subtrees(roots, ready_env_id)
+                self._mcts_eval.search(
+                    roots, self._eval_model, latent_state_roots, reward_hidden_state_roots, to_play, reused_subtrees
+                )
+            else:
+                self._mcts_eval.search(roots, self._eval_model, latent_state_roots, reward_hidden_state_roots, to_play)
 
             # list of list, shape: ``{list: batch_size} -> {list: action_space_size}``
             roots_visit_count_distributions = roots.get_distributions()
@@ -704,9 +831,6 @@ class EfficientZeroPolicy(MuZeroPolicy):
             data_id = [i for i in range(active_eval_env_num)]
             output = {i: None for i in data_id}
 
-            if ready_env_id is None:
-                ready_env_id = np.arange(active_eval_env_num)
-
             for i, env_id in enumerate(ready_env_id):
                 distributions, value = roots_visit_count_distributions[i], roots_values[i]
                 # NOTE: Only legal actions possess visit counts, so the ``action_index_in_legal_action_set`` represents
@@ -725,6 +849,8 @@ class EfficientZeroPolicy(MuZeroPolicy):
                     'predicted_value': pred_values[i],
                     'predicted_policy_logits': policy_logits[i],
                 }
+            if use_subtree_reuse:
+                self._mcts_eval.save_subtrees(roots, ready_env_id, [output[env_id]['action'] for env_id in ready_env_id])
 
         return output
 
@@ -15,7 +15,7 @@ from lzero.model import ImageTransforms
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, to_torch_float_tensor, mz_network_output_unpack, select_action, negative_cosine_similarity, \
     prepare_obs, \
-    configure_optimizers
+    configure_optimizers, learn_autocast, unrolled_cross_entropy_loss, unrolled_entropy, tensors_to_host
 from lzero.policy.muzero import MuZeroPolicy
 
 
@@ -70,10 +70,16 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         gumbel_algo=True,
         # (bool) Whether to use C++ MCTS in policy. If False, use Python implementation.
         mcts_ctree=True,
+        # (bool) Whether the ctree search keeps its latent states in one preallocated tensor on the policy's device,
+        # instead of copying them to and from the host in every simulation.
+        use_latent_state_pool=False,
         # (bool) Whether to use cuda for network.
         cuda=True,
         # (int) The number of environments used in collecting data.
         collector_env_num=8,
+        # (bool) Whether the collector splits its envs into two groups and searches the ready envs of one group while
+        # the envs of the other group step, instead of stepping all the envs after the search of all the envs.
+        pipelined_collect=False,
         # (int) The number of environments used in evaluating policy.
         evaluator_env_num=3,
         # (str) The type of environment. Options is ['not_board_games', 'board_games'].
@@ -91,6 +97,13 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         # IMPORTANT: Setting eval_offline to True requires configuring the saving of checkpoints to align with the evaluation frequency.
         # This is done by setting the parameter learn.learner.hook.save_ckpt_after_iter to the same value as eval_freq in the train_muzero.py automatically.
         eval_offline=False,
+        # (dict) The config of the asynchronous evaluator (``MuZeroAsyncEvaluator``) of ``train_muzero``, which runs
+        # the evaluations in worker processes while the training continues, see its ``config`` for the other keys.
+        # It can not be used together with ``eval_offline``.
+        async_eval=dict(
+            # (int) The number of evaluation worker processes. 0 means the evaluations run inline in the training loop.
+            num_workers=0,
+        ),
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
@@ -129,6 +142,12 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         momentum=0.9,
         # (float) The maximum constraint value of gradient norm clipping.
         grad_clip_value=10,
+        # (bool) Whether the learn step stacks the network outputs of all the unroll steps, computes each loss once on
+        # the stacked tensors, and gathers the logging variables with a single device to host transfer.
+        fused_learn_step=False,
+        # (str) The autocast dtype of the network forward passes in the learn step, e.g. 'bfloat16'. None means float32.
+        # Only effective when ``fused_learn_step=True``, whose losses are computed in float32.
+        learn_autocast_dtype=None,
         # (int) The number of episode in each collecting stage.
         n_episode=8,
         # (int) the number of simulations in MCTS.
@@ -163,6 +182,13 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         fixed_temperature_value=0.25,
         # (bool) Whether to add noise to roots during reanalyze process.
         reanalyze_noise=False,
+        # (dict) The config of the background reanalyze service (``MuZeroReanalyzeService``) of ``train_muzero``,
+        # which computes the targets of the sampled batches in worker processes, see its ``config`` for the other keys.
+        reanalyze_service=dict(
+            # (int) The number of reanalyze worker processes. 0 means the learner reanalyzes every batch synchronously
+            # through ``replay_buffer.sample``.
+            num_workers=0,
+        ),
 
         # ****** Priority ******
         # (bool) Whether to use priority when sampling training data from the buffer.
@@ -256,6 +282,7 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
             update_kwargs={'freq': self._cfg.target_update_freq}
         )
         self._learn_model = self._model
+        self._learn_autocast_dtype = self._cfg.learn_autocast_dtype if self._cfg.fused_learn_step else None
 
         if self._cfg.use_augmentation:
             self.image_transforms = ImageTransforms(
@@ -326,18 +353,22 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         # ==============================================================
         # the core initial_inference in Gumbel MuZero policy.
         # ==============================================================
-        network_output = self._learn_model.initial_inference(obs_batch)
+        with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+            network_output = self._learn_model.initial_inference(obs_batch)
 
         # value_prefix shape: (batch_size, 10), the ``value_prefix`` at the first step is zero padding.
         latent_state, reward, value, policy_logits = mz_network_output_unpack(network_output)
 
         # transform the scaled value or its categorical representation to its original value,
         # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-        original_value = self.inverse_scalar_transform_handle(value)
+        original_value = self.inverse_scalar_transform_handle(value.float())
 
         # Note: The following lines are just for debugging.
         predicted_rewards = []
-        if self._cfg.monitor_extra_statistics:
+        if self._cfg.fused_learn_step:
+            # the outputs of the unroll steps, whose losses are computed at once after the unroll.
+            policy_logits_steps, value_steps, reward_steps = [policy_logits], [value], []
+        elif self._cfg.monitor_extra_statistics:
             predicted_values, predicted_policies = original_value.detach().cpu(), torch.softmax(
                 policy_logits, dim=1
             ).detach().cpu()
@@ -353,17 +384,20 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         # The core difference between GumbelMuZero and MuZero
         # ==============================================================
         # In Gumbel MuZero, the policy loss is defined as the KL loss between current policy and improved policy calculated in MCTS.
-        policy_loss = self.kl_loss(torch.log(torch.softmax(policy_logits, dim=1)),
-                                   torch.from_numpy(improved_policy_batch[:, 0]).to(self._cfg.device).detach().float())
-        policy_loss = policy_loss.mean(dim=-1) * mask_batch[:, 0]
-        # Output the entropy for experimental observation.
+        if not self._cfg.fused_learn_step:
+            policy_loss = self.kl_loss(
+                torch.log(torch.softmax(policy_logits, dim=1)),
+                torch.from_numpy(improved_policy_batch[:, 0]).to(self._cfg.device).detach().float()
+            )
+            policy_loss = policy_loss.mean(dim=-1) * mask_batch[:, 0]
+            # Output the entropy for experimental observation.
 
-        prob = torch.softmax(policy_logits, dim=-1)
-        policy_entropy = -(prob * prob.log()).sum(-1)
+            prob = torch.softmax(policy_logits, dim=-1)
+            policy_entropy = -(prob * prob.log()).sum(-1)
 
-        value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
+            value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
 
-        reward_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            reward_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
         consistency_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
 
         # ==============================================================
@@ -373,13 +407,10 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
             # unroll with the dynamics function: predict the next ``latent_state``, ``reward``,
             # given current ``latent_state`` and ``action``.
             # And then predict policy_logits and value with the prediction function.
-            network_output = self._learn_model.recurrent_inference(latent_state, action_batch[:, step_k])
+            with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                network_output = self._learn_model.recurrent_inference(latent_state, action_batch[:, step_k])
             latent_state, reward, value, policy_logits = mz_network_output_unpack(network_output)
 
-            # transform the scaled value or its categorical representation to its original value,
-            # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-            original_value = self.inverse_scalar_transform_handle(value)
-
             if self._cfg.model.self_supervised_learning_loss:
                 # ==============================================================
                 # calculate consistency loss for the next ``num_unroll_steps`` unroll steps.
@@ -387,17 +418,26 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
                 if self._cfg.ssl_loss_weight > 0:
                     # obtain the oracle latent states from representation function.
                     beg_index, end_index = self._get_target_obs_index_in_step_k(step_k)
-                    network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
-
-                    latent_state = to_tensor(latent_state)
-                    representation_state = to_tensor(network_output.latent_state)
-
-                    # NOTE: no grad for the representation_state branch
-                    dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
-                    observation_proj = self._learn_model.project(representation_state, with_grad=False)
-                    temp_loss = negative_cosine_similarity(dynamic_proj, observation_proj) * mask_batch[:, step_k]
+                    with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                        network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
+
+                        latent_state = to_tensor(latent_state)
+                        representation_state = to_tensor(network_output.latent_state)
+
+                        # NOTE: no grad for the representation_state branch
+                        dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
+                        observation_proj = self._learn_model.project(representation_state, with_grad=False)
+                    temp_loss = negative_cosine_similarity(
+                        dynamic_proj.float(), observation_proj.float()
+                    ) * mask_batch[:, step_k]
                     consistency_loss += temp_loss
 
+            if self._cfg.fused_learn_step:
+                policy_logits_steps.append(policy_logits)
+                value_steps.append(value)
+                reward_steps.append(reward)
+                continue
+
             # NOTE: the target policy, target_value_categorical, target_reward_categorical is calculated in
             # game buffer now.
             # ==============================================================
@@ -411,7 +451,7 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
             reward_loss += cross_entropy_loss(reward, target_reward_categorical[:, step_k])
 
             prob = torch.softmax(policy_logits, dim=-1)
-            policy_entropy += (prob * prob.log()).sum(-1)
+            policy_entropy += -(prob * prob.log()).sum(-1)
 
             if self._cfg.monitor_extra_statistics:
                 original_rewards = self.inverse_scalar_transform_handle(reward)
@@ -423,6 +463,18 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
                 predicted_rewards.append(original_rewards_cpu)
                 predicted_policies = torch.cat((predicted_policies, torch.softmax(policy_logits, dim=1).detach().cpu()))
 
+        if self._cfg.fused_learn_step:
+            # ==============================================================
+            # calculate the losses of all the unroll steps on the stacked outputs.
+            # ==============================================================
+            improved_policy = torch.from_numpy(improved_policy_batch).to(self._cfg.device).float()
+            log_prob = torch.log_softmax(torch.stack(policy_logits_steps, dim=1).float(), dim=-1)
+            policy_loss = self.kl_loss(log_prob, improved_policy[:, :log_prob.shape[1]]).mean(dim=-1)
+            policy_loss = (policy_loss * mask_batch[:, :log_prob.shape[1]]).sum(-1)
+            value_loss = unrolled_cross_entropy_loss(value_steps, target_value_categorical).sum(-1)
+            reward_loss = unrolled_cross_entropy_loss(reward_steps, target_reward_categorical).sum(-1)
+            policy_entropy = unrolled_entropy(policy_logits_steps).sum(-1)
+
         # ==============================================================
         # the core learn model update step.
         # ==============================================================
@@ -451,6 +503,35 @@ class GumbelMuZeroPolicy(MuZeroPolicy):
         # ==============================================================
         self._target_model.update(self._learn_model.state_dict())
 
+        if self._cfg.fused_learn_step:
+            with torch.no_grad():
+                predicted_values = self.inverse_scalar_transform_handle(torch.cat(value_steps).float())
+                predicted_rewards = self.inverse_scalar_transform_handle(torch.cat(reward_steps).float())
+            # all the logging scalars are moved to the host at once.
+            log_vars = tensors_to_host(dict(
+                weighted_total_loss=weighted_total_loss,
+                total_loss=loss.mean(),
+                policy_loss=policy_loss.mean(),
+                reward_loss=reward_loss.mean(),
+                value_loss=value_loss.mean(),
+                consistency_loss=consistency_loss.mean() / self._cfg.num_unroll_steps,
+                policy_entropy=policy_entropy.mean(),
+                target_reward=target_reward.mean(),
+                target_value=target_value.mean(),
+                transformed_target_reward=transformed_target_reward.mean(),
+                transformed_target_value=transformed_target_value.mean(),
+                predicted_rewards=predicted_rewards.mean(),
+                predicted_values=predicted_values.mean(),
+                total_grad_norm_before_clip=total_grad_norm_before_clip,
+            ))
+            return {
+                'collect_mcts_temperature': self._collect_mcts_temperature,
+                'cur_lr': self._optimizer.param_groups[0]['lr'],
+                **log_vars,
+                'value_priority_orig': value_priority,
+                'value_priority': value_priority.mean().item(),
+            }
+
         if self._cfg.monitor_extra_statistics:
             predicted_rewards = torch.stack(predicted_rewards).transpose(1, 0).squeeze(-1)
             predicted_rewards = predicted_rewards.reshape(-1).unsqueeze(-1)
@@ -1,5 +1,5 @@
 import copy
-from typing import List, Dict, Any, Tuple, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 import numpy as np
 import torch
@@ -13,9 +13,10 @@ from torch.nn import L1Loss
 from lzero.mcts import MuZeroMCTSCtree as MCTSCtree
 from lzero.mcts import MuZeroMCTSPtree as MCTSPtree
 from lzero.model import ImageTransforms
+from lzero.model.compiled_inference import enable_compiled_inference
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, to_torch_float_tensor, mz_network_output_unpack, select_action, negative_cosine_similarity, \
-    prepare_obs
+    prepare_obs, learn_autocast, unrolled_cross_entropy_loss, unrolled_entropy, tensors_to_host
 
 
 @POLICY_REGISTRY.register('muzero')
@@ -72,10 +73,32 @@ class MuZeroPolicy(Policy):
         gumbel_algo=False,
         # (bool) Whether to use C++ MCTS in policy. If False, use Python implementation.
         mcts_ctree=True,
+        # (bool) Whether the ctree search keeps its latent states in one preallocated tensor on the policy's device,
+        # instead of copying them to and from the host in every simulation.
+        use_latent_state_pool=False,
+        # (bool) Whether the collect, eval and target (reanalyze) models run ``initial_inference`` and
+        # ``recurrent_inference`` in eval mode with traced (or compiled) steps of static batch sizes, instead of eager
+        # mode. Only ``MuZeroModel`` and ``MuZeroModelMLP`` support it, see ``lzero.model.compiled_inference``.
+        compiled_inference=False,
+        # (list) The static batch sizes of the compiled inference, to which the inference batches are padded.
+        compiled_inference_batch_buckets=[8, 16, 32, 64, 128, 256],
+        # (str) The backend of the compiled inference. Options are ['torchscript', 'torch_compile'].
+        compiled_inference_backend='torchscript',
+        # (bool) Whether the ctree search of each env starts from the subtree of the action taken after its last search,
+        # keeping its visit counts, values and latent states, and only runs the simulations the root still lacks.
+        use_subtree_reuse=False,
+        # (int) The max number of moves in a row whose searches start from the reused subtrees of the last ones. The
+        # latent states of a reused subtree are predicted by the dynamics model instead of encoded from the new
+        # observations, so the root is encoded again from the observation after this number of moves. None means no
+        # limit. Only used when ``use_subtree_reuse=True``.
+        subtree_reuse_max_depth=5,
         # (bool) Whether to use cuda for network.
         cuda=True,
         # (int) The number of environments used in collecting data.
         collector_env_num=8,
+        # (bool) Whether the collector splits its envs into two groups and searches the ready envs of one group while
+        # the envs of the other group step, instead of stepping all the envs after the search of all the envs.
+        pipelined_collect=False,
         # (int) The number of environments used in evaluating policy.
         evaluator_env_num=3,
         # (str) The type of environment. Options are ['not_board_games', 'board_games'].
@@ -93,6 +116,13 @@ class MuZeroPolicy(Policy):
         # IMPORTANT: Setting eval_offline to True requires configuring the saving of checkpoints to align with the evaluation frequency.
         # This is done by setting the parameter learn.learner.hook.save_ckpt_after_iter to the same value as eval_freq in the train_muzero.py automatically.
         eval_offline=False,
+        # (dict) The config of the asynchronous evaluator (``MuZeroAsyncEvaluator``) of ``train_muzero``, which runs
+        # the evaluations in worker processes while the training continues, see its ``config`` for the other keys.
+        # It can not be used together with ``eval_offline``.
+        async_eval=dict(
+            # (int) The number of evaluation worker processes. 0 means the evaluations run inline in the training loop.
+            num_workers=0,
+        ),
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
@@ -134,6 +164,12 @@ class MuZeroPolicy(Policy):
         momentum=0.9,
         # (float) The maximum constraint value of gradient norm clipping.
         grad_clip_value=10,
+        # (bool) Whether the learn step stacks the network outputs of all the unroll steps, computes each loss once on
+        # the stacked tensors, and gathers the logging variables with a single device to host transfer.
+        fused_learn_step=False,
+        # (str) The autocast dtype of the network forward passes in the learn step, e.g. 'bfloat16'. None means float32.
+        # Only effective when ``fused_learn_step=True``, whose losses are computed in float32.
+        learn_autocast_dtype=None,
         # (int) The number of episodes in each collecting stage.
         n_episode=8,
         # (int) the number of simulations in MCTS.
@@ -170,6 +206,13 @@ class MuZeroPolicy(Policy):
         use_ture_chance_label_in_chance_encoder=False,
         # (bool) Whether to add noise to roots during reanalyze process.
         reanalyze_noise=False,
+        # (dict) The config of the background reanalyze service (``MuZeroReanalyzeService``) of ``train_muzero``,
+        # which computes the targets of the sampled batches in worker processes, see its ``config`` for the other keys.
+        reanalyze_service=dict(
+            # (int) The number of reanalyze worker processes. 0 means the learner reanalyzes every batch synchronously
+            # through ``replay_buffer.sample``.
+            num_workers=0,
+        ),
 
         # ****** Priority ******
         # (bool) Whether to use priority when sampling training data from the buffer.
@@ -251,6 +294,8 @@ class MuZeroPolicy(Policy):
             lr_lambda = lambda step: 1 if step < max_step * 0.5 else (0.1 if step < max_step else 0.01)  # noqa
             self.lr_scheduler = LambdaLR(self._optimizer, lr_lambda=lr_lambda)
 
+        # the target model copies the compiled inference mode of the model, which is used in the reanalyze.
+        self._init_compiled_inference()
         # use model_wrapper for specialized demands of different modes
         self._target_model = copy.deepcopy(self._model)
         self._target_model = model_wrap(
@@ -260,6 +305,7 @@ class MuZeroPolicy(Policy):
             update_kwargs={'freq': self._cfg.target_update_freq}
         )
         self._learn_model = self._model
+        self._learn_autocast_dtype = self._cfg.learn_autocast_dtype if self._cfg.fused_learn_step else None
 
         if self._cfg.use_augmentation:
             self.image_transforms = ImageTransforms(
@@ -347,18 +393,22 @@ class MuZeroPolicy(Policy):
         # ==============================================================
         # the core initial_inference in MuZero policy.
         # ==============================================================
-        network_output = self._learn_model.initial_inference(obs_batch)
+        with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+            network_output = self._learn_model.initial_inference(obs_batch)
 
         # value_prefix shape: (batch_size, 10), the ``value_prefix`` at the first step is zero padding.
         latent_state, reward, value, policy_logits = mz_network_output_unpack(network_output)
 
         # transform the scaled value or its categorical representation to its original value,
         # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-        original_value = self.inverse_scalar_transform_handle(value)
+        original_value = self.inverse_scalar_transform_handle(value.float())
 
         # Note: The following lines are just for debugging.
         predicted_rewards = []
-        if self._cfg.monitor_extra_statistics:
+        if self._cfg.fused_learn_step:
+            # the outputs of the unroll steps, whose losses are computed at once after the unroll.
+            policy_logits_steps, value_steps, reward_steps = [policy_logits], [value], []
+        elif self._cfg.monitor_extra_statistics:
             predicted_values, predicted_policies = original_value.detach().cpu(), torch.softmax(
                 policy_logits, dim=1
             ).detach().cpu()
@@ -369,14 +419,15 @@ class MuZeroPolicy(Policy):
         # ==============================================================
         # calculate policy and value loss for the first step.
         # ==============================================================
-        policy_loss = cross_entropy_loss(policy_logits, target_policy[:, 0])
-        value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
+        if not self._cfg.fused_learn_step:
+            policy_loss = cross_entropy_loss(policy_logits, target_policy[:, 0])
+            value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
 
-        prob = torch.softmax(policy_logits, dim=-1)
-        entropy = -(prob * prob.log()).sum(-1)
-        policy_entropy_loss = -entropy
+            prob = torch.softmax(policy_logits, dim=-1)
+            entropy = -(prob * prob.log()).sum(-1)
+            policy_entropy_loss = -entropy
 
-        reward_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            reward_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
         consistency_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
 
         # ==============================================================
@@ -386,13 +437,10 @@ class MuZeroPolicy(Policy):
             # unroll with the dynamics function: predict the next ``latent_state``, ``reward``,
             # given current ``latent_state`` and ``action``.
             # And then predict policy_logits and value with the prediction function.
-            network_output = self._learn_model.recurrent_inference(latent_state, action_batch[:, step_k])
+            with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                network_output = self._learn_model.recurrent_inference(latent_state, action_batch[:, step_k])
             latent_state, reward, value, policy_logits = mz_network_output_unpack(network_output)
 
-            # transform the scaled value or its categorical representation to its original value,
-            # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-            original_value = self.inverse_scalar_transform_handle(value)
-
             if self._cfg.model.self_supervised_learning_loss:
                 # ==============================================================
                 # calculate consistency loss for the next ``num_unroll_steps`` unroll steps.
@@ -400,17 +448,26 @@ class MuZeroPolicy(Policy):
                 if self._cfg.ssl_loss_weight > 0:
                     # obtain the oracle latent states from representation function.
                     beg_index, end_index = self._get_target_obs_index_in_step_k(step_k)
-                    network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
-
-                    latent_state = to_tensor(latent_state)
-                    representation_state = to_tensor(network_output.latent_state)
-
-                    # NOTE: no grad for the representation_state branch
-                    dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
-                    observation_proj = self._learn_model.project(representation_state, with_grad=False)
-                    temp_loss = negative_cosine_similarity(dynamic_proj, observation_proj) * mask_batch[:, step_k]
+                    with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                        network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
+
+                        latent_state = to_tensor(latent_state)
+                        representation_state = to_tensor(network_output.latent_state)
+
+                        # NOTE: no grad for the representation_state branch
+                        dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
+                        observation_proj = self._learn_model.project(representation_state, with_grad=False)
+                    temp_loss = negative_cosine_similarity(
+                        dynamic_proj.float(), observation_proj.float()
+                    ) * mask_batch[:, step_k]
                     consistency_loss += temp_loss
 
+            if self._cfg.fused_learn_step:
+                policy_logits_steps.append(policy_logits)
+                value_steps.append(value)
+                reward_steps.append(reward)
+                continue
+
             # NOTE: the target policy, target_value_categorical, target_reward_categorical is calculated in
             # game buffer now.
             # ==============================================================
@@ -436,6 +493,15 @@ class MuZeroPolicy(Policy):
                 predicted_rewards.append(original_rewards_cpu)
                 predicted_policies = torch.cat((predicted_policies, torch.softmax(policy_logits, dim=1).detach().cpu()))
 
+        if self._cfg.fused_learn_step:
+            # ==============================================================
+            # calculate the losses of all the unroll steps on the stacked outputs.
+            # ==============================================================
+            policy_loss = unrolled_cross_entropy_loss(policy_logits_steps, target_policy).sum(-1)
+            value_loss = unrolled_cross_entropy_loss(value_steps, target_value_categorical).sum(-1)
+            reward_loss = unrolled_cross_entropy_loss(reward_steps, target_reward_categorical).sum(-1)
+            policy_entropy_loss = -unrolled_entropy(policy_logits_steps).sum(-1)
+
         # ==============================================================
         # the core learn model update step.
         # ==============================================================
@@ -466,6 +532,36 @@ class MuZeroPolicy(Policy):
         if self._cfg.use_rnd_model:
             self._target_model_for_intrinsic_reward.update(self._learn_model.state_dict())
 
+        if self._cfg.fused_learn_step:
+            with torch.no_grad():
+                predicted_values = self.inverse_scalar_transform_handle(torch.cat(value_steps).float())
+                predicted_rewards = self.inverse_scalar_transform_handle(torch.cat(reward_steps).float())
+            # all the logging scalars are moved to the host at once.
+            log_vars = tensors_to_host(dict(
+                weighted_total_loss=weighted_total_loss,
+                total_loss=loss.mean(),
+                policy_loss=policy_loss.mean(),
+                policy_entropy=-policy_entropy_loss.mean() / (self._cfg.num_unroll_steps + 1),
+                reward_loss=reward_loss.mean(),
+                value_loss=value_loss.mean(),
+                consistency_loss=consistency_loss.mean() / self._cfg.num_unroll_steps,
+                target_reward=target_reward.mean(),
+                target_value=target_value.mean(),
+                transformed_target_reward=transformed_target_reward.mean(),
+                transformed_target_value=transformed_target_value.mean(),
+                predicted_rewards=predicted_rewards.mean(),
+                predicted_values=predicted_values.mean(),
+                total_grad_norm_before_clip=total_grad_norm_before_clip,
+                value_priority=value_priority.mean(),
+            ))
+            return {
+                'collect_mcts_temperature': self._collect_mcts_temperature,
+                'collect_epsilon': self.collect_epsilon,
+                'cur_lr': self._optimizer.param_groups[0]['lr'],
+                **log_vars,
+                'value_priority_orig': value_priority,  # torch.tensor compatible with ddp settings
+            }
+
         if self._cfg.monitor_extra_statistics:
             predicted_rewards = torch.stack(predicted_rewards).transpose(1, 0).squeeze(-1)
             predicted_rewards = predicted_rewards.reshape(-1).unsqueeze(-1)
@@ -495,11 +591,23 @@ class MuZeroPolicy(Policy):
             'value_priority_orig': value_priority,  # torch.tensor compatible with ddp settings
         }
 
+    def _init_compiled_inference(self) -> None:
+        """
+        Overview:
+            Turn on the compiled inference mode of the model if ``compiled_inference`` is set. It is used by the MCTS \
+            search and the reanalyze, which run the model in eval mode.
+        """
+        if self._cfg.compiled_inference and getattr(self._model, 'compiled_inference', False) is None:
+            enable_compiled_inference(
+                self._model, self._cfg.compiled_inference_batch_buckets, self._cfg.compiled_inference_backend
+            )
+
     def _init_collect(self) -> None:
         """
         Overview:
             Collect mode init method. Called by ``self.__init__``. Initialize the collect model and MCTS utils.
         """
+        self._init_compiled_inference()
         self._collect_model = self._model
         if self._cfg.mcts_ctree:
             self._mcts_collect = MCTSCtree(self._cfg)
@@ -568,8 +676,18 @@ class MuZeroPolicy(Policy):
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_collect_env_num, legal_actions)
 
+            if ready_env_id is None:
+                ready_env_id = np.arange(active_collect_env_num)
+            use_subtree_reuse = self._cfg.mcts_ctree and self._cfg.use_subtree_reuse
+
             roots.prepare(self._cfg.root_noise_weight, noises, reward_roots, policy_logits, to_play)
-            self._mcts_collect.search(roots, self._collect_model, latent_state_roots, to_play)
+            if use_subtree_reuse:
+                reused_subtrees = self._mcts_collect.reuse_subtrees(
+                    roots, ready_env_id, self._cfg.root_noise_weight, noises
+                )
+                self._mcts_collect.search(roots, self._collect_model, latent_state_roots, to_play, reused_subtrees)
+            else:
+                self._mcts_collect.search(roots, self._collect_model, latent_state_roots, to_play)
 
             # list of list, shape: ``{list: batch_size} -> {list: action_space_size}``
             roots_visit_count_distributions = roots.get_distributions()
@@ -578,9 +696,6 @@ class MuZeroPolicy(Policy):
             data_id = [i for i in range(active_collect_env_num)]
             output = {i: None for i in data_id}
 
-            if ready_env_id is None:
-                ready_env_id = np.arange(active_collect_env_num)
-
             for i, env_id in enumerate(ready_env_id):
                 distributions, value = roots_visit_count_distributions[i], roots_values[i]
                 if self._cfg.eps.eps_greedy_exploration_in_collect:
@@ -608,14 +723,30 @@ class MuZeroPolicy(Policy):
                     'predicted_value': pred_values[i],
                     'predicted_policy_logits': policy_logits[i],
                 }
+            if use_subtree_reuse:
+                self._mcts_collect.save_subtrees(
+                    roots, ready_env_id, [output[env_id]['action'] for env_id in ready_env_id]
+                )
 
         return output
 
+    def _reset_collect(self, data_id: Optional[List[int]] = None) -> None:
+        """
+        Overview:
+            Drop the subtrees kept for the envs in ``data_id`` whose episodes end, or for all the envs if None.
+        Arguments:
+            - data_id (:obj:`Optional[List[int]]`): The id of the envs to reset.
+        """
+        # the subclasses whose searches do not reuse subtrees keep nothing to drop
+        if hasattr(self._mcts_collect, 'reset_subtrees'):
+            self._mcts_collect.reset_subtrees(data_id)
+
     def _init_eval(self) -> None:
         """
         Overview:
             Evaluate mode init method. Called by ``self.__init__``. Initialize the eval model and MCTS utils.
         """
+        self._init_compiled_inference()
         self._eval_model = self._model
         if self._cfg.mcts_ctree:
             self._mcts_eval = MCTSCtree(self._cfg)
@@ -689,8 +820,16 @@ class MuZeroPolicy(Policy):
             else:
                 # python mcts_tree
                 roots = MCTSPtree.roots(active_eval_env_num, legal_actions)
+            if ready_env_id is None:
+                ready_env_id = np.arange(active_eval_env_num)
+            use_subtree_reuse = self._cfg.mcts_ctree and self._cfg.use_subtree_reuse
+
             roots.prepare_no_noise(reward_roots, policy_logits, to_play)
-            self._mcts_eval.search(roots, self._eval_model, latent_state_roots, to_play)
+            if use_subtree_reuse:
+                reused_subtrees = self._mcts_eval.reuse_subtrees(roots, ready_env_id)
+                self._mcts_eval.search(roots, self._eval_model, latent_state_roots, to_play, reused_subtrees)
+            else:
+                self._mcts_eval.search(roots, self._eval_model, latent_state_roots, to_play)
 
             # list of list, shape: ``{list: batch_size} -> {list: action_space_size}``
             roots_visit_count_distributions = roots.get_distributions()
@@ -699,9 +838,6 @@ class MuZeroPolicy(Policy):
             data_id = [i for i in range(active_eval_env_num)]
             output = {i: None for i in data_id}
 
-            if ready_env_id is None:
-                ready_env_id = np.arange(active_eval_env_num)
-
             for i, env_id in enumerate(ready_env_id):
                 distributions, value = roots_visit_count_distributions[i], roots_values[i]
                 # NOTE: Only legal actions possess visit counts, so the ``action_index_in_legal_action_set`` represents
@@ -723,9 +859,22 @@ class MuZeroPolicy(Policy):
                     'predicted_value': pred_values[i],
                     'predicted_policy_logits': policy_logits[i],
                 }
+            if use_subtree_reuse:
+                self._mcts_eval.save_subtrees(roots, ready_env_id, [output[env_id]['action'] for env_id in ready_env_id])
 
         return output
 
+    def _reset_eval(self, data_id: Optional[List[int]] = None) -> None:
+        """
+        Overview:
+            Drop the subtrees kept for the envs in ``data_id`` whose episodes end, or for all the envs if None.
+        Arguments:
+            - data_id (:obj:`Optional[List[int]]`): The id of the envs to reset.
+        """
+        # the subclasses whose searches do not reuse subtrees keep nothing to drop
+        if hasattr(self._mcts_eval, 'reset_subtrees'):
+            self._mcts_eval.reset_subtrees(data_id)
+
     def _monitor_vars_learn(self) -> List[str]:
         """
         Overview:
@@ -17,7 +17,7 @@ from lzero.model import ImageTransforms
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, to_torch_float_tensor, ez_network_output_unpack, select_action, negative_cosine_similarity, \
     prepare_obs, \
-    configure_optimizers
+    configure_optimizers, learn_autocast, unrolled_cross_entropy_loss, tensors_to_host
 from lzero.policy.muzero import MuZeroPolicy
 
 
@@ -76,10 +76,21 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         gumbel_algo=False,
         # (bool) Whether to use C++ MCTS in policy. If False, use Python implementation.
         mcts_ctree=True,
+        # (bool) Whether the ctree search keeps its latent states in one preallocated tensor on the policy's device,
+        # instead of copying them to and from the host in every simulation.
+        use_latent_state_pool=False,
+        # (bool) Whether the ctree search samples the actions of the roots and of the leaf nodes of each simulation in
+        # one batched torch op, instead of node by node in the C++ tree.
+        sample_actions_in_torch=False,
+        # (int) The seed of the counter-based RNG of the batched action sampling. None means the default torch generator.
+        sampled_actions_seed=None,
         # (bool) Whether to use cuda in policy.
         cuda=True,
         # (int) The number of environments used in collecting data.
         collector_env_num=8,
+        # (bool) Whether the collector splits its envs into two groups and searches the ready envs of one group while
+        # the envs of the other group step, instead of stepping all the envs after the search of all the envs.
+        pipelined_collect=False,
         # (int) The number of environments used in evaluating policy.
         evaluator_env_num=3,
         # (str) The type of environment. The options are ['not_board_games', 'board_games'].
@@ -97,6 +108,13 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         # IMPORTANT: Setting eval_offline to True requires configuring the saving of checkpoints to align with the evaluation frequency.
         # This is done by setting the parameter learn.learner.hook.save_ckpt_after_iter to the same value as eval_freq in the train_muzero.py automatically.
         eval_offline=False,
+        # (dict) The config of the asynchronous evaluator (``MuZeroAsyncEvaluator``) of ``train_muzero``, which runs
+        # the evaluations in worker processes while the training continues, see its ``config`` for the other keys.
+        # It can not be used together with ``eval_offline``.
+        async_eval=dict(
+            # (int) The number of evaluation worker processes. 0 means the evaluations run inline in the training loop.
+            num_workers=0,
+        ),
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
@@ -139,6 +157,12 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         weight_decay=1e-4,
         momentum=0.9,
         grad_clip_value=10,
+        # (bool) Whether the learn step stacks the network outputs of all the unroll steps, computes each loss once on
+        # the stacked tensors, and gathers the logging variables with a single device to host transfer.
+        fused_learn_step=False,
+        # (str) The autocast dtype of the network forward passes in the learn step, e.g. 'bfloat16'. None means float32.
+        # Only effective when ``fused_learn_step=True``, whose losses are computed in float32.
+        learn_autocast_dtype=None,
         # You can use either "n_sample" or "n_episode" in collector.collect.
         # Get "n_episode" episodes per collect.
         n_episode=8,
@@ -181,6 +205,13 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         use_ture_chance_label_in_chance_encoder=False,
         # (bool) Whether to add noise to roots during reanalyze process.
         reanalyze_noise=False,
+        # (dict) The config of the background reanalyze service (``MuZeroReanalyzeService``) of ``train_muzero``,
+        # which computes the targets of the sampled batches in worker processes, see its ``config`` for the other keys.
+        reanalyze_service=dict(
+            # (int) The number of reanalyze worker processes. 0 means the learner reanalyzes every batch synchronously
+            # through ``replay_buffer.sample``.
+            num_workers=0,
+        ),
 
         # ****** Priority ******
         # (bool) Whether to use priority when sampling training data from the buffer.
@@ -294,6 +325,7 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
             update_kwargs={'freq': self._cfg.target_update_freq}
         )
         self._learn_model = self._model
+        self._learn_autocast_dtype = self._cfg.learn_autocast_dtype if self._cfg.fused_learn_step else None
 
         if self._cfg.use_augmentation:
             self.image_transforms = ImageTransforms(
@@ -370,17 +402,21 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         # ==============================================================
         # the core initial_inference in SampledEfficientZero policy.
         # ==============================================================
-        network_output = self._learn_model.initial_inference(obs_batch)
+        with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+            network_output = self._learn_model.initial_inference(obs_batch)
         # value_prefix shape: (batch_size, 10), the ``value_prefix`` at the first step is zero padding.
         latent_state, value_prefix, reward_hidden_state, value, policy_logits = ez_network_output_unpack(network_output)
 
         # transform the scaled value or its categorical representation to its original value,
         # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-        original_value = self.inverse_scalar_transform_handle(value)
+        original_value = self.inverse_scalar_transform_handle(value.float())
 
         # Note: The following lines are just for logging.
         predicted_value_prefixs = []
-        if self._cfg.monitor_extra_statistics:
+        if self._cfg.fused_learn_step:
+            # the outputs of the unroll steps, whose losses are computed at once after the unroll.
+            policy_logits_steps, value_steps, value_prefix_steps = [policy_logits], [value], []
+        elif self._cfg.monitor_extra_statistics:
             predicted_values, predicted_policies = original_value.detach().cpu(), torch.softmax(
                 policy_logits, dim=1
             ).detach().cpu()
@@ -389,27 +425,28 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         value_priority = L1Loss(reduction='none')(original_value.squeeze(-1), target_value[:, 0])
         value_priority = value_priority.data.cpu().numpy() + 1e-6
 
-        # ==============================================================
-        # calculate policy and value loss for the first step.
-        # ==============================================================
-        value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
+        if not self._cfg.fused_learn_step:
+            # ==============================================================
+            # calculate policy and value loss for the first step.
+            # ==============================================================
+            value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
 
-        policy_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
-        # ==============================================================
-        # sampled related core code: calculate policy loss, typically cross_entropy_loss
-        # ==============================================================
-        if self._cfg.model.continuous_action_space:
-            """continuous action space"""
-            policy_loss, policy_entropy, policy_entropy_loss, target_policy_entropy, target_sampled_actions, mu, sigma = self._calculate_policy_loss_cont(
-                policy_loss, policy_logits, target_policy, mask_batch, child_sampled_actions_batch, unroll_step=0
-            )
-        else:
-            """discrete action space"""
-            policy_loss, policy_entropy, policy_entropy_loss, target_policy_entropy, target_sampled_actions = self._calculate_policy_loss_disc(
-                policy_loss, policy_logits, target_policy, mask_batch, child_sampled_actions_batch, unroll_step=0
-            )
+            policy_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            # ==============================================================
+            # sampled related core code: calculate policy loss, typically cross_entropy_loss
+            # ==============================================================
+            if self._cfg.model.continuous_action_space:
+                """continuous action space"""
+                policy_loss, policy_entropy, policy_entropy_loss, target_policy_entropy, target_sampled_actions, mu, sigma = self._calculate_policy_loss_cont(
+                    policy_loss, policy_logits, target_policy, mask_batch, child_sampled_actions_batch, unroll_step=0
+                )
+            else:
+                """discrete action space"""
+                policy_loss, policy_entropy, policy_entropy_loss, target_policy_entropy, target_sampled_actions = self._calculate_policy_loss_disc(
+                    policy_loss, policy_logits, target_policy, mask_batch, child_sampled_actions_batch, unroll_step=0
+                )
 
-        value_prefix_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            value_prefix_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
         consistency_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
 
         # ==============================================================
@@ -419,9 +456,10 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
             # unroll with the dynamics function: predict the next ``latent_state``, ``reward_hidden_state``,
             # `` value_prefix`` given current ``latent_state`` ``reward_hidden_state`` and ``action``.
             # And then predict policy_logits and value  with the prediction function.
-            network_output = self._learn_model.recurrent_inference(
-                latent_state, reward_hidden_state, action_batch[:, step_k]
-            )
+            with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                network_output = self._learn_model.recurrent_inference(
+                    latent_state, reward_hidden_state, action_batch[:, step_k]
+                )
             latent_state, value_prefix, reward_hidden_state, value, policy_logits = ez_network_output_unpack(
                 network_output
             )
@@ -433,18 +471,33 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
                 if self._cfg.ssl_loss_weight > 0:
                     # obtain the oracle latent states from representation function.
                     beg_index, end_index = self._get_target_obs_index_in_step_k(step_k)
-                    network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
+                    with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                        network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
 
-                    latent_state = to_tensor(latent_state)
-                    representation_state = to_tensor(network_output.latent_state)
+                        latent_state = to_tensor(latent_state)
+                        representation_state = to_tensor(network_output.latent_state)
 
-                    # NOTE: no grad for the representation_state branch.
-                    dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
-                    observation_proj = self._learn_model.project(representation_state, with_grad=False)
-                    temp_loss = negative_cosine_similarity(dynamic_proj, observation_proj) * mask_batch[:, step_k]
+                        # NOTE: no grad for the representation_state branch.
+                        dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
+                        observation_proj = self._learn_model.project(representation_state, with_grad=False)
+                    temp_loss = negative_cosine_similarity(
+                        dynamic_proj.float(), observation_proj.float()
+                    ) * mask_batch[:, step_k]
 
                     consistency_loss += temp_loss
 
+            if self._cfg.fused_learn_step:
+                policy_logits_steps.append(policy_logits)
+                value_steps.append(value)
+                value_prefix_steps.append(value_prefix)
+                # reset hidden states every ``lstm_horizon_len`` unroll steps.
+                if (step_k + 1) % self._cfg.lstm_horizon_len == 0:
+                    reward_hidden_state = (
+                        torch.zeros(1, self._cfg.batch_size, self._cfg.model.lstm_hidden_size).to(self._cfg.device),
+                        torch.zeros(1, self._cfg.batch_size, self._cfg.model.lstm_hidden_size).to(self._cfg.device)
+                    )
+                continue
+
             # NOTE: the target policy, target_value_categorical, target_value_prefix_categorical is calculated in
             # game buffer now.
             # ==============================================================
@@ -493,6 +546,19 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
                 predicted_value_prefixs.append(original_value_prefixs_cpu)
                 predicted_policies = torch.cat((predicted_policies, torch.softmax(policy_logits, dim=1).detach().cpu()))
 
+        if self._cfg.fused_learn_step:
+            # ==============================================================
+            # calculate the losses of all the unroll steps on the stacked outputs.
+            # ==============================================================
+            value_loss = unrolled_cross_entropy_loss(value_steps, target_value_categorical).sum(-1)
+            value_prefix_loss = unrolled_cross_entropy_loss(value_prefix_steps, target_value_prefix_categorical).sum(-1)
+            (
+                policy_loss, policy_entropy, policy_entropy_loss, target_policy_entropy, target_sampled_actions, mu,
+                sigma
+            ) = self._calculate_policy_loss_fused(
+                policy_logits_steps, target_policy, mask_batch, child_sampled_actions_batch
+            )
+
         # ==============================================================
         # the core learn model update step.
         # ==============================================================
@@ -522,6 +588,52 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
         # ==============================================================
         self._target_model.update(self._learn_model.state_dict())
 
+        if self._cfg.fused_learn_step:
+            with torch.no_grad():
+                predicted_values = self.inverse_scalar_transform_handle(torch.cat(value_steps).float())
+                predicted_value_prefixs = self.inverse_scalar_transform_handle(torch.cat(value_prefix_steps).float())
+            log_vars = dict(
+                weighted_total_loss=weighted_total_loss,
+                total_loss=loss.mean(),
+                policy_loss=policy_loss.mean(),
+                policy_entropy=policy_entropy / (self._cfg.num_unroll_steps + 1),
+                target_policy_entropy=target_policy_entropy / (self._cfg.num_unroll_steps + 1),
+                value_prefix_loss=value_prefix_loss.mean(),
+                value_loss=value_loss.mean(),
+                consistency_loss=consistency_loss.mean() / self._cfg.num_unroll_steps,
+                target_value_prefix=target_value_prefix.mean(),
+                target_value=target_value.mean(),
+                transformed_target_value_prefix=transformed_target_value_prefix.mean(),
+                transformed_target_value=transformed_target_value.mean(),
+                predicted_value_prefixs=predicted_value_prefixs.mean(),
+                predicted_values=predicted_values.mean(),
+                total_grad_norm_before_clip=total_grad_norm_before_clip,
+            )
+            if self._cfg.model.continuous_action_space:
+                # take the fist dim in action space
+                target_sampled_actions = target_sampled_actions[:, :, 0]
+                log_vars.update(
+                    policy_mu_max=mu[:, 0].max(),
+                    policy_mu_min=mu[:, 0].min(),
+                    policy_mu_mean=mu[:, 0].mean(),
+                    policy_sigma_max=sigma.max(),
+                    policy_sigma_min=sigma.min(),
+                    policy_sigma_mean=sigma.mean(),
+                )
+            log_vars.update(
+                target_sampled_actions_max=target_sampled_actions.float().max(),
+                target_sampled_actions_min=target_sampled_actions.float().min(),
+                target_sampled_actions_mean=target_sampled_actions.float().mean(),
+            )
+            return {
+                'cur_lr': self._optimizer.param_groups[0]['lr'],
+                'collect_mcts_temperature': self._collect_mcts_temperature,
+                # all the logging scalars are moved to the host at once.
+                **tensors_to_host(log_vars),
+                'value_priority': value_priority.flatten().mean().item(),
+                'value_priority_orig': value_priority,
+            }
+
         if self._cfg.monitor_extra_statistics:
             predicted_value_prefixs = torch.stack(predicted_value_prefixs).transpose(1, 0).squeeze(-1)
             predicted_value_prefixs = predicted_value_prefixs.reshape(-1).unsqueeze(-1)
@@ -778,6 +890,89 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
 
         return policy_loss, policy_entropy, policy_entropy_loss, target_policy_entropy, target_sampled_actions
 
+    def _calculate_policy_loss_fused(
+            self, policy_logits: List[torch.Tensor], target_policy: torch.Tensor, mask_batch: torch.Tensor,
+            child_sampled_actions_batch: torch.Tensor
+    ) -> Tuple[torch.Tensor]:
+        """
+        Overview:
+            Calculate the policy loss of all the unroll steps at once on the stacked policy logits, for both the \
+            continuous and the discrete action space. It matches the sum of the per-step losses of \
+            ``_calculate_policy_loss_cont`` and ``_calculate_policy_loss_disc``, and like them returns the entropy \
+            related outputs of the last step.
+        Arguments:
+            - policy_logits (:obj:`List[torch.Tensor]`): The policy logits of each unroll step.
+            - target_policy (:obj:`torch.Tensor`): The target policy tensor.
+            - mask_batch (:obj:`torch.Tensor`): The mask tensor.
+            - child_sampled_actions_batch (:obj:`torch.Tensor`): The child sampled actions tensor.
+        Returns:
+            - policy_loss (:obj:`torch.Tensor`): The policy loss tensor.
+            - policy_entropy (:obj:`torch.Tensor`): The policy entropy tensor.
+            - policy_entropy_loss (:obj:`torch.Tensor`): The policy entropy loss tensor.
+            - target_policy_entropy (:obj:`torch.Tensor`): The target policy entropy tensor.
+            - target_sampled_actions (:obj:`torch.Tensor`): The target sampled actions tensor.
+            - mu (:obj:`torch.Tensor`): The mu tensor, None in the discrete action space.
+            - sigma (:obj:`torch.Tensor`): The sigma tensor, None in the discrete action space.
+        """
+        # shape: (batch_size, num_unroll_steps+1, ...)
+        policy_logits = torch.stack(policy_logits, dim=1).float()
+        num_steps = policy_logits.shape[1]
+        target_policy, step_mask = target_policy[:, :num_steps], mask_batch[:, :num_steps]
+        target_sampled_actions = child_sampled_actions_batch[:, :num_steps]
+        mu, sigma = None, None
+
+        if self._cfg.model.continuous_action_space:
+            action_space_size = self._cfg.model.action_space_size
+            mu, sigma = policy_logits[..., :action_space_size], policy_logits[..., -action_space_size:]
+            dist = Independent(Normal(mu, sigma), 1)
+            entropy = dist.entropy()
+            # the entropy of the normalized visit counts, as ``Categorical``.
+            target_prob = target_policy[:, -1] / target_policy[:, -1].sum(-1, keepdim=True).clamp(min=1e-10)
+            target_entropy = torch.special.entr(target_prob).sum(-1)
+
+            # SAC-like log prob of the tanh-squashed sampled actions, the sampled actions are put in front of the
+            # batch dims of ``dist``: (num_of_sampled_actions, batch_size, num_unroll_steps+1, action_dim).
+            target_sampled_actions = target_sampled_actions.float()
+            y = 1 - target_sampled_actions.pow(2)
+            target_sampled_actions_before_tanh = torch.arctanh(torch.clamp(target_sampled_actions, -1 + 1e-6, 1 - 1e-6))
+            log_prob_sampled_actions = dist.log_prob(target_sampled_actions_before_tanh.permute(2, 0, 1, 3))
+            log_prob_sampled_actions = log_prob_sampled_actions.permute(1, 2, 0) - torch.log(y + 1e-6).sum(-1)
+            mu, sigma = mu[:, -1], sigma[:, -1]
+        else:
+            prob = torch.softmax(policy_logits, dim=-1)
+            entropy = -(prob * prob.log()).sum(-1)
+            target_entropy = -((target_policy[:, -1] + 1e-6) * (target_policy[:, -1] + 1e-6).log()).sum(-1)
+
+            if len(target_sampled_actions.shape) == 3:
+                target_sampled_actions = target_sampled_actions.unsqueeze(-1)
+            # shape: (batch_size, num_unroll_steps+1, num_of_sampled_actions)
+            log_prob_sampled_actions = torch.log(
+                prob.gather(-1, target_sampled_actions.squeeze(-1).long()) + 1e-6
+            )
+
+        if self._cfg.normalize_prob_of_sampled_actions:
+            # normalize the prob of sampled actions
+            prob_sampled_actions_norm = torch.exp(log_prob_sampled_actions) / torch.exp(log_prob_sampled_actions).sum(
+                -1, keepdim=True
+            ).detach()
+            log_prob_sampled_actions = torch.log(prob_sampled_actions_norm + 1e-6)
+
+        target_log_prob_sampled_actions = torch.log(target_policy + 1e-6).detach()
+        if self._cfg.policy_loss_type == 'KL':
+            policy_loss = (
+                torch.exp(target_log_prob_sampled_actions) *
+                (target_log_prob_sampled_actions - log_prob_sampled_actions)
+            ).sum(-1)
+        elif self._cfg.policy_loss_type == 'cross_entropy':
+            policy_loss = -(torch.exp(target_log_prob_sampled_actions) * log_prob_sampled_actions).sum(-1)
+        policy_loss = (policy_loss * step_mask).sum(-1)
+
+        # ******* NOTE: target_policy_entropy is only for debug.  ******
+        last_mask = step_mask[:, -1]
+        target_policy_entropy = (target_entropy * last_mask).sum() / last_mask.sum().clamp(min=1)
+        return policy_loss, entropy[:, -1].mean(), -entropy[:, -1], target_policy_entropy, \
+            target_sampled_actions[:, -1], mu, sigma
+
     def _init_collect(self) -> None:
         """
           Overview:
@@ -833,6 +1028,9 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
                 reward_hidden_state_roots[0].detach().cpu().numpy(),
                 reward_hidden_state_roots[1].detach().cpu().numpy()
             )
+            sample_actions_in_torch = self._cfg.mcts_ctree and self._cfg.sample_actions_in_torch
+            if sample_actions_in_torch:
+                sampled_actions, sampled_priors = self._mcts_collect.sample_actions(policy_logits)
             policy_logits = policy_logits.detach().cpu().numpy().tolist()
 
             if self._cfg.model.continuous_action_space is True:
@@ -865,7 +1063,12 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
                                     ).astype(np.float32).tolist() for j in range(active_collect_env_num)
             ]
 
-            roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_roots, policy_logits, to_play)
+            if sample_actions_in_torch:
+                roots.prepare_with_sampled_actions(
+                    self._cfg.root_noise_weight, noises, value_prefix_roots, sampled_actions, sampled_priors, to_play
+                )
+            else:
+                roots.prepare(self._cfg.root_noise_weight, noises, value_prefix_roots, policy_logits, to_play)
             self._mcts_collect.search(
                 roots, self._collect_model, latent_state_roots, reward_hidden_state_roots, to_play
             )
@@ -962,6 +1165,9 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
                 network_output
             )
 
+            sample_actions_in_torch = self._cfg.mcts_ctree and self._cfg.sample_actions_in_torch
+            if sample_actions_in_torch:
+                sampled_actions, sampled_priors = self._mcts_eval.sample_actions(policy_logits)
             if not self._eval_model.training:
                 # if not in training, obtain the scalars of the value/reward
                 pred_values = self.inverse_scalar_transform_handle(pred_values).detach().cpu().numpy()  # shape（B, 1）
@@ -996,7 +1202,10 @@ class SampledEfficientZeroPolicy(MuZeroPolicy):
                     self._cfg.model.num_of_sampled_actions, self._cfg.model.continuous_action_space
                 )
 
-            roots.prepare_no_noise(value_prefix_roots, policy_logits, to_play)
+            if sample_actions_in_torch:
+                roots.prepare_with_sampled_actions(0., [], value_prefix_roots, sampled_actions, sampled_priors, to_play)
+            else:
+                roots.prepare_no_noise(value_prefix_roots, policy_logits, to_play)
             self._mcts_eval.search(roots, self._eval_model, latent_state_roots, reward_hidden_state_roots, to_play)
 
             # list of list, shape: ``{list: batch_size} -> {list: action_space_size}``
@@ -14,7 +14,7 @@ from lzero.mcts import StochasticMuZeroMCTSPtree as MCTSPtree
 from lzero.model import ImageTransforms
 from lzero.policy import scalar_transform, InverseScalarTransform, cross_entropy_loss, phi_transform, \
     DiscreteSupport, to_torch_float_tensor, mz_network_output_unpack, select_action, negative_cosine_similarity, \
-    prepare_obs
+    prepare_obs, learn_autocast, unrolled_cross_entropy_loss, tensors_to_host
 from lzero.policy.muzero import MuZeroPolicy
 from lzero.policy.utils import plot_topk_accuracy, visualize_avg_softmax, plot_argmax_distribution
 
@@ -63,10 +63,16 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
         gumbel_algo=False,
         # (bool) Whether to use C++ MCTS in policy. If False, use Python implementation.
         mcts_ctree=True,
+        # (bool) Whether the ctree search keeps its latent states in one preallocated tensor on the policy's device,
+        # instead of copying them to and from the host in every simulation.
+        use_latent_state_pool=False,
         # (bool) Whether to use cuda for network.
         cuda=True,
         # (int) The number of environments used in collecting data.
         collector_env_num=8,
+        # (bool) Whether the collector splits its envs into two groups and searches the ready envs of one group while
+        # the envs of the other group step, instead of stepping all the envs after the search of all the envs.
+        pipelined_collect=False,
         # (int) The number of environments used in evaluating policy.
         evaluator_env_num=3,
         # (str) The type of environment. Options is ['not_board_games', 'board_games'].
@@ -86,6 +92,13 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
         # IMPORTANT: Setting eval_offline to True requires configuring the saving of checkpoints to align with the evaluation frequency.
         # This is done by setting the parameter learn.learner.hook.save_ckpt_after_iter to the same value as eval_freq in the train_muzero.py automatically.
         eval_offline=False,
+        # (dict) The config of the asynchronous evaluator (``MuZeroAsyncEvaluator``) of ``train_muzero``, which runs
+        # the evaluations in worker processes while the training continues, see its ``config`` for the other keys.
+        # It can not be used together with ``eval_offline``.
+        async_eval=dict(
+            # (int) The number of evaluation worker processes. 0 means the evaluations run inline in the training loop.
+            num_workers=0,
+        ),
 
         # ****** observation ******
         # (bool) Whether to transform image to string to save memory.
@@ -124,6 +137,13 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
         momentum=0.9,
         # (float) The maximum constraint value of gradient norm clipping.
         grad_clip_value=10,
+        # (bool) Whether the learn step stacks the network outputs of all the unroll steps, computes each loss once on
+        # the stacked tensors, and gathers the logging variables with a single device to host transfer. The chance
+        # codes of all the unroll steps are encoded in one batch. Not compatible with ``analyze_chance_distribution``.
+        fused_learn_step=False,
+        # (str) The autocast dtype of the network forward passes in the learn step, e.g. 'bfloat16'. None means float32.
+        # Only effective when ``fused_learn_step=True``, whose losses are computed in float32.
+        learn_autocast_dtype=None,
         # (int) The number of episode in each collecting stage.
         n_episode=8,
         # (int) the number of simulations in MCTS.
@@ -164,6 +184,13 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
         use_ture_chance_label_in_chance_encoder=False,
         # (bool) Whether to add noise to roots during reanalyze process.
         reanalyze_noise=False,
+        # (dict) The config of the background reanalyze service (``MuZeroReanalyzeService``) of ``train_muzero``,
+        # which computes the targets of the sampled batches in worker processes, see its ``config`` for the other keys.
+        reanalyze_service=dict(
+            # (int) The number of reanalyze worker processes. 0 means the learner reanalyzes every batch synchronously
+            # through ``replay_buffer.sample``.
+            num_workers=0,
+        ),
 
         # ****** Priority ******
         # (bool) Whether to use priority when sampling training data from the buffer.
@@ -256,6 +283,9 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
             update_kwargs={'freq': self._cfg.target_update_freq}
         )
         self._learn_model = self._model
+        assert not (self._cfg.fused_learn_step and self._cfg.analyze_chance_distribution), \
+            "analyze_chance_distribution needs the per-step learn step, set fused_learn_step=False"
+        self._learn_autocast_dtype = self._cfg.learn_autocast_dtype if self._cfg.fused_learn_step else None
 
         if self._cfg.use_augmentation:
             self.image_transforms = ImageTransforms(
@@ -337,18 +367,34 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
         # ==============================================================
         # the core initial_inference in MuZero policy.
         # ==============================================================
-        network_output = self._learn_model.initial_inference(obs_batch)
+        with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+            network_output = self._learn_model.initial_inference(obs_batch)
 
         # value_prefix shape: (batch_size, 10), the ``value_prefix`` at the first step is zero padding.
         latent_state, reward, value, policy_logits = mz_network_output_unpack(network_output)
 
         # transform the scaled value or its categorical representation to its original value,
         # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-        original_value = self.inverse_scalar_transform_handle(value)
+        original_value = self.inverse_scalar_transform_handle(value.float())
 
         # Note: The following lines are just for debugging.
         predicted_rewards = []
-        if self._cfg.monitor_extra_statistics:
+        if self._cfg.fused_learn_step:
+            # the outputs of the unroll steps, whose losses are computed at once after the unroll.
+            policy_logits_steps, value_steps, reward_steps = [policy_logits], [value], []
+            afterstate_policy_logits_steps, afterstate_value_steps = [], []
+            # the chance encoder sees each pair of consecutive frames on its own, so the chance codes of all the
+            # unroll steps are encoded in one batch.
+            concat_frames = torch.cat(
+                [
+                    torch.cat((obs_list_for_chance_encoder[step_k], obs_list_for_chance_encoder[step_k + 1]), dim=1)
+                    for step_k in range(self._cfg.num_unroll_steps)
+                ]
+            )
+            with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                all_chance_encoding, all_chance_one_hot = self._learn_model.chance_encode(concat_frames)
+            chance_encoding_steps = all_chance_encoding.chunk(self._cfg.num_unroll_steps)
+        elif self._cfg.monitor_extra_statistics:
             predicted_values, predicted_policies = original_value.detach().cpu(), torch.softmax(
                 policy_logits, dim=1
             ).detach().cpu()
@@ -360,15 +406,16 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
         # ==============================================================
         # calculate policy and value loss for the first step.
         # ==============================================================
-        policy_loss = cross_entropy_loss(policy_logits, target_policy[:, 0])
-        value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
+        if not self._cfg.fused_learn_step:
+            policy_loss = cross_entropy_loss(policy_logits, target_policy[:, 0])
+            value_loss = cross_entropy_loss(value, target_value_categorical[:, 0])
 
-        reward_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
-        consistency_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            reward_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
 
-        afterstate_policy_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
-        afterstate_value_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
-        commitment_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            afterstate_policy_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            afterstate_value_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+            commitment_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+        consistency_loss = torch.zeros(self._cfg.batch_size, device=self._cfg.device)
 
         # ==============================================================
         # the core recurrent_inference in MuZero policy.
@@ -378,18 +425,22 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
             # given current ``state`` and ``action``.
             # 'afterstate reward' is not used, we kept it for the sake of uniformity between decision nodes and chance nodes.
             # And then predict afterstate_policy_logits and afterstate_value with the afterstate prediction function.
-            network_output = self._learn_model.recurrent_inference(
-                latent_state, action_batch[:, step_k], afterstate=False
-            )
+            with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                network_output = self._learn_model.recurrent_inference(
+                    latent_state, action_batch[:, step_k], afterstate=False
+                )
             afterstate, afterstate_reward, afterstate_value, afterstate_policy_logits = mz_network_output_unpack(network_output)
 
             # ==============================================================
             # encode the consecutive frames to predict chance
             # ==============================================================
-            # concat consecutive frames to predict chance
-            concat_frame = torch.cat((obs_list_for_chance_encoder[step_k],
-                                      obs_list_for_chance_encoder[step_k + 1]), dim=1)
-            chance_encoding, chance_one_hot = self._learn_model.chance_encode(concat_frame)
+            if self._cfg.fused_learn_step:
+                chance_encoding = chance_encoding_steps[step_k]
+            else:
+                # concat consecutive frames to predict chance
+                concat_frame = torch.cat((obs_list_for_chance_encoder[step_k],
+                                          obs_list_for_chance_encoder[step_k + 1]), dim=1)
+                chance_encoding, chance_one_hot = self._learn_model.chance_encode(concat_frame)
             if self._cfg.use_ture_chance_label_in_chance_encoder:
                 true_chance_code = chance_batch[:, step_k]
                 true_chance_one_hot = chance_one_hot_batch[:, step_k]
@@ -400,14 +451,11 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
             # unroll with the dynamics function: predict the next ``latent_state``, ``reward``,
             # given current ``afterstate`` and ``chance_code``.
             # And then predict policy_logits and value with the prediction function.
-            network_output = self._learn_model.recurrent_inference(afterstate, chance_code, afterstate=True)
+            with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                network_output = self._learn_model.recurrent_inference(afterstate, chance_code, afterstate=True)
 
             latent_state, reward, value, policy_logits = mz_network_output_unpack(network_output)
 
-            # transform the scaled value or its categorical representation to its original value,
-            # i.e. h^(-1)(.) function in paper https://arxiv.org/pdf/1805.11593.pdf.
-            original_value = self.inverse_scalar_transform_handle(value)
-
             if self._cfg.model.self_supervised_learning_loss:
                 # ==============================================================
                 # calculate consistency loss for the next ``num_unroll_steps`` unroll steps.
@@ -415,17 +463,28 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
                 if self._cfg.ssl_loss_weight > 0:
                     # obtain the oracle hidden states from representation function.
                     beg_index, end_index = self._get_target_obs_index_in_step_k(step_k)
-                    network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
-
-                    latent_state = to_tensor(latent_state)
-                    representation_state = to_tensor(network_output.latent_state)
-
-                    # NOTE: no grad for the representation_state branch
-                    dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
-                    observation_proj = self._learn_model.project(representation_state, with_grad=False)
-                    temp_loss = negative_cosine_similarity(dynamic_proj, observation_proj) * mask_batch[:, step_k]
+                    with learn_autocast(self._cfg.device, self._learn_autocast_dtype):
+                        network_output = self._learn_model.initial_inference(obs_target_batch[:, beg_index:end_index])
+
+                        latent_state = to_tensor(latent_state)
+                        representation_state = to_tensor(network_output.latent_state)
+
+                        # NOTE: no grad for the representation_state branch
+                        dynamic_proj = self._learn_model.project(latent_state, with_grad=True)
+                        observation_proj = self._learn_model.project(representation_state, with_grad=False)
+                    temp_loss = negative_cosine_similarity(
+                        dynamic_proj.float(), observation_proj.float()
+                    ) * mask_batch[:, step_k]
                     consistency_loss += temp_loss
 
+            if self._cfg.fused_learn_step:
+                policy_logits_steps.append(policy_logits)
+                value_steps.append(value)
+                reward_steps.append(reward)
+                afterstate_policy_logits_steps.append(afterstate_policy_logits)
+                afterstate_value_steps.append(afterstate_value)
+                continue
+
             # NOTE: the target policy, target_value_categorical, target_reward_categorical is calculated in
             # game buffer now.
             # ==============================================================
@@ -476,6 +535,34 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
                 predicted_rewards.append(original_rewards_cpu)
                 predicted_policies = torch.cat((predicted_policies, torch.softmax(policy_logits, dim=1).detach().cpu()))
 
+        if self._cfg.fused_learn_step:
+            # ==============================================================
+            # calculate the losses of all the unroll steps on the stacked outputs.
+            # ==============================================================
+            policy_loss = unrolled_cross_entropy_loss(policy_logits_steps, target_policy).sum(-1)
+            value_loss = unrolled_cross_entropy_loss(value_steps, target_value_categorical).sum(-1)
+            reward_loss = unrolled_cross_entropy_loss(reward_steps, target_reward_categorical).sum(-1)
+            afterstate_value_loss = unrolled_cross_entropy_loss(
+                afterstate_value_steps, target_value_categorical
+            ).sum(-1)
+            if self._cfg.use_ture_chance_label_in_chance_encoder:
+                # The chance encoder is not used in the mcts, so we don't need to calculate the commitment loss.
+                target_chance_one_hot = chance_one_hot_batch[:, :self._cfg.num_unroll_steps].float().detach()
+                all_target_chance_one_hot = target_chance_one_hot.transpose(0, 1).flatten(0, 1)
+            else:
+                all_target_chance_one_hot = all_chance_one_hot.float()
+                target_chance_one_hot = all_target_chance_one_hot.view(
+                    self._cfg.num_unroll_steps, self._cfg.batch_size, -1
+                ).transpose(0, 1).detach()
+            afterstate_policy_loss = unrolled_cross_entropy_loss(
+                afterstate_policy_logits_steps, target_chance_one_hot
+            ).sum(-1)
+            # the per-step mse losses are means over equally sized steps, whose sum is num_unroll_steps times the
+            # mean over all the steps.
+            commitment_loss = torch.nn.MSELoss()(
+                all_chance_encoding.float(), all_target_chance_one_hot
+            ) * self._cfg.num_unroll_steps + torch.zeros(self._cfg.batch_size, device=self._cfg.device)
+
         # ==============================================================
         # the core learn model update step.
         # ==============================================================
@@ -504,6 +591,37 @@ class StochasticMuZeroPolicy(MuZeroPolicy):
         # ==============================================================
         self._target_model.update(self._learn_model.state_dict())
 
+        if self._cfg.fused_learn_step:
+            with torch.no_grad():
+                predicted_values = self.inverse_scalar_transform_handle(torch.cat(value_steps).float())
+                predicted_rewards = self.inverse_scalar_transform_handle(torch.cat(reward_steps).float())
+            # all the logging scalars are moved to the host at once.
+            log_vars = tensors_to_host(dict(
+                weighted_total_loss=weighted_total_loss,
+                total_loss=loss.mean(),
+                policy_loss=policy_loss.mean(),
+                reward_loss=reward_loss.mean(),
+                value_loss=value_loss.mean(),
+                consistency_loss=consistency_loss.mean() / self._cfg.num_unroll_steps,
+                afterstate_policy_loss=afterstate_policy_loss.mean(),
+                afterstate_value_loss=afterstate_value_loss.mean(),
+                commitment_loss=commitment_loss.mean(),
+                target_reward=target_reward.mean(),
+                target_value=target_value.mean(),
+                transformed_target_reward=transformed_target_reward.mean(),
+                transformed_target_value=transformed_target_value.mean(),
+                predicted_rewards=predicted_rewards.mean(),
+                predicted_values=predicted_values.mean(),
+                total_grad_norm_before_clip=total_grad_norm_before_clip,
+            ))
+            return {
+                'collect_mcts_temperature': self._collect_mcts_temperature,
+                'cur_lr': self._optimizer.param_groups[0]['lr'],
+                **log_vars,
+                'value_priority_orig': value_priority,
+                'value_priority': value_priority.mean().item(),
+            }
+
         # packing loss info for tensorboard logging
         loss_info = (
             weighted_total_loss.item(),
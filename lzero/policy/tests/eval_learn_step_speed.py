@@ -0,0 +1,55 @@
+"""
+Overview:
+    Benchmark of the learn step of the MuZero-family policies on CartPole. For each policy it runs the per-step learn
+    path, the fused learn path (``fused_learn_step=True``) and the fused learn path with bf16 autocast
+    (``learn_autocast_dtype='bfloat16'``) on the same synthetic batches, reports the learner steps per second, and
+    checks the loss parity of the fused paths against the per-step path from the same initial weights.
+"""
+import time
+from copy import deepcopy
+from typing import Dict, Tuple
+
+import torch
+
+from lzero.policy.tests.test_fused_learn_step import make_policy, make_batch
+
+PARITY_KEYS = ['weighted_total_loss', 'policy_loss', 'value_loss', 'total_grad_norm_before_clip']
+
+
+def time_learn_step(algo: str, batch_size: int, num_steps: int = 20, **kwargs) -> Tuple[float, Dict[str, float]]:
+    """
+    Overview:
+        Run ``num_steps`` learn steps after one warmup step, from the initial weights of seed 0.
+    Returns:
+        - steps_per_sec (:obj:`float`): The learner steps per second.
+        - log_vars (:obj:`Dict[str, float]`): The logging variables of the first learn step.
+    """
+    torch.manual_seed(0)
+    policy, cfg = make_policy(algo, batch_size=batch_size, **kwargs)
+    batches = [make_batch(algo, cfg, seed=i) for i in range(num_steps + 1)]
+    log_vars = policy._forward_learn(deepcopy(batches[0]))
+    log_vars = {k: float(log_vars[k]) for k in PARITY_KEYS}
+    t0 = time.perf_counter()
+    for batch in batches[1:]:
+        policy._forward_learn(batch)
+    return num_steps / (time.perf_counter() - t0), log_vars
+
+
+if __name__ == "__main__":
+    torch.set_num_threads(4)
+    for algo in ['muzero', 'efficientzero', 'gumbel_muzero', 'sampled_efficientzero', 'stochastic_muzero']:
+        for batch_size in [256]:
+            base_speed, base_log_vars = time_learn_step(algo, batch_size)
+            print(f'{algo} batch_size={batch_size}: per-step path {base_speed:.1f} steps/s')
+            for name, kwargs in [
+                ('fused', dict(fused_learn_step=True)),
+                ('fused bf16', dict(fused_learn_step=True, learn_autocast_dtype='bfloat16')),
+            ]:
+                speed, log_vars = time_learn_step(algo, batch_size, **kwargs)
+                rel_diff = max(
+                    abs(log_vars[k] - base_log_vars[k]) / max(abs(base_log_vars[k]), 1e-8) for k in PARITY_KEYS
+                )
+                print(
+                    f'  {name} path {speed:.1f} steps/s ({speed / base_speed:.2f}x), '
+                    f'max relative loss difference: {rel_diff:.2e}'
+                )
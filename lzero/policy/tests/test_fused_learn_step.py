@@ -0,0 +1,122 @@
+from copy import deepcopy
+from importlib import import_module
+
+import numpy as np
+import pytest
+import torch
+from ding.config import compile_config
+from ding.policy import create_policy
+
+algos = ['muzero', 'efficientzero', 'gumbel_muzero', 'sampled_efficientzero', 'stochastic_muzero']
+
+
+def make_policy(algo: str, **kwargs):
+    config_module = import_module(f'zoo.classic_control.cartpole.config.cartpole_{algo}_config')
+    cfg, create_cfg = deepcopy(config_module.main_config), deepcopy(config_module.create_config)
+    cfg.policy.update(dict(cuda=False, device='cpu', batch_size=16))
+    cfg.policy.update(kwargs)
+    create_cfg.env_manager.type = 'base'
+    cfg = compile_config(cfg, seed=0, env=None, auto=True, create_cfg=create_cfg, save_cfg=False)
+    return create_policy(cfg.policy, enable_field=['learn', 'collect']), cfg.policy
+
+
+def make_batch(algo: str, cfg, seed: int = 0):
+    rng = np.random.RandomState(seed)
+    batch_size, num_unroll_steps = cfg.batch_size, cfg.num_unroll_steps
+    action_space_size = cfg.model.action_space_size
+    obs = rng.randn(batch_size, cfg.model.observation_shape * (num_unroll_steps + 1)).astype(np.float32)
+    action = rng.randint(0, action_space_size, size=(batch_size, num_unroll_steps))
+    mask = np.ones((batch_size, num_unroll_steps + 1), dtype=np.float32)
+    # the last steps of some positions are out of their trajectory
+    mask[:batch_size // 4, -2:] = 0
+    weights = (rng.rand(batch_size) + 0.5).astype(np.float32)
+    current_batch = [obs, action, mask, np.arange(batch_size), weights, np.zeros(batch_size)]
+
+    policy_size = action_space_size
+    if algo == 'gumbel_muzero':
+        improved_policy = rng.dirichlet(np.ones(action_space_size), size=(batch_size, num_unroll_steps + 1))
+        current_batch.insert(2, improved_policy.astype(np.float32))
+    elif algo == 'sampled_efficientzero':
+        policy_size = cfg.model.num_of_sampled_actions
+        child_sampled_actions = np.argsort(rng.rand(batch_size, num_unroll_steps + 1, action_space_size), axis=-1)
+        current_batch.insert(2, child_sampled_actions[..., :policy_size, None])
+
+    target_reward = rng.randint(-1, 2, size=(batch_size, num_unroll_steps + 1)).astype(np.float32)
+    target_value = (5 * rng.randn(batch_size, num_unroll_steps + 1)).astype(np.float32)
+    target_policy = rng.dirichlet(np.ones(policy_size), size=(batch_size, num_unroll_steps + 1)).astype(np.float32)
+    return current_batch, [target_reward, target_value, target_policy]
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('algo', algos)
+def test_fused_learn_step_parity(algo):
+    torch.manual_seed(0)
+    policy, cfg = make_policy(algo)
+    fused_policy, _ = make_policy(algo, fused_learn_step=True)
+    fused_policy._model.load_state_dict(policy._model.state_dict())
+    fused_policy._optimizer.load_state_dict(policy._optimizer.state_dict())
+
+    data = make_batch(algo, cfg)
+    log_vars = policy._forward_learn(deepcopy(data))
+    fused_log_vars = fused_policy._forward_learn(deepcopy(data))
+
+    for key, value in log_vars.items():
+        if key == 'value_priority_orig':
+            continue
+        if isinstance(value, torch.Tensor):
+            value = value.item()
+        assert isinstance(fused_log_vars[key], (float, int)), key
+        assert np.isclose(fused_log_vars[key], value, rtol=1e-4, atol=1e-5), (key, fused_log_vars[key], value)
+    for (name, param), fused_param in zip(policy._model.named_parameters(), fused_policy._model.parameters()):
+        if param.grad is not None:
+            assert torch.allclose(param.grad, fused_param.grad, rtol=1e-4, atol=1e-5), name
+        assert torch.allclose(param, fused_param, rtol=1e-4, atol=1e-5), name
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('algo', ['muzero', 'gumbel_muzero'])
+def test_per_step_learn_step_log_vars(algo, monkeypatch):
+    # record the network outputs of the initial step and of every unroll step.
+    policy_module = import_module(f'lzero.policy.{algo}')
+    unpack, outputs = policy_module.mz_network_output_unpack, []
+
+    def recording_unpack(network_output):
+        outputs.append(unpack(network_output))
+        return outputs[-1]
+
+    monkeypatch.setattr(policy_module, 'mz_network_output_unpack', recording_unpack)
+    torch.manual_seed(0)
+    policy, cfg = make_policy(algo)
+    current_batch, target_batch = make_batch(algo, cfg)
+    log_vars = policy._forward_learn((current_batch, target_batch))
+    assert len(outputs) == cfg.num_unroll_steps + 1
+
+    with torch.no_grad():
+        values = torch.cat([value for _, _, value, _ in outputs])
+        prob = torch.softmax(torch.stack([logits for _, _, _, logits in outputs], dim=1), dim=-1)
+        # the entropy of the policy of each step is summed over the initial and the unroll steps.
+        policy_entropy = -(prob * prob.log()).sum(-1).sum(-1).mean().item()
+        if algo == 'muzero':
+            # MuZero logs the entropy averaged over the steps.
+            policy_entropy /= cfg.num_unroll_steps + 1
+        # the priority only depends on the value predicted at the initial step.
+        initial_value = policy.inverse_scalar_transform_handle(outputs[0][2]).squeeze(-1).numpy()
+        value_priority = np.abs(initial_value - target_batch[1][:, 0])
+        predicted_values = policy.inverse_scalar_transform_handle(values).mean().item()
+    assert np.isclose(log_vars['policy_entropy'], policy_entropy, rtol=1e-5)
+    assert log_vars['policy_entropy'] > 0
+    value_priority_orig = log_vars['value_priority_orig']
+    if isinstance(value_priority_orig, torch.Tensor):
+        value_priority_orig = value_priority_orig.detach().numpy()
+    assert np.allclose(value_priority_orig, value_priority, atol=1e-5)
+    assert np.isclose(log_vars['predicted_values'], predicted_values, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('algo', ['muzero', 'efficientzero'])
+def test_fused_learn_step_bf16(algo):
+    torch.manual_seed(0)
+    policy, cfg = make_policy(algo, fused_learn_step=True, learn_autocast_dtype='bfloat16')
+    log_vars = policy._forward_learn(make_batch(algo, cfg))
+    assert all(np.isfinite(log_vars[key]) for key in ['weighted_total_loss', 'policy_loss', 'value_loss'])
+    assert all(param.dtype == torch.float32 for param in policy._model.parameters())
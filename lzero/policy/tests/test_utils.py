@@ -3,8 +3,10 @@ import pytest
 import torch
 import torch.nn.functional as F
 
+from lzero.policy.scaling_transform import cross_entropy_loss
 from lzero.policy.utils import negative_cosine_similarity, to_torch_float_tensor, visualize_avg_softmax, \
-    calculate_topk_accuracy, plot_topk_accuracy, compare_argmax, plot_argmax_distribution
+    calculate_topk_accuracy, plot_topk_accuracy, compare_argmax, plot_argmax_distribution, learn_autocast, \
+    unrolled_cross_entropy_loss, unrolled_entropy, tensors_to_host
 
 
 # We use the pytest.mark.unittest decorator to mark this class for unit testing.
@@ -165,3 +167,37 @@ class TestUtils():
         assert (mask_batch_func == mask_batch_2).all() and (target_value_prefix_func == target_value_prefix_2).all(
         ) and (target_value_func == target_value_2).all() and (target_policy_func == target_policy_2
                                                                ).all() and (weights_func == weights_2).all()
+
+    def test_unrolled_losses(self):
+        batch_size, num_steps, num_classes = 8, 6, 5
+        logits = [torch.randn(batch_size, num_classes) for _ in range(num_steps)]
+        # the target has one more step than the predictions, as the rewards of the unroll
+        target = torch.softmax(torch.randn(batch_size, num_steps + 1, num_classes), dim=-1)
+        loss = unrolled_cross_entropy_loss(logits, target)
+        assert loss.shape == (batch_size, num_steps)
+        for k in range(num_steps):
+            assert torch.allclose(loss[:, k], cross_entropy_loss(logits[k], target[:, k]), atol=1e-6)
+
+        entropy = unrolled_entropy(logits)
+        assert entropy.shape == (batch_size, num_steps)
+        for k in range(num_steps):
+            prob = torch.softmax(logits[k], dim=-1)
+            assert torch.allclose(entropy[:, k], -(prob * prob.log()).sum(-1), atol=1e-6)
+
+        # the losses are computed in float32 from low precision logits
+        assert unrolled_cross_entropy_loss([x.bfloat16() for x in logits], target).dtype == torch.float32
+
+    def test_tensors_to_host(self):
+        log_vars = tensors_to_host(
+            dict(loss=torch.tensor(1.5), grad_norm=torch.tensor([2.]), lr=0.1, step=3, count=torch.tensor(4))
+        )
+        assert log_vars == dict(loss=1.5, grad_norm=2., lr=0.1, step=3, count=4.)
+        assert all(isinstance(log_vars[key], float) for key in ['loss', 'grad_norm', 'count'])
+        assert tensors_to_host(dict(lr=0.1)) == dict(lr=0.1)
+
+    def test_learn_autocast(self):
+        x, w = torch.randn(4, 8), torch.randn(8, 2)
+        with learn_autocast('cpu', None):
+            assert (x @ w).dtype == torch.float32
+        with learn_autocast('cpu', 'bfloat16'):
+            assert (x @ w).dtype == torch.bfloat16
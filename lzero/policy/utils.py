@@ -1,6 +1,6 @@
 import inspect
 import logging
-from typing import List, Tuple, Dict, Union
+from typing import List, Tuple, Dict, Union, Optional, ContextManager
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -596,3 +596,69 @@ def mz_network_output_unpack(network_output: Dict) -> Tuple:
     value = network_output.value  # shape: (batch_size, support_support_size)
     policy_logits = network_output.policy_logits  # shape: (batch_size, action_space_size)
     return latent_state, reward, value, policy_logits
+
+
+def learn_autocast(device: Union[str, torch.device], dtype: Optional[str] = None) -> ContextManager:
+    """
+    Overview:
+        The autocast context of the network forward passes in the learn step, e.g. ``dtype='bfloat16'`` runs the \
+        matmuls and convolutions of the unroll in bf16 on cpu or cuda. The autocast is disabled if ``dtype`` is None.
+    Arguments:
+        - device (:obj:`Union[str, torch.device]`): The device of the learn model.
+        - dtype (:obj:`Optional[str]`): The name of the autocast dtype, e.g. 'bfloat16' or 'float16'.
+    Returns:
+        - context (:obj:`ContextManager`): The autocast context.
+    """
+    device_type = 'cuda' if 'cuda' in str(device) else 'cpu'
+    return torch.autocast(
+        device_type=device_type,
+        dtype=getattr(torch, dtype) if dtype is not None else torch.bfloat16,
+        enabled=dtype is not None
+    )
+
+
+def unrolled_cross_entropy_loss(prediction: List[torch.Tensor], target: torch.Tensor) -> torch.Tensor:
+    """
+    Overview:
+        The cross entropy losses of all the unroll steps at once. The logits of the steps are stacked and reduced in \
+        float32 by one ``log_softmax``, instead of one ``cross_entropy_loss`` per step.
+    Arguments:
+        - prediction (:obj:`List[torch.Tensor]`): The logits of each unroll step, each of shape (batch_size, N).
+        - target (:obj:`torch.Tensor`): The targets of shape (batch_size, >=len(prediction), N), the k-th logits \
+            are paired with ``target[:, k]``.
+    Returns:
+        - loss (:obj:`torch.Tensor`): The loss of each unroll step, of shape (batch_size, len(prediction)).
+    """
+    prediction = torch.stack(prediction, dim=1).float()
+    return -(torch.log_softmax(prediction, dim=-1) * target[:, :prediction.shape[1]]).sum(-1)
+
+
+def unrolled_entropy(policy_logits: List[torch.Tensor]) -> torch.Tensor:
+    """
+    Overview:
+        The entropy of the policy of all the unroll steps at once, computed on the stacked logits in float32.
+    Arguments:
+        - policy_logits (:obj:`List[torch.Tensor]`): The policy logits of each unroll step, each of shape \
+            (batch_size, action_space_size).
+    Returns:
+        - entropy (:obj:`torch.Tensor`): The entropy of each unroll step, of shape (batch_size, len(policy_logits)).
+    """
+    log_prob = torch.log_softmax(torch.stack(policy_logits, dim=1).float(), dim=-1)
+    return -(log_prob.exp() * log_prob).sum(-1)
+
+
+def tensors_to_host(log_vars: Dict[str, Union[torch.Tensor, float, int]]) -> Dict[str, Union[float, int]]:
+    """
+    Overview:
+        Convert the scalar tensors of a dict of logging variables to python floats with a single device to host \
+        transfer, instead of one ``.item()`` synchronization per variable. The other values are kept as they are.
+    Arguments:
+        - log_vars (:obj:`Dict[str, Union[torch.Tensor, float, int]]`): The logging variables.
+    Returns:
+        - log_vars (:obj:`Dict[str, Union[float, int]]`): The logging variables with python floats for the tensors.
+    """
+    keys = [k for k, v in log_vars.items() if isinstance(v, torch.Tensor)]
+    if not keys:
+        return dict(log_vars)
+    values = torch.stack([log_vars[k].detach().float().reshape(()) for k in keys]).cpu().tolist()
+    return {**log_vars, **dict(zip(keys, values))}
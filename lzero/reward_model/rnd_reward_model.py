@@ -1,5 +1,4 @@
 import copy
-import random
 from typing import Union, Tuple, List, Dict
 
 import numpy as np
@@ -8,7 +7,6 @@ import torch.nn as nn
 import torch.nn.functional as F
 from ding.model import FCEncoder, ConvEncoder
 from ding.reward_model.base_reward_model import BaseRewardModel
-from ding.torch_utils.data_helper import to_tensor
 from ding.utils import RunningMeanStd
 from ding.utils import SequenceType, REWARD_MODEL_REGISTRY
 from easydict import EasyDict
@@ -71,6 +69,145 @@ class RNDNetworkRepr(nn.Module):
         return predict_feature, target_feature
 
 
+class TensorRingBuffer(object):
+    """
+    Overview:
+        The training data of the RND reward model: a ring of rows kept in one preallocated tensor on the device of
+        the model. New rows overwrite the oldest ones once ``capacity`` rows are stored, and a minibatch is sampled by
+        a single gather of random indices.
+        The tensor is allocated on the first ``extend``, with the shape and dtype of the rows, and grows by doubling
+        up to ``capacity``, so that a large capacity does not allocate memory which is never used.
+    Interfaces:
+        ``__init__``, ``__len__``, ``extend``, ``sample``, ``clear``
+    """
+
+    def __init__(self, capacity: int, device: str = 'cpu', init_size: int = 1024) -> None:
+        """
+        Arguments:
+            - capacity (:obj:`int`): The max number of rows.
+            - device (:obj:`str`): The device of the rows.
+            - init_size (:obj:`int`): The number of rows first allocated.
+        """
+        self.capacity = int(capacity)
+        self.device = device
+        self._init_size = min(init_size, self.capacity)
+        self._data = None
+        # the index the next row is written to, and the number of valid rows
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self, rows: torch.Tensor, min_size: int) -> None:
+        size = self._init_size if self._data is None else len(self._data)
+        while size < min_size:
+            size *= 2
+        size = min(size, self.capacity)
+        data = torch.empty((size, ) + rows.shape[1:], dtype=rows.dtype, device=self.device)
+        if self._data is not None:
+            # the ring is only grown before it wraps around, so that the rows are in order
+            data[:self._size] = self._data[:self._size]
+        self._data = data
+        self._head = self._size
+
+    def extend(self, rows: torch.Tensor) -> None:
+        """
+        Overview:
+            Append the rows, overwriting the oldest rows if the ring is full.
+        Arguments:
+            - rows (:obj:`torch.Tensor`): The rows, of shape ``(N, *row_shape)``.
+        """
+        rows = rows[-self.capacity:]
+        num = len(rows)
+        if num == 0:
+            return
+        if self._data is None or (len(self._data) < self.capacity and self._size + num > len(self._data)):
+            self._grow(rows, self._size + num)
+        indices = (self._head + torch.arange(num, device=self.device)) % len(self._data)
+        self._data[indices] = rows.to(self.device, self._data.dtype)
+        self._head = (self._head + num) % len(self._data)
+        self._size = min(self._size + num, len(self._data))
+
+    def sample(self, batch_size: int) -> torch.Tensor:
+        """
+        Overview:
+            Sample a minibatch of rows uniformly, without replacement if the ring holds at least ``batch_size`` rows, \
+            and with replacement otherwise.
+        Arguments:
+            - batch_size (:obj:`int`): The number of sampled rows.
+        Returns:
+            - rows (:obj:`torch.Tensor`): The sampled rows, of shape ``(batch_size, *row_shape)``.
+        """
+        assert self._size > 0, "the ring buffer is empty"
+        if batch_size <= self._size:
+            indices = torch.randperm(self._size, device=self.device)[:batch_size]
+        else:
+            indices = torch.randint(0, self._size, (batch_size, ), device=self.device)
+        return self._data[indices]
+
+    def clear(self) -> None:
+        self._head = 0
+        self._size = 0
+
+
+class TensorRunningMeanStd(object):
+    """
+    Overview:
+        The running mean and std of batches of tensors, as ``ding.utils.RunningMeanStd``, updated on the device of
+        the tensors so that neither the batches nor the statistics are copied to the cpu.
+    Interfaces:
+        ``__init__``, ``update``, ``normalize``
+    Properties:
+        ``mean``, ``std``
+    """
+
+    def __init__(self, epsilon: float = 1e-4) -> None:
+        self._epsilon = epsilon
+        # the statistics are created with the shape of the first batch, and are 0 and 1 before it
+        self._mean = None
+        self._var = None
+        self._count = epsilon
+
+    @property
+    def mean(self) -> Union[float, torch.Tensor]:
+        return 0. if self._mean is None else self._mean
+
+    @property
+    def std(self) -> Union[float, torch.Tensor]:
+        return 1. if self._var is None else torch.sqrt(self._var + 1e-8)
+
+    def update(self, x: torch.Tensor) -> None:
+        """
+        Overview:
+            Update the statistics with a batch of rows.
+        Arguments:
+            - x (:obj:`torch.Tensor`): The batch, of shape ``(N, *row_shape)``.
+        """
+        x = x.detach().float()
+        batch_mean = x.mean(dim=0)
+        batch_var = x.var(dim=0, unbiased=False)
+        batch_count = x.shape[0]
+        if self._mean is None:
+            self._mean = torch.zeros_like(batch_mean)
+            self._var = torch.ones_like(batch_var)
+
+        new_count = batch_count + self._count
+        mean_delta = batch_mean - self._mean
+        m2 = self._var * self._count + batch_var * batch_count + \
+            mean_delta.square() * self._count * batch_count / new_count
+        self._mean = self._mean + mean_delta * batch_count / new_count
+        self._var = m2 / new_count
+        self._count = new_count
+
+    def normalize(self, x: torch.Tensor, clamp_min: float, clamp_max: float) -> torch.Tensor:
+        """
+        Overview:
+            Transform the rows to mean 0 and std 1 by the statistics, and clamp them to ``[clamp_min, clamp_max]``.
+        """
+        return torch.clamp((x - self.mean) / self.std, min=clamp_min, max=clamp_max)
+
+
 @REWARD_MODEL_REGISTRY.register('rnd_muzero')
 class RNDRewardModel(BaseRewardModel):
     """
@@ -138,6 +275,15 @@ class RNDRewardModel(BaseRewardModel):
         extrinsic_reward_norm=True,
         # (int) The upper bound of the reward normalization.
         extrinsic_reward_norm_max=1,
+        # (int) The max number of the training rows of the reward model, the oldest rows are overwritten.
+        rnd_buffer_size=int(1e6),
+        # (int) The stride of the observations collected from each game segment as training rows.
+        collect_stride=1,
+        # (int) The max number of the observations collected from each game segment, None means no limit.
+        collect_max_per_segment=300,
+        # (str) How the observations of a game segment are selected when there are more than
+        # ``collect_max_per_segment``, including head (the first ones) or random.
+        collect_sampling='head',
     )
 
     def __init__(self, config: EasyDict, device: str = 'cpu', tb_logger: 'SummaryWriter' = None,
@@ -174,36 +320,34 @@ class RNDRewardModel(BaseRewardModel):
 
         assert self.intrinsic_reward_type in ['add', 'new', 'assign']
         if self.input_type in ['obs', 'obs_latent_state']:
-            self.train_obs = []
+            self.train_obs = TensorRingBuffer(self.rnd_buffer_size, self.device)
         if self.input_type == 'latent_state':
-            self.train_latent_state = []
+            self.train_latent_state = TensorRingBuffer(self.rnd_buffer_size, self.device)
+        self.collect_stride = self.cfg.get('collect_stride', 1)
+        self.collect_max_per_segment = self.cfg.get('collect_max_per_segment', 300)
+        self.collect_sampling = self.cfg.get('collect_sampling', 'head')
+        assert self.collect_sampling in ['head', 'random'], self.collect_sampling
 
         self._optimizer_rnd = torch.optim.Adam(
             self.reward_model.predictor.parameters(), lr=self.cfg.learning_rate, weight_decay=self.cfg.weight_decay
         )
 
         self._running_mean_std_rnd_reward = RunningMeanStd(epsilon=1e-4)
-        self._running_mean_std_rnd_obs = RunningMeanStd(epsilon=1e-4)
+        self._running_mean_std_rnd_obs = TensorRunningMeanStd(epsilon=1e-4)
         self.estimate_cnt_rnd = 0
         self.train_cnt_rnd = 0
 
     def _train_with_data_one_step(self) -> None:
         if self.input_type in ['obs', 'obs_latent_state']:
-            train_data = random.sample(self.train_obs, self.cfg.batch_size)
+            train_data = self.train_obs.sample(self.cfg.batch_size)
         elif self.input_type == 'latent_state':
-            train_data = random.sample(self.train_latent_state, self.cfg.batch_size)
-
-        train_data = torch.stack(train_data).to(self.device)
+            train_data = self.train_latent_state.sample(self.cfg.batch_size)
 
         if self.cfg.input_norm:
             # Note: observation normalization: transform obs to mean 0, std 1
-            self._running_mean_std_rnd_obs.update(train_data.detach().cpu().numpy())
-            normalized_train_data = (train_data - to_tensor(self._running_mean_std_rnd_obs.mean).to(
-                self.device)) / to_tensor(
-                self._running_mean_std_rnd_obs.std
-            ).to(self.device)
-            train_data = torch.clamp(normalized_train_data, min=self.cfg.input_norm_clamp_min,
-                                     max=self.cfg.input_norm_clamp_max)
+            train_data = self._running_mean_std_rnd_obs.normalize(
+                train_data, self.cfg.input_norm_clamp_min, self.cfg.input_norm_clamp_max
+            )
 
         predict_feature, target_feature = self.reward_model(train_data)
         loss = F.mse_loss(predict_feature, target_feature)
@@ -244,7 +388,7 @@ class RNDRewardModel(BaseRewardModel):
                 latent_state = self.representation_network(torch.from_numpy(obs_batch_tmp).to(self.device))
             input_data = latent_state
         elif self.input_type in ['obs', 'obs_latent_state']:
-            input_data = to_tensor(obs_batch_tmp).to(self.device)
+            input_data = torch.as_tensor(obs_batch_tmp, dtype=torch.float32, device=self.device)
 
         # NOTE: deepcopy reward part of data is very important,
         # otherwise the reward of data in the replay buffer will be incorrectly modified.
@@ -252,15 +396,10 @@ class RNDRewardModel(BaseRewardModel):
         target_reward_augmented = np.reshape(target_reward_augmented, (batch_size * 6, 1))
 
         if self.cfg.input_norm:
-            # add this line to avoid inplace operation on the original tensor.
-            input_data = input_data.clone()
             # Note: observation normalization: transform obs to mean 0, std 1
-            input_data = (input_data - to_tensor(self._running_mean_std_rnd_obs.mean
-                                                 ).to(self.device)) / to_tensor(self._running_mean_std_rnd_obs.std).to(
-                self.device)
-            input_data = torch.clamp(input_data, min=self.cfg.input_norm_clamp_min, max=self.cfg.input_norm_clamp_max)
-        else:
-            input_data = input_data
+            input_data = self._running_mean_std_rnd_obs.normalize(
+                input_data, self.cfg.input_norm_clamp_min, self.cfg.input_norm_clamp_max
+            )
         with torch.no_grad():
             predict_feature, target_feature = self.reward_model(input_data)
             mse = F.mse_loss(predict_feature, target_feature, reduction='none').mean(dim=1)
@@ -301,28 +440,33 @@ class RNDRewardModel(BaseRewardModel):
 
         return train_data_augmented
 
+    def _select_obs(self, obs_segment: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            Select the observations of a game segment collected as training rows, every ``collect_stride`` ones, and
+            at most ``collect_max_per_segment`` of them chosen by ``collect_sampling``.
+        """
+        obs = np.asarray(obs_segment)[::self.collect_stride]
+        if self.collect_max_per_segment is not None and len(obs) > self.collect_max_per_segment:
+            if self.collect_sampling == 'head':
+                obs = obs[:self.collect_max_per_segment]
+            else:
+                obs = obs[np.sort(np.random.choice(len(obs), self.collect_max_per_segment, replace=False))]
+        return obs
+
     def collect_data(self, data: list) -> None:
-        # TODO(pu): now we only collect the first 300 steps of each game segment.
-        collected_transitions = np.concatenate([game_segment.obs_segment[:300] for game_segment in data[0]], axis=0)
+        collected_transitions = np.concatenate([self._select_obs(game_segment.obs_segment) for game_segment in data[0]])
+        collected_transitions = torch.as_tensor(collected_transitions, dtype=torch.float32, device=self.device)
         if self.input_type == 'latent_state':
             with torch.no_grad():
-                self.train_latent_state.extend(
-                    self.representation_network(torch.from_numpy(collected_transitions).to(self.device)))
-        elif self.input_type == 'obs':
-            self.train_obs.extend(to_tensor(collected_transitions).to(self.device))
-        elif self.input_type == 'obs_latent_state':
-            self.train_obs.extend(to_tensor(collected_transitions).to(self.device))
-
-    def clear_old_data(self) -> None:
-        if self.input_type == 'latent_state':
-            if len(self.train_latent_state) >= self.cfg.rnd_buffer_size:
-                self.train_latent_state = self.train_latent_state[-self.cfg.rnd_buffer_size:]
-        elif self.input_type == 'obs':
-            if len(self.train_obs) >= self.cfg.rnd_buffer_size:
-                self.train_obs = self.train_obs[-self.cfg.rnd_buffer_size:]
-        elif self.input_type == 'obs_latent_state':
-            if len(self.train_obs) >= self.cfg.rnd_buffer_size:
-                self.train_obs = self.train_obs[-self.cfg.rnd_buffer_size:]
+                collected_transitions = self.representation_network(collected_transitions)
+            train_data = self.train_latent_state
+        else:
+            train_data = self.train_obs
+        if self.cfg.input_norm:
+            # the normalization statistics are updated once per collection, by all the collected rows
+            self._running_mean_std_rnd_obs.update(collected_transitions)
+        train_data.extend(collected_transitions)
 
     def state_dict(self) -> Dict:
         return self.reward_model.state_dict()
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+import torch
+from easydict import EasyDict
+from tensorboardX import SummaryWriter
+
+from lzero.reward_model.rnd_reward_model import RNDRewardModel, TensorRingBuffer, TensorRunningMeanStd
+
+
+@pytest.mark.unittest
+def test_tensor_ring_buffer():
+    ring = TensorRingBuffer(capacity=10, init_size=2)
+    assert len(ring) == 0
+    ring.extend(torch.arange(3).float().unsqueeze(1))
+    assert len(ring) == 3 and len(ring._data) == 4
+    ring.extend(torch.arange(3, 8).float().unsqueeze(1))
+    assert len(ring) == 8 and len(ring._data) == 8
+    # the ring is full at its capacity, and the oldest rows are overwritten
+    ring.extend(torch.arange(8, 14).float().unsqueeze(1))
+    assert len(ring) == 10 and len(ring._data) == 10
+    assert sorted(ring._data.squeeze(1).tolist()) == list(range(4, 14))
+    ring.extend(torch.arange(14, 40).float().unsqueeze(1))
+    assert sorted(ring._data.squeeze(1).tolist()) == list(range(30, 40))
+
+    # the rows of a minibatch are distinct when the ring holds enough rows
+    batch = ring.sample(8)
+    assert batch.shape == (8, 1) and len(batch.unique()) == 8 and ((batch >= 30) & (batch < 40)).all()
+    batch = ring.sample(64)
+    assert batch.shape == (64, 1) and ((batch >= 30) & (batch < 40)).all()
+
+
+@pytest.mark.unittest
+def test_tensor_running_mean_std():
+    rng = np.random.RandomState(0)
+    batches = [rng.randn(50, 3) * 2 + 1 for _ in range(4)]
+    running_mean_std = TensorRunningMeanStd()
+    for batch in batches:
+        running_mean_std.update(torch.as_tensor(batch))
+    data = np.concatenate(batches)
+    assert np.allclose(running_mean_std.mean.numpy(), data.mean(0), atol=1e-4)
+    assert np.allclose(running_mean_std.std.numpy(), data.std(0), atol=1e-4)
+
+
+class FakeGameSegment:
+
+    def __init__(self, obs_segment: np.ndarray) -> None:
+        self.obs_segment = obs_segment
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('collect_sampling', ['head', 'random'])
+def test_rnd_collect_and_train(collect_sampling, tmp_path):
+    cfg = EasyDict(RNDRewardModel.default_config())
+    cfg.update(
+        dict(
+            input_type='obs',
+            obs_shape=8,
+            hidden_size_list=[16, 16],
+            weight_decay=1e-4,
+            batch_size=16,
+            update_per_collect=4,
+            rnd_buffer_size=100,
+            collect_stride=2,
+            collect_max_per_segment=30,
+            collect_sampling=collect_sampling,
+        )
+    )
+    reward_model = RNDRewardModel(cfg, tb_logger=SummaryWriter(str(tmp_path)))
+    game_segments = [FakeGameSegment(np.random.randn(80, 8).astype(np.float32)) for _ in range(3)]
+    reward_model.collect_data([game_segments, None])
+    # 30 of the 40 observations of each game segment taken every 2 steps
+    assert len(reward_model.train_obs) == 90
+    rows = reward_model.train_obs._data[:30].numpy()
+    strided = game_segments[0].obs_segment[::2]
+    if collect_sampling == 'head':
+        assert np.array_equal(rows, strided[:30])
+    else:
+        assert all((strided == row).all(axis=1).any() for row in rows)
+
+    reward_model.collect_data([game_segments, None])
+    assert len(reward_model.train_obs) == 100
+    reward_model.train_with_data()
+    assert reward_model.train_cnt_rnd == 4
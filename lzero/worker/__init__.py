@@ -1,4 +1,7 @@
 from .alphazero_collector import AlphaZeroCollector
 from .alphazero_evaluator import AlphaZeroEvaluator
 from .muzero_collector import MuZeroCollector
-from .muzero_evaluator import MuZeroEvaluator
\ No newline at end of file
+from .muzero_evaluator import MuZeroEvaluator
+from .muzero_reanalyze_service import MuZeroReanalyzeService
+from .muzero_inference_server import MuZeroInferenceServer
+from .muzero_async_evaluator import MuZeroAsyncEvaluator
@@ -350,6 +350,13 @@ class AlphaZeroCollector(ISerialCollector):
                 'total_episode_count': self._total_episode_count,
                 'total_duration': self._total_duration,
             }
+            try:
+                transposition_table_stats = self._policy.get_attribute('collect_transposition_table_stats')
+            except NotImplementedError:
+                transposition_table_stats = None
+            if transposition_table_stats is not None:
+                info['transposition_table_hit_rate'] = transposition_table_stats['hit_rate']
+                info['network_calls_saved_per_move'] = transposition_table_stats['network_calls_saved_per_move']
             self._episode_info.clear()
             self._logger.info("collect end:\n{}".format('\n'.join(['{}: {}'.format(k, v) for k, v in info.items()])))
             for k, v in info.items():
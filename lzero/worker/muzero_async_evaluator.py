@@ -0,0 +1,240 @@
+import copy
+import logging
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from multiprocessing.util import Finalize
+from ding.envs import create_env_manager, get_vec_env_setting
+from ding.policy import create_policy
+from ding.torch_utils import to_device
+from ding.utils import set_pkg_seed, save_file
+from easydict import EasyDict
+
+from .muzero_evaluator import MuZeroEvaluator
+
+# The policy and the evaluator of an evaluation worker process, set up by ``_init_eval_worker``.
+_worker = None
+
+AsyncEvalTask = namedtuple('AsyncEvalTask', ['future', 'train_iter', 'envstep', 'state_dict'])
+
+
+def _init_eval_worker(cfg: EasyDict, model: torch.nn.Module, seed: int) -> None:
+    global _worker
+    # The worker searches its own trees next to the learner, so one intra-op thread avoids oversubscribing the cores.
+    torch.set_num_threads(1)
+    set_pkg_seed(seed, use_cuda=cfg.policy.cuda)
+    env_fn, _, evaluator_env_cfg = get_vec_env_setting(cfg.env, collect=False)
+    evaluator_env = create_env_manager(cfg.env.manager, [partial(env_fn, cfg=c) for c in evaluator_env_cfg])
+    evaluator_env.seed(seed, dynamic_seed=False)
+    policy = create_policy(cfg.policy, model=model, enable_field=['learn', 'collect', 'eval'])
+    evaluator = MuZeroEvaluator(
+        eval_freq=cfg.policy.eval_freq,
+        n_evaluator_episode=cfg.env.n_evaluator_episode,
+        stop_value=cfg.env.stop_value,
+        env=evaluator_env,
+        policy=policy.eval_mode,
+        exp_name=cfg.exp_name,
+        instance_name='async_evaluator',
+        policy_config=cfg.policy
+    )
+    _worker = (policy, evaluator)
+    # close the env and the tensorboard logger of the evaluator when the worker exits, before the multiprocessing
+    # queues of the logger are closed
+    Finalize(None, evaluator.close, exitpriority=100)
+
+
+def _async_eval(model_state_dict: Dict[str, Any], train_iter: int, envstep: int) -> Tuple[bool, Dict[str, Any]]:
+    policy, evaluator = _worker
+    policy._model.load_state_dict(model_state_dict)
+    return evaluator.eval(None, train_iter, envstep)
+
+
+class MuZeroAsyncEvaluator(object):
+    """
+    Overview:
+        The asynchronous evaluator for MCTS+RL algorithms, which takes the evaluation off the training loop.
+        Each evaluation snapshots the weights of the learner's policy and hands them over to a pool of worker
+        processes, each with its own evaluator env and policy, so that the collection and the learning continue
+        while the episodes are played. The results are logged against the train iteration and the env step of their
+        snapshot, by the tensorboard logger of the ``async_evaluator`` instance of the workers and, with the tags of
+        the synchronous ``evaluator``, by the given tensorboard logger of the learner. The snapshot which achieves the
+        highest return is saved as ``ckpt_best.pth.tar``. At most ``max_in_flight`` evaluations run or wait for a
+        worker at a time, a new one waits for the oldest one to finish.
+    Interfaces:
+        ``__init__``, ``should_eval``, ``eval``, ``poll``, ``close``
+    """
+
+    @classmethod
+    def default_config(cls: type) -> EasyDict:
+        """
+        Overview:
+            Retrieve the default configuration of the asynchronous evaluator.
+        Returns:
+            - cfg (:obj:`EasyDict`): The default configuration of the asynchronous evaluator.
+        """
+        cfg = EasyDict(copy.deepcopy(cls.config))
+        cfg.cfg_type = cls.__name__ + 'Dict'
+        return cfg
+
+    config = dict(
+        # (int) The number of worker processes running the evaluations. 0 means that the evaluations run inline in
+        # the training loop with ``MuZeroEvaluator``.
+        num_workers=0,
+        # (int) The maximum number of evaluations running or waiting for a worker.
+        max_in_flight=2,
+        # (str) The device of the policy in the worker processes.
+        device='cpu',
+        # (str) The start method of the worker processes. 'spawn' is required when the workers use cuda.
+        start_method='spawn',
+    )
+
+    def __init__(
+            self,
+            cfg: dict,
+            main_cfg: EasyDict,
+            policy: Any,
+            tb_logger: Optional['SummaryWriter'] = None,  # noqa
+            seed: int = 0,
+    ) -> None:
+        """
+        Overview:
+            Start the pool of evaluation workers.
+        Arguments:
+            - cfg (:obj:`dict`): The config of the asynchronous evaluator, merged into ``default_config()``.
+            - main_cfg (:obj:`EasyDict`): The compiled config of the experiment, with its ``env`` and ``policy``.
+            - policy (:obj:`Policy`): The policy of the learner, whose model is evaluated.
+            - tb_logger (:obj:`Optional[SummaryWriter]`): The tensorboard logger of the learner, which the results \
+                of the evaluations are also logged to.
+            - seed (:obj:`int`): The seed of the evaluator envs of the workers.
+        """
+        self._cfg = self.default_config()
+        self._cfg.update(cfg)
+        assert self._cfg.num_workers > 0, "MuZeroAsyncEvaluator needs at least one worker"
+        assert self._cfg.max_in_flight >= 1
+        self._policy = policy
+        self._tb_logger = tb_logger
+        self._exp_name = main_cfg.exp_name
+        self._eval_freq = main_cfg.policy.eval_freq
+        self._last_eval_iter = -1
+        self._max_episode_return = float('-inf')
+
+        worker_cfg = copy.deepcopy(main_cfg)
+        worker_cfg.policy.device = self._cfg.device
+        worker_cfg.policy.cuda = self._cfg.device != 'cpu'
+        # the env numbers are popped off the env config when the envs of the learner are created
+        worker_cfg.env.evaluator_env_num = worker_cfg.env.get('evaluator_env_num', main_cfg.policy.evaluator_env_num)
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._cfg.num_workers,
+            mp_context=mp.get_context(self._cfg.start_method),
+            initializer=_init_eval_worker,
+            initargs=(worker_cfg, copy.deepcopy(policy._model).cpu(), seed),
+        )
+        self._pending = deque()
+        self._end_flag = False
+
+    def should_eval(self, train_iter: int) -> bool:
+        """
+        Overview:
+            Determine whether to evaluate at this train iteration, every ``eval_freq`` iterations as \
+            ``MuZeroEvaluator.should_eval``.
+        """
+        if train_iter == self._last_eval_iter:
+            return False
+        if (train_iter - self._last_eval_iter) < self._eval_freq and train_iter != 0:
+            return False
+        self._last_eval_iter = train_iter
+        return True
+
+    def eval(self, train_iter: int = -1, envstep: int = -1) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Overview:
+            Start the evaluation of a snapshot of the current policy, and collect the evaluations which finished.
+            It waits only when ``max_in_flight`` evaluations are already in flight.
+        Arguments:
+            - train_iter (:obj:`int`): The current train iteration, which the results are logged against.
+            - envstep (:obj:`int`): The current env step count.
+        Returns:
+            - stop_flag (:obj:`bool`): Whether a finished evaluation reached the stop value.
+            - episode_info (:obj:`Optional[Dict[str, Any]]`): The information of the latest finished evaluation, \
+                None if no evaluation finished.
+        """
+        stop_flag, episode_info = False, None
+        # the evaluation of this snapshot also counts for ``should_eval``
+        self._last_eval_iter = max(self._last_eval_iter, train_iter)
+        while len(self._pending) >= self._cfg.max_in_flight:
+            stop, info = self._finish(self._pending.popleft())
+            stop_flag, episode_info = stop_flag or stop, info
+        state_dict = to_device(copy.deepcopy(self._policy.learn_mode.state_dict()), 'cpu')
+        future = self._executor.submit(_async_eval, state_dict['model'], train_iter, envstep)
+        self._pending.append(AsyncEvalTask(future, train_iter, envstep, state_dict))
+        stop, info = self.poll()
+        return stop_flag or stop, info if info is not None else episode_info
+
+    def poll(self, wait: bool = False) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Overview:
+            Collect the evaluations which finished, in the order they were started.
+        Arguments:
+            - wait (:obj:`bool`): Whether to wait for all the evaluations in flight to finish.
+        Returns:
+            - stop_flag (:obj:`bool`): Whether a finished evaluation reached the stop value.
+            - episode_info (:obj:`Optional[Dict[str, Any]]`): The information of the latest finished evaluation, \
+                None if no evaluation finished.
+        """
+        stop_flag, episode_info = False, None
+        while self._pending and (wait or self._pending[0].future.done()):
+            stop, info = self._finish(self._pending.popleft())
+            stop_flag, episode_info = stop_flag or stop, info
+        return stop_flag, episode_info
+
+    def _finish(self, task: AsyncEvalTask) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Overview:
+            Wait for the result of an evaluation, and save its snapshot if it achieves the highest return.
+        """
+        stop_flag, episode_info = task.future.result()
+        episode_return = episode_info['eval_episode_return_mean']
+        logging.info(
+            f'async eval at train_iter: {task.train_iter}, collector_envstep: {task.envstep}, '
+            f'eval_episode_return_mean: {episode_return}'
+        )
+        if self._tb_logger is not None:
+            # with the tags of the synchronous evaluator, so that the curves are comparable
+            info = dict(reward_mean=episode_return, **episode_info)
+            for k, v in info.items():
+                if np.isscalar(v):
+                    self._tb_logger.add_scalar('evaluator_iter/' + k, v, task.train_iter)
+                    self._tb_logger.add_scalar('evaluator_step/' + k, v, task.envstep)
+        if episode_return > self._max_episode_return:
+            self._max_episode_return = episode_return
+            dirname = './{}/ckpt'.format(self._exp_name)
+            os.makedirs(dirname, exist_ok=True)
+            state_dict = dict(task.state_dict, last_iter=task.train_iter, last_step=task.envstep)
+            save_file(os.path.join(dirname, 'ckpt_best.pth.tar'), state_dict)
+        return stop_flag, episode_info
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Overview:
+            Shut down the worker processes, after the evaluations in flight finish if ``wait``, otherwise cancelling
+            the ones which did not start.
+        """
+        if self._end_flag:
+            return
+        self._end_flag = True
+        if wait:
+            self.poll(wait=True)
+        else:
+            for task in self._pending:
+                task.future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+    def __del__(self) -> None:
+        self.close(wait=False)
@@ -1,6 +1,8 @@
+import threading
 import time
 from collections import deque, namedtuple
-from typing import Optional, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, List, Dict, Tuple
 
 import numpy as np
 import torch
@@ -12,6 +14,7 @@ from ding.worker.collector.base_serial_collector import ISerialCollector
 from torch.nn import L1Loss
 
 from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.mcts.buffer.segment_storage import SegmentStorage
 from lzero.mcts.utils import prepare_observation
 
 
@@ -23,7 +26,8 @@ class MuZeroCollector(ISerialCollector):
         It manages the data collection process for training these algorithms using a serial mechanism.
     Interfaces:
         ``__init__``, ``reset``, ``reset_env``, ``reset_policy``, ``_reset_stat``, ``envstep``, ``__del__``, ``_compute_priorities``,
-        ``pad_and_save_last_trajectory``, ``collect``, ``_output_log``, ``close``
+        ``pad_and_save_last_trajectory``, ``collect``, ``_step_envs``, ``_step_pipelined``, ``_output_log``, ``close``,
+        ``attach_segment_storage``, ``_write_to_segment_storage``
     Properties:
         ``envstep``
     """
@@ -81,6 +85,14 @@ class MuZeroCollector(ISerialCollector):
 
         self.policy_config = policy_config
 
+        # The env manager is only called under this lock, so that the background thread of the pipelined collection
+        # and the main thread do not use it at the same time.
+        self._env_lock = threading.Lock()
+        self._step_executor = None
+        self._pending_steps = deque()
+        # The segment storage of the replay buffer, into which the collected game segments are written.
+        self._segment_storage = None
+
         self.reset(policy, env)
 
     def reset_env(self, _env: Optional[BaseEnvManager] = None) -> None:
@@ -145,6 +157,9 @@ class MuZeroCollector(ISerialCollector):
         self._total_duration = 0
         self._last_train_iter = 0
         self._end_flag = False
+        # The wall time of the main thread spent in the searches, in waiting for the envs and in the bookkeeping of
+        # the game segments, since the last log.
+        self._time_breakdown = {'search_time': 0., 'env_time': 0., 'bookkeeping_time': 0.}
 
         # A game_segment_pool implementation based on the deque structure.
         self.game_segment_pool = deque(maxlen=int(1e6))
@@ -180,6 +195,12 @@ class MuZeroCollector(ISerialCollector):
         if self._end_flag:
             return
         self._end_flag = True
+        if self._segment_storage is not None:
+            self._segment_storage.close()
+            self._segment_storage = None
+        if self._step_executor is not None:
+            self._step_executor.shutdown(wait=True)
+            self._step_executor = None
         self._env.close()
         if self._tb_logger:
             self._tb_logger.flush()
@@ -301,6 +322,66 @@ class MuZeroCollector(ISerialCollector):
 
         return None
 
+    def attach_segment_storage(self, handle: Tuple) -> None:
+        """
+        Overview:
+            Attach to the ``SegmentStorage`` of the replay buffer (``use_segment_storage``), which may be owned by
+            another process on the same node. The collected game segments are then written straight into its slots,
+            and ``collect`` returns them without the stored columns, so that only their shells are sent to the buffer.
+        Arguments:
+            - handle (:obj:`Tuple`): The ``handle`` of the segment storage of the replay buffer.
+        """
+        if self._segment_storage is not None:
+            if self._segment_storage.handle == handle:
+                return
+            self._segment_storage.close()
+        self._segment_storage = SegmentStorage.attach(handle)
+
+    def _write_to_segment_storage(self, game_segment: GameSegment) -> None:
+        """
+        Overview:
+            Write the columns of the game segment into a free slot of the attached segment storage, and strip them
+            off the game segment, which keeps its ``storage_slot``. The replay buffer binds the columns to the slot
+            again when the game segment is pushed. The game segment keeps its own arrays if the storage is full.
+        Arguments:
+            - game_segment (:obj:`GameSegment`): The collected game segment, after ``game_segment_to_array``.
+        """
+        slot = self._segment_storage.allocate()
+        if slot is None:
+            return
+        self._segment_storage.write(slot, game_segment)
+        self._segment_storage.strip(game_segment, slot)
+
+    def _step_envs(self, actions: Dict[int, Any]) -> Dict[int, Any]:
+        """
+        Overview:
+            Step the envs of the given actions, holding the lock of the env manager.
+        Arguments:
+            - actions (:obj:`Dict[int, Any]`): The actions of the envs to step, indexed by env id.
+        Returns:
+            - timesteps (:obj:`Dict[int, Any]`): The timesteps of the stepped envs, indexed by env id.
+        """
+        with self._env_lock:
+            return self._env.step(actions)
+
+    def _step_pipelined(self, actions: Dict[int, Any]) -> Dict[int, Any]:
+        """
+        Overview:
+            Step the envs of one group in the background thread, and wait for the step of the other group in flight, \
+            so that the envs of one group step while the envs of the other group are searched.
+        Arguments:
+            - actions (:obj:`Dict[int, Any]`): The actions of the searched envs of the group, which may be empty if \
+                no env of the group is ready.
+        Returns:
+            - timesteps (:obj:`Dict[int, Any]`): The timesteps of the earliest step in flight, or an empty dict if \
+                the step of the given actions is the only one.
+        """
+        if len(actions) > 0:
+            self._pending_steps.append(self._step_executor.submit(self._step_envs, actions))
+        if len(self._pending_steps) > 1 or (len(actions) == 0 and len(self._pending_steps) > 0):
+            return self._pending_steps.popleft().result()
+        return {}
+
     def collect(self,
                 n_episode: Optional[int] = None,
                 train_iter: int = 0,
@@ -390,93 +471,107 @@ class MuZeroCollector(ISerialCollector):
         ready_env_id = set()
         remain_episode = n_episode
 
+        # The outputs of the searches, indexed by env id. In the pipelined collection, an env is searched one iteration
+        # before its timestep is processed, so they are kept across the iterations.
+        actions = {}
+        distributions_dict = {}
+        if self.policy_config.sampled_algo:
+            root_sampled_actions_dict = {}
+        value_dict = {}
+        pred_value_dict = {}
+        visit_entropy_dict = {}
+        if self.policy_config.gumbel_algo:
+            improved_policy_dict = {}
+            completed_value_dict = {}
+
+        pipelined_collect = self.policy_config.get('pipelined_collect', False) and env_nums > 1
+        if pipelined_collect:
+            if self._step_executor is None:
+                self._step_executor = ThreadPoolExecutor(max_workers=1)
+            # The envs are split into two groups. In each iteration, the ready envs of one group are searched while the
+            # envs of the other group step in the background thread, then the timesteps of the other group are
+            # processed while the searched group steps. As the env manager is not read between the steps, the envs
+            # start their episodes here and when the episodes of the envs end.
+            env_groups = [set(range(0, env_nums, 2)), set(range(1, env_nums, 2))]
+            group_index = 0
+            ready_env_id = set(list(init_obs.keys())[:remain_episode])
+            remain_episode -= len(ready_env_id)
+
         while True:
             with self._timer:
-                # Get current ready env obs.
-                obs = self._env.ready_obs
-                new_available_env_id = set(obs.keys()).difference(ready_env_id)
-                ready_env_id = ready_env_id.union(set(list(new_available_env_id)[:remain_episode]))
-                remain_episode -= min(len(new_available_env_id), remain_episode)
-
-                stack_obs = {env_id: game_segments[env_id].get_obs() for env_id in ready_env_id}
-                stack_obs = list(stack_obs.values())
-
-                action_mask_dict = {env_id: action_mask_dict[env_id] for env_id in ready_env_id}
-                to_play_dict = {env_id: to_play_dict[env_id] for env_id in ready_env_id}
-                action_mask = [action_mask_dict[env_id] for env_id in ready_env_id]
-                to_play = [to_play_dict[env_id] for env_id in ready_env_id]
-                if self.policy_config.use_ture_chance_label_in_chance_encoder:
-                    chance_dict = {env_id: chance_dict[env_id] for env_id in ready_env_id}
-                    chance = [chance_dict[env_id] for env_id in ready_env_id]
-
-                stack_obs = to_ndarray(stack_obs)
-                # return stack_obs shape: [B, S*C, W, H] e.g. [8, 4*1, 96, 96]
-                stack_obs = prepare_observation(stack_obs, self.policy_config.model.model_type)
-
-                # stack_obs = torch.from_numpy(stack_obs).to(self.policy_config.device).float()
-                stack_obs = torch.from_numpy(stack_obs).to(self.policy_config.device)
+                if pipelined_collect:
+                    search_env_id = [env_id for env_id in ready_env_id if env_id in env_groups[group_index]]
+                    group_index = 1 - group_index
+                else:
+                    # Get current ready env obs.
+                    obs = self._env.ready_obs
+                    new_available_env_id = set(obs.keys()).difference(ready_env_id)
+                    ready_env_id = ready_env_id.union(set(list(new_available_env_id)[:remain_episode]))
+                    remain_episode -= min(len(new_available_env_id), remain_episode)
+                    search_env_id = list(ready_env_id)
+
+                search_start = time.time()
+                if len(search_env_id) > 0:
+                    stack_obs = {env_id: game_segments[env_id].get_obs() for env_id in search_env_id}
+                    stack_obs = list(stack_obs.values())
+
+                    action_mask_dict = {env_id: action_mask_dict[env_id] for env_id in ready_env_id}
+                    to_play_dict = {env_id: to_play_dict[env_id] for env_id in ready_env_id}
+                    action_mask = [action_mask_dict[env_id] for env_id in search_env_id]
+                    to_play = [to_play_dict[env_id] for env_id in search_env_id]
+                    if self.policy_config.use_ture_chance_label_in_chance_encoder:
+                        chance_dict = {env_id: chance_dict[env_id] for env_id in ready_env_id}
+                        chance = [chance_dict[env_id] for env_id in search_env_id]
 
-                # ==============================================================
-                # policy forward
-                # ==============================================================
-                policy_output = self._policy.forward(stack_obs, action_mask, temperature, to_play, epsilon)
-
-                actions_no_env_id = {k: v['action'] for k, v in policy_output.items()}
-                distributions_dict_no_env_id = {k: v['visit_count_distributions'] for k, v in policy_output.items()}
-                if self.policy_config.sampled_algo:
-                    root_sampled_actions_dict_no_env_id = {
-                        k: v['root_sampled_actions']
-                        for k, v in policy_output.items()
-                    }
-                value_dict_no_env_id = {k: v['searched_value'] for k, v in policy_output.items()}
-                pred_value_dict_no_env_id = {k: v['predicted_value'] for k, v in policy_output.items()}
-                visit_entropy_dict_no_env_id = {
-                    k: v['visit_count_distribution_entropy']
-                    for k, v in policy_output.items()
-                }
-
-                if self.policy_config.gumbel_algo:
-                    improved_policy_dict_no_env_id = {k: v['improved_policy_probs'] for k, v in policy_output.items()}
-                    completed_value_no_env_id = {
-                        k: v['roots_completed_value']
-                        for k, v in policy_output.items()
-                    }
-                # TODO(pu): subprocess
-                actions = {}
-                distributions_dict = {}
-                if self.policy_config.sampled_algo:
-                    root_sampled_actions_dict = {}
-                value_dict = {}
-                pred_value_dict = {}
-                visit_entropy_dict = {}
-                if self.policy_config.gumbel_algo:
-                    improved_policy_dict = {}
-                    completed_value_dict = {}
-                for index, env_id in enumerate(ready_env_id):
-                    actions[env_id] = actions_no_env_id.pop(index)
-                    distributions_dict[env_id] = distributions_dict_no_env_id.pop(index)
-                    if self.policy_config.sampled_algo:
-                        root_sampled_actions_dict[env_id] = root_sampled_actions_dict_no_env_id.pop(index)
-                    value_dict[env_id] = value_dict_no_env_id.pop(index)
-                    pred_value_dict[env_id] = pred_value_dict_no_env_id.pop(index)
-                    visit_entropy_dict[env_id] = visit_entropy_dict_no_env_id.pop(index)
-                    if self.policy_config.gumbel_algo:
-                        improved_policy_dict[env_id] = improved_policy_dict_no_env_id.pop(index)
-                        completed_value_dict[env_id] = completed_value_no_env_id.pop(index)
+                    stack_obs = to_ndarray(stack_obs)
+                    # return stack_obs shape: [B, S*C, W, H] e.g. [8, 4*1, 96, 96]
+                    stack_obs = prepare_observation(stack_obs, self.policy_config.model.model_type)
+
+                    # stack_obs = torch.from_numpy(stack_obs).to(self.policy_config.device).float()
+                    stack_obs = torch.from_numpy(stack_obs).to(self.policy_config.device)
+
+                    # ==============================================================
+                    # policy forward
+                    # ==============================================================
+                    policy_output = self._policy.forward(
+                        stack_obs, action_mask, temperature, to_play, epsilon, ready_env_id=np.array(search_env_id)
+                    )
+
+                    # the outputs of the policy are indexed by env id
+                    for env_id in search_env_id:
+                        actions[env_id] = policy_output[env_id]['action']
+                        distributions_dict[env_id] = policy_output[env_id]['visit_count_distributions']
+                        if self.policy_config.sampled_algo:
+                            root_sampled_actions_dict[env_id] = policy_output[env_id]['root_sampled_actions']
+                        value_dict[env_id] = policy_output[env_id]['searched_value']
+                        pred_value_dict[env_id] = policy_output[env_id]['predicted_value']
+                        visit_entropy_dict[env_id] = policy_output[env_id]['visit_count_distribution_entropy']
+                        if self.policy_config.gumbel_algo:
+                            improved_policy_dict[env_id] = policy_output[env_id]['improved_policy_probs']
+                            completed_value_dict[env_id] = policy_output[env_id]['roots_completed_value']
 
                 # ==============================================================
                 # Interact with env.
                 # ==============================================================
-                timesteps = self._env.step(actions)
-
-            interaction_duration = self._timer.value / len(timesteps)
-
+                env_start = time.time()
+                search_actions = {env_id: actions[env_id] for env_id in search_env_id}
+                if pipelined_collect:
+                    timesteps = self._step_pipelined(search_actions)
+                else:
+                    timesteps = self._step_envs(search_actions)
+                self._time_breakdown['search_time'] += env_start - search_start
+                self._time_breakdown['env_time'] += time.time() - env_start
+
+            interaction_duration = self._timer.value / max(len(timesteps), 1)
+
+            bookkeeping_start = time.time()
             for env_id, timestep in timesteps.items():
                 with self._timer:
                     if timestep.info.get('abnormal', False):
                         # If there is an abnormal timestep, reset all the related variables(including this env).
                         # suppose there is no reset param, reset this env
-                        self._env.reset({env_id: None})
+                        with self._env_lock:
+                            self._env.reset({env_id: None})
                         self._policy.reset([env_id])
                         self._reset_stat(env_id)
                         self._logger.info('Env{} returns a abnormal step, its info is {}'.format(env_id, timestep.info))
@@ -608,23 +703,25 @@ class MuZeroCollector(ISerialCollector):
                     # reset the finished env and init game_segments
                     if n_episode > self._env_num:
                         # Get current ready env obs.
-                        init_obs = self._env.ready_obs
-                        retry_waiting_time = 0.001
-                        while len(init_obs.keys()) != self._env_num:
-                            # In order to be compatible with subprocess env_manager, in which sometimes self._env_num is not equal to
-                            # len(self._env.ready_obs), especially in tictactoe env.
-                            self._logger.info('The current init_obs.keys() is {}'.format(init_obs.keys()))
-                            self._logger.info('Before sleeping, the _env_states is {}'.format(self._env._env_states))
-                            time.sleep(retry_waiting_time)
-                            self._logger.info(
-                                '=' * 10 + 'Wait for all environments (subprocess) to finish resetting.' + '=' * 10
-                            )
-                            self._logger.info(
-                                'After sleeping {}s, the current _env_states is {}'.format(
-                                    retry_waiting_time, self._env._env_states
-                                )
-                            )
+                        # NOTE: in the pipelined collection, this waits for the step of the other group in flight.
+                        with self._env_lock:
                             init_obs = self._env.ready_obs
+                            retry_waiting_time = 0.001
+                            while len(init_obs.keys()) != self._env_num:
+                                # In order to be compatible with subprocess env_manager, in which sometimes self._env_num is not equal to
+                                # len(self._env.ready_obs), especially in tictactoe env.
+                                self._logger.info('The current init_obs.keys() is {}'.format(init_obs.keys()))
+                                self._logger.info('Before sleeping, the _env_states is {}'.format(self._env._env_states))
+                                time.sleep(retry_waiting_time)
+                                self._logger.info(
+                                    '=' * 10 + 'Wait for all environments (subprocess) to finish resetting.' + '=' * 10
+                                )
+                                self._logger.info(
+                                    'After sleeping {}s, the current _env_states is {}'.format(
+                                        retry_waiting_time, self._env._env_states
+                                    )
+                                )
+                                init_obs = self._env.ready_obs
 
                         new_available_env_id = set(init_obs.keys()).difference(ready_env_id)
                         ready_env_id = ready_env_id.union(set(list(new_available_env_id)[:remain_episode]))
@@ -665,8 +762,20 @@ class MuZeroCollector(ISerialCollector):
                     # TODO(pu): subprocess mode, when n_episode > self._env_num, occasionally the ready_env_id=()
                     # and the stack_obs is np.array(None, dtype=object)
                     ready_env_id.remove(env_id)
+                    if pipelined_collect and remain_episode > 0:
+                        # the env is reset by the env manager and its game segment is initialized above, so it starts
+                        # its next episode right away
+                        ready_env_id.add(env_id)
+                        remain_episode -= 1
+            self._time_breakdown['bookkeeping_time'] += time.time() - bookkeeping_start
 
             if collected_episode >= n_episode:
+                # the steps in flight are of the envs whose episodes are not collected, wait for them before returning
+                while len(self._pending_steps) > 0:
+                    self._pending_steps.popleft().result()
+                if self._segment_storage is not None:
+                    for game_segment, _, _ in self.game_segment_pool:
+                        self._write_to_segment_storage(game_segment)
                 # [data, meta_data]
                 return_data = [self.game_segment_pool[i][0] for i in range(len(self.game_segment_pool))], [
                     {
@@ -730,6 +839,8 @@ class MuZeroCollector(ISerialCollector):
             }
             if self.policy_config.gumbel_algo:
                 info['completed_value'] = np.mean(completed_value)
+            info.update(self._time_breakdown)
+            self._time_breakdown = {k: 0. for k in self._time_breakdown}
             self._episode_info.clear()
             self._logger.info("collect end:\n{}".format('\n'.join(['{}: {}'.format(k, v) for k, v in info.items()])))
             for k, v in info.items():
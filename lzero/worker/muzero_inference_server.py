@@ -0,0 +1,260 @@
+import copy
+import itertools
+import queue
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+import torch
+from ding.torch_utils import to_ndarray
+from easydict import EasyDict
+
+from lzero.mcts.utils import prepare_observation
+
+InferenceRequest = namedtuple(
+    'InferenceRequest', ['session_id', 'observation', 'action_mask', 'to_play', 'future', 'arrival_time']
+)
+
+
+class MuZeroInferenceServer(object):
+    """
+    Overview:
+        The local inference server of the MuZero-family policies, which serves the actions of a trained policy to
+        many independent game sessions, e.g. the external games of a production service. The clients submit the
+        observation, action mask and player of their sessions from any thread, and get a future of the search result.
+        A serving thread gathers the pending requests into batches, within a latency budget, and runs one batched MCTS
+        search per batch through the policy's ``_forward_eval``. The server keeps the stacked frames of each session,
+        and the session ids are given to the policy as env ids, so that its subtree reuse works across the requests
+        of a session.
+    Interfaces:
+        ``__init__``, ``submit``, ``act``, ``end_session``, ``close``
+    Properties:
+        ``stats``
+    """
+
+    @classmethod
+    def default_config(cls: type) -> EasyDict:
+        """
+        Overview:
+            Retrieve the default configuration of the inference server.
+        Returns:
+            - cfg (:obj:`EasyDict`): The default configuration of the inference server.
+        """
+        cfg = EasyDict(copy.deepcopy(cls.config))
+        cfg.cfg_type = cls.__name__ + 'Dict'
+        return cfg
+
+    config = dict(
+        # (int) The maximum number of requests searched in one batch.
+        max_batch_size=64,
+        # (float) The maximum time (in seconds) the first request of a batch waits for other requests to join it.
+        max_wait_time=0.005,
+        # (int) The number of the latest request latencies used to compute the latency percentiles.
+        latency_window=10000,
+    )
+
+    def __init__(self, cfg: dict, policy: Any, policy_config: EasyDict) -> None:
+        """
+        Overview:
+            Start the serving thread of the inference server.
+        Arguments:
+            - cfg (:obj:`dict`): The config of the inference server, merged into ``default_config()``.
+            - policy (:obj:`Policy`): The eval mode of the policy, e.g. ``policy.eval_mode``.
+            - policy_config (:obj:`EasyDict`): The config of the policy.
+        """
+        self._cfg = self.default_config()
+        self._cfg.update(cfg)
+        assert self._cfg.max_batch_size >= 1
+        self._policy = policy
+        self.policy_config = policy_config
+
+        self._queue = queue.Queue()
+        # the requests of the sessions which already have a request in the current batch
+        self._deferred = deque()
+        # the stacked frames and the env id given to the policy of each session
+        self._frames = {}
+        self._session_env_id = {}
+        self._next_env_id = itertools.count()
+        self._policy_lock = threading.Lock()
+
+        self._latencies = deque(maxlen=self._cfg.latency_window)
+        self._batch_sizes = Counter()
+        self._num_requests = 0
+        self._end_flag = False
+        self._thread = threading.Thread(target=self._serve, name='MuZeroInferenceServer', daemon=True)
+        self._thread.start()
+
+    def submit(
+            self,
+            session_id: Hashable,
+            observation: np.ndarray,
+            action_mask: Optional[np.ndarray] = None,
+            to_play: int = -1
+    ) -> Future:
+        """
+        Overview:
+            Submit the current observation of a session. The requests of a session must be submitted in order, each
+            after the result of the previous one, as the frames of a session are stacked in the order of its requests.
+        Arguments:
+            - session_id (:obj:`Hashable`): The id of the game session.
+            - observation (:obj:`np.ndarray`): The current observation of the session, without stacked frames.
+            - action_mask (:obj:`Optional[np.ndarray]`): The mask of the legal actions. None means all the actions.
+            - to_play (:obj:`int`): The player to play, -1 for single-player games.
+        Returns:
+            - future (:obj:`Future`): The future of the search result, a dict with the ``action``, the \
+                ``visit_count_distributions`` and the ``searched_value`` of the root, as the output of \
+                ``_forward_eval``.
+        """
+        assert not self._end_flag, "the inference server is closed"
+        if action_mask is None:
+            action_mask = np.ones(self.policy_config.model.action_space_size, dtype=np.int8)
+        future = Future()
+        self._queue.put(
+            InferenceRequest(session_id, to_ndarray(observation), to_ndarray(action_mask), to_play, future, time.time())
+        )
+        return future
+
+    def act(
+            self,
+            session_id: Hashable,
+            observation: np.ndarray,
+            action_mask: Optional[np.ndarray] = None,
+            to_play: int = -1,
+            timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Overview:
+            Submit the current observation of a session and wait for its search result, see ``submit``.
+        """
+        return self.submit(session_id, observation, action_mask, to_play).result(timeout)
+
+    def end_session(self, session_id: Hashable) -> None:
+        """
+        Overview:
+            Drop the stacked frames and the search subtrees of a session whose game ends. The next request of the
+            session starts a new game.
+        """
+        with self._policy_lock:
+            self._frames.pop(session_id, None)
+            env_id = self._session_env_id.pop(session_id, None)
+            if env_id is not None:
+                self._policy.reset([env_id])
+
+    def _serve(self) -> None:
+        while not self._end_flag:
+            batch = self._gather_batch()
+            if batch:
+                self._run_batch(batch)
+
+    def _gather_batch(self) -> List[InferenceRequest]:
+        """
+        Overview:
+            Gather a batch of requests of distinct sessions: the first request waits at most ``max_wait_time`` for
+            others to join it, and the requests already queued then join it without waiting.
+        """
+        batch, sessions = [], set()
+
+        def add(request: InferenceRequest) -> None:
+            if request.session_id in sessions:
+                self._deferred.append(request)
+            else:
+                sessions.add(request.session_id)
+                batch.append(request)
+
+        deferred, self._deferred = self._deferred, deque()
+        while deferred and len(batch) < self._cfg.max_batch_size:
+            add(deferred.popleft())
+        self._deferred.extend(deferred)
+        if not batch:
+            try:
+                add(self._queue.get(timeout=0.1))
+            except queue.Empty:
+                return batch
+        deadline = min(request.arrival_time for request in batch) + self._cfg.max_wait_time
+        while len(batch) < self._cfg.max_batch_size and not self._end_flag:
+            try:
+                timeout = deadline - time.time()
+                add(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch: List[InferenceRequest]) -> None:
+        """
+        Overview:
+            Run one batched MCTS search for the requests of a batch and set their results.
+        """
+        frame_stack_num = self.policy_config.model.frame_stack_num
+        try:
+            with self._policy_lock:
+                stack_obs = []
+                for request in batch:
+                    frames = self._frames.get(request.session_id)
+                    if frames is None:
+                        # the first observation of a session fills its stack, as the evaluator does at reset
+                        frames = deque([request.observation] * frame_stack_num, maxlen=frame_stack_num)
+                        self._frames[request.session_id] = frames
+                        self._session_env_id[request.session_id] = next(self._next_env_id)
+                    else:
+                        frames.append(request.observation)
+                    stack_obs.append(list(frames))
+                stack_obs = prepare_observation(to_ndarray(stack_obs), self.policy_config.model.model_type)
+                stack_obs = torch.from_numpy(stack_obs).to(self.policy_config.device).float()
+                env_ids = [self._session_env_id[request.session_id] for request in batch]
+                output = self._policy.forward(
+                    stack_obs, [request.action_mask for request in batch], [request.to_play for request in batch],
+                    ready_env_id=env_ids
+                )
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        finish_time = time.time()
+        self._batch_sizes[len(batch)] += 1
+        self._num_requests += len(batch)
+        for request, env_id in zip(batch, env_ids):
+            result = dict(output[env_id])
+            result['action'] = int(result['action'])
+            self._latencies.append(finish_time - request.arrival_time)
+            request.future.set_result(result)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """
+        Overview:
+            The metrics of the server: the number of served requests and batches, the mean batch size, the p50 and
+            p99 latencies (in milliseconds, from the submission to the result) of the latest requests, and the
+            histogram of the batch sizes.
+        """
+        latencies = np.array(self._latencies) * 1000
+        num_batches = sum(self._batch_sizes.values())
+        return {
+            'num_requests': self._num_requests,
+            'num_batches': num_batches,
+            'mean_batch_size': self._num_requests / max(num_batches, 1),
+            'latency_p50': float(np.percentile(latencies, 50)) if len(latencies) else 0.,
+            'latency_p99': float(np.percentile(latencies, 99)) if len(latencies) else 0.,
+            'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+        }
+
+    def close(self) -> None:
+        """
+        Overview:
+            Stop the serving thread, and fail the requests which were not served.
+        """
+        if self._end_flag:
+            return
+        self._end_flag = True
+        self._thread.join()
+        pending = list(self._deferred)
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for request in pending:
+            request.future.set_exception(RuntimeError('the inference server is closed'))
+
+    def __del__(self) -> None:
+        self.close()
@@ -0,0 +1,289 @@
+import copy
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch.multiprocessing as mp
+from ding.utils import set_pkg_seed
+from easydict import EasyDict
+
+# The state of a reanalyze worker process, set up by ``_init_reanalyze_worker``.
+_worker = None
+
+ReanalyzeTask = namedtuple('ReanalyzeTask', ['future', 'train_iter', 'policy_re_context'])
+
+
+class _ReanalyzeWorker:
+    """
+    Overview:
+        The reanalyze worker living in each process of the pool. It holds an empty game buffer of the same type as
+        the learner's, used only for its target computation methods, and a private copy of the target model, which is
+        refreshed from the shared target model whenever the learner syncs a new version.
+    """
+
+    def __init__(
+            self, buffer_type: type, buffer_cfg: EasyDict, shared_model: torch.nn.Module, model_iter: Any, lock: Any
+    ) -> None:
+        self.buffer = buffer_type(buffer_cfg)
+        self.device = buffer_cfg.device
+        self.shared_model = shared_model
+        self.shared_model_iter = model_iter
+        self.lock = lock
+        self.model = copy.deepcopy(shared_model).to(self.device)
+        self.model.eval()
+        self.model_iter = -1
+
+    def reanalyze(self, context: Tuple[Any]) -> Tuple[List[Any], int, Optional[List[Tuple[Any, Any]]]]:
+        """
+        Overview:
+            Compute the train data of a batch context with the latest synced target model.
+        Arguments:
+            - context (:obj:`Tuple`): reward_value_context, policy_re_context, policy_non_re_context, current_batch
+        Returns:
+            - train_data (:obj:`List`): The train data, including current_batch and target_batch.
+            - model_iter (:obj:`int`): The train iteration of the target model used to reanalyze the batch.
+            - windows (:obj:`Optional[List[Tuple]]`): The updated ``(child_visit, root_value)`` of the reanalyzed \
+                positions in each game segment, which are written back into the learner's game segments.
+        """
+        if self.model_iter != self.shared_model_iter.value:
+            with self.lock:
+                self.model.load_state_dict(self.shared_model.state_dict())
+                self.model_iter = self.shared_model_iter.value
+        with torch.no_grad():
+            train_data = self.buffer._compute_train_data(context, self.model)
+
+        policy_re_context = context[1]
+        if policy_re_context is None:
+            return train_data, self.model_iter, None
+        unroll_len = self.buffer._cfg.num_unroll_steps + 1
+        pos_in_game_segment_list, child_visits, root_values = policy_re_context[2], policy_re_context[4], \
+            policy_re_context[5]
+        windows = [
+            (child_visit[pos:pos + unroll_len], root_value[pos:pos + unroll_len])
+            for pos, child_visit, root_value in zip(pos_in_game_segment_list, child_visits, root_values)
+        ]
+        return train_data, self.model_iter, windows
+
+
+def _init_reanalyze_worker(
+        buffer_type: type, buffer_cfg: EasyDict, shared_model: torch.nn.Module, model_iter: Any, lock: Any,
+        worker_count: Any, seed: int
+) -> None:
+    global _worker
+    with worker_count.get_lock():
+        rank = worker_count.value
+        worker_count.value += 1
+    # Each worker runs its own tree search, so one intra-op thread per worker avoids oversubscribing the cores.
+    torch.set_num_threads(1)
+    set_pkg_seed(seed + rank, use_cuda=buffer_cfg.device != 'cpu')
+    _worker = _ReanalyzeWorker(buffer_type, buffer_cfg, shared_model, model_iter, lock)
+
+
+def _reanalyze(context: Tuple[Any]) -> Tuple[List[Any], int, Optional[List[Tuple[Any, Any]]]]:
+    return _worker.reanalyze(context)
+
+
+class MuZeroReanalyzeService(object):
+    """
+    Overview:
+        The reanalyze service for MCTS+RL algorithms, which takes the reanalyze search off the learner's critical path.
+        The learner keeps sampling batch contexts from its game buffer, while a pool of worker processes computes
+        their value and policy targets with a periodically synced copy of the target model, and the ready train data
+        is consumed in order from a bounded prefetch queue.
+        Batches that became too stale while waiting in the queue are discarded and replaced by new ones.
+    Interfaces:
+        ``__init__``, ``sync_model``, ``sample``, ``close``
+    Properties:
+        ``stats``
+    """
+
+    @classmethod
+    def default_config(cls: type) -> EasyDict:
+        """
+        Overview:
+            Retrieve the default configuration of the reanalyze service.
+        Returns:
+            - cfg (:obj:`EasyDict`): The default configuration of the reanalyze service.
+        """
+        cfg = EasyDict(copy.deepcopy(cls.config))
+        cfg.cfg_type = cls.__name__ + 'Dict'
+        return cfg
+
+    config = dict(
+        # (int) The number of worker processes running the reanalyze search. 0 means the learner reanalyzes
+        # every batch synchronously through ``replay_buffer.sample``.
+        num_workers=0,
+        # (int) The maximum number of sampled batches that are being reanalyzed or waiting to be consumed.
+        prefetch_size=4,
+        # (int) The frequency (in train iterations) to copy the learner's target model to the workers.
+        model_sync_freq=10,
+        # (int) The maximum number of train iterations the target model used to reanalyze a batch may lag behind the
+        # learner, otherwise the batch is discarded. None means no limit.
+        max_model_lag=100,
+        # (int) The maximum number of train iterations between sampling a batch and consuming it,
+        # otherwise the batch is discarded. None means no limit.
+        max_batch_age=None,
+        # (str) The device of the target model in the worker processes.
+        device='cpu',
+        # (str) The start method of the worker processes. 'spawn' is required when the workers use cuda.
+        start_method='spawn',
+    )
+
+    def __init__(
+            self,
+            cfg: dict,
+            replay_buffer: Any,
+            policy: Any,
+            tb_logger: Optional['SummaryWriter'] = None,  # noqa
+            seed: int = 0,
+    ) -> None:
+        """
+        Overview:
+            Create the shared target model and start the pool of reanalyze workers.
+        Arguments:
+            - cfg (:obj:`dict`): The config of the reanalyze service, merged into ``default_config()``.
+            - replay_buffer (:obj:`GameBuffer`): The game buffer of the learner, whose batch contexts are reanalyzed.
+            - policy (:obj:`Policy`): The policy, whose ``_target_model`` is synced to the workers.
+            - tb_logger (:obj:`Optional[SummaryWriter]`): The tensorboard logger of the queue metrics.
+            - seed (:obj:`int`): The base random seed of the workers.
+        """
+        self._cfg = self.default_config()
+        self._cfg.update(cfg)
+        assert self._cfg.num_workers > 0, "MuZeroReanalyzeService needs at least one worker"
+        assert self._cfg.prefetch_size >= 1
+        # a freshly sampled batch must never be discarded, otherwise ``sample`` could wait forever
+        assert self._cfg.max_model_lag is None or self._cfg.max_model_lag >= self._cfg.model_sync_freq, \
+            "max_model_lag must be no less than model_sync_freq"
+        self._replay_buffer = replay_buffer
+        self._policy = policy
+        self._tb_logger = tb_logger
+
+        self._shared_model = copy.deepcopy(policy._model).cpu()
+        self._shared_model.load_state_dict(policy._target_model.state_dict())
+        self._shared_model.share_memory()
+        ctx = mp.get_context(self._cfg.start_method)
+        self._model_iter = ctx.Value('q', 0)
+        self._lock = ctx.Lock()
+        self._synced_iter = 0
+
+        buffer_cfg = copy.deepcopy(replay_buffer._cfg)
+        buffer_cfg.device = self._cfg.device
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._cfg.num_workers,
+            mp_context=ctx,
+            initializer=_init_reanalyze_worker,
+            initargs=(
+                type(replay_buffer), buffer_cfg, self._shared_model, self._model_iter, self._lock, ctx.Value('i', 0),
+                seed
+            ),
+        )
+        self._pending = deque()
+        self._num_dropped = 0
+        self._last_model_lag = 0
+        self._last_wait_time = 0.
+        self._end_flag = False
+
+    def sync_model(self, train_iter: int, force: bool = False) -> None:
+        """
+        Overview:
+            Copy the learner's target model into the shared model, every ``model_sync_freq`` train iterations.
+            The workers load it before reanalyzing their next batch.
+        Arguments:
+            - train_iter (:obj:`int`): The current train iteration of the learner.
+            - force (:obj:`bool`): Whether to sync regardless of ``model_sync_freq``.
+        """
+        if not force and train_iter - self._synced_iter < self._cfg.model_sync_freq:
+            return
+        with self._lock:
+            self._shared_model.load_state_dict(self._policy._target_model.state_dict())
+            self._model_iter.value = train_iter
+        self._synced_iter = train_iter
+
+    def sample(self, batch_size: int, train_iter: int) -> List[Any]:
+        """
+        Overview:
+            Dequeue the oldest reanalyzed batch that is fresh enough, after topping up the prefetch queue with newly
+            sampled batch contexts. The updated search statistics of its reanalyzed positions are written back into
+            the game segments, as ``replay_buffer.sample`` does.
+        Arguments:
+            - batch_size (:obj:`int`): The batch size.
+            - train_iter (:obj:`int`): The current train iteration of the learner.
+        Returns:
+            - train_data (:obj:`List`): List of train data, including current_batch and target_batch.
+        """
+        self.sync_model(train_iter)
+        wait_start = time.time()
+        while True:
+            while len(self._pending) < self._cfg.prefetch_size:
+                self._submit(batch_size, train_iter)
+            task = self._pending.popleft()
+            train_data, model_iter, windows = task.future.result()
+            model_lag = train_iter - model_iter
+            batch_age = train_iter - task.train_iter
+            if (self._cfg.max_model_lag is not None and model_lag > self._cfg.max_model_lag) or \
+                    (self._cfg.max_batch_age is not None and batch_age > self._cfg.max_batch_age):
+                self._num_dropped += 1
+                continue
+            break
+        self._last_wait_time = time.time() - wait_start
+        self._last_model_lag = model_lag
+
+        # the game segments removed from the buffer since the batch was sampled may reuse their storage slots
+        if windows is not None and train_data[0][-1][0] > self._replay_buffer.clear_time:
+            pos_in_game_segment_list, child_visits, root_values = task.policy_re_context
+            for pos, child_visit, root_value, (child_visit_window, root_value_window) in zip(
+                    pos_in_game_segment_list, child_visits, root_values, windows):
+                child_visit[pos:pos + len(child_visit_window)] = child_visit_window
+                root_value[pos:pos + len(root_value_window)] = root_value_window
+
+        if self._tb_logger is not None:
+            for k, v in self.stats.items():
+                self._tb_logger.add_scalar('reanalyze_service_iter/' + k, v, train_iter)
+        return train_data
+
+    def _submit(self, batch_size: int, train_iter: int) -> None:
+        """
+        Overview:
+            Sample a batch context from the game buffer and hand it over to the workers.
+        """
+        context = self._replay_buffer._make_batch(batch_size, self._replay_buffer._cfg.reanalyze_ratio)
+        policy_re_context = context[1]
+        if policy_re_context is not None:
+            # keep the references to the game segments of the reanalyzed positions, to write back the search results
+            policy_re_context = (policy_re_context[2], policy_re_context[4], policy_re_context[5])
+        future = self._executor.submit(_reanalyze, context)
+        self._pending.append(ReanalyzeTask(future, train_iter, policy_re_context))
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Overview:
+            The metrics of the prefetch queue: the number of ready batches, the number of batches in flight, the
+            target model lag and the learner's wait time of the last consumed batch, and the number of discarded
+            stale batches.
+        """
+        return {
+            'queue_depth': sum(task.future.done() for task in self._pending),
+            'in_flight': len(self._pending),
+            'target_model_lag': self._last_model_lag,
+            'wait_time': self._last_wait_time,
+            'dropped_batches': self._num_dropped,
+        }
+
+    def close(self) -> None:
+        """
+        Overview:
+            Cancel the pending batches and shut down the worker processes.
+        """
+        if self._end_flag:
+            return
+        self._end_flag = True
+        for task in self._pending:
+            task.future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+    def __del__(self) -> None:
+        self.close()
@@ -0,0 +1,64 @@
+import os
+from collections import defaultdict
+from copy import deepcopy
+
+import pytest
+import torch
+from ding.config import compile_config
+from ding.policy import create_policy
+
+from lzero.worker import MuZeroAsyncEvaluator
+from zoo.classic_control.cartpole.config.cartpole_muzero_config import main_config, create_config
+
+
+class ScalarRecorder(object):
+
+    def __init__(self):
+        self.scalars = defaultdict(dict)
+
+    def add_scalar(self, tag, value, step):
+        self.scalars[tag][step] = value
+
+
+@pytest.mark.unittest
+def test_async_evaluator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cfg, create_cfg = deepcopy(main_config), deepcopy(create_config)
+    cfg.exp_name = 'async_eval'
+    cfg.env.update(dict(evaluator_env_num=2, n_evaluator_episode=2, max_episode_steps=20))
+    cfg.policy.update(dict(cuda=False, device='cpu', num_simulations=4, eval_freq=10))
+    cfg.policy.model.update(dict(latent_state_dim=16))
+    create_cfg.env_manager.type = 'base'
+    cfg = compile_config(cfg, seed=0, env=None, auto=True, create_cfg=create_cfg, save_cfg=False)
+    policy = create_policy(cfg.policy, enable_field=['learn', 'collect', 'eval'])
+
+    tb_logger = ScalarRecorder()
+    evaluator = MuZeroAsyncEvaluator(dict(num_workers=1, max_in_flight=2), cfg, policy, tb_logger=tb_logger, seed=0)
+    try:
+        assert evaluator.should_eval(0) and not evaluator.should_eval(5) and evaluator.should_eval(10)
+        # the snapshot of the weights is taken at the submission, the later updates do not change it
+        weights = deepcopy(policy.learn_mode.state_dict()['model'])
+        evaluator.eval(train_iter=0, envstep=0)
+        task = evaluator._pending[0]
+        with torch.no_grad():
+            for param in policy._model.parameters():
+                param.add_(1.)
+        evaluator.eval(train_iter=10, envstep=100)
+        # at most max_in_flight evaluations are in flight, the oldest one is collected first
+        evaluator.eval(train_iter=20, envstep=200)
+        assert len(evaluator._pending) <= 2 and evaluator._pending[-1].train_iter == 20
+        # the iteration of the last evaluation is not evaluated again
+        assert not evaluator.should_eval(20) and evaluator.should_eval(30)
+        stop, episode_info = evaluator.poll(wait=True)
+        assert not evaluator._pending
+        assert all(torch.equal(task.state_dict['model'][key], value) for key, value in weights.items())
+        assert not stop and episode_info['eval_episode_return_mean'] > 0
+        # the results are logged to the tensorboard logger of the learner, with the tags of the synchronous evaluator
+        assert set(tb_logger.scalars['evaluator_iter/reward_mean']) == {0, 10, 20}
+        assert set(tb_logger.scalars['evaluator_step/reward_mean']) == {0, 100, 200}
+        assert tb_logger.scalars['evaluator_iter/reward_mean'][20] == episode_info['eval_episode_return_mean']
+        ckpt = torch.load(os.path.join(cfg.exp_name, 'ckpt', 'ckpt_best.pth.tar'), map_location='cpu')
+        assert ckpt['last_iter'] in [0, 10, 20] and 'model' in ckpt
+    finally:
+        evaluator.close()
+    assert evaluator._end_flag
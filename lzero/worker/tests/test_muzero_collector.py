@@ -0,0 +1,120 @@
+import multiprocessing as mp
+import os
+from copy import deepcopy
+from functools import partial
+
+import numpy as np
+import pytest
+from ding.config import compile_config
+from ding.envs import create_env_manager, get_vec_env_setting
+from ding.policy import create_policy
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.worker import MuZeroCollector
+from zoo.classic_control.cartpole.config.cartpole_muzero_config import main_config, create_config
+
+collect_kwargs = {'temperature': 1., 'epsilon': 0.}
+
+
+def make_config(pipelined_collect: bool = False, env_num: int = 3):
+    cfg, create_cfg = deepcopy(main_config), deepcopy(create_config)
+    cfg.env.update(dict(collector_env_num=env_num, n_evaluator_episode=1, evaluator_env_num=1))
+    cfg.policy.update(
+        dict(
+            cuda=False,
+            device='cpu',
+            collector_env_num=env_num,
+            evaluator_env_num=1,
+            num_simulations=4,
+            game_segment_length=20,
+            pipelined_collect=pipelined_collect,
+        )
+    )
+    cfg.policy.model.update(dict(lstm_hidden_size=16, latent_state_dim=16))
+    create_cfg.env_manager.type = 'base'
+    return compile_config(cfg, seed=0, env=None, auto=True, create_cfg=create_cfg, save_cfg=False)
+
+
+def make_collector(pipelined_collect: bool, env_num: int = 3) -> MuZeroCollector:
+    cfg = make_config(pipelined_collect, env_num)
+    env_fn, collector_env_cfg, _ = get_vec_env_setting(cfg.env)
+    collector_env = create_env_manager(cfg.env.manager, [partial(env_fn, cfg=c) for c in collector_env_cfg])
+    collector_env.seed(cfg.seed)
+    policy = create_policy(cfg.policy, enable_field=['learn', 'collect', 'eval'])
+    return MuZeroCollector(
+        env=collector_env, policy=policy.collect_mode, tb_logger=None, exp_name=cfg.exp_name, policy_config=cfg.policy
+    )
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('pipelined_collect', [False, True])
+@pytest.mark.parametrize('n_episode', [3, 5])
+def test_collect(pipelined_collect, n_episode, tmp_path, monkeypatch):
+    # the collector logs to the directory of the experiment in the working directory
+    monkeypatch.chdir(tmp_path)
+    collector = make_collector(pipelined_collect)
+    try:
+        game_segments, metas = collector.collect(n_episode=n_episode, policy_kwargs=collect_kwargs)
+        # every transition of the collected episodes is in a game segment
+        assert collector._total_episode_count == n_episode
+        assert sum(len(segment.action_segment) for segment in game_segments) == collector.envstep
+        assert len(metas) == len(game_segments) >= n_episode
+        assert len(collector._pending_steps) == 0
+        assert all(t > 0 for t in collector._time_breakdown.values())
+    finally:
+        collector.close()
+
+
+def collect_in_subprocess(work_dir, handle_queue, data_queue):
+    os.chdir(work_dir)
+    collector = make_collector(False, env_num=2)
+    written_columns = []
+    write_to_segment_storage = collector._write_to_segment_storage
+
+    def record_and_write(game_segment):
+        # the columns of the game segment before they are written into the storage, sent only for the check
+        written_columns.append({name: np.copy(getattr(game_segment, name)) for name in storage_columns})
+        write_to_segment_storage(game_segment)
+
+    collector._write_to_segment_storage = record_and_write
+    try:
+        # the storage of the buffer is created by the game segments of the first collect
+        data_queue.put(collector.collect(n_episode=2, policy_kwargs=collect_kwargs))
+        collector.attach_segment_storage(handle_queue.get(timeout=60))
+        storage_columns = collector._segment_storage._columns_name
+        data_queue.put((collector.collect(n_episode=2, policy_kwargs=collect_kwargs), written_columns))
+    finally:
+        collector.close()
+
+
+@pytest.mark.unittest
+def test_collect_into_segment_storage(tmp_path):
+    cfg = make_config()
+    cfg.policy.update(dict(use_segment_storage=True, segment_storage_slots=64))
+    buffer = MuZeroGameBuffer(cfg.policy)
+    handle_queue, data_queue = mp.Queue(), mp.Queue()
+    process = mp.Process(target=collect_in_subprocess, args=(str(tmp_path), handle_queue, data_queue))
+    process.start()
+    try:
+        buffer.push_game_segments(data_queue.get(timeout=300))
+        storage = buffer.segment_storage
+        handle_queue.put(storage.handle)
+        (game_segments, metas), written_columns = data_queue.get(timeout=300)
+    finally:
+        process.join(timeout=60)
+    assert len(game_segments) == len(written_columns) > 0
+
+    # the game segments are sent without the columns written into their slots by the collector
+    for game_segment, columns in zip(game_segments, written_columns):
+        assert game_segment.storage_slot is not None
+        assert all(getattr(game_segment, name) is None for name in columns)
+    num_free_slots = storage.num_free_slots
+    buffer.push_game_segments([game_segments, metas])
+    # the slots reserved by the collector are not given out again by the buffer
+    assert storage.num_free_slots == num_free_slots
+    assert len({game_segment.storage_slot for game_segment in buffer.game_segment_buffer}) == \
+        len(buffer.game_segment_buffer)
+    for game_segment, columns in zip(game_segments, written_columns):
+        for name, column in columns.items():
+            assert np.shares_memory(getattr(game_segment, name), storage._columns[name])
+            assert np.array_equal(getattr(game_segment, name), column)
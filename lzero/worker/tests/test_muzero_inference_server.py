@@ -0,0 +1,68 @@
+import threading
+from copy import deepcopy
+
+import numpy as np
+import pytest
+import torch
+from ding.config import compile_config
+from ding.policy import create_policy
+
+from lzero.worker import MuZeroInferenceServer
+from zoo.classic_control.cartpole.config.cartpole_muzero_config import main_config, create_config
+
+
+def make_policy():
+    cfg, create_cfg = deepcopy(main_config), deepcopy(create_config)
+    cfg.policy.update(dict(cuda=False, device='cpu', num_simulations=4))
+    cfg.policy.model.update(dict(latent_state_dim=16))
+    create_cfg.env_manager.type = 'base'
+    cfg = compile_config(cfg, seed=0, env=None, auto=True, create_cfg=create_cfg, save_cfg=False)
+    return create_policy(cfg.policy, enable_field=['learn', 'collect', 'eval']), cfg.policy
+
+
+@pytest.mark.unittest
+def test_inference_server():
+    policy, policy_config = make_policy()
+    server = MuZeroInferenceServer(dict(max_batch_size=8, max_wait_time=0.05), policy.eval_mode, policy_config)
+    rng = np.random.RandomState(0)
+    observations = rng.randn(16, 5, 4).astype(np.float32)
+    results = {}
+
+    def play(session_id: int) -> None:
+        for t in range(5):
+            # the first action is illegal in the odd sessions
+            action_mask = np.array([session_id % 2 == 0, 1], dtype=np.int8)
+            results[session_id, t] = server.act(session_id, observations[session_id, t], action_mask, timeout=60)
+
+    clients = [threading.Thread(target=play, args=(session_id, )) for session_id in range(16)]
+    try:
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+
+        assert len(results) == 16 * 5
+        for (session_id, t), result in results.items():
+            assert set(result) >= {'action', 'visit_count_distributions', 'searched_value'}
+            assert session_id % 2 == 0 or result['action'] == 1
+        # the search results of a batch are those of the policy on the same observations
+        expected = policy.eval_mode.forward(torch.from_numpy(observations[:, 0]), np.ones((16, 2)), [-1] * 16)
+        for session_id in range(0, 16, 2):
+            assert results[session_id, 0]['action'] == expected[session_id]['action']
+            assert results[session_id, 0]['searched_value'] == pytest.approx(
+                expected[session_id]['searched_value'], abs=1e-4
+            )
+
+        stats = server.stats
+        assert stats['num_requests'] == 16 * 5
+        assert sum(size * count for size, count in stats['batch_size_histogram'].items()) == 16 * 5
+        assert max(stats['batch_size_histogram']) <= 8 and stats['mean_batch_size'] > 1
+        assert 0 < stats['latency_p50'] <= stats['latency_p99']
+
+        server.end_session(0)
+        assert 0 not in server._frames
+        assert server.act(0, observations[0, 0], timeout=60)['action'] == results[0, 0]['action']
+    finally:
+        server.close()
+    with pytest.raises(AssertionError):
+        server.submit(0, observations[0, 0])
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from lzero.mcts.buffer.game_buffer_muzero import MuZeroGameBuffer
+from lzero.mcts.buffer.game_segment import GameSegment
+from lzero.model.muzero_model_mlp import MuZeroModelMLP
+from lzero.policy.muzero import MuZeroPolicy
+from lzero.worker import MuZeroReanalyzeService
+
+config = MuZeroPolicy.default_config()
+config.model.update(
+    dict(
+        model_type='mlp',
+        observation_shape=4,
+        action_space_size=2,
+        latent_state_dim=16,
+        support_scale=10,
+        reward_support_size=21,
+        value_support_size=21,
+    )
+)
+config.update(
+    dict(
+        device='cpu',
+        num_simulations=4,
+        game_segment_length=20,
+        num_unroll_steps=3,
+        td_steps=3,
+        batch_size=8,
+        reanalyze_ratio=1.,
+        replay_buffer_size=1000,
+    )
+)
+
+
+def make_game_segment(seed: int) -> GameSegment:
+    rng = np.random.RandomState(seed)
+    game_segment = GameSegment(config.model.action_space_size, config.game_segment_length, config)
+    game_segment.reset([np.zeros(4, dtype=np.float32)])
+    for _ in range(config.game_segment_length):
+        game_segment.append(rng.randint(2), rng.randn(4).astype(np.float32), 1., np.ones(2, dtype=np.int8))
+        game_segment.store_search_stats([1, 1], 0.)
+    game_segment.game_segment_to_array()
+    return game_segment
+
+
+class FakePolicy:
+
+    def __init__(self) -> None:
+        self._model = MuZeroModelMLP(**config.model)
+        self._target_model = MuZeroModelMLP(**config.model)
+        self._target_model.eval()
+
+
+@pytest.mark.unittest
+def test_reanalyze_service():
+    buffer = MuZeroGameBuffer(config)
+    segments = [make_game_segment(i) for i in range(4)]
+    metas = [
+        {
+            'done': True,
+            'unroll_plus_td_steps': 5,
+            'priorities': np.ones(config.game_segment_length)
+        } for _ in range(4)
+    ]
+    buffer.push_game_segments([segments, metas])
+    policy = FakePolicy()
+
+    service = MuZeroReanalyzeService(
+        EasyDict(dict(num_workers=1, prefetch_size=2, model_sync_freq=1, max_batch_age=0)), buffer, policy
+    )
+    try:
+        current_batch, target_batch = service.sample(config.batch_size, train_iter=0)
+        # the search results of the reanalyzed positions are written back into the learner's game segments
+        segment_idx, pos = buffer.game_segment_game_pos_look_up[current_batch[3][0]]
+        assert buffer.game_segment_buffer[segment_idx].root_value_segment[pos] != 0.
+
+        reference_batch, reference_target = buffer.sample(config.batch_size, policy)
+        for data, reference in zip(current_batch + target_batch, reference_batch + reference_target):
+            assert np.shape(data) == np.shape(reference)
+
+        # the remaining prefetched batch was sampled at train_iter 0, and is too old at train_iter 1
+        service.sample(config.batch_size, train_iter=1)
+        stats = service.stats
+        assert stats['dropped_batches'] == 1
+        assert stats['target_model_lag'] == 0
+        assert stats['in_flight'] == 1
+    finally:
+        service.close()
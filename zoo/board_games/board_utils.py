@@ -0,0 +1,37 @@
+from typing import Sequence
+
+# The directions of the lines through a cell: horizontal, vertical, diagonal and anti-diagonal.
+LINE_DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def is_n_in_row_through(board: Sequence[int], num_rows: int, num_cols: int, row: int, col: int, n_in_row: int) -> bool:
+    """
+    Overview:
+        Check whether the stone at ``(row, col)`` is in a line of at least ``n_in_row`` consecutive stones of its
+        player. Only the 4 lines through this cell are scanned, so that the board games can detect a win after each
+        move from the last placed stone, instead of scanning the whole board.
+    Arguments:
+        - board (:obj:`Sequence[int]`): The flattened board of ``num_rows * num_cols`` cells, 0 for the empty cells \
+            and the player 1 or 2 for the stones, e.g. a list or a flat view of a numpy array.
+        - num_rows (:obj:`int`): The number of rows of the board.
+        - num_cols (:obj:`int`): The number of columns of the board.
+        - row (:obj:`int`): The row of the stone.
+        - col (:obj:`int`): The column of the stone.
+        - n_in_row (:obj:`int`): The number of consecutive stones to win.
+    Returns:
+        - win (:obj:`bool`): Whether the stone is in a winning line.
+    """
+    player = board[row * num_cols + col]
+    if player == 0:
+        return False
+    for d_row, d_col in LINE_DIRECTIONS:
+        count = 1
+        for sign in (1, -1):
+            r, c = row + sign * d_row, col + sign * d_col
+            while 0 <= r < num_rows and 0 <= c < num_cols and board[r * num_cols + c] == player:
+                count += 1
+                r += sign * d_row
+                c += sign * d_col
+        if count >= n_in_row:
+            return True
+    return False
@@ -43,6 +43,7 @@ from ditk import logging
 from easydict import EasyDict
 from gymnasium import spaces
 
+from zoo.board_games.board_utils import is_n_in_row_through
 from zoo.board_games.connect4.envs.rule_bot import Connect4RuleBot
 from zoo.board_games.mcts_bot import MCTSBot
 
@@ -159,12 +160,8 @@ class Connect4Env(BaseEnv):
             - timestep (:obj:`BaseEnvTimestep`): A namedtuple that records the observation and obtained reward after taking the action, \
             whether the game is terminated, and some other information. 
         """
-        if action in self.legal_actions:
-            piece = self.players.index(self._current_player) + 1
-            for i in list(filter(lambda x: x % 7 == action, list(range(41, -1, -1)))):
-                if self.board[i] == 0:
-                    self.board[i] = piece
-                    break
+        if action in self._get_legal_actions():
+            self._drop_piece(action)
         else:
             print(np.array(self.board).reshape(6, 7))
             logging.warning(
@@ -174,11 +171,7 @@ class Connect4Env(BaseEnv):
             )
             action = self.random_action()
             print("the random action is", action)
-            piece = self.players.index(self._current_player) + 1
-            for i in list(filter(lambda x: x % 7 == action, list(range(41, -1, -1)))):
-                if self.board[i] == 0:
-                    self.board[i] = piece
-                    break
+            self._drop_piece(action)
 
         # Check if there is a winner.
         done, winner = self.get_done_winner()
@@ -309,6 +302,7 @@ class Connect4Env(BaseEnv):
             self.replay_name_suffix = replay_name_suffix
         if init_state is None:
             self.board = [0] * (6 * 7)
+            self._done_winner = (False, -1)
         else:
             self.board = init_state
         self.players = [1, 2]
@@ -360,7 +354,7 @@ class Connect4Env(BaseEnv):
             return raw_obs, scale_obs
 
     def observe(self) -> dict:
-        legal_moves = self.legal_actions
+        legal_moves = self._get_legal_actions()
 
         action_mask = np.zeros(7, "int8")
         for i in legal_moves:
@@ -381,9 +375,49 @@ class Connect4Env(BaseEnv):
                     "to_play": self._current_player
                     }
 
+    @property
+    def board(self) -> List[int]:
+        return self._board
+
+    @board.setter
+    def board(self, board: List[int]) -> None:
+        # The legal actions and the terminal state are tracked incrementally by ``_drop_piece``. They are recomputed
+        # from a new board on the first query, so the board must be changed by ``step`` or by assigning it.
+        self._board = board
+        self._legal_actions = None
+        self._done_winner = None
+
     @property
     def legal_actions(self) -> List[int]:
-        return [i for i in range(7) if self.board[i] == 0]
+        return list(self._get_legal_actions())
+
+    def _get_legal_actions(self) -> List[int]:
+        # The sorted list of the columns that are not full, updated by ``_drop_piece``.
+        if self._legal_actions is None:
+            self._legal_actions = [i for i in range(7) if self._board[i] == 0]
+        return self._legal_actions
+
+    def _drop_piece(self, action: int) -> None:
+        """
+        Overview:
+            Drop a piece of the current player in the column ``action``, and update the legal actions and the
+            terminal state from this piece only.
+        Arguments:
+            - action (:obj:`int`): The column, which must not be full.
+        """
+        piece = self.players.index(self._current_player) + 1
+        row = 5
+        while self._board[row * 7 + action] != 0:
+            row -= 1
+        self._board[row * 7 + action] = piece
+        legal_actions = self._get_legal_actions()
+        if row == 0:
+            legal_actions.remove(action)
+        if self._done_winner is not None and not self._done_winner[0]:
+            if is_n_in_row_through(self._board, 6, 7, row, action, 4):
+                self._done_winner = (True, piece)
+            else:
+                self._done_winner = (len(legal_actions) == 0, -1)
 
     def render(self, mode: str = None) -> None:
         """
@@ -500,6 +534,19 @@ class Connect4Env(BaseEnv):
                 - if player 2 win,     'done' = True, 'winner' = 2
                 - if draw,             'done' = True, 'winner' = -1
                 - if game is not over, 'done' = False,'winner' = -1
+
+        .. note::
+            After each move, only the lines through the last piece are checked (see ``_drop_piece``), and the whole
+            board is only scanned once after it is reset or assigned.
+        """
+        if self._done_winner is None:
+            self._done_winner = self._scan_done_winner()
+        return self._done_winner
+
+    def _scan_done_winner(self) -> Tuple[bool, int]:
+        """
+        Overview:
+            Check if the game is done and find the winner by scanning the whole board.
         """
         board = copy.deepcopy(np.array(self.board)).reshape(6, 7)
         for piece in [1, 2]:
@@ -21,6 +21,7 @@ from zoo.board_games.gomoku.envs.get_done_winner_cython import get_done_winner_c
 from zoo.board_games.gomoku.envs.legal_actions_cython import legal_actions_cython
 
 from zoo.board_games.alphabeta_pruning_bot import AlphaBetaPruningBot
+from zoo.board_games.board_utils import is_n_in_row_through
 from zoo.board_games.gomoku.envs.gomoku_rule_bot_v0 import GomokuRuleBotV0
 from zoo.board_games.gomoku.envs.gomoku_rule_bot_v1 import GomokuRuleBotV1
 
@@ -34,15 +35,6 @@ def _legal_actions_func_lru(board_size, board_tuple):
     return legal_actions_cython(board_size, board_view)
 
 
-@lru_cache(maxsize=512)
-def _get_done_winner_func_lru(board_size, board_tuple):
-    # Convert tuple to NumPy array.
-    board_array = np.array(board_tuple, dtype=np.int32)
-    # Convert NumPy array to memory view.
-    board_view = board_array.view(dtype=np.int32).reshape(board_array.shape)
-    return get_done_winner_cython(board_size, board_view)
-
-
 @ENV_REGISTRY.register('gomoku')
 class GomokuEnv(BaseEnv):
     """
@@ -95,10 +87,27 @@ class GomokuEnv(BaseEnv):
         cfg.cfg_type = cls.__name__ + 'Dict'
         return cfg
 
+    @property
+    def board(self) -> np.ndarray:
+        return self._board
+
+    @board.setter
+    def board(self, board: np.ndarray) -> None:
+        # The legal actions and the terminal state are tracked incrementally by ``_place_stone``. They are recomputed
+        # from a new board on the first query, so the board must be changed by ``step`` or by assigning it.
+        self._board = board
+        self._legal_actions = None
+        self._done_winner = None
+
     @property
     def legal_actions(self):
-        # Convert NumPy arrays to nested tuples to make them hashable.
-        return _legal_actions_func_lru(self.board_size, tuple(map(tuple, self.board)))
+        return list(self._get_legal_actions())
+
+    def _get_legal_actions(self) -> List[int]:
+        # The sorted list of the empty cells, updated by ``_place_stone``.
+        if self._legal_actions is None:
+            self._legal_actions = np.flatnonzero(self._board == 0).tolist()
+        return self._legal_actions
 
     # only for evaluation speed
     @property
@@ -116,8 +125,38 @@ class GomokuEnv(BaseEnv):
         return _legal_actions_func_lru(self.board_size, tuple(map(tuple, self.board)))
 
     def get_done_winner(self):
-        # Convert NumPy arrays to nested tuples to make them hashable.
-        return _get_done_winner_func_lru(self.board_size, tuple(map(tuple, self.board)))
+        """
+        Overview:
+             Check if the game is over and who the winner is. Return 'done' and 'winner'. After each move, only the
+             lines through the last stone are checked (see ``_place_stone``), and the whole board is only scanned
+             once after it is reset or assigned.
+        Returns:
+            - outputs (:obj:`Tuple`): Tuple containing 'done' and 'winner',
+                - if player 1 win,     'done' = True, 'winner' = 1
+                - if player 2 win,     'done' = True, 'winner' = 2
+                - if draw,             'done' = True, 'winner' = -1
+                - if game is not over, 'done' = False, 'winner' = -1
+        """
+        if self._done_winner is None:
+            board = np.ascontiguousarray(self._board, dtype=np.int32)
+            self._done_winner = tuple(get_done_winner_cython(self.board_size, board))
+        return self._done_winner
+
+    def _place_stone(self, action: int) -> None:
+        """
+        Overview:
+            Place a stone of the current player on the cell of ``action``, and update the legal actions and the
+            terminal state from this stone only.
+        """
+        row, col = self.action_to_coord(action)
+        self._board[row, col] = self.current_player
+        legal_actions = self._get_legal_actions()
+        legal_actions.remove(action)
+        if self._done_winner is not None and not self._done_winner[0]:
+            if is_n_in_row_through(self._board.reshape(-1), self.board_size, self.board_size, row, col, 5):
+                self._done_winner = (True, self.current_player)
+            else:
+                self._done_winner = (len(legal_actions) == 0, -1)
 
     def __init__(self, cfg: dict = None):
         self.cfg = cfg
@@ -196,8 +235,9 @@ class GomokuEnv(BaseEnv):
                 self.board = self.board.reshape((self.board_size, self.board_size))
         else:
             self.board = np.zeros((self.board_size, self.board_size), dtype="int32")
+            self._done_winner = (False, -1)
         action_mask = np.zeros(self.total_num_actions, 'int8')
-        action_mask[self.legal_actions] = 1
+        action_mask[self._get_legal_actions()] = 1
         if self.battle_mode == 'play_with_bot_mode' or self.battle_mode == 'eval_mode':
             # In ``play_with_bot_mode`` and ``eval_mode``, we need to set the "to_play" parameter in the "obs" dict to -1,
             # because we don't take into account the alternation between players.
@@ -314,17 +354,15 @@ class GomokuEnv(BaseEnv):
             return timestep
 
     def _player_step(self, action):
-        if action in self.legal_actions:
-            row, col = self.action_to_coord(action)
-            self.board[row, col] = self.current_player
+        if action in self._get_legal_actions():
+            self._place_stone(action)
         else:
             logging.warning(
                 f"You input illegal action: {action}, the legal_actions are {self.legal_actions}. "
                 f"Now we randomly choice a action from self.legal_actions."
             )
             action = np.random.choice(self.legal_actions)
-            row, col = self.action_to_coord(action)
-            self.board[row, col] = self.current_player
+            self._place_stone(action)
 
         # Check whether the game is ended or not and give the winner
         done, winner = self.get_done_winner()
@@ -349,7 +387,7 @@ class GomokuEnv(BaseEnv):
                                         format=self.replay_format)
 
         action_mask = np.zeros(self.total_num_actions, 'int8')
-        action_mask[self.legal_actions] = 1
+        action_mask[self._get_legal_actions()] = 1
         obs = {
             'observation': self.current_state()[1],
             'action_mask': action_mask,
@@ -551,11 +589,10 @@ class GomokuEnv(BaseEnv):
             - new_legal_actions (:obj:`np.array`):
         """
         self.reset(start_player_index, init_state=board)
-        if action not in self.legal_actions:
+        if action not in self._get_legal_actions():
             raise ValueError("action {0} on board {1} is not legal".format(action, self.board))
-        row, col = self.action_to_coord(action)
-        self.board[row, col] = self.current_player
-        new_legal_actions = copy.deepcopy(self.legal_actions)
+        self._place_stone(action)
+        new_legal_actions = self.legal_actions
         new_board = copy.deepcopy(self.board)
         return new_board, new_legal_actions
 
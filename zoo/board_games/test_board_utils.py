@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from easydict import EasyDict
+
+from zoo.board_games.connect4.envs.connect4_env import Connect4Env
+from zoo.board_games.gomoku.envs.get_done_winner_cython import get_done_winner_cython as gomoku_get_done_winner
+from zoo.board_games.gomoku.envs.gomoku_env import GomokuEnv
+from zoo.board_games.tictactoe.envs.get_done_winner_cython import get_done_winner_cython as tictactoe_get_done_winner
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+
+
+def make_env(env_type, **kwargs):
+    cfg = EasyDict(env_type.default_config())
+    cfg.update(dict(battle_mode='self_play_mode', alphazero_mcts_ctree=True, **kwargs))
+    return env_type(cfg)
+
+
+def scan_done_winner(env):
+    # the terminal state of the whole board, as computed before the incremental tracking
+    if isinstance(env, Connect4Env):
+        return env._scan_done_winner()
+    board = np.ascontiguousarray(env.board, dtype=np.int32)
+    if isinstance(env, GomokuEnv):
+        return tuple(gomoku_get_done_winner(env.board_size, board))
+    return tuple(tictactoe_get_done_winner(board))
+
+
+def scan_legal_actions(env):
+    if isinstance(env, Connect4Env):
+        return [i for i in range(7) if env.board[i] == 0]
+    return np.flatnonzero(np.asarray(env.board) == 0).tolist()
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('env_type, env_kwargs', [(TicTacToeEnv, dict()), (Connect4Env, dict()),
+                                                  (GomokuEnv, dict(board_size=6)), (GomokuEnv, dict(board_size=9))])
+def test_incremental_done_winner_and_legal_actions(env_type, env_kwargs):
+    env = make_env(env_type, **env_kwargs)
+    rng = np.random.RandomState(0)
+    winners = set()
+    for episode in range(50):
+        env.reset(episode % 2)
+        done = False
+        while not done:
+            assert env.legal_actions == scan_legal_actions(env)
+            done = env.step(int(rng.choice(env.legal_actions))).done
+            assert tuple(env.get_done_winner()) == scan_done_winner(env)
+            # the incremental state is recomputed from an assigned board
+            if rng.rand() < 0.1:
+                env.board = env.board.copy()
+                assert tuple(env.get_done_winner()) == scan_done_winner(env)
+        winners.add(env.get_done_winner()[1])
+    assert winners >= {1, 2}
+
+    # the returned legal actions are copies
+    env.reset()
+    env.legal_actions.remove(0)
+    assert env.legal_actions == scan_legal_actions(env)
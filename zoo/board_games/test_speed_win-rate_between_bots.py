@@ -10,9 +10,12 @@ import time
 import numpy as np
 from easydict import EasyDict
 
-from zoo.board_games.gomoku.envs.gomoku_env import GomokuEnv
+from zoo.board_games.connect4.envs.connect4_env import Connect4Env
+from zoo.board_games.gomoku.envs.get_done_winner_cython import get_done_winner_cython as gomoku_get_done_winner
+from zoo.board_games.gomoku.envs.gomoku_env import GomokuEnv, _legal_actions_func_lru as gomoku_legal_actions
 from zoo.board_games.mcts_bot import MCTSBot
-from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv
+from zoo.board_games.tictactoe.envs.get_done_winner_cython import get_done_winner_cython as tictactoe_get_done_winner
+from zoo.board_games.tictactoe.envs.tictactoe_env import TicTacToeEnv, _legal_actions_func_lru as tictactoe_legal_actions
 
 cfg_tictactoe = dict(
     battle_mode='self_play_mode',
@@ -516,7 +519,72 @@ def test_gomoku_mcts_bot_vs_rule_bot_v0_bot(num_simulations=50):
     )
 
 
+def full_scan_legal_actions_and_done_winner(env):
+    """
+    Overview:
+        The legal actions and the terminal state computed from the whole board, as the envs did before tracking them
+        incrementally: an ``lru_cache`` over the board tuple for tictactoe and gomoku, and a scan of the grid for
+        connect4.
+    """
+    if isinstance(env, Connect4Env):
+        return [i for i in range(7) if env.board[i] == 0], env._scan_done_winner()
+    board_tuple = tuple(map(tuple, env.board))
+    board = np.array(board_tuple, dtype=np.int32)
+    if isinstance(env, GomokuEnv):
+        return gomoku_legal_actions(env.board_size, board_tuple), gomoku_get_done_winner(env.board_size, board)
+    return tictactoe_legal_actions(board_tuple), tictactoe_get_done_winner(board)
+
+
+def test_board_game_env_speed(num_games=20):
+    """
+    Overview:
+        Measure the time of ``step`` and of the queries of ``legal_actions`` and ``get_done_winner`` at each move of
+        random self-play games, where the envs track the legal actions and check the lines through the last stone,
+        against the time of computing the same queries by the full-board scans.
+    Arguments:
+        - num_games (:obj:`int`): The number of games played in each env.
+    """
+    for env_type, env_cfg in [
+        (TicTacToeEnv, dict()),
+        (Connect4Env, dict()),
+        (GomokuEnv, dict(board_size=9)),
+        (GomokuEnv, dict(board_size=15)),
+    ]:
+        cfg = env_type.default_config()
+        cfg.update(dict(battle_mode='self_play_mode', alphazero_mcts_ctree=True, **env_cfg))
+        env = env_type(EasyDict(cfg))
+        incremental_time, full_scan_time, num_moves = 0., 0., 0
+        for i in range(num_games):
+            np.random.seed(i)
+            env.reset()
+            done = False
+            while not done:
+                action = int(np.random.choice(env.legal_actions))
+                t1 = time.time()
+                done = env.step(action).done
+                legal_actions, done_winner = env.legal_actions, env.get_done_winner()
+                t2 = time.time()
+                full_scan_legal_actions, full_scan_done_winner = full_scan_legal_actions_and_done_winner(env)
+                t3 = time.time()
+                assert list(legal_actions) == list(full_scan_legal_actions)
+                assert tuple(done_winner) == tuple(full_scan_done_winner)
+                incremental_time += t2 - t1
+                full_scan_time += t3 - t2
+                num_moves += 1
+        print(
+            '{} {}: step + legal_actions + get_done_winner {:.1f} us per move, full-board scans of legal_actions + '
+            'get_done_winner {:.1f} us per move'.format(
+                env_type.__name__, env_cfg, incremental_time / num_moves * 1e6, full_scan_time / num_moves * 1e6
+            )
+        )
+
+
 if __name__ == '__main__':
+    # ==============================================================
+    # test the speed of the legal actions and the terminal state of the envs
+    # ==============================================================
+    # test_board_game_env_speed()
+
     # ==============================================================
     # test win rate between alphabeta_bot and rule_bot_v0
     # ==============================================================
@@ -16,6 +16,7 @@ from zoo.board_games.tictactoe.envs.get_done_winner_cython import get_done_winne
 from zoo.board_games.tictactoe.envs.legal_actions_cython import legal_actions_cython
 
 from zoo.board_games.alphabeta_pruning_bot import AlphaBetaPruningBot
+from zoo.board_games.board_utils import is_n_in_row_through
 
 
 @lru_cache(maxsize=512)
@@ -27,15 +28,6 @@ def _legal_actions_func_lru(board_tuple):
     return legal_actions_cython(board_view)
 
 
-@lru_cache(maxsize=512)
-def _get_done_winner_func_lru(board_tuple):
-    # Convert tuple to NumPy array.
-    board_array = np.array(board_tuple, dtype=np.int32)
-    # Convert NumPy array to memory view.
-    board_view = board_array.view(dtype=np.int32).reshape(board_array.shape)
-    return get_done_winner_cython(board_view)
-
-
 @ENV_REGISTRY.register('tictactoe')
 class TicTacToeEnv(BaseEnv):
 
@@ -98,10 +90,27 @@ class TicTacToeEnv(BaseEnv):
         self._replay_path = cfg.replay_path if hasattr(cfg, "replay_path") and cfg.replay_path is not None else None
         self._save_replay_count = 0
 
+    @property
+    def board(self) -> np.ndarray:
+        return self._board
+
+    @board.setter
+    def board(self, board: np.ndarray) -> None:
+        # The legal actions and the terminal state are tracked incrementally by ``_place_stone``. They are recomputed
+        # from a new board on the first query, so the board must be changed by ``step`` or by assigning it.
+        self._board = board
+        self._legal_actions = None
+        self._done_winner = None
+
     @property
     def legal_actions(self):
-        # Convert NumPy arrays to nested tuples to make them hashable.
-        return _legal_actions_func_lru(tuple(map(tuple, self.board)))
+        return list(self._get_legal_actions())
+
+    def _get_legal_actions(self) -> List[int]:
+        # The sorted list of the empty cells, updated by ``_place_stone``.
+        if self._legal_actions is None:
+            self._legal_actions = np.flatnonzero(self._board == 0).tolist()
+        return self._legal_actions
 
     # only for evaluation speed
     @property
@@ -124,9 +133,30 @@ class TicTacToeEnv(BaseEnv):
                 - if player 2 win,     'done' = True, 'winner' = 2
                 - if draw,             'done' = True, 'winner' = -1
                 - if game is not over, 'done' = False, 'winner' = -1
+
+        .. note::
+            After each move, only the lines through the last stone are checked (see ``_place_stone``), and the whole
+            board is only scanned once after it is reset or assigned.
         """
-        # Convert NumPy arrays to nested tuples to make them hashable.
-        return _get_done_winner_func_lru(tuple(map(tuple, self.board)))
+        if self._done_winner is None:
+            self._done_winner = tuple(get_done_winner_cython(np.ascontiguousarray(self._board, dtype=np.int32)))
+        return self._done_winner
+
+    def _place_stone(self, action: int) -> None:
+        """
+        Overview:
+            Place a stone of the current player on the cell of ``action``, and update the legal actions and the
+            terminal state from this stone only.
+        """
+        row, col = self.action_to_coord(action)
+        self._board[row, col] = self.current_player
+        legal_actions = self._get_legal_actions()
+        legal_actions.remove(action)
+        if self._done_winner is not None and not self._done_winner[0]:
+            if is_n_in_row_through(self._board.reshape(-1), self.board_size, self.board_size, row, col, 3):
+                self._done_winner = (True, self.current_player)
+            else:
+                self._done_winner = (len(legal_actions) == 0, -1)
 
     def reset(self, start_player_index=0, init_state=None, katago_policy_init=False, katago_game_state=None):
         """
@@ -164,9 +194,10 @@ class TicTacToeEnv(BaseEnv):
                 self.board = self.board.reshape((self.board_size, self.board_size))
         else:
             self.board = np.zeros((self.board_size, self.board_size), dtype="int32")
+            self._done_winner = (False, -1)
 
         action_mask = np.zeros(self.total_num_actions, 'int8')
-        action_mask[self.legal_actions] = 1
+        action_mask[self._get_legal_actions()] = 1
 
         if self.battle_mode == 'play_with_bot_mode' or self.battle_mode == 'eval_mode':
             # In ``play_with_bot_mode`` and ``eval_mode``, we need to set the "to_play" parameter in the "obs" dict to -1,
@@ -311,17 +342,15 @@ class TicTacToeEnv(BaseEnv):
 
     def _player_step(self, action):
 
-        if action in self.legal_actions:
-            row, col = self.action_to_coord(action)
-            self.board[row, col] = self.current_player
+        if action in self._get_legal_actions():
+            self._place_stone(action)
         else:
             logging.warning(
                 f"You input illegal action: {action}, the legal_actions are {self.legal_actions}. "
                 f"Now we randomly choice a action from self.legal_actions."
             )
             action = np.random.choice(self.legal_actions)
-            row, col = self.action_to_coord(action)
-            self.board[row, col] = self.current_player
+            self._place_stone(action)
 
         # Check whether the game is ended or not and give the winner
         done, winner = self.get_done_winner()
@@ -337,7 +366,7 @@ class TicTacToeEnv(BaseEnv):
             info['eval_episode_return'] = reward
             # print('tictactoe one episode done: ', info)
         action_mask = np.zeros(self.total_num_actions, 'int8')
-        action_mask[self.legal_actions] = 1
+        action_mask[self._get_legal_actions()] = 1
         obs = {
             'observation': self.current_state()[1],
             'action_mask': action_mask,
@@ -605,11 +634,10 @@ class TicTacToeEnv(BaseEnv):
             - new_legal_actions (:obj:`list`): new legal actions
         """
         self.reset(start_player_index, init_state=board)
-        if action not in self.legal_actions:
+        if action not in self._get_legal_actions():
             raise ValueError("action {0} on board {1} is not legal".format(action, self.board))
-        row, col = self.action_to_coord(action)
-        self.board[row, col] = self.current_player
-        new_legal_actions = copy.deepcopy(self.legal_actions)
+        self._place_stone(action)
+        new_legal_actions = self.legal_actions
         new_board = copy.deepcopy(self.board)
 
         return new_board, new_legal_actions
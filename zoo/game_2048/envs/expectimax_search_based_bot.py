@@ -3,6 +3,8 @@ from typing import Tuple, Union
 
 import numpy as np
 
+from zoo.game_2048.envs.game_2048_core import board_to_exponents, exponents_to_board, move_batch
+
 
 # Define expectimax search bot for 2048 env
 def expectimax_search(grid: np.array, fast_search: bool = True) -> int:
@@ -68,11 +70,11 @@ def expectimax_search(grid: np.array, fast_search: bool = True) -> int:
         else:
             best_score = 0
             best_action = None
-            # 0, 1, 2, 3 mean top, right, bottom, left
+            # 0, 1, 2, 3 mean top, right, bottom, left, all the directions are moved at once
+            new_grids, _, move_flags = move_batch(np.repeat(board_to_exponents(grid)[None], 4, axis=0), np.arange(4))
             for dire in [0, 1, 2, 3]:
-                new_grid, move_flag, _ = move(grid, dire)
-                if move_flag:
-                    score = expectation_search(new_grid, depth - 1, True)[0]
+                if move_flags[dire]:
+                    score = expectation_search(exponents_to_board(new_grids[dire]), depth - 1, True)[0]
                     if score > best_score:
                         best_score = score
                         best_action = dire
@@ -96,43 +98,8 @@ def move(grid: np.array, action: int, game_score: int = 0) -> Tuple[np.array, bo
     # execute action in 2048 game
     # 0, 1, 2, 3 mean top, right, bottom, left
     assert action in [0, 1, 2, 3], action
-    old_grid = grid
-    grid = np.copy(grid)
-    # rotate
-    if action == 0:
-        grid = np.rot90(grid)
-    elif action == 1:
-        grid = np.rot90(grid, k=2)
-    elif action == 2:
-        grid = np.rot90(grid, k=3)
-    # simple move
-    for i in range(4):
-        for j in range(3):
-            if grid[i, j] == 0:
-                grid[i, j] = grid[i, j + 1]
-                grid[i, j + 1] = 0
-    # merge
-    for i in range(4):
-        for j in range(3):
-            if grid[i, j] == grid[i, j + 1]:
-                game_score += 2 * grid[i, j]
-                grid[i, j] *= 2
-                grid[i, j + 1] = 0
-    # simple move
-    for i in range(4):
-        for j in range(3):
-            if grid[i, j] == 0:
-                grid[i, j] = grid[i, j + 1]
-                grid[i, j + 1] = 0
-    # rotate back
-    if action == 0:
-        grid = np.rot90(grid, k=3)
-    elif action == 1:
-        grid = np.rot90(grid, k=2)
-    elif action == 2:
-        grid = np.rot90(grid)
-    move_flag = np.any(old_grid != grid)
-    return grid, move_flag, game_score
+    new_exponents, reward, move_flag = move_batch(board_to_exponents(grid)[None], [action])
+    return exponents_to_board(new_exponents[0]), bool(move_flag[0]), game_score + int(reward[0])
 
 
 # # Define generate function, randomly generate 2 or 4 in an empty location
@@ -0,0 +1,205 @@
+"""
+Overview:
+    The shared core of the 2048 game, used by ``Game2048Env``, ``Game2048VecEnv`` and the expectimax bot. A board is
+    a ``(4, 4)`` uint8 array of tile exponents, i.e. 0 for an empty cell and ``k`` for the tile ``2 ** k``, and a batch
+    of boards is a ``(B, 4, 4)`` array. A line of 4 exponents (at most 15 each) is packed into a 16-bit key, and the
+    moves are looked up in tables precomputed for all the 65536 lines: the line after the move, and its reward.
+    The moves, the legal actions and the random tiles of a batch of boards are computed at once by numpy.
+    The actions are 0 (up), 1 (right), 2 (down) and 3 (left), as in ``Game2048Env``.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+# the bit offsets of the 4 cells of a line in its key
+_SHIFTS = np.arange(0, 16, 4, dtype=np.int64)
+# the moves which slide the tiles towards index 0 of a line, i.e. up (on columns) and left (on rows)
+_TOWARDS_START = np.array([True, False, False, True])
+# the moves which act on the columns of the board, i.e. up and down
+_ON_COLUMNS = np.array([True, False, True, False])
+
+
+def _build_line_tables() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Overview:
+        Precompute the moves of all the 65536 lines, towards index 0 (``[0]``) and towards index 3 (``[1]``).
+        The tiles slide towards the end and two equal adjacent tiles merge once, starting from that end.
+    Returns:
+        - lines (:obj:`np.ndarray`): The lines after the move, of shape ``(2, 65536, 4)``. A merge of two 2**15 \
+            tiles gives the exponent 16, which is not packed in the keys.
+        - rewards (:obj:`np.ndarray`): The sum of the merged tiles of the move, of shape ``(2, 65536)``.
+        - moved (:obj:`np.ndarray`): Whether the move changes the line, of shape ``(2, 65536)``.
+    """
+    num = 1 << 16
+    index = np.arange(num)
+    cells = ((index[:, None] >> _SHIFTS) & 0xF).astype(np.uint8)
+    out = np.zeros_like(cells)
+    reward = np.zeros(num, dtype=np.int64)
+    filled = np.zeros(num, dtype=np.int64)
+    # the exponent of the last tile written, which the next tile can merge with, 0 after a merge
+    last = np.zeros(num, dtype=np.uint8)
+    for i in range(4):
+        exponent = cells[:, i]
+        merge = (exponent > 0) & (exponent == last)
+        place = (exponent > 0) & ~merge
+        out[index[merge], filled[merge] - 1] = exponent[merge] + 1
+        reward[merge] += 1 << (exponent[merge].astype(np.int64) + 1)
+        out[index[place], filled[place]] = exponent[place]
+        filled += place
+        last = np.where(merge, 0, np.where(place, exponent, last)).astype(np.uint8)
+
+    # the move towards index 3 of a line is the move towards index 0 of the reversed line, reversed
+    reversed_keys = (cells[:, ::-1].astype(np.int64) << _SHIFTS).sum(axis=1)
+    lines = np.stack([out, out[reversed_keys, ::-1]])
+    rewards = np.stack([reward, reward[reversed_keys]])
+    moved = (lines != cells[None]).any(axis=2)
+    return lines, rewards, moved
+
+
+LINE_MOVES, LINE_REWARDS, LINE_MOVED = _build_line_tables()
+
+
+def board_to_exponents(board: np.ndarray) -> np.ndarray:
+    """
+    Overview:
+        Convert the tile values of boards to exponents.
+    """
+    board = np.asarray(board)
+    return np.where(board > 0, np.log2(np.maximum(board, 1)), 0).astype(np.uint8)
+
+
+def exponents_to_board(exponents: np.ndarray) -> np.ndarray:
+    """
+    Overview:
+        Convert the tile exponents of boards to values.
+    """
+    return np.where(exponents > 0, np.left_shift(1, exponents.astype(np.int64)), 0)
+
+
+def _line_keys(lines: np.ndarray) -> np.ndarray:
+    return (lines.astype(np.int64) << _SHIFTS).sum(axis=-1)
+
+
+def _move_line(line: np.ndarray, towards_start: bool) -> Tuple[np.ndarray, int]:
+    """
+    Overview:
+        Move a single line without the tables, for the lines with a tile of exponent above 15.
+    """
+    tiles = [int(e) for e in (line if towards_start else line[::-1]) if e > 0]
+    out, reward, i = [], 0, 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1]:
+            out.append(tiles[i] + 1)
+            reward += 1 << (tiles[i] + 1)
+            i += 2
+        else:
+            out.append(tiles[i])
+            i += 1
+    out = np.array(out + [0] * (4 - len(out)), dtype=np.uint8)
+    return (out if towards_start else out[::-1]), reward
+
+
+def move_batch(exponents: np.ndarray, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Overview:
+        Move a batch of boards, each by its action.
+    Arguments:
+        - exponents (:obj:`np.ndarray`): The boards, of shape ``(B, 4, 4)``.
+        - actions (:obj:`np.ndarray`): The actions, of shape ``(B, )``.
+    Returns:
+        - exponents (:obj:`np.ndarray`): The boards after the moves, of shape ``(B, 4, 4)``.
+        - rewards (:obj:`np.ndarray`): The sum of the merged tiles of each move, of shape ``(B, )``.
+        - moved (:obj:`np.ndarray`): Whether each move changes the board, of shape ``(B, )``.
+    """
+    exponents = np.asarray(exponents, dtype=np.uint8)
+    actions = np.asarray(actions, dtype=np.int64)
+    on_columns = _ON_COLUMNS[actions][:, None, None]
+    # the lines along the moves, index 0 of a column is its top cell
+    lines = np.where(on_columns, exponents.transpose(0, 2, 1), exponents)
+    direction = (~_TOWARDS_START[actions]).astype(np.int64)[:, None]
+    keys = _line_keys(np.minimum(lines, 15))
+    new_lines = LINE_MOVES[direction, keys]
+    rewards = LINE_REWARDS[direction, keys].sum(axis=1)
+
+    overflow = np.flatnonzero((lines > 15).any(axis=(1, 2)))
+    for b in overflow:
+        rewards[b] = 0
+        for i in range(4):
+            new_lines[b, i], reward = _move_line(lines[b, i], bool(direction[b, 0] == 0))
+            rewards[b] += reward
+
+    new_exponents = np.where(on_columns, new_lines.transpose(0, 2, 1), new_lines)
+    moved = (new_exponents != exponents).any(axis=(1, 2))
+    return new_exponents, rewards, moved
+
+
+def legal_actions_batch(exponents: np.ndarray) -> np.ndarray:
+    """
+    Overview:
+        The legal actions of a batch of boards, i.e. the moves which change the board.
+    Arguments:
+        - exponents (:obj:`np.ndarray`): The boards, of shape ``(B, 4, 4)``.
+    Returns:
+        - legal (:obj:`np.ndarray`): Whether each action of each board is legal, of shape ``(B, 4)``.
+    """
+    exponents = np.asarray(exponents, dtype=np.uint8)
+    row_keys = _line_keys(np.minimum(exponents, 15))
+    column_keys = _line_keys(np.minimum(exponents.transpose(0, 2, 1), 15))
+    legal = np.stack(
+        [
+            LINE_MOVED[0, column_keys].any(axis=1),
+            LINE_MOVED[1, row_keys].any(axis=1),
+            LINE_MOVED[1, column_keys].any(axis=1),
+            LINE_MOVED[0, row_keys].any(axis=1),
+        ],
+        axis=1
+    )
+    for b in np.flatnonzero((exponents > 15).any(axis=(1, 2))):
+        legal[b] = move_batch(np.repeat(exponents[b:b + 1], 4, axis=0), np.arange(4))[2]
+    return legal
+
+
+def spawn_tiles_batch(
+        exponents: np.ndarray,
+        rng: np.random.Generator,
+        tile_exponents: np.ndarray = np.array([1, 2]),
+        tile_probabilities: np.ndarray = np.array([0.9, 0.1]),
+        mask: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Overview:
+        Add a random tile on a random empty cell of each board, in place.
+    Arguments:
+        - exponents (:obj:`np.ndarray`): The boards, of shape ``(B, 4, 4)``.
+        - rng (:obj:`np.random.Generator`): The random generator.
+        - tile_exponents (:obj:`np.ndarray`): The exponents of the possible tiles.
+        - tile_probabilities (:obj:`np.ndarray`): The probabilities of the possible tiles.
+        - mask (:obj:`Optional[np.ndarray]`): The boards to add a tile to, of shape ``(B, )``. None means all.
+    Returns:
+        - exponents (:obj:`np.ndarray`): The boards, with the new tiles.
+        - positions (:obj:`np.ndarray`): The cell of each new tile, ``4 * row + column``, -1 if the board is full.
+        - tile_indices (:obj:`np.ndarray`): The index of each new tile in ``tile_exponents``.
+    """
+    num = len(exponents)
+    cells = exponents.reshape(num, 16)
+    empty = cells == 0
+    num_empty = empty.sum(axis=1)
+    tile_indices = rng.choice(len(tile_exponents), size=num, p=tile_probabilities)
+    # the k-th empty cell of each board, with k uniform in [0, num_empty)
+    k = np.minimum((rng.random(num) * num_empty).astype(np.int64), np.maximum(num_empty - 1, 0))
+    positions = (np.cumsum(empty, axis=1) > k[:, None]).argmax(axis=1)
+    valid = num_empty > 0
+    if mask is not None:
+        valid &= mask
+    cells[valid, positions[valid]] = np.asarray(tile_exponents, dtype=np.uint8)[tile_indices[valid]]
+    positions = np.where(num_empty > 0, positions, -1)
+    return exponents, positions, tile_indices
+
+
+def encode_exponents(exponents: np.ndarray, num_of_template_tiles: int = 16) -> np.ndarray:
+    """
+    Overview:
+        The one-hot encoding of a batch of boards, as ``encode_board`` of ``game_2048_env``, of shape
+        ``(B, 4, 4, num_of_template_tiles)``.
+    """
+    return (exponents[..., None] == np.arange(num_of_template_tiles)).astype(np.float32)
@@ -17,6 +17,8 @@ from easydict import EasyDict
 from gymnasium import spaces
 from gymnasium.utils import seeding
 
+from zoo.game_2048.envs.game_2048_core import board_to_exponents, exponents_to_board, legal_actions_batch, move_batch
+
 
 @ENV_REGISTRY.register('game_2048')
 class Game2048Env(gym.Env):
@@ -375,112 +377,12 @@ class Game2048Env(gym.Env):
         if not trial:
             logging.debug(["Up", "Right", "Down", "Left"][int(direction)])
 
-        move_reward = 0
-        # Calculate merge direction of the shift (0 for up/left, 1 for down/right) based on the input direction
-        merge_direction = 0 if direction in [0, 3] else 1
-
-        # Construct a range for extracting row/column into a list
-        range_x = list(range(self.w))
-        range_y = list(range(self.h))
-
-        # If direction is up or down, process the board column by column
-        if direction in [0, 2]:
-            for y in range(self.h):
-                old_col = [self.board[x, y] for x in range_x]
-                new_col, reward = self.shift(old_col, merge_direction)
-                move_reward += reward
-                if old_col != new_col and not trial:  # Update the board if it's not a trial move
-                    for x in range_x:
-                        self.board[x, y] = new_col[x]
-        # If direction is left or right, process the board row by row
-        else:
-            for x in range(self.w):
-                old_row = [self.board[x, y] for y in range_y]
-                new_row, reward = self.shift(old_row, merge_direction)
-                move_reward += reward
-                if old_row != new_row and not trial:  # Update the board if it's not a trial move
-                    for y in range_y:
-                        self.board[x, y] = new_row[y]
-
-        return move_reward
-
-    def shift(self, row, merge_direction):
-        """
-        Overview:
-            This method shifts the elements in a given row or column of the 2048 board in a specified direction.
-            It performs three main operations: removal of zeroes, combination of similar elements, and filling up the
-            remaining spaces with zeroes. The direction of shift can be either left (0) or right (1).
-        Arguments:
-            - row: A list of integers representing a row or a column in the 2048 board.
-            - merge_direction: An integer that dictates the direction of merge. It can be either 0 or 1.
-                - 0: The elements in the 'row' will be merged towards left/up.
-                - 1: The elements in the 'row' will be merged towards right/down.
-        Returns:
-            - combined_row: A list of integers of the same length as 'row' after shifting and merging.
-            - move_reward: The reward gained from combining similar elements in 'row'. It is the sum of all new
-                combinations.
-        Note:
-            This method assumes that the input 'row' is a list of integers and 'merge_direction' is either 0 or 1.
-        """
-
-        # Remove the zero elements from the row and store it in a new list.
-        non_zero_row = [i for i in row if i != 0]
-
-        # Determine the start, stop, and step values based on the direction of shift.
-        # If the direction is left (0), we start at the first element and move forwards.
-        # If the direction is right (1), we start at the last element and move backwards.
-        start, stop, step = (0, len(non_zero_row), 1) if merge_direction == 0 else (len(non_zero_row) - 1, -1, -1)
-
-        # Call the combine function to merge the adjacent, same elements in the row.
-        combined_row, move_reward = self.combine(non_zero_row, start, stop, step)
-
-        if merge_direction == 1:
-            # If direction is 'right'/'down', reverse the row
-            combined_row = combined_row[::-1]
-
-        # Fill up the remaining spaces in the row with 0, if any.
-        if merge_direction == 0:
-            combined_row += [0] * (len(row) - len(combined_row))
-        elif merge_direction == 1:
-            combined_row = [0] * (len(row) - len(combined_row)) + combined_row
-
-        return combined_row, move_reward
-
-    def combine(self, row, start, stop, step):
-        """
-        Overview:
-            Combine similar adjacent elements in the row, starting from the specified start index,
-            ending at the stop index, and moving in the direction indicated by the step. The function
-            also calculates the reward as the sum of all combined elements.
-        """
-
-        # Initialize the reward for this move as 0.
-        move_reward = 0
-
-        # Initialize the list to store the row after combining same elements.
-        combined_row = []
-
-        # Initialize a flag to indicate whether the next element should be skipped.
-        skip_next = False
-
-        # Iterate over the elements in the row based on the start, stop, and step values.
-        for i in range(start, stop, step):
-            # If the next element should be skipped, reset the flag and continue to the next iteration.
-            if skip_next:
-                skip_next = False
-                continue
-
-            # If the current element and the next element are the same, combine them.
-            if i + step != stop and row[i] == row[i + step]:
-                combined_row.append(row[i] * 2)
-                move_reward += row[i] * 2
-                # Set the flag to skip the next element in the next iteration.
-                skip_next = True
-            else:
-                # If the current element and the next element are not the same, just append the current element to the result.
-                combined_row.append(row[i])
+        # Move the board by the precomputed line tables of the shared core
+        new_exponents, move_reward, moved = move_batch(board_to_exponents(self.board)[None], [int(direction)])
+        if moved[0] and not trial:  # Update the board if it's not a trial move
+            self.board[:] = exponents_to_board(new_exponents[0])
 
-        return combined_row, move_reward
+        return int(move_reward[0])
 
     @property
     def legal_actions(self):
@@ -492,32 +394,8 @@ class Game2048Env(gym.Env):
         if self.ignore_legal_actions:
             return [0, 1, 2, 3]
 
-        legal_actions = []
-
-        # For each direction, simulate a move. If the move changes the board, add the direction to the list of legal actions
-        for direction in range(4):
-            # Calculate merge direction of the shift (0 for up/left, 1 for down/right) based on the input direction
-            merge_direction = 0 if direction in [0, 3] else 1
-
-            range_x = list(range(self.w))
-            range_y = list(range(self.h))
-
-            if direction % 2 == 0:
-                for y in range(self.h):
-                    old_col = [self.board[x, y] for x in range_x]
-                    new_col, _ = self.shift(old_col, merge_direction)
-                    if old_col != new_col:
-                        legal_actions.append(direction)
-                        break  # As soon as we know the move is legal, we can stop checking
-            else:
-                for x in range(self.w):
-                    old_row = [self.board[x, y] for y in range_y]
-                    new_row, _ = self.shift(old_row, merge_direction)
-                    if old_row != new_row:
-                        legal_actions.append(direction)
-                        break  # As soon as we know the move is legal, we can stop checking
-
-        return legal_actions
+        legal = legal_actions_batch(board_to_exponents(self.board)[None])[0]
+        return np.flatnonzero(legal).tolist()
 
     # Implementation of game logic for 2048
     def add_random_2_4_tile(self):
@@ -0,0 +1,273 @@
+import copy
+from typing import Any, Dict, List, Optional, Union
+
+import gymnasium as gym
+import numpy as np
+from ding.envs import BaseEnvTimestep
+from easydict import EasyDict
+
+from zoo.game_2048.envs.game_2048_core import board_to_exponents, encode_exponents, exponents_to_board, \
+    legal_actions_batch, move_batch, spawn_tiles_batch
+from zoo.game_2048.envs.game_2048_env import Game2048Env
+
+
+class Game2048VecEnv(object):
+    """
+    Overview:
+        A vectorized 2048 environment, which steps the boards of ``env_num`` games at once by the shared core
+        (``game_2048_core``), instead of one ``Game2048Env`` per process or per step. It has the interface of the
+        env managers used by the collectors and evaluators (``launch``, ``reset``, ``ready_obs``, ``step``, ``seed``,
+        ``close``), so that it can be given to them as the ``env`` argument in place of an env manager.
+        The games follow the config and the rules of ``Game2048Env``, and are reset automatically when they end.
+        The random tiles of all the games are drawn from one random generator, so that a game with the same seed
+        does not give the same tiles as ``Game2048Env``.
+    Interfaces:
+        ``__init__``, ``launch``, ``reset``, ``step``, ``seed``, ``close``, ``random_action``, ``ready_obs``.
+    """
+    config = Game2048Env.config
+
+    @classmethod
+    def default_config(cls: type) -> EasyDict:
+        cfg = EasyDict(copy.deepcopy(cls.config))
+        cfg.cfg_type = cls.__name__ + 'Dict'
+        return cfg
+
+    def __init__(self, cfg: dict, env_num: int) -> None:
+        """
+        Overview:
+            Initialize the vectorized environment.
+        Arguments:
+            - cfg (:obj:`dict`): The config of ``Game2048Env``, shared by all the games.
+            - env_num (:obj:`int`): The number of games.
+        """
+        default_config = self.default_config()
+        default_config.update(cfg)
+        self._cfg = default_config
+        self._env_num = env_num
+        assert self._cfg.obs_type in ['raw_board', 'raw_encoded_board', 'dict_encoded_board']
+        assert self._cfg.reward_type in ['raw', 'merged_tiles_plus_log_max_tile_num']
+        assert self._cfg.reward_type == 'raw' or self._cfg.reward_normalize is False
+        self.max_tile = self._cfg.max_tile
+        assert self.max_tile is None or isinstance(self.max_tile, int)
+
+        self.num_of_possible_chance_tile = self._cfg.num_of_possible_chance_tile
+        if self.num_of_possible_chance_tile > 2:
+            possible_tiles = np.array([2 ** (i + 1) for i in range(self.num_of_possible_chance_tile)])
+            self.tile_probabilities = np.full(self.num_of_possible_chance_tile, 1 / self.num_of_possible_chance_tile)
+            self.chance_space_size = self.num_of_possible_chance_tile * 16
+        else:
+            # as ``Game2048Env.add_random_2_4_tile``, the chance is the position of the new tile
+            possible_tiles = np.array([2, 4])
+            self.tile_probabilities = np.array([0.9, 0.1])
+            self.chance_space_size = 16
+        self.tile_exponents = board_to_exponents(possible_tiles)
+
+        self._action_space = gym.spaces.Discrete(4)
+        self._observation_space = gym.spaces.Box(0, 1, (4, 4, 16), dtype=int)
+        self._reward_range = (0., self.max_tile)
+        self._closed = True
+        self.seed(0)
+
+    def launch(self, reset_param: Optional[Dict] = None) -> None:
+        """
+        Overview:
+            Create the boards of all the games and reset them.
+        """
+        self._exponents = np.zeros((self._env_num, 4, 4), dtype=np.uint8)
+        self._chance = np.zeros(self._env_num, dtype=np.int64)
+        self._episode_length = np.zeros(self._env_num, dtype=np.int64)
+        self._episode_return = np.zeros(self._env_num, dtype=np.float64)
+        # as ``Game2048Env.max_tile_num``, the largest tile seen by each game, used by the reward
+        self._max_tile_num = np.zeros(self._env_num, dtype=np.int64)
+        self._closed = False
+        self.reset(reset_param)
+
+    def reset(self, reset_param: Optional[Dict] = None) -> None:
+        """
+        Overview:
+            Reset the games of ``reset_param``, or all the games if it is None.
+        Arguments:
+            - reset_param (:obj:`Optional[Dict]`): The reset arguments of each game, None or a dict with an \
+                ``init_board`` (:obj:`np.ndarray`), as the arguments of ``Game2048Env.reset``.
+        """
+        if reset_param is None:
+            reset_param = {env_id: None for env_id in range(self._env_num)}
+        env_ids = np.array(list(reset_param.keys()), dtype=np.int64)
+        random_ids = []
+        for env_id in env_ids:
+            param = reset_param[env_id] or {}
+            if param.get('init_board', None) is not None:
+                self._exponents[env_id] = board_to_exponents(param['init_board'])
+            else:
+                self._exponents[env_id] = 0
+                random_ids.append(env_id)
+        # add two tiles at the start of the games
+        random_ids = np.array(random_ids, dtype=np.int64)
+        for _ in range(2):
+            self._spawn(random_ids)
+        self._episode_length[env_ids] = 0
+        self._episode_return[env_ids] = 0
+
+    def step(self, actions: Dict[int, Any]) -> Dict[int, BaseEnvTimestep]:
+        """
+        Overview:
+            Step the games of ``actions`` at once, and reset the games which end.
+        Arguments:
+            - actions (:obj:`Dict[int, Any]`): The action of each game.
+        Returns:
+            - timesteps (:obj:`Dict[int, BaseEnvTimestep]`): The timestep of each game. The observation of a game \
+                which ends is its last one, the observation of the next game is then in ``ready_obs``.
+        """
+        env_ids = np.array(list(actions.keys()), dtype=np.int64)
+        action = np.array([np.asarray(a).item() for a in actions.values()], dtype=np.int64)
+        exponents = self._exponents[env_ids]
+        self._episode_length[env_ids] += 1
+
+        if not self._cfg.ignore_legal_actions:
+            # as ``Game2048Env.step``, an illegal action is replaced by a random legal action
+            legal = legal_actions_batch(exponents)
+            for i in np.flatnonzero(~legal[np.arange(len(env_ids)), action]):
+                action[i] = self._rng.choice(np.flatnonzero(legal[i]))
+
+        empty_num = (exponents == 0).sum(axis=(1, 2))
+        exponents, raw_reward, _ = move_batch(exponents, action)
+        self._exponents[env_ids] = exponents
+        raw_reward = raw_reward.astype(np.float64)
+        if self._cfg.reward_type == 'merged_tiles_plus_log_max_tile_num':
+            reward = ((exponents == 0).sum(axis=(1, 2)) - empty_num).astype(np.float64)
+            max_tile_num = exponents_to_board(exponents.max(axis=(1, 2)))
+            new_max = max_tile_num > self._max_tile_num[env_ids]
+            reward[new_max] += np.log2(max_tile_num[new_max]) * 0.1
+            self._max_tile_num[env_ids] = np.maximum(self._max_tile_num[env_ids], max_tile_num)
+        elif self._cfg.reward_normalize:
+            reward = raw_reward / self._cfg.reward_norm_scale
+        else:
+            reward = raw_reward
+        self._episode_return[env_ids] += raw_reward
+
+        full = self._spawn(env_ids)
+        exponents = self._exponents[env_ids]
+        highest = exponents_to_board(exponents.max(axis=(1, 2)))
+        done = full | (self._episode_length[env_ids] >= self._cfg.max_episode_steps)
+        if self.max_tile is not None:
+            done |= highest == self.max_tile
+        legal = self._legal_actions(exponents)
+        done |= ~legal.any(axis=1)
+
+        observations = self._make_obs(exponents, legal, self._chance[env_ids])
+        timesteps = {}
+        for i, env_id in enumerate(env_ids.tolist()):
+            info = {'raw_reward': raw_reward[i], 'current_max_tile_num': highest[i]}
+            if done[i]:
+                info['eval_episode_return'] = self._episode_return[env_id]
+            timesteps[env_id] = BaseEnvTimestep(
+                observations[i], np.array([reward[i]], dtype=np.float32), bool(done[i]), info
+            )
+        if done.any():
+            self.reset({env_id: None for env_id in env_ids[done].tolist()})
+        return timesteps
+
+    def seed(self, seed: Union[Dict[int, int], List[int], int], dynamic_seed: Optional[bool] = None) -> None:
+        """
+        Overview:
+            Set the seed of the random generator of the random tiles of all the games. A list or a dict of seeds, \
+            one per game as for an env manager, seeds the generator with its first seed.
+        """
+        if isinstance(seed, dict):
+            seed = list(seed.values())
+        if isinstance(seed, (list, tuple)):
+            seed = seed[0]
+        self._rng = np.random.default_rng(seed)
+
+    def close(self) -> None:
+        self._closed = True
+
+    def random_action(self) -> Dict[int, np.ndarray]:
+        return {env_id: np.array([self._action_space.sample()]) for env_id in range(self._env_num)}
+
+    @property
+    def ready_obs(self) -> Dict[int, Any]:
+        """
+        Overview:
+            The current observation of each game, which are all ready to step.
+        """
+        legal = self._legal_actions(self._exponents)
+        observations = self._make_obs(self._exponents, legal, self._chance)
+        return {env_id: obs for env_id, obs in enumerate(observations)}
+
+    @property
+    def ready_obs_id(self) -> List[int]:
+        return list(range(self._env_num))
+
+    @property
+    def done(self) -> bool:
+        return False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def env_num(self) -> int:
+        return self._env_num
+
+    @property
+    def observation_space(self) -> gym.spaces.Space:
+        return self._observation_space
+
+    @property
+    def action_space(self) -> gym.spaces.Space:
+        return self._action_space
+
+    @property
+    def reward_space(self) -> gym.spaces.Space:
+        return self._reward_range
+
+    def _spawn(self, env_ids: np.ndarray) -> np.ndarray:
+        """
+        Overview:
+            Add a random tile to the boards of ``env_ids`` and set their chances.
+        Returns:
+            - full (:obj:`np.ndarray`): Whether each board was full, so that no tile was added.
+        """
+        exponents, positions, tile_indices = spawn_tiles_batch(
+            self._exponents[env_ids], self._rng, self.tile_exponents, self.tile_probabilities
+        )
+        self._exponents[env_ids] = exponents
+        full = positions < 0
+        chance = positions if self.chance_space_size == 16 else tile_indices * 16 + positions
+        self._chance[env_ids[~full]] = chance[~full]
+        return full
+
+    def _legal_actions(self, exponents: np.ndarray) -> np.ndarray:
+        if self._cfg.ignore_legal_actions:
+            return np.ones((len(exponents), 4), dtype=bool)
+        return legal_actions_batch(exponents)
+
+    def _make_obs(self, exponents: np.ndarray, legal: np.ndarray, chance: np.ndarray) -> List[Any]:
+        """
+        Overview:
+            The observations of a batch of boards, as ``Game2048Env.step``.
+        """
+        if self._cfg.obs_type == 'raw_board':
+            return list(exponents_to_board(exponents))
+        observation = encode_exponents(exponents)
+        if not self._cfg.channel_last:
+            # (B, W, H, C) -> (B, C, W, H)
+            observation = np.transpose(observation, [0, 3, 1, 2])
+        if self._cfg.need_flatten:
+            observation = observation.reshape(len(exponents), -1)
+        if self._cfg.obs_type == 'raw_encoded_board':
+            return list(observation)
+        action_mask = legal.astype(np.int8)
+        return [
+            {
+                'observation': observation[i],
+                'action_mask': action_mask[i],
+                'to_play': -1,
+                'chance': int(chance[i])
+            } for i in range(len(exponents))
+        ]
+
+    def __repr__(self) -> str:
+        return "LightZero vectorized game 2048 Env({})".format(self._env_num)
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from .expectimax_search_based_bot import move
+from .game_2048_core import board_to_exponents, exponents_to_board, legal_actions_batch, move_batch, \
+    spawn_tiles_batch
+from .game_2048_env import Game2048Env
+from .game_2048_vec_env import Game2048VecEnv
+
+
+def reference_move(board: np.ndarray, action: int):
+    # the rules of 2048 on tile values: slide the tiles and merge each pair of equal tiles once, from the end
+    board = board.copy()
+    reward = 0
+    for i in range(4):
+        line = list(board[:, i] if action in [0, 2] else board[i])
+        if action in [1, 2]:
+            line = line[::-1]
+        tiles = [tile for tile in line if tile]
+        new_line, j = [], 0
+        while j < len(tiles):
+            if j + 1 < len(tiles) and tiles[j] == tiles[j + 1]:
+                new_line.append(2 * tiles[j])
+                reward += 2 * tiles[j]
+                j += 2
+            else:
+                new_line.append(tiles[j])
+                j += 1
+        new_line += [0] * (4 - len(new_line))
+        if action in [1, 2]:
+            new_line = new_line[::-1]
+        if action in [0, 2]:
+            board[:, i] = new_line
+        else:
+            board[i] = new_line
+    return board, reward
+
+
+def random_boards(num: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.RandomState(seed)
+    exponents = rng.randint(1, 8, size=(num, 4, 4))
+    exponents[rng.rand(num, 4, 4) < 0.4] = 0
+    return exponents_to_board(exponents)
+
+
+@pytest.mark.unittest
+def test_move_batch():
+    boards = random_boards(1000)
+    actions = np.random.RandomState(1).randint(4, size=len(boards))
+    new_exponents, rewards, moved = move_batch(board_to_exponents(boards), actions)
+    for board, action, new_exponent, reward, flag in zip(boards, actions, new_exponents, rewards, moved):
+        expected, expected_reward = reference_move(board, action)
+        assert np.array_equal(exponents_to_board(new_exponent), expected)
+        assert reward == expected_reward
+        assert flag == (not np.array_equal(expected, board))
+    # the tiles merge once per move, and the merges start from the end of the move
+    board = np.array([[2, 2, 4, 4], [2, 2, 2, 0], [8, 0, 8, 16], [0, 0, 0, 0]])
+    assert np.array_equal(
+        move(board, 3)[0], np.array([[4, 8, 0, 0], [4, 2, 0, 0], [16, 16, 0, 0], [0, 0, 0, 0]])
+    )
+    assert move(board, 1)[2] == 4 + 8 + 4 + 16
+    # the tiles above 2**15 are moved without the tables
+    board = np.array([[2 ** 15, 2 ** 15, 2 ** 16, 2 ** 16], [2, 0, 0, 2], [0] * 4, [0] * 4])
+    assert np.array_equal(move(board, 3)[0][:2], np.array([[2 ** 16, 2 ** 17, 0, 0], [4, 0, 0, 0]]))
+
+
+@pytest.mark.unittest
+def test_legal_actions_batch():
+    boards = random_boards(200, seed=2)
+    boards[0] = np.array([[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]])
+    legal = legal_actions_batch(board_to_exponents(boards))
+    assert not legal[0].any()
+    for board, board_legal in zip(boards, legal):
+        for action in range(4):
+            assert board_legal[action] == (not np.array_equal(reference_move(board, action)[0], board))
+
+
+@pytest.mark.unittest
+def test_spawn_tiles_batch():
+    exponents = board_to_exponents(random_boards(500, seed=3))
+    exponents[0] = 1
+    before = exponents.copy()
+    rng = np.random.default_rng(0)
+    exponents, positions, tile_indices = spawn_tiles_batch(exponents, rng, np.array([1, 2]), np.array([0.9, 0.1]))
+    assert positions[0] == -1 and np.array_equal(exponents[0], before[0])
+    for i in range(1, len(exponents)):
+        changed = np.flatnonzero((exponents[i] != before[i]).reshape(-1))
+        assert changed.tolist() == [positions[i]] and before[i].reshape(-1)[positions[i]] == 0
+        assert exponents[i].reshape(-1)[positions[i]] == tile_indices[i] + 1
+    # the new tiles are uniform on the empty cells
+    counts = np.zeros(16)
+    for _ in range(2000):
+        counts[spawn_tiles_batch(np.zeros((1, 4, 4), dtype=np.uint8), rng)[1][0]] += 1
+    assert counts.min() > 80
+
+
+@pytest.mark.unittest
+@pytest.mark.parametrize('ignore_legal_actions', [True, False])
+def test_game_2048_vec_env(ignore_legal_actions):
+    cfg = Game2048Env.default_config()
+    cfg.update(dict(env_id='game_2048', ignore_legal_actions=ignore_legal_actions, max_episode_steps=300))
+    env = Game2048VecEnv(cfg, env_num=8)
+    env.seed(0)
+    env.launch()
+    assert len(env.ready_obs) == 8
+    for obs in env.ready_obs.values():
+        assert obs['observation'].shape == (16, 4, 4) and obs['observation'].sum() == 16
+
+    reference_env = Game2048Env(cfg)
+    rng = np.random.RandomState(0)
+    num_episodes = 0
+    for _ in range(400):
+        obs = env.ready_obs
+        boards = {env_id: exponents_to_board(env._exponents[env_id]) for env_id in obs}
+        actions = {env_id: rng.randint(4) for env_id in obs}
+        timesteps = env.step(actions)
+        for env_id, timestep in timesteps.items():
+            # the move and the reward of a step are those of ``Game2048Env``, before the new tile
+            reference_env.reset(init_board=boards[env_id].copy())
+            if ignore_legal_actions or actions[env_id] in reference_env.legal_actions:
+                moved, reward = reference_move(boards[env_id], actions[env_id])
+                assert timestep.reward[0] == reward == timestep.info['raw_reward']
+                board = np.argmax(timestep.obs['observation'], axis=0)
+                new_tiles = np.flatnonzero((exponents_to_board(board) != moved).reshape(-1))
+                assert new_tiles.tolist() in [[timestep.obs['chance']], []]
+            reference_env.board = exponents_to_board(np.argmax(timestep.obs['observation'], axis=0))
+            mask = np.zeros(4, dtype=np.int8)
+            mask[reference_env.legal_actions] = 1
+            assert np.array_equal(timestep.obs['action_mask'], mask)
+            if timestep.done:
+                num_episodes += 1
+                assert 'eval_episode_return' in timestep.info
+                assert env.ready_obs[env_id]['observation'][1:].sum() == 2
+    assert num_episodes > 0
+    env.close()
+    assert env.closed